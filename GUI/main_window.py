@@ -1,14 +1,22 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import yaml
 import serial.tools.list_ports
 from GUI.code_editor import CodeEditor
 from struttura.menu import create_menu_bar
 from struttura.lang import tr, set_language
+from struttura.frame_scheduler import EDIT
+from struttura.config_parser import model_from_document
+from struttura.file_io import CANCELLED, DONE, PROGRESS, FileTask, load_file, save_file
+from struttura.marlin_lexer import is_header
+from struttura.parse_cache import ParseCache, cache_version, make_entry
 from struttura.traceback import log_exception
+import queue
 import sys
 import os
 
+# How often the status bar shows the progress of a file being opened or saved
+FILE_TASK_POLL_MS = 100
+
 class MarlinConfigurator(tk.Tk):
     def __init__(self):
         super().__init__()
@@ -25,6 +33,14 @@ class MarlinConfigurator(tk.Tk):
         self.config_path = tk.StringVar()
         self.connected = False
         self.current_file = None
+        # Option model of the loaded configuration header
+        self.config_model = None
+        # Line ending of the loaded file, which saving keeps
+        self.file_newline = '\n'
+        # Parsed and lexed headers, kept across sessions
+        self.parse_cache = ParseCache()
+        # File being read or written on a worker, one at a time
+        self.file_task = None
         self.modified = False
         
         # Configure style
@@ -42,6 +58,7 @@ class MarlinConfigurator(tk.Tk):
         self.bind('<Control-o>', lambda e: self.load_config())
         self.bind('<Control-s>', lambda e: self.save_config())
         self.bind('<Control-S>', lambda e: self.save_as_config())
+        self.bind('<Escape>', self.cancel_file_task)
     
     def setup_ui(self):
         # Main container
@@ -94,13 +111,21 @@ class MarlinConfigurator(tk.Tk):
         # Status bar
         self.status_var = tk.StringVar()
         self.status_var.set(tr('ready_status'))
+        status_frame = ttk.Frame(self)
+        status_frame.pack(side=tk.BOTTOM, fill=tk.X)
         status_bar = ttk.Label(
-            self, 
+            status_frame, 
             textvariable=self.status_var, 
             relief=tk.SUNKEN, 
             anchor=tk.W
         )
-        status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+        status_bar.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        
+        # Size of the editor's undo history
+        self.undo_status = ttk.Label(status_frame, relief=tk.SUNKEN, anchor=tk.E)
+        self.undo_status.pack(side=tk.RIGHT)
+        self.editor.scheduler.add_pass(self.update_undo_status, kinds=(EDIT,))
+        self.update_undo_status()
     
     def setup_editor_tab(self):
         """Set up the editor tab with the code editor"""
@@ -154,25 +179,112 @@ class MarlinConfigurator(tk.Tk):
         self.connect_btn.configure(text=tr('connect'))
         self.status_var.set(tr('disconnected'))
     
+    def run_file_task(self, label, failure, on_done, work, *args):
+        """Run ``work`` on a FileTask, with ``label`` and its progress in the
+        status bar; ``on_done`` gets the result on the Tk thread"""
+        if self.file_task is not None or self.editor.is_loading:
+            self.status_var.set(tr('file_busy'))
+            return False
+        self.file_task = FileTask(work, *args)
+        self.status_var.set(label)
+        self.after(FILE_TASK_POLL_MS, self.poll_file_task, label, failure, on_done)
+        return True
+    
+    def poll_file_task(self, label, failure, on_done):
+        """Show the running file task's progress, and hand its outcome over"""
+        messages = self.file_task.messages
+        kind = fraction = None
+        while kind in (None, PROGRESS):
+            try:
+                kind, value = messages.get_nowait()
+            except queue.Empty:
+                break
+            if kind == PROGRESS:
+                fraction = value
+        if kind in (None, PROGRESS):
+            if fraction is not None:
+                self.status_var.set(tr('file_progress', task=label, percent=round(fraction * 100)))
+            self.after(FILE_TASK_POLL_MS, self.poll_file_task, label, failure, on_done)
+            return
+        
+        self.file_task = None
+        try:
+            if kind == DONE:
+                on_done(value)
+            elif kind == CANCELLED:
+                self.status_var.set(tr('file_cancelled', task=label))
+            else:
+                raise value
+        except Exception as e:
+            self.status_var.set(f"{tr(failure)}: {str(e)}")
+            messagebox.showerror(tr('error'), f"{tr(failure)}: {str(e)}")
+    
+    def cancel_file_task(self, event=None):
+        """Cancel the file being opened or saved; saving leaves the file as it was"""
+        if self.file_task is not None:
+            self.file_task.cancel()
+    
+    def read_document(self, file_path, on_done):
+        """Read and parse ``file_path`` on a worker, then load it into the
+        editor as it is and call ``on_done()``; headers read before come
+        parsed and lexed from the cache"""
+        
+        def show(loaded):
+            self.editor.set_filename(file_path)
+            self.file_newline = loaded.newline
+            self.editor.load_document(loaded.content, loaded.parsed, done=lambda: shown(loaded))
+        
+        def shown(loaded):
+            if loaded.key is not None and not loaded.hit:
+                self.store_parse(loaded.key)
+            on_done()
+        
+        version = cache_version(CodeEditor.lexer_for(file_path))
+        self.run_file_task(tr('file_loading', file=os.path.basename(file_path)), 'load_error',
+                           show, load_file, file_path, self.parse_cache, version)
+    
+    def store_parse(self, key):
+        """Store the editor's parse of a header in the parse cache"""
+        if self.editor.is_large:
+            self.parse_cache.store(key, make_entry(self.editor.document))
+        else:
+            # Stored once the highlighter has lexed the whole header
+            self.editor.when_highlighted(
+                lambda snapshot: self.parse_cache.store(key, make_entry(self.editor.document, snapshot))
+            )
+    
+    def write_document(self, file_path, on_done):
+        """Save a snapshot of the editor's document to ``file_path`` on a
+        worker, with the file's line ending, then call ``on_done()``"""
+        self.run_file_task(tr('file_saving', file=os.path.basename(file_path)), 'save_error',
+                           lambda path: on_done(), save_file,
+                           file_path, self.editor.document_snapshot(), self.file_newline)
+    
     def load_config(self, event=None):
         """Load configuration from a file"""
         file_path = filedialog.askopenfilename(
-            filetypes=[("YAML files", "*.yaml;*.yml"), ("All files", "*.*")],
+            filetypes=[
+                ("YAML files", "*.yaml;*.yml"),
+                ("Marlin configuration", "Configuration*.h"),
+                ("All files", "*.*"),
+            ],
             title=tr('open_config')
         )
         
         if not file_path:
             return
-        
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                config_data = yaml.safe_load(f)
-                self.editor.delete('1.0', tk.END)
-                self.editor.insert(tk.END, yaml.dump(config_data, default_flow_style=False, allow_unicode=True))
-                self.current_file = file_path
-                self.status_var.set(tr('file_loaded').format(file=os.path.basename(file_path)))
-        except Exception as e:
-            messagebox.showerror(tr('error'), f"{tr('load_error')}: {str(e)}")
+        self.read_document(file_path, lambda: self.loaded_config(file_path))
+    
+    def loaded_config(self, file_path):
+        """Take over a file read_document loaded into the editor"""
+        self.current_file = file_path
+        if is_header(file_path):
+            # Configuration headers are edited as they are
+            self.config_model = model_from_document(self.editor.document, file_path)
+        else:
+            # YAML is edited as written, comments and formatting included
+            self.config_model = None
+        self.status_var.set(tr('file_loaded').format(file=os.path.basename(file_path)))
     
     def save_config(self, event=None):
         """Save configuration to the current file"""
@@ -180,13 +292,21 @@ class MarlinConfigurator(tk.Tk):
             self.save_as_config()
             return
         
-        try:
-            config_data = yaml.safe_load(self.editor.get('1.0', tk.END))
-            with open(self.current_file, 'w', encoding='utf-8') as f:
-                yaml.dump(config_data, f, default_flow_style=False, allow_unicode=True)
-            self.status_var.set(tr('file_saved').format(file=os.path.basename(self.current_file)))
-        except Exception as e:
-            messagebox.showerror(tr('error'), f"{tr('save_error')}: {str(e)}")
+        file_path = self.current_file
+        if not is_header(file_path):
+            # YAML is saved as edited; lines the live document could not
+            # read would not load again
+            errors = self.editor.document.errors(limit=1)
+            if errors:
+                line, row = errors[0]
+                messagebox.showerror(tr('error'), f"{tr('save_error')}: line {line + 1}: {row[1]}")
+                return
+        
+        def saved():
+            if is_header(file_path):
+                self.config_model = model_from_document(self.editor.document, file_path)
+            self.status_var.set(tr('file_saved').format(file=os.path.basename(file_path)))
+        self.write_document(file_path, saved)
     
     def save_as_config(self, event=None):
         """Save configuration to a new file"""
@@ -216,6 +336,11 @@ class MarlinConfigurator(tk.Tk):
             f"{tr('unexpected_error')}:\n{str(exc_value)}\n\n{tr('error_logged')}"
         )
     
+    def update_undo_status(self, kinds=None):
+        """Show the size of the editor's undo history in the status bar"""
+        journal = self.editor.journal
+        self.undo_status.config(text=f"Undo: {len(journal)} steps, {journal.memory / 1024:.1f} KB")
+    
     # Editor commands
     def undo(self):
         try:
@@ -1,4 +1,14 @@
-from .main import main
+import os
+import sys
+
+# Add the project root to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from struttura.cli import is_command, main as run_command
 
 if __name__ == "__main__":
+    # Commands like validate run headless, without Tk
+    if is_command(sys.argv[1:]):
+        sys.exit(run_command(sys.argv[1:]))
+    from .main import main
     main()
@@ -1,62 +1,15 @@
 import tkinter as tk
-from tkinter import ttk, font as tkfont
-from pygments import lex
-from pygments.lexers import CppLexer, get_lexer_by_name
-from pygments.token import Token
+from tkinter import ttk
 
-class LineNumbers(tk.Canvas):
-    def __init__(self, master, text_widget, *args, **kwargs):
-        super().__init__(master, *args, **kwargs)
-        self.text_widget = text_widget
-        
-        # Try to get a monospace font, fall back to system default if needed
-        self.font_family = 'Consolas'
-        self.font_size = 10
-        
-        # Check if Consolas is available, otherwise use a fallback
-        available_fonts = list(tkfont.families())
-        if 'Consolas' not in available_fonts:
-            # Try common monospace fonts in order of preference
-            for font in ['DejaVu Sans Mono', 'Liberation Mono', 'Courier New', 'Courier', 'monospace']:
-                if font in available_fonts:
-                    self.font_family = font
-                    break
-        
-        self.font = tkfont.Font(family=self.font_family, size=self.font_size)
-        self.text_widget.configure(font=self.font)
-        
-        self.text_widget.bind('<Configure>', self._on_configure)
-        self.text_widget.bind('<KeyRelease>', self._on_key_release)
-        self.text_widget.bind('<MouseWheel>', self._on_mousewheel)
-        self.text_widget.bind("<Button-4>", self._on_mousewheel)
-        self.text_widget.bind("<Button-5>", self._on_mousewheel)
-    
-    def _on_configure(self, event=None):
-        self.redraw()
-    
-    def _on_key_release(self, event=None):
-        self.redraw()
-    
-    def _on_mousewheel(self, event):
-        self.redraw()
-    
-    def redraw(self, *args):
-        self.delete('all')
-        
-        # Get the visible lines
-        first_visible_line = int(self.text_widget.index('@0,0').split('.')[0])
-        last_visible_line = int(self.text_widget.index(f'@0,{self.text_widget.winfo_height()}').split('.')[0])
-        
-        # Draw line numbers
-        for line in range(first_visible_line, last_visible_line + 2):
-            y = self.text_widget.bbox(f'{line}.0')[1] if self.text_widget.get(f'{line}.0', f'{line}.0 lineend').strip() else -1000
-            if y > 0:
-                self.create_text(2, y, anchor='nw', text=str(line), font=self.font, fill="#666666")
-        
-        # Update scroll region
-        self.configure(scrollregion=self.bbox('all'))
+from struttura.document_editor import DocumentEditor
+from struttura.gutter import LineGutter
+from struttura.syntax_theme import get_style_map
+
+class LineNumbers(LineGutter):
+    """Line number gutter of the editor; redraws are driven by the
+    editor's FrameScheduler, which sees edits, scrolling and resizing"""
 
-class CodeEditor(ttk.Frame):
+class CodeEditor(DocumentEditor, ttk.Frame):
     def __init__(self, master, **kwargs):
         super().__init__(master, **kwargs)
         self.master = master
@@ -65,13 +18,11 @@ class CodeEditor(ttk.Frame):
         # Configure tags for syntax highlighting
         self.setup_highlighting()
         
+        # Highlighting, parsing, undo and recovery of the document
+        self.setup_document(self.v_scrollbar, self._redraw_line_numbers, '#6a6a6a')
+        
         # Bind events
-        self.text.bind('<KeyRelease>', self._on_key_release)
         self.text.bind('<FocusIn>', self._on_focus_in)
-        self.text.bind('<FocusOut>', self._on_focus_out)
-        
-        # Setup lexer for syntax highlighting
-        self.lexer = CppLexer()
         
     def setup_ui(self):
         # Create main frame
@@ -99,9 +50,8 @@ class CodeEditor(ttk.Frame):
             font=('Courier New', 10),  # Default font that's widely available
             tabs=(4 * 8),  # 4 spaces for tab
             insertwidth=2,
-            undo=True,
-            autoseparators=True,
-            maxundo=-1
+            # Undo is kept by the editor's UndoJournal, not by Tk
+            undo=False
         )
         self.text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         
@@ -118,23 +68,10 @@ class CodeEditor(ttk.Frame):
         self.setup_context_menu()
     
     def setup_highlighting(self):
-        # Syntax highlighting colors
-        self.text.tag_configure('Token.Comment', foreground='#6A9955')
-        self.text.tag_configure('Token.Keyword', foreground='#569CD6')
-        self.text.tag_configure('Token.Keyword.Constant', foreground='#9CDCFE')
-        self.text.tag_configure('Token.Keyword.Declaration', foreground='#C586C0')
-        self.text.tag_configure('Token.Keyword.Namespace', foreground='#569CD6')
-        self.text.tag_configure('Token.Keyword.Pseudo', foreground='#569CD6')
-        self.text.tag_configure('Token.Keyword.Reserved', foreground='#569CD6')
-        self.text.tag_configure('Token.Keyword.Type', foreground='#4EC9B0')
-        self.text.tag_configure('Token.Name.Class', foreground='#4EC9B0')
-        self.text.tag_configure('Token.Name.Function', foreground='#DCDCAA')
-        self.text.tag_configure('Token.Name.Variable', foreground='#9CDCFE')
-        self.text.tag_configure('Token.Literal.Number', foreground='#B5CEA8')
-        self.text.tag_configure('Token.Literal.String', foreground='#CE9178')
-        self.text.tag_configure('Token.Operator', foreground='#D4D4D4')
-        self.text.tag_configure('Token.Punctuation', foreground='#D4D4D4')
-        self.text.tag_configure('Token.Text', foreground='#D4D4D4')
+        # Syntax highlighting colors: a fixed set of tags shared with every
+        # editor using the same theme; other token types use their parent's
+        self.style_map = get_style_map('dark')
+        self.style_map.configure(self.text)
     
     def setup_context_menu(self):
         self.context_menu = tk.Menu(self.text, tearoff=0)
@@ -163,65 +100,20 @@ class CodeEditor(ttk.Frame):
         self.text.tag_add('sel', '1.0', 'end')
         return 'break'
     
-    def _on_key_release(self, event=None):
-        self.highlight_syntax()
-        self.line_numbers.redraw()
+    def _redraw_line_numbers(self, kinds=None):
+        if self.line_numbers_visible:
+            self.line_numbers.line_offset = self.window.first
+            self.line_numbers.redraw()
     
     def _on_focus_in(self, event):
         self.highlight_syntax()
     
-    def _on_focus_out(self, event):
-        pass
-    
-    def highlight_syntax(self, event=None):
-        if not hasattr(self, 'lexer'):
-            return
-            
-        # Get the text
-        text = self.text.get('1.0', 'end-1c')
-        if not text.strip():
-            return
-        
-        # Clear previous tags
-        for tag in self.text.tag_names():
-            if tag != 'sel' and tag != 'current_line':
-                self.text.tag_remove(tag, '1.0', 'end')
-        
-        # Lex the text
-        try:
-            tokens = list(lex(text, self.lexer))
-            
-            # Apply highlighting
-            for token in tokens:
-                token_type = token[0]
-                token_text = token[1]
-                start = token[2][0] - 1  # Convert to 0-based index
-                line = token[2][1]
-                
-                if not token_text.strip():
-                    continue
-                    
-                # Calculate start and end positions
-                start_pos = f"{line}.{token[2][2]}"
-                end_pos = f"{line}.{token[2][2] + len(token_text)}"
-                
-                # Apply the tag
-                tag_name = str(token_type)
-                if tag_name not in self.text.tag_names():
-                    self.text.tag_configure(tag_name, foreground='#D4D4D4')
-                
-                self.text.tag_add(tag_name, start_pos, end_pos)
-                
-        except Exception as e:
-            # If there's an error in lexing, just continue without highlighting
-            pass
-    
     def show_line_numbers(self):
         """Show line numbers in the editor"""
         if not hasattr(self, 'line_numbers_visible') or not self.line_numbers_visible:
             self.line_numbers.pack(side=tk.LEFT, fill=tk.Y, before=self.text_frame)
             self.line_numbers_visible = True
-            self.line_numbers.redraw()
+            self.line_numbers.redraw(force=True)
     
     def hide_line_numbers(self):
         """Hide line numbers in the editor"""
@@ -238,18 +130,6 @@ class CodeEditor(ttk.Frame):
     def insert(self, *args, **kwargs):
         return self.text.insert(*args, **kwargs)
     
-    def edit_undo(self):
-        try:
-            self.text.edit_undo()
-        except tk.TclError:
-            pass
-    
-    def edit_redo(self):
-        try:
-            self.text.edit_redo()
-        except tk.TclError:
-            pass
-    
     def event_generate(self, *args, **kwargs):
         return self.text.event_generate(*args, **kwargs)
     
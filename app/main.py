@@ -1,18 +1,39 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import yaml
 import serial.tools.list_ports
+import queue
 import sys
 import os
+import time
+import yaml
 
 # Add the project root to the Python path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from app.code_editor import CodeEditor
+from struttura.frame_scheduler import EDIT
 from struttura.menu import create_menu_bar
 from struttura.lang import tr, set_language
+from struttura.config_diff import EQUAL, diff_lines, diff_options
+from struttura.config_parser import model_from_document, parse_config
+from struttura.diff_view import DiffView
+from struttura.file_io import CANCELLED, DONE, PROGRESS, FileTask, load_file, read_file, save_file
+from struttura.marlin_lexer import is_header
+from struttura.parse_cache import ParseCache, cache_version, make_entry
+from struttura.profiles import BASE, DocumentLayer, ProfileSet, profiles_path
+from struttura.history_dialog import HistoryDialog
+from struttura.recovery_journal import RecoveryJournal
+from struttura.rules import validator_for
+from struttura.snapshot_store import SnapshotStore
+from struttura.symbol_index import SymbolIndex
+from struttura.template_dialog import TemplateDialog
+from struttura.template_store import TemplateStore
+from struttura.logger import log_error
 from struttura.traceback import log_exception
 
+# How often the status bar shows the progress of a file being opened or saved
+FILE_TASK_POLL_MS = 100
+
 class MarlinConfigurator(tk.Tk):
     def __init__(self):
         super().__init__()
@@ -29,6 +50,40 @@ class MarlinConfigurator(tk.Tk):
         self.config_path = tk.StringVar()
         self.connected = False
         self.current_file = None
+        # Option model of the loaded configuration header
+        self.config_model = None
+        # Validation rules over the editor's document, re-run as it changes
+        self.validator = None
+        # Line ending of the loaded file, which saving keeps
+        self.file_newline = '\n'
+        # Parsed and lexed headers, kept across sessions
+        self.parse_cache = ParseCache()
+        # File being read or written on a worker, one at a time
+        self.file_task = None
+        # Symbols of the headers in the loaded file's directory, and
+        # whether the editor changed since they were taken from it
+        self.symbol_index = None
+        self.symbols_stale = False
+        # (path, lines) of the file the Diff tab compares the editor with,
+        # and whether the editor changed since the diff was shown
+        self.diff_base = None
+        self.diff_stale = False
+        # Option changes listed in the Diff tab
+        self.diff_changes = []
+        # Printer template library, of which only the index is read
+        self.template_store = None
+        # Revisions of the files saved, each kept on a worker as it is saved
+        self.snapshots = SnapshotStore()
+        # Edits since the last open or save, written on a worker, from
+        # which a crash is recovered at the next start
+        self.recovery = RecoveryJournal()
+        # Overlay layers and profiles of the loaded header, the stamp of
+        # the file they were read from, the rows the Profiles tab shows
+        # (option -> (value, layer)) and whether it needs updating
+        self.profiles = None
+        self.profiles_stamp = None
+        self.profile_rows = {}
+        self.profiles_stale = False
         self.modified = False
         self.show_line_numbers = tk.BooleanVar(value=True)  # Track line numbers visibility
         
@@ -42,11 +97,16 @@ class MarlinConfigurator(tk.Tk):
         # Setup UI
         self.setup_ui()
         self.update_ports()
+        self.editor.recovery = self.recovery
+        self.after_idle(self.offer_recovery)
         
         # Bind keyboard shortcuts
         self.bind('<Control-o>', lambda e: self.load_config())
         self.bind('<Control-s>', lambda e: self.save_config())
         self.bind('<Control-S>', lambda e: self.save_as_config())
+        self.bind('<Escape>', self.cancel_file_task)
+        self.bind('<F12>', self.goto_definition)
+        self.bind('<Shift-F12>', self.find_usages)
     
     def setup_ui(self):
         # Main container
@@ -110,17 +170,27 @@ class MarlinConfigurator(tk.Tk):
         
         # Add editor tab
         self.setup_editor_tab()
+        self.setup_diff_tab()
+        self.setup_profiles_tab()
         
         # Status bar
         self.status_var = tk.StringVar()
         self.status_var.set(tr('ready_status'))
+        status_frame = ttk.Frame(self)
+        status_frame.pack(side=tk.BOTTOM, fill=tk.X)
         status_bar = ttk.Label(
-            self, 
+            status_frame, 
             textvariable=self.status_var, 
             relief=tk.SUNKEN, 
             anchor=tk.W
         )
-        status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+        status_bar.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        
+        # Size of the editor's undo history
+        self.undo_status = ttk.Label(status_frame, relief=tk.SUNKEN, anchor=tk.E)
+        self.undo_status.pack(side=tk.RIGHT)
+        self.editor.scheduler.add_pass(self.update_undo_status, kinds=(EDIT,))
+        self.update_undo_status()
         
         # Initialize validation status
         self.validation_status = ttk.Label(
@@ -139,9 +209,252 @@ class MarlinConfigurator(tk.Tk):
         self.editor = CodeEditor(self.editor_tab)
         self.editor.pack(fill=tk.BOTH, expand=True)
         
+        # Revalidate as the user types, in the same per-frame pass as the
+        # editor's highlighting and gutter redraw
+        self.editor.scheduler.add_pass(self.on_editor_changed, kinds=(EDIT,))
+        
         # Initialize line numbers based on the current setting
         self.toggle_line_numbers()
     
+    def setup_diff_tab(self):
+        """Set up the tab comparing the editor with another file"""
+        self.diff_tab = ttk.Frame(self.notebook)
+        self.notebook.add(self.diff_tab, text=tr('diff_tab'))
+        
+        toolbar = ttk.Frame(self.diff_tab, padding="2")
+        toolbar.pack(fill=tk.X)
+        ttk.Button(toolbar, text=tr('compare_with'), command=self.compare_with).pack(side=tk.LEFT)
+        ttk.Button(
+            toolbar, text=tr('previous_change'),
+            command=lambda: self.diff_view.next_change(backwards=True)
+        ).pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Button(
+            toolbar, text=tr('next_change'),
+            command=lambda: self.diff_view.next_change()
+        ).pack(side=tk.LEFT, padx=(5, 0))
+        self.diff_label = ttk.Label(toolbar, text=tr('diff_prompt'))
+        self.diff_label.pack(side=tk.LEFT, padx=10)
+        
+        panes = ttk.PanedWindow(self.diff_tab, orient=tk.VERTICAL)
+        panes.pack(fill=tk.BOTH, expand=True)
+        
+        # Options enabled, disabled, changed, added or removed
+        columns = ('change', 'option', 'before', 'after')
+        self.option_changes = ttk.Treeview(panes, columns=columns, show='headings', height=6)
+        for column, width in zip(columns, (80, 260, 200, 200)):
+            self.option_changes.heading(column, text=tr(f'diff_{column}'))
+            self.option_changes.column(column, width=width, stretch=column in ('before', 'after'))
+        self.option_changes.bind('<<TreeviewSelect>>', self.show_option_change)
+        panes.add(self.option_changes, weight=1)
+        
+        # The lines of both files side by side
+        self.diff_view = DiffView(panes)
+        panes.add(self.diff_view, weight=3)
+        
+        self.notebook.bind('<<NotebookTabChanged>>', self.on_tab_changed)
+    
+    def setup_profiles_tab(self):
+        """Set up the tab showing the options of a profile and the layer
+        each comes from"""
+        self.profiles_tab = ttk.Frame(self.notebook)
+        self.notebook.add(self.profiles_tab, text=tr('profiles_tab'))
+        
+        toolbar = ttk.Frame(self.profiles_tab, padding="2")
+        toolbar.pack(fill=tk.X)
+        ttk.Label(toolbar, text=tr('profile')).pack(side=tk.LEFT)
+        self.profile_var = tk.StringVar(value=BASE)
+        self.profile_combobox = ttk.Combobox(toolbar, textvariable=self.profile_var, state='readonly',
+                                             width=30, values=[BASE])
+        self.profile_combobox.pack(side=tk.LEFT, padx=5)
+        self.profile_combobox.bind('<<ComboboxSelected>>', lambda e: self.show_profile())
+        self.profile_overrides_only = tk.BooleanVar(value=False)
+        ttk.Checkbutton(toolbar, text=tr('profile_overrides_only'), variable=self.profile_overrides_only,
+                        command=self.show_profile).pack(side=tk.LEFT, padx=5)
+        self.profiles_label = ttk.Label(toolbar, text=tr('profiles_prompt'))
+        self.profiles_label.pack(side=tk.LEFT, padx=10)
+        
+        columns = ('option', 'value', 'layer')
+        frame = ttk.Frame(self.profiles_tab)
+        frame.pack(fill=tk.BOTH, expand=True)
+        self.profile_tree = ttk.Treeview(frame, columns=columns, show='headings')
+        for column, width in zip(columns, (300, 300, 120)):
+            self.profile_tree.heading(column, text=tr(f'profile_{column}'))
+            self.profile_tree.column(column, width=width, stretch=column == 'value')
+        # Options a layer sets over the base
+        self.profile_tree.tag_configure('layer', foreground='#1f6fd1')
+        scrollbar = ttk.Scrollbar(frame, command=self.profile_tree.yview)
+        self.profile_tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.profile_tree.pack(fill=tk.BOTH, expand=True)
+        self.profile_tree.bind('<Double-Button-1>', self.show_profile_option)
+    
+    def load_profiles(self, file_path):
+        """Read the profiles of the header ``file_path`` over the editor's
+        document, if it has a profiles file"""
+        self.profiles = ProfileSet(DocumentLayer(self.editor.document))
+        self.profiles_stamp = None
+        self.refresh_profiles(file_path)
+    
+    def refresh_profiles(self, file_path):
+        """Read the profiles file again if it changed since it was read;
+        layers kept over are updated in place"""
+        path = profiles_path(file_path)
+        try:
+            stamp = os.stat(path).st_mtime_ns
+        except OSError:
+            stamp = None
+        if stamp == self.profiles_stamp:
+            return
+        self.profiles_stamp = stamp
+        try:
+            if stamp is None:
+                # No profiles file, or none any more
+                self.profiles.load({})
+            else:
+                self.profiles.read(path)
+        except (OSError, ValueError, yaml.YAMLError) as e:
+            self.status_var.set(tr('profiles_read_error', file=os.path.basename(path), error=str(e)))
+        names = [BASE] + list(self.profiles.profiles)
+        self.profile_combobox.configure(values=names)
+        if self.profile_var.get() not in names:
+            self.profile_var.set(BASE)
+        self.profiles_stale = True
+    
+    @staticmethod
+    def profile_value_text(value):
+        """An option's value as the Profiles tab lists it"""
+        if value is True:
+            return tr('option_enabled')
+        if value is False:
+            return tr('option_disabled')
+        if isinstance(value, (list, tuple)):
+            return "{ " + ", ".join(str(item) for item in value) + " }"
+        return str(value)
+    
+    def show_profile(self):
+        """Show the options of the chosen profile, changing only the rows
+        that differ from those shown"""
+        self.profiles_stale = False
+        tree = self.profile_tree
+        if self.profiles is None:
+            tree.delete(*tree.get_children())
+            self.profile_rows = {}
+            return
+        name = self.profile_var.get()
+        view = self.profiles.view(None if name == BASE else name)
+        overrides_only = self.profile_overrides_only.get()
+        rows = {}
+        overridden = 0
+        for key, value, layer in view.items():
+            if layer != BASE:
+                overridden += 1
+            elif overrides_only:
+                continue
+            rows[key] = (self.profile_value_text(value), layer)
+        
+        shown = self.profile_rows
+        for key in shown.keys() - rows.keys():
+            tree.delete(key)
+        for index, (key, row) in enumerate(rows.items()):
+            tags = ('layer',) if row[1] != BASE else ()
+            if key not in shown:
+                tree.insert('', index, iid=key, values=(key,) + row, tags=tags)
+            elif shown[key] != row:
+                tree.item(key, values=(key,) + row, tags=tags)
+        self.profile_rows = rows
+        self.profiles_label.config(text=tr('profiles_summary', count=overridden, total=len(view.keys())))
+    
+    def show_profile_option(self, event=None):
+        """Put the editor's cursor on the option selected in the Profiles tab"""
+        selection = self.profile_tree.selection()
+        if not selection:
+            return
+        rows = self.editor.document.find_all(selection[0])
+        lines = sorted(self.editor.document.line_of(row) for row in rows)
+        if not lines:
+            self.status_var.set(tr('layer_only', option=selection[0]))
+            return
+        self.notebook.select(self.editor_tab)
+        self.editor.goto_line(lines[0])
+    
+    def compare_with(self):
+        """Choose a file for the Diff tab to compare the editor with"""
+        file_path = filedialog.askopenfilename(
+            filetypes=[
+                (tr('marlin_configuration'), "Configuration*.h"),
+                (tr('yaml_files'), "*.yaml;*.yml"),
+                (tr('all_files'), "*.*"),
+            ]
+        )
+        if not file_path:
+            return
+        
+        def read(result):
+            text, _ = result
+            self.diff_base = (file_path, text.split('\n'))
+            self.update_diff()
+            self.notebook.select(self.diff_tab)
+        
+        self.run_file_task(tr('file_loading', file=os.path.basename(file_path)), 'load_error',
+                           read, read_file, file_path)
+    
+    def on_tab_changed(self, event=None):
+        """Compare again when the Diff tab is shown after edits, and show
+        the profiles again when they or the editor changed"""
+        if self.diff_stale and self.notebook.select() == str(self.diff_tab):
+            self.update_diff()
+        if self.notebook.select() == str(self.profiles_tab):
+            if self.profiles is not None:
+                self.refresh_profiles(self.current_file)
+            if self.profiles_stale:
+                self.show_profile()
+    
+    def update_diff(self):
+        """Compare the editor's document with the chosen file, by lines and,
+        for headers, by options"""
+        if self.diff_base is None:
+            return
+        self.diff_stale = False
+        base_path, base_lines = self.diff_base
+        lines = self.editor.document_text().split('\n')
+        opcodes = diff_lines(base_lines, lines)
+        self.diff_view.show(base_lines, lines, opcodes)
+        
+        self.option_changes.delete(*self.option_changes.get_children())
+        self.diff_changes = []
+        if is_header(base_path) and self.current_file and is_header(self.current_file):
+            # The editor's options come from its live document, parsed already
+            self.diff_changes = diff_options(parse_config(base_lines),
+                                             model_from_document(self.editor.document))
+        for i, change in enumerate(self.diff_changes):
+            self.option_changes.insert('', tk.END, iid=str(i), values=(
+                tr(f'diff_{change.kind}'), change.name, self.option_text(change.before), self.option_text(change.after)
+            ))
+        
+        blocks = sum(1 for opcode in opcodes if opcode.tag != EQUAL)
+        current = os.path.basename(self.current_file) if self.current_file else tr('diff_editor')
+        self.diff_label.config(text=tr('diff_summary', old=os.path.basename(base_path), new=current,
+                                       blocks=blocks, options=len(self.diff_changes)))
+    
+    @staticmethod
+    def option_text(option):
+        """An option's value as the Diff tab lists it"""
+        if option is None:
+            return ""
+        return option.raw if option.enabled else f"//{option.raw}"
+    
+    def show_option_change(self, event=None):
+        """Scroll the side-by-side view to the selected option change"""
+        selection = self.option_changes.selection()
+        if not selection:
+            return
+        change = self.diff_changes[int(selection[0])]
+        if change.after is not None:
+            row = self.diff_view.row_of(right=change.after.line)
+        else:
+            row = self.diff_view.row_of(left=change.before.line)
+        self.diff_view.scroll_to(max(row - 3, 0))
+    
     def toggle_line_numbers(self):
         """Toggle line numbers in the editor"""
         self.show_line_numbers.set(not self.show_line_numbers.get())
@@ -199,48 +512,17 @@ class MarlinConfigurator(tk.Tk):
         self.status_indicator.config(foreground="red")
         self.status_label.config(text=tr('disconnected'))
     
-    def validate_config(self, config_data):
-        """
-        Validate the configuration data
-        
-        Args:
-            config_data (dict): The configuration data to validate
-            
-        Returns:
-            tuple: (is_valid, errors) where is_valid is a boolean and errors is a list of error messages
-        """
-        errors = []
-        
-        # Check for required top-level sections
-        required_sections = ['configuration', 'pins', 'temperature', 'motion']
-        for section in required_sections:
-            if section not in config_data:
-                errors.append(f"Missing required section: {section}")
-        
-        # Check for required configuration values
-        if 'configuration' in config_data:
-            config = config_data['configuration']
-            if 'firmware_name' not in config:
-                errors.append("Missing required configuration: firmware_name")
-            if 'firmware_version' not in config:
-                errors.append("Missing required configuration: firmware_version")
-        
-        # Add more validation rules as needed
-        
-        return len(errors) == 0, errors
-    
-    def update_validation_status(self, config_data):
-        """Update the validation status in the UI"""
-        if not config_data:
+    def update_validation_status(self):
+        """Show the validator's live results in the UI"""
+        if self.validator is None:
             self.validation_status.config(
                 text="No configuration loaded",
                 foreground="gray"
             )
             return
-            
-        is_valid, errors = self.validate_config(config_data)
         
-        if is_valid:
+        errors = self.validation_errors()
+        if not errors:
             self.validation_status.config(
                 text="✓ Configuration is valid",
                 foreground="green"
@@ -255,32 +537,406 @@ class MarlinConfigurator(tk.Tk):
             )
             
             # Show detailed errors in status bar
-            if errors:
-                self.status_var.set(f"Validation error: {errors[0]}")
+            self.status_var.set(f"Validation error: {errors[0]}")
+    
+    def syntax_errors(self):
+        """Lines of the YAML document that could not be read, as messages"""
+        return [tr('line_error', line=line + 1, error=row[1]) for line, row in self.editor.document.errors()]
+    
+    def validation_errors(self):
+        """Unreadable lines, then the failures of the validation rules"""
+        return self.syntax_errors() + self.validator.errors()
+    
+    def on_editor_changed(self, kinds=None):
+        """Revalidate the editor contents after edits"""
+        self.symbols_stale = True
+        self.diff_stale = self.diff_base is not None
+        if self.validator is None:
+            return
+        # The live document re-parsed only the lines the edits touched, and
+        # only the rules reading the keys on those lines, or the options an
+        # edited #if block turned on or off, run again; edits that changed
+        # neither leave the validation as it was
+        changed = self.editor.document.take_changes() | self.editor.take_effective_changes()
+        if not changed:
+            return
+        if self.profiles is not None:
+            # Only the changed options are resolved again in each profile
+            self.profiles.base.changed(changed)
+            self.profiles_stale = True
+        self.validator.update(changed)
+        self.update_validation_status()
+    
+    def run_file_task(self, label, failure, on_done, work, *args):
+        """Run ``work`` on a FileTask, with ``label`` and its progress in the
+        status bar; ``on_done`` gets the result on the Tk thread"""
+        if self.file_task is not None or self.editor.is_loading:
+            self.status_var.set(tr('file_busy'))
+            return False
+        self.file_task = FileTask(work, *args)
+        self.status_var.set(label)
+        self.after(FILE_TASK_POLL_MS, self.poll_file_task, label, failure, on_done)
+        return True
+    
+    def poll_file_task(self, label, failure, on_done):
+        """Show the running file task's progress, and hand its outcome over"""
+        messages = self.file_task.messages
+        kind = fraction = None
+        while kind in (None, PROGRESS):
+            try:
+                kind, value = messages.get_nowait()
+            except queue.Empty:
+                break
+            if kind == PROGRESS:
+                fraction = value
+        if kind in (None, PROGRESS):
+            if fraction is not None:
+                self.status_var.set(tr('file_progress', task=label, percent=round(fraction * 100)))
+            self.after(FILE_TASK_POLL_MS, self.poll_file_task, label, failure, on_done)
+            return
+        
+        self.file_task = None
+        try:
+            if kind == DONE:
+                on_done(value)
+            elif kind == CANCELLED:
+                self.status_var.set(tr('file_cancelled', task=label))
+            else:
+                raise value
+        except Exception as e:
+            self.status_var.set(f"{tr(failure)}: {str(e)}")
+            messagebox.showerror(tr('error_title'), f"{tr(failure)}: {str(e)}")
+    
+    def cancel_file_task(self, event=None):
+        """Cancel the file being opened or saved; saving leaves the file as it was"""
+        if self.file_task is not None:
+            self.file_task.cancel()
+    
+    def read_document(self, file_path, on_done):
+        """Read and parse ``file_path`` on a worker, then load it into the
+        editor as it is and call ``on_done()``; headers read before come
+        parsed and lexed from the cache"""
+        
+        def show(loaded):
+            self.status_var.set(tr('file_showing', file=os.path.basename(file_path)))
+            self.editor.set_filename(file_path)
+            self.file_newline = loaded.newline
+            self.editor.load_document(loaded.content, loaded.parsed, done=lambda: shown(loaded))
+        
+        def shown(loaded):
+            if loaded.key is not None and not loaded.hit:
+                self.store_parse(loaded.key)
+            on_done()
+        
+        version = cache_version(CodeEditor.lexer_for(file_path))
+        self.run_file_task(tr('file_loading', file=os.path.basename(file_path)), 'load_error',
+                           show, load_file, file_path, self.parse_cache, version)
+    
+    def store_parse(self, key):
+        """Store the editor's parse of a header in the parse cache"""
+        if self.editor.is_large:
+            self.parse_cache.store(key, make_entry(self.editor.document))
+        else:
+            # Stored once the highlighter has lexed the whole header
+            self.editor.when_highlighted(
+                lambda snapshot: self.parse_cache.store(key, make_entry(self.editor.document, snapshot))
+            )
+    
+    def write_document(self, file_path, on_done):
+        """Save a snapshot of the editor's document to ``file_path`` on a
+        worker, with the file's line ending, then call ``on_done(snapshot)``"""
+        snapshot = self.editor.document_snapshot()
+        
+        def saved(path):
+            self.recovery.saved()
+            on_done(snapshot)
+        
+        if self.run_file_task(tr('file_saving', file=os.path.basename(file_path)), 'save_error',
+                              saved, save_file, file_path, snapshot, self.file_newline):
+            # Edits from now on are journaled against the text being saved,
+            # which stays to recover until the save is done
+            self.recovery.start(file_path, snapshot, self.file_newline, saved=False)
+    
+    def keep_revision(self, file_path, snapshot):
+        """Keep ``snapshot`` as a revision of ``file_path`` in the backup
+        store, on a worker"""
+        task = FileTask(lambda task: self.snapshots.snapshot(file_path, snapshot, task))
+        self.after(FILE_TASK_POLL_MS, self.poll_revision, task, file_path)
+    
+    def poll_revision(self, task, file_path):
+        """Report a revision keep_revision could not keep"""
+        kind = None
+        while kind in (None, PROGRESS):
+            try:
+                kind, value = task.messages.get_nowait()
+            except queue.Empty:
+                self.after(FILE_TASK_POLL_MS, self.poll_revision, task, file_path)
+                return
+        if kind not in (DONE, CANCELLED):
+            log_error(f"Failed to back up {file_path}: {value}")
+            self.status_var.set(tr('backup_failed', file=os.path.basename(file_path), error=value))
+    
+    def show_history(self, event=None):
+        """List the revisions kept of the current file"""
+        if not self.current_file:
+            self.status_var.set(tr('history_unavailable'))
+            return
+        HistoryDialog.show(self, self.snapshots, self.current_file,
+                           self.restore_revision, self.compare_revision)
+    
+    def restore_revision(self, revision):
+        """Put a revision of the current file in the editor, keeping the
+        editor's text as a revision first so the restore can be undone"""
+        file_path = self.current_file
+        when = time.strftime('%Y-%m-%d %H:%M', time.localtime(revision.time))
+        if not messagebox.askyesno(
+            tr('restore_revision'),
+            tr('restore_revision_confirm', file=os.path.basename(file_path), time=when)
+        ):
+            return
+        snapshot = self.editor.document_snapshot()
+        
+        def work(task):
+            self.snapshots.snapshot(file_path, snapshot)
+            return self.snapshots.restore(revision)
+        
+        def restored(text):
+            def shown():
+                self.loaded_config(file_path, saved=False)
+                self.status_var.set(tr('revision_restored', file=os.path.basename(file_path), time=when))
+            self.editor.load_document(text, done=shown)
+        
+        self.run_file_task(tr('revision_restoring', file=os.path.basename(file_path)), 'restore_error',
+                           restored, work)
+    
+    def compare_revision(self, revision):
+        """Compare the editor with a revision of the current file in the Diff tab"""
+        file_path = self.current_file
+        
+        def read(text):
+            self.diff_base = (file_path, text.split('\n'))
+            self.update_diff()
+            self.notebook.select(self.diff_tab)
+        
+        self.run_file_task(tr('revision_loading', file=os.path.basename(file_path)), 'diff_load_error',
+                           read, lambda task: self.snapshots.restore(revision))
     
     def load_config(self, event=None):
         """Load configuration from a file"""
         file_path = filedialog.askopenfilename(
-            filetypes=[("YAML files", "*.yaml;*.yml"), ("All files", "*.*")]
+            filetypes=[
+                (tr('yaml_files'), "*.yaml;*.yml"),
+                (tr('marlin_configuration'), "Configuration*.h"),
+                (tr('all_files'), "*.*"),
+            ]
         )
         
         if not file_path:
             return
+        self.read_document(file_path, lambda: self.loaded_config(file_path))
+    
+    def new_from_template(self, event=None):
+        """Start a configuration from a template of the printer library"""
+        if self.template_store is None:
+            try:
+                self.template_store = TemplateStore()
+            except (OSError, ValueError) as e:
+                messagebox.showerror(tr('error_title'), tr('template_library_error', error=str(e)))
+                return
+        TemplateDialog.show(self, self.template_store, self.create_from_template)
+    
+    def create_from_template(self, template):
+        """Write the headers of ``template`` to a chosen directory and open them"""
+        directory = filedialog.askdirectory(title=tr('template_directory', vendor=template.vendor, model=template.model))
+        if not directory:
+            return
+        existing = [name for name in template.files if os.path.exists(os.path.join(directory, name))]
+        if existing and not messagebox.askyesno(
+            tr('replace_files'),
+            tr('replace_files_confirm', files=', '.join(existing), directory=directory)
+        ):
+            return
+        store = self.template_store
         
-        try:
-            with open(file_path, 'r') as f:
-                config_data = yaml.safe_load(f)
-                self.editor.delete('1.0', tk.END)
-                yaml_str = yaml.dump(config_data, default_flow_style=False)
-                self.editor.insert(tk.END, yaml_str)
-                self.current_file = file_path
-                self.status_var.set(f"Loaded {os.path.basename(file_path)}")
-                
-                # Update validation status
-                self.update_validation_status(config_data)
-                
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to load file: {str(e)}")
+        def created(paths):
+            # Configuration.h first, when the template has one
+            names = [os.path.basename(path) for path in paths]
+            file_path = paths[names.index('Configuration.h')] if 'Configuration.h' in names else paths[0]
+            self.read_document(file_path, lambda: self.loaded_config(file_path))
+        
+        self.run_file_task(tr('template_creating', vendor=template.vendor, model=template.model), 'template_error',
+                           created, lambda task: store.extract(template.id, directory, task))
+    
+    def offer_recovery(self):
+        """Offer back the text a crash, or closing without saving, left
+        unsaved in the recovery journal"""
+        for recovered in self.recovery.pending():
+            name = os.path.basename(recovered.path) if recovered.path else tr('unsaved_document')
+            when = time.strftime('%Y-%m-%d %H:%M', time.localtime(recovered.time))
+            if messagebox.askyesno(
+                tr('recover_title'),
+                tr('recover_confirm', file=name, time=when, edits=recovered.edits)
+            ):
+                self.recover(recovered)
+                return
+            self.recovery.discard(recovered)
+        self.recovery.start(None, self.editor.document_snapshot())
+    
+    def recover(self, recovered):
+        """Put a document rebuilt from the recovery journal in the editor,
+        unsaved"""
+        file_path = recovered.path
+        # Its journal goes once the document is journaled again
+        self.recovery.take_over(recovered)
+        if file_path:
+            self.editor.set_filename(file_path)
+        self.file_newline = recovered.newline
+        
+        def shown():
+            if file_path:
+                self.loaded_config(file_path, saved=False)
+            else:
+                self.recovery.start(None, self.editor.document_snapshot(), saved=False)
+            self.status_var.set(tr('recovered', file=os.path.basename(file_path) if file_path else tr('new_document')))
+        
+        self.editor.load_document(recovered.text, done=shown)
+    
+    def loaded_config(self, file_path, saved=True):
+        """Take over a file read_document loaded into the editor; unless
+        ``saved``, the editor's text is not the file's"""
+        self.current_file = file_path
+        self.diff_stale = self.diff_base is not None
+        if is_header(file_path):
+            # Configuration headers are edited as they are
+            self.config_model = model_from_document(self.editor.document, file_path)
+            self.status_var.set(
+                tr('file_loaded_options', file=os.path.basename(file_path), count=len(self.config_model))
+            )
+        else:
+            # YAML is edited as written, comments and formatting included
+            self.config_model = None
+            self.status_var.set(tr('file_loaded', file=os.path.basename(file_path)))
+        
+        # Update validation status
+        if self.editor.evaluator.predefined:
+            # Set again once the project is indexed, if the file needs them
+            self.editor.set_predefined({})
+        self.editor.document.take_changes()
+        self.editor.take_effective_changes()
+        # Headers are validated by the options in the #if blocks taken
+        self.validator = validator_for(file_path, self.editor.document,
+                                       lambda: self.editor.effective.defines)
+        self.validator.validate_all()
+        self.update_validation_status()
+        self.recovery.start(file_path, self.editor.document_snapshot(), self.file_newline, saved)
+        if is_header(file_path):
+            self.load_profiles(file_path)
+            self.index_symbols(file_path)
+        else:
+            self.profiles = None
+            self.profiles_stale = True
+    
+    def index_symbols(self, file_path):
+        """Index the headers around ``file_path`` on a worker, starting from
+        the index kept by the last session"""
+        root = os.path.dirname(os.path.abspath(file_path))
+        if self.symbol_index is not None and self.symbol_index.root != root:
+            self.symbol_index = None
+        index = SymbolIndex(root)
+        
+        def work(task):
+            index.load()
+            index.refresh(task)
+            index.save()
+            return index
+        
+        self.after(FILE_TASK_POLL_MS, self.poll_symbol_index, FileTask(work), file_path)
+    
+    def poll_symbol_index(self, task, file_path):
+        """Take over the index built by index_symbols once it is done"""
+        kind = None
+        while kind in (None, PROGRESS):
+            try:
+                kind, value = task.messages.get_nowait()
+            except queue.Empty:
+                self.after(FILE_TASK_POLL_MS, self.poll_symbol_index, task, file_path)
+                return
+        if kind != DONE or self.current_file != file_path:
+            return
+        self.symbol_index = value
+        self.symbols_stale = True
+        # Configuration_adv.h is compiled with the options of Configuration.h
+        predefined = value.predefined(file_path)
+        if predefined != self.editor.evaluator.predefined:
+            self.editor.set_predefined(predefined)
+            self.on_editor_changed()
+    
+    def current_symbols(self):
+        """The symbol index, with the editor's text in place of its file"""
+        index = self.symbol_index
+        if index is None:
+            self.status_var.set(tr('symbols_not_indexed'))
+            return None
+        if self.symbols_stale and is_header(self.current_file):
+            index.update(self.current_file, self.editor.document_text())
+            self.symbols_stale = False
+        return index
+    
+    def goto_definition(self, event=None):
+        """Show where the name under the cursor is defined"""
+        name = self.editor.word_at_cursor()
+        index = self.current_symbols() if name else None
+        if index is None:
+            return
+        sites = index.definitions(name)
+        if not sites:
+            self.status_var.set(tr('no_definition', name=name, root=index.root))
+            return
+        self.show_site(sites[0])
+    
+    def find_usages(self, event=None):
+        """List where the name under the cursor is referenced or tested"""
+        name = self.editor.word_at_cursor()
+        index = self.current_symbols() if name else None
+        if index is None:
+            return
+        usages = index.usages(name)
+        sites = index.definitions(name) + usages
+        
+        dialog = tk.Toplevel(self)
+        dialog.title(f"{tr('find_usages')}: {name}")
+        dialog.geometry("600x300")
+        listbox = tk.Listbox(dialog, font=('Consolas', 10))
+        scrollbar = ttk.Scrollbar(dialog, command=listbox.yview)
+        listbox.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        listbox.pack(fill=tk.BOTH, expand=True)
+        for site in sites:
+            kind = tr(f'symbol_{site.kind}')
+            if not site.enabled:
+                kind = tr('commented_out', kind=kind)
+            listbox.insert(tk.END, f"{os.path.relpath(site.path, index.root)}:{site.line + 1}  ({kind})")
+        
+        def show(event=None):
+            selection = listbox.curselection()
+            if selection:
+                self.show_site(sites[selection[0]])
+        
+        listbox.bind('<Double-Button-1>', show)
+        listbox.bind('<Return>', show)
+        self.status_var.set(tr('usages_found', count=len(usages), name=name))
+    
+    def show_site(self, site):
+        """Put the editor's cursor on a symbol's Site, opening its file if needed"""
+        if self.current_file and os.path.abspath(self.current_file) == site.path:
+            self.editor.goto_line(site.line, site.column)
+            return
+        
+        def loaded():
+            self.loaded_config(site.path)
+            self.editor.goto_line(site.line, site.column)
+        
+        self.read_document(site.path, loaded)
     
     def save_config(self, event=None):
         """Save configuration to the current file"""
@@ -288,37 +944,32 @@ class MarlinConfigurator(tk.Tk):
             self.save_as_config()
             return
         
-        try:
-            config_data = yaml.safe_load(self.editor.get('1.0', tk.END))
-            
-            # Validate before saving
-            is_valid, errors = self.validate_config(config_data)
-            if not is_valid:
-                if messagebox.askyesno(
-                    "Validation Errors",
-                    f"Found {len(errors)} validation error(s). Save anyway?\n\n" +
-                    "\n".join(f"• {error}" for error in errors[:5])
-                ):
-                    # User chose to save anyway
-                    pass
-                else:
-                    return
-            
-            with open(self.current_file, 'w') as f:
-                yaml.dump(config_data, f, default_flow_style=False)
-            self.status_var.set(f"Saved {os.path.basename(self.current_file)}")
-            
-            # Update validation status
-            self.update_validation_status(config_data)
-            
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to save file: {str(e)}")
+        file_path = self.current_file
+        # Validate before saving, from the live results
+        errors = self.validation_errors() if self.validator is not None else []
+        if errors:
+            if messagebox.askyesno(
+                "Validation Errors",
+                f"Found {len(errors)} validation error(s). Save anyway?\n\n" +
+                "\n".join(f"• {error}" for error in errors[:5])
+            ):
+                # User chose to save anyway
+                pass
+            else:
+                return
+        
+        def saved(snapshot):
+            if is_header(file_path):
+                self.config_model = model_from_document(self.editor.document, file_path)
+            self.status_var.set(tr('file_saved', file=os.path.basename(file_path)))
+            self.keep_revision(file_path, snapshot)
+        self.write_document(file_path, saved)
     
     def save_as_config(self, event=None):
         """Save configuration to a new file"""
         file_path = filedialog.asksaveasfilename(
             defaultextension=".yaml",
-            filetypes=[("YAML files", "*.yaml"), ("All files", "*.*")]
+            filetypes=[(tr('yaml_files'), "*.yaml"), (tr('all_files'), "*.*")]
         )
         
         if not file_path:
@@ -342,6 +993,11 @@ class MarlinConfigurator(tk.Tk):
             "The error has been logged. Please contact support if the problem persists."
         )
     
+    def update_undo_status(self, kinds=None):
+        """Show the size of the editor's undo history in the status bar"""
+        journal = self.editor.journal
+        self.undo_status.config(text=tr('undo_status', steps=len(journal), size=journal.memory / 1024))
+    
     # Editor commands
     def undo(self):
         try:
@@ -355,6 +1011,13 @@ class MarlinConfigurator(tk.Tk):
         except:
             pass
     
+    def destroy(self):
+        # Closing the window from any entry point ends here: the journal
+        # writes what is queued, and unsaved edits stay in it to be
+        # offered back at the next start
+        self.recovery.close()
+        super().destroy()
+    
     def cut(self):
         self.editor.event_generate("<<Cut>>")
     
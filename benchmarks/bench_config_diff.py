@@ -0,0 +1,54 @@
+"""Time diffing two versions of a configuration header.
+
+Usage:
+    python benchmarks/bench_config_diff.py [old.h new.h]
+
+Without arguments a LINES-line header shaped like the stock ones is
+generated, and a second version of it with every 97th line edited and a
+definition inserted every 499 lines.  The line diff and the option diff of
+the two are expected to take under TARGET_MS milliseconds together;
+difflib's SequenceMatcher is timed on the same lines for comparison.
+"""
+
+import difflib
+
+from common import best, read_sources, run, sample_config
+from struttura.config_diff import EQUAL, diff_lines, diff_options
+from struttura.config_parser import parse_config
+
+# Lines of each generated header
+LINES = 5000
+
+# Time budget for the line and option diffs of two headers
+TARGET_MS = 100.0
+
+
+def main(paths):
+    if paths:
+        old, new = (text.split('\n') for _, text in read_sources(paths[:2]))
+    else:
+        old = sample_config(60).split('\n')[:LINES]
+        new = list(old)
+        for line in range(0, LINES, 97):
+            new[line] += ' // edited'
+        for line in range(LINES - LINES % 499, 0, -499):
+            new.insert(line, '#define INSERTED_OPTION 1')
+    old_model = parse_config(old)
+    new_model = parse_config(new)
+
+    lines = best(lambda: diff_lines(old, new))
+    options = best(lambda: diff_options(old_model, new_model))
+    reference = best(lambda: difflib.SequenceMatcher(None, old, new).get_opcodes(), 3)
+    opcodes = diff_lines(old, new)
+    blocks = sum(1 for opcode in opcodes if opcode.tag != EQUAL)
+    total = lines + options
+    print(f'{len(old)} and {len(new)} lines: {blocks} changed blocks, '
+          f'{len(diff_options(old_model, new_model))} options changed')
+    print(f'line diff {lines * 1000:.1f} ms  option diff {options * 1000:.1f} ms  '
+          f'(difflib {reference * 1000:.1f} ms)')
+    print(f'total {total * 1000:.1f} ms (target {TARGET_MS:.0f} ms)')
+    return 0 if total * 1000 < TARGET_MS else 1
+
+
+if __name__ == '__main__':
+    run(main)
@@ -0,0 +1,69 @@
+"""Time parse_config on a pair of configuration headers.
+
+Usage:
+    python benchmarks/bench_config_parser.py [Configuration.h Configuration_adv.h]
+
+Without arguments, headers shaped like the stock files are generated.
+Parsing both is expected to take under
+TARGET_MS milliseconds.  The memory taken by one model, and by ten variants
+of it sharing its columns, is reported as well, and so is the time a live
+document takes to re-parse after a one-line edit.
+"""
+
+import tracemalloc
+
+from common import best, read_sources, run
+from struttura.config_parser import ConfigLineParser, parse_config
+from struttura.live_document import LiveDocument
+
+# Time budget for parsing both files
+TARGET_MS = 20.0
+
+
+def variants_memory(text, count=10):
+    """Bytes allocated by one model, and by ``count`` changed copies of it."""
+    tracemalloc.start()
+    model = parse_config(text)
+    model.index('')
+    base = tracemalloc.get_traced_memory()[0]
+    variants = [model.copy() for _ in range(count)]
+    for i, variant in enumerate(variants):
+        variant.set_raw(i, '1')
+        variant.set_enabled(i, True)
+    total = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return base, total - base
+
+
+def edit_time(text):
+    """Best time to re-parse a live document after changing a line in its middle."""
+    lines = text.split('\n')
+    document = LiveDocument(ConfigLineParser(), lambda start, stop: lines[start:stop])
+    document.reset(len(lines))
+    middle = next(i for i in range(len(lines) // 2, len(lines)) if lines[i].startswith('#define'))
+    original = lines[middle]
+
+    def edit():
+        lines[middle] = original + '0' if lines[middle] == original else original
+        document.splice(middle, 1, 1)
+    return best(edit, 50)
+
+
+def main(paths):
+    total = 0.0
+    for name, text in read_sources(paths):
+        parsed = best(lambda: parse_config(text, name), 20)
+        model = parse_config(text, name)
+        enabled = sum(1 for option in model if option.enabled)
+        print(f'{name}: {model.line_count} lines, {len(model)} options ({enabled} enabled)  '
+              f'{parsed * 1000:.2f} ms')
+        total += parsed
+        base, variants = variants_memory(text)
+        print(f'  model {base / 1024:.0f} KiB, ten changed variants {variants / 1024:.0f} KiB more')
+        print(f'  one-line edit re-parsed in {edit_time(text) * 1000:.3f} ms')
+    print(f'total {total * 1000:.2f} ms (target {TARGET_MS:.0f} ms)')
+    return 0 if total * 1000 < TARGET_MS else 1
+
+
+if __name__ == '__main__':
+    run(main)
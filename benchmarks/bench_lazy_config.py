@@ -0,0 +1,111 @@
+"""Compare peak memory of eager and lazy loading of a large configuration.
+
+Usage:
+    python benchmarks/bench_lazy_config.py [bundle.h|bundle.yaml ...]
+
+Without arguments, a header bundle of about BUNDLE_MB megabytes and a YAML
+bundle of about YAML_MB megabytes are generated in a temporary directory.  Each file is
+loaded in a fresh process, once the eager way (read into a string and
+parse every option) and once through LazyConfig, touching one option or
+key and one section.  The lazy peak RSS is expected to be at most
+TARGET_RATIO of the eager one.  Peak RSS is read with the resource
+module, so this runs on Unix only.
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import CONFIGURATION_SECTIONS, ROOT, run, sample_config
+
+# Size of the generated bundles
+BUNDLE_MB = 50
+# Size of the generated YAML bundle; the eager yaml.safe_load takes minutes at 50
+YAML_MB = 10
+# Largest lazy / eager peak RSS ratio
+TARGET_RATIO = 0.5
+
+# Run in the child process: load the file, then report time and peak RSS
+_CHILD = '''
+import resource, sys, time
+sys.path.insert(0, {root!r})
+import yaml
+from struttura.config_parser import parse_config
+from struttura.lazy_config import LazyConfig
+mode, path = sys.argv[1:]
+start = time.perf_counter()
+if mode == 'eager':
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    config = parse_config(text, path) if path.endswith('.h') else yaml.safe_load(text)
+    config.get('BAUDRATE') if path.endswith('.h') else config.get('section_7')
+else:
+    config = LazyConfig(path)
+    if path.endswith('.h'):
+        config.get('BAUDRATE')
+        config.section(config.section_names()[1])
+    else:
+        config.get('section_7')
+elapsed = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(elapsed, rss * (1 if sys.platform == 'darwin' else 1024))
+'''
+
+
+def sample_yaml(sections):
+    """Return a YAML mapping with ``sections`` top-level keys."""
+    parts = []
+    for i in range(sections):
+        parts.append(f'section_{i}:\n')
+        for j in range(60):
+            parts.append(f'  option_{j}: {i * j}   # comment {j}\n'
+                         f'  list_{j}:\n    - {j}\n    - "text {j}"\n')
+    return ''.join(parts)
+
+
+def write_bundles(directory):
+    header = sample_config(CONFIGURATION_SECTIONS)
+    header_path = os.path.join(directory, 'bundle.h')
+    with open(header_path, 'w', encoding='utf-8') as f:
+        for _ in range(BUNDLE_MB * 1024 * 1024 // len(header)):
+            f.write(header)
+    yaml_text = sample_yaml(100)
+    yaml_path = os.path.join(directory, 'bundle.yaml')
+    with open(yaml_path, 'w', encoding='utf-8') as f:
+        for copy in range(YAML_MB * 1024 * 1024 // len(yaml_text)):
+            f.write(yaml_text.replace('section_', f'copy_{copy}_section_') if copy else yaml_text)
+    return [header_path, yaml_path]
+
+
+def measure(mode, path):
+    output = subprocess.run(
+        [sys.executable, '-c', _CHILD.format(root=ROOT), mode, path],
+        check=True, capture_output=True, text=True,
+    ).stdout.split()
+    return float(output[0]), int(output[1])
+
+
+def main(paths):
+    with tempfile.TemporaryDirectory() as directory:
+        if not paths:
+            start = time.perf_counter()
+            paths = write_bundles(directory)
+            print(f'generated bundles in {time.perf_counter() - start:.1f} s')
+        worst = 0.0
+        for path in paths:
+            size = os.path.getsize(path) / (1024 * 1024)
+            eager_time, eager_rss = measure('eager', path)
+            lazy_time, lazy_rss = measure('lazy', path)
+            ratio = lazy_rss / eager_rss
+            worst = max(worst, ratio)
+            print(f'{os.path.basename(path)} ({size:.0f} MiB): '
+                  f'eager {eager_time:.2f} s, peak {eager_rss / 2 ** 20:.0f} MiB; '
+                  f'lazy {lazy_time:.2f} s, peak {lazy_rss / 2 ** 20:.0f} MiB ({ratio:.0%})')
+    print(f'largest ratio {worst:.0%} (target {TARGET_RATIO:.0%})')
+    return 0 if worst <= TARGET_RATIO else 1
+
+
+if __name__ == '__main__':
+    run(main)
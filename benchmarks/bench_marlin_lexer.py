@@ -0,0 +1,76 @@
+"""Compare MarlinConfigLexer with pygments' CppLexer on configuration headers.
+
+Usage:
+    python benchmarks/bench_marlin_lexer.py [Configuration.h ...]
+
+Pass the stock Marlin/Configuration.h and Configuration_adv.h of a Marlin
+checkout to measure the files the lexer is for; without arguments headers
+shaped like them are generated.
+
+Two paths are timed against the target speedup: lexing the whole text with
+pygments' ``get_tokens_unprocessed``, and lexing line at a time as the
+editors do through IncrementalHighlighter, against CppLexer behind
+RegexLineLexer.
+"""
+
+import timeit
+
+from pygments.lexers import CppLexer
+
+from common import read_sources, run
+from struttura.highlighter import RegexLineLexer
+from struttura.marlin_lexer import MarlinConfigLexer
+
+# Speedup the dedicated lexer is expected to reach on both paths
+TARGET_SPEEDUP = 5.0
+
+
+def best_of(baseline, candidate, repeat=30):
+    """Best times of two functions, run alternately so both see the same load."""
+    times = ([], [])
+    for _ in range(repeat):
+        for i, func in enumerate((baseline, candidate)):
+            times[i].append(timeit.timeit(func, number=1))
+    return min(times[0]), min(times[1])
+
+
+def lex_lines(line_lexer, lines):
+    state = line_lexer.initial_state
+    for line in lines:
+        _, state = line_lexer.lex_line(line, state)
+
+
+def bench(name, text):
+    lines = text.split('\n')
+    cpp = CppLexer()
+    marlin = MarlinConfigLexer()
+    cpp_lines = RegexLineLexer(cpp)
+
+    results = [
+        ('whole text',) + best_of(lambda: list(cpp.get_tokens_unprocessed(text)),
+                                  lambda: list(marlin.get_tokens_unprocessed(text))),
+        ('per line',) + best_of(lambda: lex_lines(cpp_lines, lines),
+                                lambda: lex_lines(marlin, lines)),
+    ]
+    print(f'{name}: {len(lines)} lines')
+    ok = True
+    for label, cpp_time, marlin_time in results:
+        speedup = cpp_time / marlin_time
+        short = '' if speedup >= TARGET_SPEEDUP else f'   below x{TARGET_SPEEDUP:.0f}'
+        print(f'  {label:10s}  CppLexer {cpp_time * 1000:8.2f} ms   '
+              f'MarlinConfigLexer {marlin_time * 1000:8.2f} ms   x{speedup:.1f}{short}')
+        ok = ok and speedup >= TARGET_SPEEDUP
+    return ok
+
+
+def main(paths):
+    ok = True
+    for name, text in read_sources(paths):
+        ok = bench(name, text) and ok
+    if not ok:
+        print(f'Speedup below x{TARGET_SPEEDUP:.0f} on some path')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    run(main)
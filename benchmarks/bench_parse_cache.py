@@ -0,0 +1,67 @@
+"""Time opening configuration headers with and without the parse cache.
+
+Usage:
+    python benchmarks/bench_parse_cache.py [Configuration.h ...]
+
+Without arguments, headers shaped like the stock files are generated.  A miss parses the header into a LiveDocument and
+lexes it with MarlinConfigLexer; a hit reads the entry from a temporary
+cache directory and restores both.  A hit is expected to take under
+TARGET_MS milliseconds per file.
+"""
+
+import os
+import tempfile
+
+from common import best, read_sources, run
+from struttura.config_parser import ConfigLineParser
+from struttura.highlighter import IncrementalHighlighter
+from struttura.live_document import LiveDocument
+from struttura.marlin_lexer import MarlinConfigLexer
+from struttura.parse_cache import ParseCache, cache_version, make_entry, read_entry
+
+# Time budget for opening one file from the cache
+TARGET_MS = 10.0
+
+
+def open_cold(lines):
+    """Parse and lex ``lines`` as the editor does on a miss."""
+    document = LiveDocument(ConfigLineParser(), lambda start, stop: lines[start:stop])
+    document.reset(len(lines))
+    highlighter = IncrementalHighlighter(MarlinConfigLexer())
+    highlighter.reset(len(lines))
+    highlighter.relex(lambda start, stop: lines[start:stop])
+    return document, highlighter
+
+
+def open_cached(cache, key):
+    """Restore the document and highlighter from the cache, as on a hit."""
+    rows, states, (tokens, token_states) = read_entry(cache.load(key))
+    document = LiveDocument(ConfigLineParser(), None)
+    document.restore(rows, states)
+    highlighter = IncrementalHighlighter(MarlinConfigLexer())
+    highlighter.restore(tokens, token_states)
+    return document, highlighter
+
+
+def main(paths):
+    worst = 0.0
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ParseCache(directory)
+        version = cache_version(MarlinConfigLexer())
+        for name, text in read_sources(paths):
+            lines = text.split('\n')
+            cold = best(lambda: open_cold(lines))
+            key = cache.key(text, version)
+            document, highlighter = open_cold(lines)
+            cache.store(key, make_entry(document, highlighter.snapshot()))
+            hit = best(lambda: (cache.key(text, version), open_cached(cache, key)), 20)
+            size = os.path.getsize(os.path.join(directory, key + '.cache'))
+            print(f'{name}: {len(lines)} lines  miss {cold * 1000:.2f} ms  '
+                  f'hit {hit * 1000:.2f} ms  entry {size / 1024:.0f} KiB')
+            worst = max(worst, hit)
+    print(f'slowest hit {worst * 1000:.2f} ms (target {TARGET_MS:.0f} ms)')
+    return 0 if worst * 1000 < TARGET_MS else 1
+
+
+if __name__ == '__main__':
+    run(main)
@@ -0,0 +1,77 @@
+"""Time switching between profiles of a configuration header.
+
+Usage:
+    python benchmarks/bench_profiles.py [Configuration.h]
+
+Without arguments a header shaped like the stock ones is generated.
+PROFILES profiles are made of three layers each, out of LAYERS layers
+setting KEYS options apiece.  Listing every option of a profile with the
+layer it comes from, as the Profiles tab does on a switch, is timed cold
+and once the views are warm, and after an edit to the base and to a layer.
+A warm switch is expected to take under TARGET_MS milliseconds.
+"""
+
+import random
+import timeit
+
+from common import best, read_text, run
+from struttura.config_parser import ConfigLineParser
+from struttura.live_document import LiveDocument
+from struttura.profiles import DocumentLayer, ProfileSet
+
+# Profiles, layers and options set by each layer
+PROFILES = 30
+LAYERS = 20
+KEYS = 25
+
+# Time budget of listing a warm profile
+TARGET_MS = 5.0
+
+
+def main(paths):
+    text = read_text(paths, 60)
+    lines = text.split('\n')
+    document = LiveDocument(ConfigLineParser(), lambda start, stop: lines[start:stop])
+    document.reset(len(lines))
+    document.take_changes()
+    profiles = ProfileSet(DocumentLayer(document))
+    names = list(profiles.base.keys())
+    rng = random.Random(1)
+    layers = {f'layer{k}': {name: rng.randint(0, 1000) for name in rng.sample(names, KEYS)}
+              for k in range(LAYERS)}
+    profiles.load({
+        'layers': layers,
+        'profiles': {f'profile{k}': rng.sample(sorted(layers), 3) for k in range(PROFILES)},
+    })
+
+    def switch_all():
+        for name in profiles.profiles:
+            for _ in profiles.view(name).items():
+                pass
+
+    cold = timeit.timeit(switch_all, number=1) / PROFILES
+    warm = best(switch_all, 5) / PROFILES
+
+    def edit_base():
+        lines[20] = lines[20] + ' '
+        document.splice(20, 1, 1)
+        profiles.base.changed(document.take_changes() | {names[0], names[1]})
+        switch_all()
+
+    def edit_layer():
+        layer = profiles.layers['layer0']
+        key = next(iter(layer.values))
+        layer.set(key, layer.values[key] + 1)
+        switch_all()
+
+    base = best(edit_base, 5) / PROFILES
+    layer = best(edit_layer, 5) / PROFILES
+    print(f'{len(names)} options, {PROFILES} profiles of 3 of {LAYERS} layers')
+    print(f'switch cold {cold * 1000:.2f} ms  warm {warm * 1000:.2f} ms  '
+          f'after a base edit {base * 1000:.2f} ms  after a layer edit {layer * 1000:.2f} ms '
+          f'(target {TARGET_MS:.0f} ms)')
+    return 0 if max(warm, base, layer) * 1000 < TARGET_MS else 1
+
+
+if __name__ == '__main__':
+    run(main)
@@ -0,0 +1,70 @@
+"""Time the editor's side of the crash recovery journal during typing.
+
+Usage:
+    python benchmarks/bench_recovery_journal.py [Configuration.h]
+
+Without arguments a header shaped like the stock ones, of about 200 KB, is
+generated.  KEYSTROKES keystrokes are typed into it, words and new lines,
+while the writer thread flushes every INTERVAL seconds.  What each
+keystroke costs the editor's thread is expected to stay under TARGET_US
+microseconds at the 99th percentile, and the text recovered from the
+journal must be the text typed.
+"""
+
+import os
+import tempfile
+import time
+
+from common import read_text, run
+from struttura.recovery_journal import RecoveryJournal, apply_edits
+
+# Keystrokes typed, and seconds between writes of the journal
+KEYSTROKES = 20000
+INTERVAL = 0.05
+
+# Cost of a keystroke to the editor's thread, at the 99th percentile
+TARGET_US = 50.0
+
+
+def main(paths):
+    text = read_text(paths, 70)
+    with tempfile.TemporaryDirectory() as directory:
+        journal = RecoveryJournal(directory, interval=INTERVAL)
+        path = os.path.join(directory, 'Configuration.h')
+        journal.start(path, text)
+        edits = []
+        times = []
+        line, column = 10, 0
+        words = '#define TYPED_OPTION_VALUE 12345 // a comment '
+        clock = time.perf_counter
+        start = clock()
+        for k in range(KEYSTROKES):
+            char = '\n' if k % 60 == 59 else words[k % len(words)]
+            edit = (line, column, '', char)
+            before = clock()
+            journal.record(*edit)
+            times.append(clock() - before)
+            edits.append(edit)
+            line, column = (line + 1, 0) if char == '\n' else (line, column + 1)
+            if k % 200 == 0:
+                # Typing speed, roughly, so the writer runs in between
+                time.sleep(0.001)
+        typing = clock() - start
+        journal.flush()
+        size = os.path.getsize(journal.journal_path(path))
+        before = clock()
+        [recovered] = journal.pending()
+        recovery = clock() - before
+        journal.close()
+    assert recovered.text == apply_edits(text, edits)
+    times.sort()
+    p99 = times[int(len(times) * 0.99)] * 1e6
+    print(f'{KEYSTROKES} keystrokes in {typing:.2f} s into a {len(text) / 1024:.0f} KB header: '
+          f'{sum(times) / len(times) * 1e6:.1f} us each, {p99:.1f} us at the 99th percentile '
+          f'(target {TARGET_US:.0f} us)')
+    print(f'journal {size / 1024:.0f} KB with {recovered.edits} edits, recovered in {recovery * 1000:.1f} ms')
+    return 0 if p99 < TARGET_US else 1
+
+
+if __name__ == '__main__':
+    run(main)
@@ -0,0 +1,68 @@
+"""Time revalidating a configuration header after one keystroke.
+
+Usage:
+    python benchmarks/bench_rules.py [Configuration.h ...]
+
+Without arguments, headers shaped like the stock files are generated.  Besides the built-in header rules, four generated rules read
+each option and some of its neighbours, several thousand rules in all.
+A keystroke changes the value of an option in the middle of the file; its
+LiveDocument re-parses the line and the Validator re-runs the rules
+reading the changed option.  That is expected to take under TARGET_MS
+milliseconds, one frame at 60 Hz; a full validation is reported for
+comparison.
+"""
+
+from common import best, read_sources, run
+from struttura.config_parser import ConfigLineParser
+from struttura.live_document import LiveDocument
+from struttura.rules import (
+    HEADER_RULES, Exclusive, Range, Requires, RuleSet, Validator, header_lookup,
+)
+
+# Time budget for revalidating after one keystroke
+TARGET_MS = 16.0
+
+
+def generated_rules(names):
+    """Rules reading each of ``names`` and its neighbours."""
+    rules = list(HEADER_RULES)
+    for i, name in enumerate(names):
+        neighbours = names[i + 1:i + 4] or names[:3]
+        rules.append(Range(name, 0, 10 ** 6))
+        rules.append(Requires(name, neighbours))
+        rules.append(Exclusive([name] + neighbours[:1]))
+        rules.append(Range(name, None, 10 ** 9))
+    return rules
+
+
+def main(paths):
+    worst = 0.0
+    for name, text in read_sources(paths):
+        lines = text.split('\n')
+        document = LiveDocument(ConfigLineParser(), lambda start, stop: lines[start:stop])
+        document.reset(len(lines))
+        names = list(dict.fromkeys(row[0] for _, row in document.items()))
+        rule_set = RuleSet(generated_rules(names))
+        validator = Validator(rule_set, header_lookup(document))
+        full = best(validator.validate_all, 5)
+        document.take_changes()
+
+        middle = next(i for i in range(len(lines) // 2, len(lines)) if lines[i].startswith('#define'))
+        original = lines[middle]
+
+        def keystroke():
+            lines[middle] = original + '0' if lines[middle] == original else original
+            document.splice(middle, 1, 1)
+            return validator.update(document.take_changes())
+
+        ran = keystroke()
+        typed = best(keystroke, 50)
+        print(f'{name}: {len(rule_set)} rules  full {full * 1000:.2f} ms  '
+              f'keystroke {typed * 1000:.3f} ms ({ran} rules re-run)')
+        worst = max(worst, typed)
+    print(f'slowest keystroke {worst * 1000:.3f} ms (target {TARGET_MS:.0f} ms)')
+    return 0 if worst * 1000 < TARGET_MS else 1
+
+
+if __name__ == '__main__':
+    run(main)
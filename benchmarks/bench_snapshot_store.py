@@ -0,0 +1,58 @@
+"""Time and size backup snapshots of a configuration header.
+
+Usage:
+    python benchmarks/bench_snapshot_store.py [Configuration.h]
+
+Without arguments a header shaped like the stock ones, of about 200 KB, is
+generated.  REVISIONS snapshots of it are taken in a temporary store, each
+after a few lines are edited, as saving while editing does.  A revision is
+expected to add under TARGET_KB kilobytes to the store on average, and
+taking a snapshot or restoring one to take under TARGET_MS milliseconds.
+"""
+
+import os
+import random
+import tempfile
+import time
+
+from common import best, read_text, run
+from struttura.snapshot_store import SnapshotStore
+
+# Snapshots taken, and lines edited before each
+REVISIONS = 300
+EDITS = 3
+
+# Average bytes a revision adds, and time budget of a snapshot or restore
+TARGET_KB = 8.0
+TARGET_MS = 50.0
+
+
+def main(paths):
+    text = read_text(paths, 70)
+    lines = text.splitlines(keepends=True)
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as directory:
+        store = SnapshotStore(directory)
+        path = os.path.join(directory, 'Configuration.h')
+        first = store.snapshot(path, text)
+        start = time.perf_counter()
+        for k in range(REVISIONS):
+            for _ in range(EDITS):
+                lines[rng.randrange(len(lines))] = f'#define EDITED_OPTION {k}\n'
+            store.snapshot(path, ''.join(lines))
+        snapshot = (time.perf_counter() - start) / REVISIONS
+        history = store.history(path)
+        later = history[1:]
+        average = sum(revision.stored for revision in later) / len(later) / 1024
+        restore = best(lambda: SnapshotStore(directory).restore(history[len(history) // 2]))
+        listing = best(lambda: store.history(path))
+    print(f'{len(text) / 1024:.0f} KB header: first snapshot {first.stored / 1024:.1f} KB, '
+          f'then {average:.2f} KB per revision over {len(later)} revisions '
+          f'(target {TARGET_KB:.0f} KB)')
+    print(f'snapshot {snapshot * 1000:.1f} ms  restore {restore * 1000:.1f} ms  '
+          f'history of {len(history)} {listing * 1000:.1f} ms (target {TARGET_MS:.0f} ms)')
+    return 0 if average < TARGET_KB and max(snapshot, restore) * 1000 < TARGET_MS else 1
+
+
+if __name__ == '__main__':
+    run(main)
@@ -0,0 +1,85 @@
+"""Time indexing the symbols of a configuration project.
+
+Usage:
+    python benchmarks/bench_symbol_index.py [project directory]
+
+Without arguments a project is generated in a temporary directory: a
+Configuration.h and a Configuration_adv.h shaped like the stock ones and
+FILES pins-sized headers.  A cold index scans every header and is expected
+to take under TARGET_SECONDS; a refresh after one header changed, a
+refresh of an index loaded from disk and lookups are reported as well.
+"""
+
+import os
+import shutil
+import tempfile
+import time
+
+from common import CONFIGURATION_ADV_SECTIONS, CONFIGURATION_SECTIONS, run, sample_config
+from struttura.symbol_index import SymbolIndex
+
+# Generated pins-sized headers
+FILES = 500
+
+# Time budget for indexing a project from scratch
+TARGET_SECONDS = 1.0
+
+
+def generate(directory):
+    with open(os.path.join(directory, 'Configuration.h'), 'w') as f:
+        f.write(sample_config(CONFIGURATION_SECTIONS))
+    with open(os.path.join(directory, 'Configuration_adv.h'), 'w') as f:
+        f.write(sample_config(CONFIGURATION_ADV_SECTIONS))
+    pins = os.path.join(directory, 'pins')
+    os.makedirs(pins)
+    for i in range(FILES):
+        with open(os.path.join(pins, f'pins_{i}.h'), 'w') as f:
+            f.write(sample_config(3).replace('OPTION_', f'PIN_{i}_'))
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def main(paths):
+    temporary = None
+    if paths:
+        root = paths[0]
+    else:
+        temporary = tempfile.mkdtemp()
+        root = os.path.join(temporary, 'project')
+        os.makedirs(root)
+        generate(root)
+    try:
+        store = os.path.join(temporary or tempfile.gettempdir(), 'bench.index')
+        index = SymbolIndex(root, store)
+        cold, scanned = timed(index.refresh)
+        print(f'cold index: {scanned} headers, {len(index)} symbols in {cold * 1000:.0f} ms')
+        index.save()
+
+        changed = sorted(index.files)[len(index.files) // 2]
+        with open(changed, 'a') as f:
+            f.write('#define ADDED_OPTION 1\n')
+        seconds, scanned = timed(index.refresh)
+        print(f'refresh after one change: {scanned} scanned in {seconds * 1000:.1f} ms')
+
+        reloaded = SymbolIndex(root, store)
+        seconds, _ = timed(lambda: (reloaded.load(), reloaded.refresh()))
+        print(f'load and refresh: {reloaded.scanned} scanned in {seconds * 1000:.0f} ms')
+
+        name = next(iter(index._names))
+        seconds, _ = timed(lambda: [(index.definitions(name), index.usages(name)) for _ in range(1000)])
+        print(f'definitions and usages of {name}: {seconds:.3f} ms per lookup')
+    finally:
+        if temporary is not None:
+            shutil.rmtree(temporary, ignore_errors=True)
+        elif os.path.exists(store):
+            os.remove(store)
+    print(f'cold index {cold:.2f} s (target {TARGET_SECONDS:.0f} s)')
+    return 0 if cold < TARGET_SECONDS else 1
+
+
+if __name__ == '__main__':
+    run(main)
@@ -0,0 +1,95 @@
+"""Setup shared by the benchmarks.
+
+Every benchmark takes configuration headers as arguments and falls back to
+headers generated by :func:`sample_config` without them.  Importing this
+module puts the repository root on ``sys.path`` so the scripts can be run
+as ``python benchmarks/bench_<name>.py`` from anywhere.
+"""
+
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# Sections of the generated headers standing in for the stock
+# Configuration.h and Configuration_adv.h, about 3500 and 4500 lines
+CONFIGURATION_SECTIONS = 40
+CONFIGURATION_ADV_SECTIONS = 52
+
+
+def sample_config(sections=25):
+    """Return text resembling a stock Marlin configuration header."""
+    parts = ['/**\n * Marlin 3D Printer Firmware\n * Copyright (c) 2020 MarlinFirmware\n *\n'
+             ' * This program is free software: you can redistribute it and/or modify\n'
+             ' * it under the terms of the GNU General Public License.\n */\n',
+             '#pragma once\n\n#define CONFIGURATION_H_VERSION 02010300\n\n']
+    for i in range(sections):
+        parts.append(
+            f'//===========================================================================\n'
+            f'//============================= Section {i:3d} ================================\n'
+            f'//===========================================================================\n\n'
+            f'// @section group{i}\n\n'
+        )
+        for j in range(5):
+            name = f'OPTION_{i}_{j}'
+            parts.append(
+                f'/**\n'
+                f' * Option group {i}.{j}\n'
+                f' * Longer explanation of what the options below do, spread over\n'
+                f' * a few lines of prose like the stock files have.\n'
+                f' */\n'
+                f'#define {name}_ENABLE\n'
+                f'#define {name}_MODE       MODE_{j}  // Mode of operation\n'
+                f'//#define {name}_EXTRA            // Disabled extra behaviour\n'
+                f'//#define {name}_DEBUG\n'
+                f'#if ENABLED({name}_ENABLE)\n'
+                f'  #define {name}_SPEED      {i * 10 + j}    // (mm/s)\n'
+                f'  //#define {name}_NAME     "Option {i}"\n'
+                f'#endif\n'
+                f'// Short note about the next group\n'
+                f'\n'
+            )
+        parts.append(
+            f'#if ANY(OPTION_{i}_1_ENABLE, OPTION_{i}_2_ENABLE) && OPTION_{i}_0_SPEED > 10\n'
+            f'  #define OPTION_{i}_ACCEL      {i * 100}.5\n'
+            f'  #define OPTION_{i}_PIN        -1\n'
+            f'  #define OPTION_{i}_STEPS      {{ 80, 80, 400, 93 }}  // X, Y, Z, E\n'
+            f'#endif\n\n'
+        )
+    return ''.join(parts)
+
+
+def read_sources(paths):
+    """
+    (name, text) of the headers ``paths``, or of a generated Configuration.h
+    and Configuration_adv.h if there are none.
+    """
+    if not paths:
+        return [('generated Configuration.h', sample_config(CONFIGURATION_SECTIONS)),
+                ('generated Configuration_adv.h', sample_config(CONFIGURATION_ADV_SECTIONS))]
+    sources = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            sources.append((os.path.basename(path), f.read()))
+    return sources
+
+
+def read_text(paths, sections):
+    """The text of the first of ``paths``, or of a header of ``sections`` generated sections."""
+    if not paths:
+        return sample_config(sections)
+    with open(paths[0], 'r', encoding='utf-8', errors='replace') as f:
+        return f.read()
+
+
+def best(function, repeat=10):
+    """Best time in seconds of ``repeat`` runs of ``function``."""
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+def run(main):
+    """Run ``main`` with the command line arguments and exit with its status."""
+    sys.exit(main(sys.argv[1:]))
@@ -19,6 +19,11 @@ def main():
         sys.path.insert(0, str(project_root))
     
     try:
+        # Commands like validate run headless, without Tk
+        from struttura.cli import is_command, main as run_command
+        if is_command(sys.argv[1:]):
+            return run_command(sys.argv[1:])
+        
         from app.main import MarlinConfigurator
         
         # Create and run the application
@@ -0,0 +1,390 @@
+"""Command line interface for checking many configurations without a display.
+
+Usage:
+    python marlin.py validate [-j JOBS] [--lazy] PATH...
+    python marlin.py diff [-j JOBS] OLD NEW
+    python marlin.py convert [-j JOBS] [--format yaml|json] [-o DIR] PATH...
+    python marlin.py stats [-j JOBS] PATH...
+    python marlin.py build-templates [-o STORE] SOURCE
+
+Paths may be files or directories, which are searched for configuration
+headers and YAML files.  Files are opened, parsed and validated by the same
+code as the editor, on a process pool with one worker per core by default.
+As each file is done its result is written to standard output as one line
+of JSON.  A last line sums up the run, with its throughput in files per
+second.  Converted files are written beside their sources or, with -o,
+in DIR, under the same path as in the directories given.  The exit
+status is 1 if a file could not be processed or, for validate, is not
+valid.
+
+validate --lazy is for bundles too large to open whole: each file is
+memory-mapped through a :class:`~struttura.lazy_config.LazyConfig` and
+only the sections holding the options the rules read are parsed.
+Headers are then checked as written, without evaluating their #if
+blocks, and lines the editor could not parse are not reported.
+
+build-templates writes the printer template library the editor's "New
+from Template" opens from a directory of templates, laid out as
+:func:`~struttura.template_store.build_store` reads it.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional
+
+import yaml
+from pygments.lexers import CppLexer
+
+from .config_diff import EQUAL, diff_lines, diff_options
+from .config_parser import ConfigLineParser, model_from_document
+from .file_io import load_file, read_file, save_file
+from .lang import tr
+from .lazy_config import LazyConfig
+from .live_document import LiveDocument
+from .marlin_lexer import MarlinConfigLexer, is_header, is_marlin_config
+from .parse_cache import ParseCache, cache_version
+from .piece_table import PieceTable
+from .preprocessor import Evaluator
+from .rules import validator_for
+from .symbol_index import SymbolIndex, included_before
+from .template_store import DEFAULT_STORE, build_store
+from .yaml_lines import YamlLineParser
+
+COMMANDS = ('validate', 'diff', 'convert', 'stats', 'build-templates')
+
+YAML_SUFFIXES = ('.yaml', '.yml')
+
+# Parse cache of this process, opened on first use
+_parse_cache: Optional[ParseCache] = None
+
+
+def is_command(argv) -> bool:
+    """Whether the command line ``argv`` (without the program) asks for a command."""
+    return bool(argv) and argv[0] in COMMANDS
+
+
+def is_config_file(path) -> bool:
+    return is_header(path) or path.lower().endswith(YAML_SUFFIXES)
+
+
+def collect(paths) -> List[str]:
+    """The files named by ``paths`` and the configuration files under the directories among them."""
+    files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append(path)
+            continue
+        found = []
+        for directory, subdirectories, names in os.walk(path):
+            subdirectories[:] = [name for name in subdirectories if not name.startswith('.')]
+            found.extend(os.path.join(directory, name) for name in names if is_config_file(name))
+        files.extend(sorted(found))
+    return files
+
+
+def open_document(path) -> LiveDocument:
+    """Read and parse ``path`` as the editor does, through the parse cache."""
+    global _parse_cache
+    if _parse_cache is None:
+        _parse_cache = ParseCache()
+    lexer = MarlinConfigLexer() if is_marlin_config(path) else CppLexer()
+    loaded = load_file(None, path, _parse_cache, cache_version(lexer))
+    content = loaded.content
+    if isinstance(content, PieceTable):
+        get_lines = content.lines
+    else:
+        lines = content.split('\n')
+        get_lines = lambda start, stop: lines[start:stop]
+    document = LiveDocument(ConfigLineParser() if is_header(path) else YamlLineParser(), get_lines)
+    rows, states, _ = loaded.parsed
+    document.restore(rows, states)
+    return document
+
+
+def effective_of(path, document):
+    """The Effective configuration of a header, seeing the definitions of
+    the headers compiled before it."""
+    index = SymbolIndex(os.path.dirname(os.path.abspath(path)), store=None)
+    for header in included_before(path):
+        if os.path.isfile(header):
+            index.update(header, read_file(None, header)[0])
+    return Evaluator(index.predefined(path)).effective(document)
+
+
+def _plain(value):
+    """``value`` with tuples as lists, for YAML and JSON."""
+    if isinstance(value, tuple):
+        return [_plain(item) for item in value]
+    return value
+
+
+def validate_file(path, lazy=False) -> Dict:
+    if lazy:
+        with LazyConfig(path) as config:
+            validator = validator_for(path, config)
+            validator.validate_all()
+            errors = validator.errors()
+            return {'valid': not errors, 'errors': errors, 'sections_parsed': len(config.materialized)}
+    document = open_document(path)
+    errors = [f"Line {line + 1}: {row[1]}" for line, row in document.errors()]
+    get_defines = None
+    if is_header(path):
+        effective = effective_of(path, document)
+        get_defines = lambda: effective.defines
+    validator = validator_for(path, document, get_defines)
+    validator.validate_all()
+    errors += validator.errors()
+    return {'valid': not errors, 'errors': errors}
+
+
+def stats_file(path) -> Dict:
+    document = open_document(path)
+    stats = {'lines': document.line_count}
+    if not is_header(path):
+        stats['keys'] = sum(1 for _ in document.items())
+        stats['errors'] = len(document.errors(limit=None))
+        return stats
+    items = list(document.items())
+    rows = [row for _, row in items]
+    effective = effective_of(path, document)
+    starts = [start for start, _ in effective.inactive]
+
+    def taken(line):
+        i = bisect_right(starts, line) - 1
+        return i < 0 or line >= effective.inactive[i][1]
+
+    stats.update(
+        options=len(rows),
+        enabled=sum(1 for row in rows if row[3]),
+        sections=len({row[6] for row in rows if row[6] is not None}),
+        # Enabled definitions outside the #if blocks not taken
+        in_effect=sum(1 for line, row in items if row[3] and taken(line)),
+        inactive_lines=sum(stop - start for start, stop in effective.inactive),
+    )
+    return stats
+
+
+def converted_path(path, fmt='yaml', output=None) -> str:
+    """Where convert_file writes ``path``: in the directory ``output``, or beside it."""
+    name = os.path.splitext(os.path.basename(path))[0] + ('.json' if fmt == 'json' else '.yaml')
+    return os.path.join(output or os.path.dirname(os.path.abspath(path)), name)
+
+
+def convert_file(path, fmt='yaml', output=None) -> Dict:
+    """
+    Write the configuration of ``path`` as YAML or JSON: for a header, the
+    options in effect by section; for YAML, its whole content.
+    """
+    if is_header(path):
+        document = open_document(path)
+        defines = effective_of(path, document).defines
+        data: Dict = {}
+        for _, row in document.items():
+            name, section = row[0], row[6] or 'general'
+            if name in defines and row[3]:
+                # The value of the last definition in effect
+                value = defines[name]
+                data.setdefault(section, {})[name] = True if value is None else _plain(value)
+        count = sum(len(options) for options in data.values())
+    else:
+        data = yaml.safe_load(read_file(None, path)[0])
+        count = len(data) if isinstance(data, dict) else 0
+    target = converted_path(path, fmt, output)
+    if os.path.abspath(target) == os.path.abspath(path):
+        raise ValueError(f'converting {path} would overwrite it')
+    if fmt == 'json':
+        text = json.dumps(data, indent=2, ensure_ascii=False) + '\n'
+    else:
+        text = yaml.safe_dump(data, sort_keys=False, allow_unicode=True)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    save_file(None, target, text)
+    return {'output': target, 'options': count}
+
+
+def diff_files(path, old) -> Dict:
+    """What changed in ``path`` since ``old``, by lines and, for headers, by options."""
+    old_lines = read_file(None, old)[0].split('\n')
+    new_lines = read_file(None, path)[0].split('\n')
+    opcodes = diff_lines(old_lines, new_lines)
+    result = {
+        'old': old,
+        'changed_blocks': sum(1 for opcode in opcodes if opcode.tag != EQUAL),
+        'removed_lines': sum(i2 - i1 for tag, i1, i2, _, _ in opcodes if tag != EQUAL),
+        'added_lines': sum(j2 - j1 for tag, _, _, j1, j2 in opcodes if tag != EQUAL),
+    }
+    if is_header(old) and is_header(path):
+        changes = diff_options(model_from_document(open_document(old)),
+                               model_from_document(open_document(path)))
+        result['options'] = [{
+            'change': change.kind,
+            'name': change.name,
+            'before': None if change.before is None else change.before.raw,
+            'after': None if change.after is None else change.after.raw,
+        } for change in changes]
+    return result
+
+
+_WORK = {
+    'validate': validate_file,
+    'stats': stats_file,
+    'convert': convert_file,
+    'diff': diff_files,
+}
+
+
+def run_job(command, path, *args) -> Dict:
+    """Run ``command`` on ``path``; failures are reported in the result."""
+    start = time.perf_counter()
+    result = {'command': command, 'file': path}
+    try:
+        result.update(_WORK[command](path, *args))
+    except Exception as e:
+        result['error'] = f'{type(e).__name__}: {e}'
+    result['ok'] = 'error' not in result and result.get('valid', True)
+    result['ms'] = round((time.perf_counter() - start) * 1000, 2)
+    return result
+
+
+def _pairs(old, new):
+    """(new, old) file pairs to diff: the two files, or the files under
+    both directories at the same relative path."""
+    if not (os.path.isdir(old) and os.path.isdir(new)):
+        return [(new, old)], []
+    old_files = {os.path.relpath(path, old): path for path in collect([old])}
+    new_files = {os.path.relpath(path, new): path for path in collect([new])}
+    pairs = [(new_files[name], old_files[name]) for name in sorted(new_files) if name in old_files]
+    unpaired = [{'command': 'diff', 'file': path, 'only_in': side, 'ok': True}
+                for side, files, other in (('old', old_files, new_files), ('new', new_files, old_files))
+                for name, path in sorted(files.items()) if name not in other]
+    return pairs, unpaired
+
+
+def _conversions(paths, fmt, output):
+    """(path, format, directory) jobs converting the files named by ``paths``,
+    and failed results for those whose output another file's would
+    overwrite.  Under ``output``, the files found in a directory keep
+    their path relative to it."""
+    jobs, clashes = [], []
+    # Output path -> file converted to it
+    targets: Dict[str, str] = {}
+    for root in paths:
+        for path in collect([root]):
+            directory = output
+            if output and os.path.isdir(root):
+                relative = os.path.relpath(os.path.dirname(path), root)
+                directory = os.path.normpath(os.path.join(output, relative))
+            target = os.path.abspath(converted_path(path, fmt, directory))
+            if target in targets:
+                clashes.append({'command': 'convert', 'file': path, 'ok': False,
+                                'error': f'{targets[target]} is converted to {target} too'})
+            else:
+                targets[target] = path
+                jobs.append((path, fmt, directory))
+    return jobs, clashes
+
+
+def execute(command, jobs, workers, out) -> Dict:
+    """
+    Run ``jobs``, tuples of run_job arguments after the command, on
+    ``workers`` processes, writing each result to ``out`` as a line of
+    JSON as soon as it is done; returns the summary.
+    """
+    start = time.perf_counter()
+    failed = 0
+
+    def emit(result):
+        nonlocal failed
+        failed += not result['ok']
+        out.write(json.dumps(result, ensure_ascii=False) + '\n')
+        out.flush()
+
+    if workers <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            emit(run_job(command, *job))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            futures = [pool.submit(run_job, command, *job) for job in jobs]
+            for future in as_completed(futures):
+                emit(future.result())
+    seconds = time.perf_counter() - start
+    return {
+        'summary': command,
+        'files': len(jobs),
+        'failed': failed,
+        'workers': min(workers, len(jobs)) if len(jobs) > 1 else 1,
+        'seconds': round(seconds, 3),
+        'files_per_second': round(len(jobs) / seconds, 1) if seconds > 0 else None,
+    }
+
+
+def make_parser() -> argparse.ArgumentParser:
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help=tr('cli_jobs'))
+    parser = argparse.ArgumentParser(
+        prog='marlin.py', description=tr('cli_description')
+    )
+    commands = parser.add_subparsers(dest='command', required=True)
+    validate = commands.add_parser('validate', parents=[common], help=tr('cli_validate'))
+    validate.add_argument('paths', nargs='+', help=tr('cli_paths'))
+    validate.add_argument('--lazy', action='store_true', help=tr('cli_lazy'))
+    diff = commands.add_parser('diff', parents=[common], help=tr('cli_diff'))
+    diff.add_argument('old')
+    diff.add_argument('new')
+    convert = commands.add_parser('convert', parents=[common], help=tr('cli_convert'))
+    convert.add_argument('paths', nargs='+', help=tr('cli_paths'))
+    convert.add_argument('--format', choices=('yaml', 'json'), default='yaml')
+    convert.add_argument('-o', '--output', help=tr('cli_output'))
+    stats = commands.add_parser('stats', parents=[common], help=tr('cli_stats'))
+    stats.add_argument('paths', nargs='+', help=tr('cli_paths'))
+    templates = commands.add_parser('build-templates', help=tr('cli_build_templates'))
+    templates.add_argument('source', help=tr('cli_template_source'))
+    templates.add_argument('-o', '--output', default=DEFAULT_STORE, help=tr('cli_template_store'))
+    return parser
+
+
+def build_templates(source, path, out) -> int:
+    """Write the template library ``path`` from the directory ``source``,
+    reporting it to ``out`` as one line of JSON; returns the exit status."""
+    result = {'command': 'build-templates', 'file': path}
+    try:
+        if not os.path.isdir(source):
+            raise NotADirectoryError(f'{source} is not a directory of templates')
+        result.update(build_store(source, path))
+    except (OSError, ValueError, yaml.YAMLError) as e:
+        result['error'] = f'{type(e).__name__}: {e}'
+    result['ok'] = 'error' not in result
+    out.write(json.dumps(result, ensure_ascii=False) + '\n')
+    return 0 if result['ok'] else 1
+
+
+def main(argv=None, out=None) -> int:
+    """Run the command line ``argv``; returns the exit status."""
+    args = make_parser().parse_args(sys.argv[1:] if argv is None else argv)
+    out = out or sys.stdout
+    if args.command == 'build-templates':
+        return build_templates(args.source, args.output, out)
+    # Results known before any file is opened
+    early = []
+    if args.command == 'diff':
+        jobs, early = _pairs(args.old, args.new)
+    elif args.command == 'convert':
+        jobs, early = _conversions(args.paths, args.format, args.output)
+    elif args.command == 'validate':
+        jobs = [(path, args.lazy) for path in collect(args.paths)]
+    else:
+        jobs = [(path,) for path in collect(args.paths)]
+    for result in early:
+        out.write(json.dumps(result, ensure_ascii=False) + '\n')
+    summary = execute(args.command, jobs, max(args.jobs, 1), out)
+    summary['failed'] += sum(1 for result in early if not result['ok'])
+    out.write(json.dumps(summary) + '\n')
+    print(f"{summary['files']} files in {summary['seconds']:.2f} s "
+          f"({summary['files_per_second'] or 0:.1f} files/s, {summary['failed']} failed)",
+          file=sys.stderr)
+    return 1 if summary['failed'] else 0
@@ -0,0 +1,304 @@
+"""Differences between two versions of a configuration.
+
+:func:`diff_lines` compares texts line by line.  Lines are replaced by
+integers, equal lines by equal integers, so the comparisons below are of
+small ints.  After the common head and tail are stripped, the patience
+algorithm anchors on the longest increasing run of lines found once on
+either side, all at once, and the gaps between the anchors are diffed the
+same way.  Gaps without such lines are split by the histogram algorithm
+around the rarest line the two sides share, and the few made only of lines
+too common to anchor on, like runs of blank lines and ``#endif``, are left
+to difflib.  The opcodes have the same form as difflib's, so they can be used
+wherever those are.
+
+:func:`diff_options` compares the option models of two headers, and
+:func:`diff_projects` compares several headers at once.  Both pair the
+definitions of each option by name and report what was enabled, disabled,
+changed, added, removed or moved to another file, in one pass over the
+options.
+"""
+
+import difflib
+from bisect import bisect_left
+from itertools import zip_longest
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from .config_parser import ConfigOption
+
+EQUAL = 'equal'
+REPLACE = 'replace'
+DELETE = 'delete'
+INSERT = 'insert'
+
+ADDED = 'added'
+REMOVED = 'removed'
+ENABLED = 'enabled'
+DISABLED = 'disabled'
+CHANGED = 'changed'
+MOVED = 'moved'
+
+# Lines found more often than this in a region are not anchored on
+MAX_CHAIN = 64
+
+
+class Opcode(NamedTuple):
+    """Turn ``a[i1:i2]`` into ``b[j1:j2]``, as in difflib."""
+    tag: str
+    i1: int
+    i2: int
+    j1: int
+    j2: int
+
+
+def _line_ids(a, b) -> Tuple[List[int], List[int]]:
+    ids: Dict[str, int] = {}
+    setdefault = ids.setdefault
+    return [setdefault(line, len(ids)) for line in a], [setdefault(line, len(ids)) for line in b]
+
+
+def _unique_anchors(ha, hb, a0, a1, b0, b1) -> List[Tuple[int, int]]:
+    """
+    (i, j) of the lines found once in ``ha[a0:a1]`` and once in
+    ``hb[b0:b1]`` that keep their order on both sides, as many as possible.
+    """
+    seen: Dict[int, int] = {}
+    for i in range(a0, a1):
+        line = ha[i]
+        seen[line] = -1 if line in seen else i
+    pairs: Dict[int, Tuple[int, int]] = {}
+    for j in range(b0, b1):
+        i = seen.get(hb[j], -1)
+        if i >= 0:
+            if hb[j] in pairs:
+                # Twice in b
+                seen[hb[j]] = -1
+                del pairs[hb[j]]
+            else:
+                pairs[hb[j]] = (i, j)
+    if not pairs:
+        return []
+    # Longest increasing subsequence of j by i, by patience sorting
+    tops: List[int] = []
+    tails: List[int] = []
+    back: List[int] = []
+    ordered = sorted(pairs.values())
+    for k, (i, j) in enumerate(ordered):
+        pile = bisect_left(tops, j)
+        if pile == len(tops):
+            tops.append(j)
+            tails.append(k)
+        else:
+            tops[pile] = j
+            tails[pile] = k
+        back.append(tails[pile - 1] if pile else -1)
+    anchors = []
+    k = tails[-1]
+    while k >= 0:
+        anchors.append(ordered[k])
+        k = back[k]
+    anchors.reverse()
+    return anchors
+
+
+def _anchor(ha, hb, a0, a1, b0, b1) -> Optional[Tuple[int, int, int]]:
+    """
+    (i, j, length) of the match around the rarest line of ``ha[a0:a1]``
+    also in ``hb[b0:b1]``, the longest among equally rare ones, or None.
+    """
+    positions: Dict[int, List[int]] = {}
+    for i in range(a0, a1):
+        positions.setdefault(ha[i], []).append(i)
+    best = None
+    best_count = MAX_CHAIN + 1
+    best_length = 0
+    j = b0
+    while j < b1:
+        occurrences = positions.get(hb[j])
+        if occurrences is None or len(occurrences) > best_count:
+            j += 1
+            continue
+        count = len(occurrences)
+        after = j + 1
+        for i in occurrences:
+            start_i, start_j = i, j
+            while start_i > a0 and start_j > b0 and ha[start_i - 1] == hb[start_j - 1]:
+                start_i -= 1
+                start_j -= 1
+            end_i, end_j = i + 1, j + 1
+            while end_i < a1 and end_j < b1 and ha[end_i] == hb[end_j]:
+                end_i += 1
+                end_j += 1
+            length = end_i - start_i
+            if count < best_count or length > best_length:
+                best = (start_i, start_j, length)
+                best_count = count
+                best_length = length
+            after = max(after, end_j)
+        # The lines inside the match cannot start a better one
+        j = after
+    return best
+
+
+def _matches(ha, hb) -> List[Tuple[int, int, int]]:
+    """(i, j, length) of the equal runs of ``ha`` and ``hb``, in order."""
+    matches = []
+    regions = [(0, len(ha), 0, len(hb))]
+    while regions:
+        a0, a1, b0, b1 = regions.pop()
+        start = a0
+        while a0 < a1 and b0 < b1 and ha[a0] == hb[b0]:
+            a0 += 1
+            b0 += 1
+        if a0 > start:
+            matches.append((start, b0 - (a0 - start), a0 - start))
+        end = a1
+        while a0 < a1 and b0 < b1 and ha[a1 - 1] == hb[b1 - 1]:
+            a1 -= 1
+            b1 -= 1
+        if end > a1:
+            matches.append((a1, b1, end - a1))
+        if a0 == a1 or b0 == b1:
+            continue
+        anchors = _unique_anchors(ha, hb, a0, a1, b0, b1)
+        if anchors:
+            for i, j in anchors:
+                matches.append((i, j, 1))
+                regions.append((a0, i, b0, j))
+                a0, b0 = i + 1, j + 1
+            regions.append((a0, a1, b0, b1))
+            continue
+        anchor = _anchor(ha, hb, a0, a1, b0, b1)
+        if anchor is None:
+            # Only lines too common to anchor on
+            matcher = difflib.SequenceMatcher(None, ha[a0:a1], hb[b0:b1], autojunk=False)
+            matches.extend((a0 + i, b0 + j, n) for i, j, n in matcher.get_matching_blocks() if n)
+            continue
+        i, j, n = anchor
+        matches.append(anchor)
+        regions.append((i + n, a1, j + n, b1))
+        regions.append((a0, i, b0, j))
+    matches.sort()
+    return matches
+
+
+def diff_lines(a: Sequence[str], b: Sequence[str]) -> List[Opcode]:
+    """Opcodes turning the lines ``a`` into the lines ``b``."""
+    ha, hb = _line_ids(a, b)
+    opcodes: List[Opcode] = []
+    i = j = 0
+    for mi, mj, n in _matches(ha, hb) + [(len(ha), len(hb), 0)]:
+        if i < mi and j < mj:
+            opcodes.append(Opcode(REPLACE, i, mi, j, mj))
+        elif i < mi:
+            opcodes.append(Opcode(DELETE, i, mi, j, mj))
+        elif j < mj:
+            opcodes.append(Opcode(INSERT, i, mi, j, mj))
+        if n:
+            if opcodes and opcodes[-1].tag == EQUAL:
+                # Runs found on either side of a split may touch
+                previous = opcodes.pop()
+                opcodes.append(Opcode(EQUAL, previous.i1, mi + n, previous.j1, mj + n))
+            else:
+                opcodes.append(Opcode(EQUAL, mi, mi + n, mj, mj + n))
+        i, j = mi + n, mj + n
+    return opcodes
+
+
+def side_by_side(opcodes: Iterable[Opcode]) -> List[Tuple[Optional[int], Optional[int], str]]:
+    """
+    The rows of a side-by-side view of ``opcodes``: (line of a, line of b,
+    tag), where a line is None on the side that has no line in that row.
+    """
+    rows = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == EQUAL:
+            rows.extend(zip(range(i1, i2), range(j1, j2), [EQUAL] * (i2 - i1)))
+        else:
+            rows.extend((i, j, tag) for i, j in zip_longest(range(i1, i2), range(j1, j2)))
+    return rows
+
+
+class OptionChange(NamedTuple):
+    """How one definition of an option differs between two configurations."""
+    # ADDED, REMOVED, ENABLED, DISABLED, CHANGED or MOVED
+    kind: str
+    name: str
+    # The definition before and after, None where there is none
+    before: Optional[ConfigOption]
+    after: Optional[ConfigOption]
+    # Files of the definitions, for diff_projects
+    before_file: Optional[str] = None
+    after_file: Optional[str] = None
+
+
+def _occurrences(models) -> Dict[str, List[Tuple[Optional[str], ConfigOption]]]:
+    """Name -> (file, option) of every definition, in file and line order."""
+    found: Dict[str, List[Tuple[Optional[str], ConfigOption]]] = {}
+    for path, model in models.items():
+        for option in model:
+            found.setdefault(option.name, []).append((path, option))
+    return found
+
+
+def _compare(name, before_file, before, after_file, after) -> Optional[OptionChange]:
+    if before.enabled != after.enabled:
+        kind = ENABLED if after.enabled else DISABLED
+    elif before.value != after.value:
+        kind = CHANGED
+    else:
+        return None
+    return OptionChange(kind, name, before, after, before_file, after_file)
+
+
+def diff_projects(before: Dict[str, Iterable[ConfigOption]],
+                  after: Dict[str, Iterable[ConfigOption]]) -> List[OptionChange]:
+    """
+    Option changes between two sets of headers, in the order of ``after``
+    and then of the files only in ``before``.
+
+    Args:
+        before, after: File name -> its ConfigModel, or any iterable of its
+            options in line order; definitions are paired by file name
+    """
+    old = _occurrences(before)
+    new = _occurrences(after)
+    changes = []
+    for name in old.keys() | new.keys():
+        # The n-th definition of an option in a file is paired with its
+        # n-th definition in the same file before; Marlin defines some
+        # options once per branch of an #if
+        remaining: Dict[Optional[str], List[ConfigOption]] = {}
+        for path, option in old.get(name, ()):
+            remaining.setdefault(path, []).append(option)
+        unpaired = []
+        for path, option in new.get(name, ()):
+            candidates = remaining.get(path)
+            if candidates:
+                change = _compare(name, path, candidates.pop(0), path, option)
+                if change is not None:
+                    changes.append(change)
+            else:
+                unpaired.append((path, option))
+        left = [(path, option) for path, options in remaining.items() for option in options]
+        for (old_path, old_option), (new_path, new_option) in zip(left, unpaired):
+            changes.append(OptionChange(MOVED, name, old_option, new_option, old_path, new_path))
+        for path, option in unpaired[len(left):]:
+            changes.append(OptionChange(ADDED, name, None, option, None, path))
+        for path, option in left[len(unpaired):]:
+            changes.append(OptionChange(REMOVED, name, option, None, path, None))
+
+    files = {path: rank for rank, path in enumerate(list(after) + [path for path in before if path not in after])}
+
+    def position(change):
+        # A removed option comes after what took its place
+        if change.after is not None:
+            return files[change.after_file], change.after.line, False, change.name
+        return files[change.before_file], change.before.line, True, change.name
+
+    changes.sort(key=position)
+    return changes
+
+
+def diff_options(before: Iterable[ConfigOption], after: Iterable[ConfigOption]) -> List[OptionChange]:
+    """Option changes between two versions of a header, in line order."""
+    return diff_projects({None: before}, {None: after})
@@ -0,0 +1,543 @@
+"""Streaming parser for Marlin's Configuration.h and Configuration_adv.h.
+
+Reads a configuration header line by line into a :class:`ConfigModel`
+holding one :class:`ConfigOption` per ``#define`` or commented-out
+``//#define``.  Each option records its raw and parsed value, whether it is
+enabled, the lines it spans, the ``#if`` conditions around it and the
+``@section`` it belongs to.  Comment prose and blank lines, most of a stock
+file, are skipped on their first character; only option and directive
+lines are matched by regular expressions.
+"""
+
+import re
+import sys
+from array import array
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+# An option line, enabled or commented out.  The value runs up to a comment;
+# whatever follows it is left to the caller, so a stray quote cannot make
+# the match backtrack.
+_DEFINE = re.compile(r'''
+    [ \t]*(?P<disabled>//[ \t]*)?\#[ \t]*define[ \t]+(?P<name>[A-Za-z_]\w*)(?P<function>\()?[ \t]*
+    (?P<value>(?:[^/"'\\\n]+|"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*'|\\.?|/(?![/*]))*)
+    (?P<rest>.*)
+''', re.VERBOSE)
+_DIRECTIVE = re.compile(r'[ \t]*\#[ \t]*(if|ifdef|ifndef|elif|else|endif)\b[ \t]*([^/]*(?:/(?![/*])[^/]*)*)')
+_SECTION = re.compile(r'[ \t]*//[ \t]*@section[ \t]+(.*?)[ \t\r]*$')
+
+_NUMBER = re.compile(r'[-+]?(?:0[xX](?P<hex>[0-9a-fA-F]+)[uUlL]*|(?:\d+\.?\d*|\.\d+)(?P<exp>[eE][-+]?\d+)?[uUlLfF]*)$')
+_ESCAPE = re.compile(r'\\(.)')
+_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', '0': '\0'}
+
+Value = Union[None, bool, int, float, str, tuple]
+
+# Changes whenever parsing a given text can give a different model, which
+# invalidates models cached from earlier versions
+PARSER_VERSION = 1
+
+
+class ConfigOption(NamedTuple):
+    """One ``#define`` of a configuration header, as read from a ConfigModel."""
+    name: str
+    # Value text as written, without the trailing comment
+    raw: str
+    value: Value
+    enabled: bool
+    # 0-based lines [line, end) the definition spans
+    line: int
+    end: int
+    # Conditions of the enclosing #if blocks, outermost first
+    conditions: Tuple[str, ...]
+    section: Optional[str]
+    comment: str
+
+
+def _split_items(text):
+    """Split the inside of a brace array at its top-level commas."""
+    items = []
+    depth = 0
+    quote = None
+    start = 0
+    escaped = False
+    for pos, char in enumerate(text):
+        if quote:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == quote:
+                quote = None
+        elif char in '"\'':
+            quote = char
+        elif char in '{(':
+            depth += 1
+        elif char in '})':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            items.append(text[start:pos].strip())
+            start = pos + 1
+    last = text[start:].strip()
+    if last:
+        items.append(last)
+    return items
+
+
+def _unescape(text):
+    return _ESCAPE.sub(lambda m: _ESCAPES.get(m.group(1), m.group(1)), text)
+
+
+def parse_value(raw: str) -> Value:
+    """
+    Parse the value text of a ``#define``.
+
+    Returns None for flags without a value, a bool, int or float for
+    literals, a str for strings and characters, a tuple for brace arrays,
+    and the raw text itself for names and expressions.
+    """
+    if not raw:
+        return None
+    if raw.isdecimal():
+        return int(raw)
+    first = raw[0]
+    if first in '0123456789-+.':
+        m = _NUMBER.match(raw)
+        if m is not None:
+            digits = m.group('hex')
+            if digits is not None:
+                return -int(digits, 16) if first == '-' else int(digits, 16)
+            number = raw.rstrip('uUlLfF')
+            if '.' in number or m.group('exp'):
+                return float(number)
+            return int(number)
+        return raw
+    if first == '{' and raw[-1] == '}':
+        return tuple(parse_value(item) for item in _split_items(raw[1:-1]))
+    if first in '"\'' and len(raw) >= 2 and raw[-1] == first:
+        return _unescape(raw[1:-1])
+    if raw == 'true':
+        return True
+    if raw == 'false':
+        return False
+    return raw
+
+
+def _effective(block):
+    """Condition under which the current branch of an #if block is taken."""
+    condition, previous = block
+    if not previous:
+        return condition
+    parts = [f'!({earlier})' for earlier in previous]
+    if condition is not None:
+        parts.append(f'({condition})')
+    return ' && '.join(parts)
+
+
+class ConfigModel:
+    """
+    The options of one configuration header, in file order.
+
+    Options are stored by column rather than as one object each, with
+    interned names and sections, and looked up by name through a hash of
+    name -> index.  Indexing and iterating the model yields
+    :class:`ConfigOption` views built on demand.
+
+    :meth:`copy` shares every column with the original.  A copy keeps its
+    changes to values and enabled states in a small table of edits, and
+    only takes its own copy of the columns once that table grows past
+    FOLD_FRACTION of the options, so variants of one base configuration
+    cost little more than the base itself.
+
+    Names can be defined more than once, typically in different #if
+    branches; lookups by name return the first enabled definition, or the
+    first one if none is enabled.
+    """
+
+    __slots__ = (
+        'filename', 'line_count', '_names', '_raws', '_values', '_enabled', '_lines', '_ends',
+        '_conditions', '_sections', '_comments', '_shared', '_edits', '_index', '_index_shared',
+        '_duplicates',
+    )
+
+    # Columns in ConfigOption field order
+    _COLUMNS = ('_names', '_raws', '_values', '_enabled', '_lines', '_ends',
+                '_conditions', '_sections', '_comments')
+
+    # Share of the options a copy may change before it copies the columns
+    FOLD_FRACTION = 1 / 16
+
+    def __init__(self, filename=None):
+        self.filename = filename
+        self.line_count = 0
+        self._names: List[str] = []
+        self._raws: List[str] = []
+        self._values: List[Value] = []
+        self._enabled = bytearray()
+        self._lines = array('l')
+        self._ends = array('l')
+        self._conditions: List[Tuple[str, ...]] = []
+        self._sections: List[Optional[str]] = []
+        self._comments: List[str] = []
+        # Whether the raw, value and enabled columns are shared with other
+        # models; changes then go to _edits as index -> (raw, value, enabled)
+        self._shared = False
+        self._edits: Dict[int, Tuple[str, Value, bool]] = {}
+        self._index: Optional[Dict[str, int]] = None
+        self._index_shared = False
+        # Every definition of the names defined more than once
+        self._duplicates: Dict[str, Tuple[int, ...]] = {}
+
+    def _load_rows(self, rows):
+        """Fill the columns from (name, raw, value, enabled, ...) rows."""
+        if not rows:
+            return
+        (names, raws, values, enabled, lines, ends,
+         conditions, sections, comments) = zip(*rows)
+        self._names = list(names)
+        self._raws = list(raws)
+        self._values = list(values)
+        self._enabled = bytearray(enabled)
+        self._lines = array('l', lines)
+        self._ends = array('l', ends)
+        self._conditions = list(conditions)
+        self._sections = list(sections)
+        self._comments = list(comments)
+        self._index = None
+
+    def copy(self) -> 'ConfigModel':
+        """A model sharing this one's columns."""
+        self._names_index()
+        other = ConfigModel.__new__(ConfigModel)
+        for slot in self.__slots__:
+            setattr(other, slot, getattr(self, slot))
+        other._edits = dict(self._edits)
+        self._shared = other._shared = True
+        self._index_shared = other._index_shared = True
+        return other
+
+    def _fold(self):
+        """Take own copies of the changeable columns and apply the edits."""
+        self._raws, self._values, self._enabled = self._merged_columns()
+        self._edits = {}
+        self._shared = False
+
+    def _merged_columns(self):
+        """Copies of the raw, value and enabled columns with the edits applied."""
+        raws = list(self._raws)
+        values = list(self._values)
+        enabled = bytearray(self._enabled)
+        for i, (raw, value, state) in self._edits.items():
+            raws[i] = raw
+            values[i] = value
+            enabled[i] = state
+        return raws, values, enabled
+
+    def __len__(self):
+        return len(self._names)
+
+    def _state(self, i):
+        """(raw, value, enabled) of option ``i``."""
+        edit = self._edits.get(i) if self._edits else None
+        if edit is not None:
+            return edit
+        return self._raws[i], self._values[i], bool(self._enabled[i])
+
+    def __getitem__(self, i) -> ConfigOption:
+        i = range(len(self._names))[i]
+        raw, value, enabled = self._state(i)
+        return ConfigOption(
+            self._names[i], raw, value, bool(enabled), self._lines[i], self._ends[i],
+            self._conditions[i], self._sections[i], self._comments[i],
+        )
+
+    def __iter__(self) -> Iterator[ConfigOption]:
+        if self._edits:
+            return (self[i] for i in range(len(self._names)))
+        return map(ConfigOption._make, zip(
+            self._names, self._raws, self._values, map(bool, self._enabled), self._lines,
+            self._ends, self._conditions, self._sections, self._comments,
+        ))
+
+    def __contains__(self, name):
+        return name in self._names_index()
+
+    def _names_index(self):
+        if self._index is None:
+            index = {}
+            duplicates = {}
+            for i, name in enumerate(self._names):
+                if name in index:
+                    duplicates[name] = duplicates.get(name, (index[name],)) + (i,)
+                else:
+                    index[name] = i
+            self._index = index
+            self._index_shared = False
+            self._duplicates = duplicates
+            for name, indices in duplicates.items():
+                index[name] = self._preferred(indices)
+        return self._index
+
+    def _preferred(self, indices):
+        for i in indices:
+            if self._state(i)[2]:
+                return i
+        return indices[0]
+
+    def index(self, name) -> Optional[int]:
+        """Index of the definition of ``name`` lookups return, or None."""
+        return self._names_index().get(name)
+
+    def find_all(self, name) -> List[ConfigOption]:
+        """Every definition of ``name``, in file order."""
+        index = self._names_index()
+        if name not in index:
+            return []
+        return [self[i] for i in self._duplicates.get(name, (index[name],))]
+
+    def get(self, name, default=None) -> Optional[ConfigOption]:
+        i = self._names_index().get(name)
+        return default if i is None else self[i]
+
+    def names(self) -> List[str]:
+        """Names of the options, once each, in file order."""
+        return list(self._names_index())
+
+    def column(self, field) -> Sequence:
+        """The column of a ConfigOption field, e.g. ``column('value')``.
+
+        Columns may be shared with copies of the model and must not be
+        changed; use :meth:`set_raw` and :meth:`set_enabled`.
+        """
+        position = ConfigOption._fields.index(field)
+        if self._edits and field in ('raw', 'value', 'enabled'):
+            return self._merged_columns()[position - 1]
+        return getattr(self, self._COLUMNS[position])
+
+    def _set(self, i, raw, value, enabled):
+        if not self._shared:
+            self._raws[i] = raw
+            self._values[i] = value
+            self._enabled[i] = enabled
+            return
+        self._edits[i] = (raw, value, enabled)
+        if len(self._edits) > len(self._names) * self.FOLD_FRACTION:
+            self._fold()
+
+    def set_raw(self, i, raw):
+        """Change the value text of option ``i``, reparsing its value."""
+        i = range(len(self._names))[i]
+        self._set(i, raw, parse_value(raw), self._state(i)[2])
+
+    def set_enabled(self, i, enabled):
+        """Enable or comment out option ``i``."""
+        i = range(len(self._names))[i]
+        raw, value, _ = self._state(i)
+        self._set(i, raw, value, bool(enabled))
+        name = self._names[i]
+        self._names_index()
+        indices = self._duplicates.get(name)
+        if indices:
+            if self._index_shared:
+                self._index = dict(self._index)
+                self._index_shared = False
+            self._index[name] = self._preferred(indices)
+
+    def as_dict(self) -> Dict[str, Value]:
+        """Name -> parsed value of the enabled options; the first definition wins."""
+        values = {}
+        _, value_column, enabled_column = self._merged_columns() if self._edits else (
+            None, self._values, self._enabled)
+        for name, value, enabled in zip(self._names, value_column, enabled_column):
+            if enabled and name not in values:
+                values[name] = value
+        return values
+
+
+class ConfigLineParser:
+    """
+    Parses a configuration header one line at a time.
+
+    The state between lines is an immutable tuple (in block comment, #if
+    blocks, their conditions, section, pending continued definition), so
+    states can be stored per line and compared, as
+    :class:`~struttura.live_document.LiveDocument` does to re-parse only
+    what an edit changed.  :meth:`parse_line` returns the option ended by
+    the line, if any, as a row (name, raw, value, enabled, span,
+    conditions, section, comment), where ``span`` is the number of lines
+    the definition took up to and including this one.
+    """
+
+    initial_state = (False, (), (), None, None)
+
+    def key(self, row):
+        return row[0]
+
+    def parse_line(self, line, state):
+        in_comment, blocks, conditions, section, pending = state
+        if in_comment:
+            if '*/' in line:
+                return None, (False, blocks, conditions, section, None)
+            return None, state
+        if pending is not None:
+            text = line.rstrip('\r\n')
+            name, enabled, parts, span = pending
+            if text.endswith('\\'):
+                pending = (name, enabled, parts + (text[:-1].strip(),), span + 1)
+                return None, (False, blocks, conditions, section, pending)
+            raw = ' '.join(part for part in parts + (text.strip(),) if part)
+            row = (name, raw, parse_value(raw), enabled, span + 1, conditions, section, '')
+            return row, (False, blocks, conditions, section, None)
+
+        stripped = line.lstrip()
+        if not stripped:
+            return None, state
+        first = stripped[0]
+        if first == '/':
+            if stripped[1:2] == '*':
+                if '*/' not in stripped[2:]:
+                    return None, (True, blocks, conditions, section, None)
+                return None, state
+            if '#' not in stripped:
+                if '@section' in stripped:
+                    m = _SECTION.match(line)
+                    if m is not None:
+                        return None, (False, blocks, conditions, sys.intern(m.group(1)), None)
+                return None, state
+            m = _DEFINE.match(line)
+            if m is None:
+                return None, state
+        elif first == '#':
+            m = _DEFINE.match(line)
+            if m is None:
+                return None, self._directive(line, state)
+        else:
+            return None, state
+
+        disabled, name, function, raw, rest = m.groups()
+        if function is not None:
+            # Function-like macros are helpers, not options
+            return None, state
+        raw = raw.strip()
+        comment = ''
+        if rest:
+            if rest.startswith('//'):
+                comment = rest[2:].strip()
+            elif rest.startswith('/*'):
+                close = rest.find('*/', 2)
+                comment = rest[2:close if close >= 0 else len(rest)].strip()
+                if close < 0 and disabled is None:
+                    state = (True, blocks, conditions, section, None)
+            elif rest.strip():
+                # An unterminated string or character literal
+                raw = (raw + rest).strip()
+        if raw.endswith('\\'):
+            pending = (sys.intern(name), disabled is None, (raw[:-1].strip(),), 1)
+            return None, (False, blocks, conditions, section, pending)
+        return (sys.intern(name), raw, parse_value(raw), disabled is None,
+                1, conditions, section, comment), state
+
+    @staticmethod
+    def _directive(line, state):
+        m = _DIRECTIVE.match(line)
+        if m is None:
+            return state
+        _, blocks, conditions, section, _ = state
+        directive, condition = m.groups()
+        condition = condition.strip()
+        if directive == 'if':
+            blocks += ((condition, ()),)
+        elif directive == 'ifdef':
+            blocks += ((f'defined({condition})', ()),)
+        elif directive == 'ifndef':
+            blocks += ((f'!defined({condition})', ()),)
+        elif not blocks:
+            return state
+        elif directive == 'endif':
+            blocks = blocks[:-1]
+        else:
+            current, previous = blocks[-1]
+            if current is not None:
+                previous += (current,)
+            blocks = blocks[:-1] + ((condition if directive == 'elif' else None, previous),)
+        if directive == 'endif':
+            conditions = conditions[:-1]
+        else:
+            conditions = conditions[:len(blocks) - 1] + (sys.intern(_effective(blocks[-1])),)
+        rest = line[m.end():]
+        return (rest.startswith('/*') and '*/' not in rest[2:], blocks, conditions, section, None)
+
+
+def _parse_rows(lines, state=ConfigLineParser.initial_state, first=0):
+    """
+    Rows for ConfigModel._load_rows of the options in ``lines``, numbered
+    from line ``first`` with the parser in ``state`` before the first line;
+    returns (rows, number of lines).
+    """
+    rows = []
+    append = rows.append
+    parse_line = ConfigLineParser().parse_line
+    number = first - 1
+    for number, line in enumerate(lines, first):
+        if state[0] and '*/' not in line:
+            # Block comment prose, much of a stock file
+            continue
+        row, state = parse_line(line, state)
+        if row is not None:
+            name, raw, value, enabled, span, conditions, section, comment = row
+            append((name, raw, value, enabled, number + 1 - span, number + 1, conditions, section, comment))
+
+    pending = state[4]
+    if pending is not None:
+        # The lines ended in a continued definition
+        name, enabled, parts, span = pending
+        raw = ' '.join(part for part in parts if part)
+        append((name, raw, parse_value(raw), enabled, number + 1 - span, number + 1,
+                state[2], state[3], ''))
+    return rows, number + 1 - first
+
+
+def parse_config(source: Union[str, Iterable[str]], filename=None) -> ConfigModel:
+    """
+    Parse a configuration header.
+
+    Args:
+        source: The header text, or an iterable of its lines such as an
+            open file
+        filename: Stored on the model
+    """
+    if isinstance(source, str):
+        # Lines as a text file yields them: no empty line after the last newline
+        source = source.split('\n')
+        if not source[-1]:
+            source.pop()
+    model = ConfigModel(filename)
+    rows, model.line_count = _parse_rows(source)
+    model._load_rows(rows)
+    return model
+
+
+def model_from_document(document, filename=None) -> ConfigModel:
+    """
+    Build a model from a LiveDocument parsed with ConfigLineParser, without
+    parsing the header again.
+    """
+    rows = []
+    for end, row in document.items():
+        name, raw, value, enabled, span, conditions, section, comment = row
+        rows.append((name, raw, value, enabled, end + 1 - span, end + 1, conditions, section, comment))
+    if document.states and document.states[-1][4] is not None:
+        # The document ends in a continued definition
+        state = document.states[-1]
+        name, enabled, parts, span = state[4]
+        raw = ' '.join(part for part in parts if part)
+        end = document.line_count
+        rows.append((name, raw, parse_value(raw), enabled, end - span, end, state[2], state[3], ''))
+    model = ConfigModel(filename)
+    model._load_rows(rows)
+    model.line_count = document.line_count
+    return model
+
+
+def parse_file(path) -> ConfigModel:
+    """Parse the configuration header at ``path``, streaming it line by line."""
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        return parse_config(f, path)
@@ -0,0 +1,196 @@
+"""Side-by-side view of a line diff.
+
+A diff of two long headers has thousands of rows, but only a screenful is
+ever visible.  :class:`DiffView` draws the visible rows on a canvas with a
+pool of items reused from one redraw to the next, like the line gutter,
+and maps its scrollbar onto the rows of the whole diff, so scrolling costs
+the same whatever the size of the files.
+"""
+
+import tkinter as tk
+from tkinter import font as tkfont
+from tkinter import ttk
+
+from .config_diff import DELETE, EQUAL, INSERT, REPLACE, diff_lines, side_by_side
+from .gutter import monospace_family
+
+# Row backgrounds of each side, by opcode tag, and of the missing side
+BACKGROUNDS = {
+    EQUAL: ('', ''),
+    REPLACE: ('#4a3b22', '#4a3b22'),
+    DELETE: ('#4d2626', ''),
+    INSERT: ('', '#24452b'),
+}
+BLANK_BACKGROUND = '#2b2b2b'
+
+
+class DiffView(ttk.Frame):
+    """
+    Two files side by side, with the changed rows highlighted.
+
+    Call :meth:`show` with the lines of both files; the rows are drawn as
+    they come into view.
+    """
+
+    def __init__(self, master, **kwargs):
+        super().__init__(master, **kwargs)
+        self.font = tkfont.Font(family=monospace_family(), size=10)
+        self.row_height = self.font.metrics('linespace') + 2
+        self.canvas = tk.Canvas(self, background='#1e1e1e', highlightthickness=0)
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.left = []
+        self.right = []
+        self.opcodes = []
+        # (left line, right line, tag) of every row
+        self.rows = []
+        # First row on screen
+        self.top = 0
+
+        # Canvas items of each row on screen: backgrounds, numbers and
+        # texts of either side, and what they currently show
+        self._items = []
+        self._shown = []
+        self._key = None
+
+        self.canvas.bind('<Configure>', lambda event: self.redraw())
+        self.canvas.bind('<MouseWheel>', self._on_wheel)
+        self.canvas.bind('<Button-4>', lambda event: self.yview('scroll', -3, 'units'))
+        self.canvas.bind('<Button-5>', lambda event: self.yview('scroll', 3, 'units'))
+
+    def show(self, left, right, opcodes=None):
+        """Compare the lines ``left`` with the lines ``right``."""
+        self.left = left
+        self.right = right
+        self.opcodes = diff_lines(left, right) if opcodes is None else opcodes
+        self.rows = side_by_side(self.opcodes)
+        self.top = 0
+        self.redraw(force=True)
+
+    @property
+    def visible_rows(self) -> int:
+        return max(1, self.canvas.winfo_height() // self.row_height)
+
+    def yview(self, *args):
+        """Scrollbar command, in rows of the diff."""
+        if args[0] == 'moveto':
+            top = int(float(args[1]) * len(self.rows))
+        elif args[2] == 'pages':
+            top = self.top + int(args[1]) * (self.visible_rows - 1)
+        else:
+            top = self.top + int(args[1])
+        self.scroll_to(top)
+
+    def scroll_to(self, row):
+        """Show ``row`` at the top of the view, as far as the rows go."""
+        self.top = max(0, min(row, len(self.rows) - self.visible_rows))
+        self.redraw()
+
+    def _on_wheel(self, event):
+        self.yview('scroll', -3 if event.delta > 0 else 3, 'units')
+
+    def row_of(self, left=None, right=None):
+        """The row showing line ``left`` of the left file or ``right`` of the right one."""
+        start = 0
+        for _, i1, i2, j1, j2 in self.opcodes:
+            first, last, line = (j1, j2, right) if right is not None else (i1, i2, left)
+            if line < last:
+                return start + max(line - first, 0)
+            # One row per line of the longer side
+            start += max(i2 - i1, j2 - j1)
+        return len(self.rows)
+
+    def next_change(self, backwards=False):
+        """Scroll to the next (or previous) block of changed rows."""
+        rows = self.rows
+        start = self.top
+        step = -1 if backwards else 1
+        row = start + step
+        # Leave the change at the top of the view first
+        while 0 <= row < len(rows) and rows[row][2] != EQUAL:
+            row += step
+        while 0 <= row < len(rows) and rows[row][2] == EQUAL:
+            row += step
+        if backwards:
+            while row > 0 and rows[row - 1][2] != EQUAL:
+                row -= 1
+        if 0 <= row < len(rows):
+            self.scroll_to(row)
+
+    def _new_row(self):
+        canvas = self.canvas
+        return (
+            canvas.create_rectangle(0, 0, 0, 0, width=0),
+            canvas.create_rectangle(0, 0, 0, 0, width=0),
+            canvas.create_text(0, 0, anchor='ne', font=self.font, fill='#666666'),
+            canvas.create_text(0, 0, anchor='nw', font=self.font, fill='#d4d4d4'),
+            canvas.create_text(0, 0, anchor='ne', font=self.font, fill='#666666'),
+            canvas.create_text(0, 0, anchor='nw', font=self.font, fill='#d4d4d4'),
+        )
+
+    def redraw(self, force=False):
+        """Draw the rows on screen, reusing the pooled canvas items."""
+        canvas = self.canvas
+        width = canvas.winfo_width()
+        count = min(self.visible_rows + 1, len(self.rows) - self.top)
+        key = (self.top, count, width, canvas.winfo_height())
+        if key == self._key and not force:
+            return
+        self._key = key
+
+        digits = len(str(max(len(self.left), len(self.right), 1)))
+        number_width = self.font.measure('9' * digits) + 8
+        half = width // 2
+        height = self.row_height
+        # Characters that fit in either half; the rest of a line is cut off
+        columns = max(1, (half - number_width - 8) // max(self.font.measure('0'), 1))
+        items = self._items
+        shown = self._shown
+        for k in range(count):
+            left, right, tag = self.rows[self.top + k]
+            backgrounds = BACKGROUNDS[tag]
+            content = (
+                backgrounds[0] if left is not None else BLANK_BACKGROUND,
+                backgrounds[1] if right is not None else BLANK_BACKGROUND,
+                '' if left is None else str(left + 1),
+                '' if left is None else self.left[left].expandtabs(4)[:columns],
+                '' if right is None else str(right + 1),
+                '' if right is None else self.right[right].expandtabs(4)[:columns],
+            )
+            y = k * height
+            geometry = (y, width, number_width)
+            if k == len(items):
+                items.append(self._new_row())
+                shown.append(None)
+            row_items = items[k]
+            previous = shown[k]
+            if previous is None or previous[1] != geometry:
+                canvas.coords(row_items[0], 0, y, half - 1, y + height)
+                canvas.coords(row_items[1], half + 1, y, width, y + height)
+                canvas.coords(row_items[2], number_width - 4, y + 1)
+                canvas.coords(row_items[3], number_width + 4, y + 1)
+                canvas.coords(row_items[4], half + number_width - 4, y + 1)
+                canvas.coords(row_items[5], half + number_width + 4, y + 1)
+            if previous is None:
+                for item in row_items:
+                    canvas.itemconfigure(item, state='normal')
+            old = previous[0] if previous is not None else (None,) * 6
+            for i, (item, value, before) in enumerate(zip(row_items, content, old)):
+                if value != before:
+                    if i < 2:
+                        canvas.itemconfigure(item, fill=value)
+                    else:
+                        canvas.itemconfigure(item, text=value)
+            shown[k] = (content, geometry)
+
+        # Hide the pooled rows that are not needed for this view
+        for k in range(count, len(items)):
+            if shown[k] is not None:
+                for item in items[k]:
+                    canvas.itemconfigure(item, state='hidden')
+                shown[k] = None
+
+        total = max(len(self.rows), 1)
+        self.scrollbar.set(self.top / total, min(1.0, (self.top + self.visible_rows) / total))
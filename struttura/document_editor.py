@@ -0,0 +1,410 @@
+"""Document handling shared by the code editors.
+
+Both CodeEditor widgets show a configuration file in a tk.Text and differ
+only in their layout, gutter and theme.  :class:`DocumentEditor` holds the
+rest: the incremental highlighter and its worker, the window of lines large
+documents are shown through, the parsed document, the #if blocks taken, the
+undo journal and the crash recovery hooks, and loading a document in
+chunks.
+"""
+
+import tkinter as tk
+
+from pygments.lexers import CppLexer
+
+from .config_parser import ConfigLineParser
+from .edit_tracker import EditTracker
+from .frame_scheduler import EDIT, RESIZE, SCROLL, FrameScheduler
+from .highlighter import IncrementalHighlighter, RegexLineLexer
+from .lex_worker import LexWorker
+from .live_document import LiveDocument
+from .marlin_lexer import MarlinConfigLexer, is_header, is_marlin_config
+from .piece_table import PieceTable
+from .preprocessor import UNDEFINED, Evaluator
+from .text_window import LARGE_FILE_CHARS, TextWindow
+from .undo_journal import UndoJournal
+from .viewport_highlighter import ViewportHighlighter
+from .yaml_lines import YamlLineParser
+
+# How often to look whether a document has been lexed to the end
+HIGHLIGHT_POLL_MS = 250
+# Lines inserted into the widget per idle callback when loading in chunks
+LOAD_CHUNK_LINES = 2000
+
+
+class DocumentEditor:
+    """
+    Mixin of a Tk widget editing a document in ``self.text``.
+
+    The widget creates ``self.text`` and ``self.style_map``, then calls
+    :meth:`setup_document` with its vertical scrollbar, the pass that
+    redraws its gutter and the color of the lines in #if blocks not taken.
+    """
+
+    def setup_document(self, scrollbar, redraw_gutter, inactive_color):
+        # Setup lexer for syntax highlighting; the highlighter caches tokens
+        # and lexer state per line so edits only re-lex what they touched,
+        # and tags the visible lines before the rest of the document, which
+        # is lexed on a worker thread
+        self.lexer = CppLexer()
+        line_lexer = RegexLineLexer(self.lexer)
+        self.highlighter = IncrementalHighlighter(line_lexer)
+        self.edit_tracker = EditTracker(self.text)
+        self.edit_tracker.add_listener(self.highlighter.splice)
+        self.lex_worker = LexWorker(line_lexer)
+        self.syntax = ViewportHighlighter(
+            self.text, self.highlighter, self.style_map, worker=self.lex_worker
+        )
+
+        # Edits, scrolling and resizing are coalesced into at most one
+        # highlighting and gutter pass per frame
+        self.scheduler = FrameScheduler(self)
+        self.scheduler.add_pass(self.highlight_syntax)
+        self.scheduler.add_pass(redraw_gutter)
+        self.edit_tracker.add_listener(self._on_edit)
+        self._scrollbar = scrollbar
+        self.text.configure(yscrollcommand=self._on_yscroll)
+        self.text.bind('<Configure>', self._on_configure)
+
+        # Large documents live in a piece table and the text widget only
+        # holds a window of their lines; the scrollbar spans the document
+        self.window = TextWindow(self.text, self.edit_tracker)
+        scrollbar.config(command=self.window.yview)
+
+        # Parsed configuration, re-parsed only where edits touch it; its
+        # listener comes after the window's, which copies edits into the
+        # piece table the document is read from in large file mode
+        self.document = LiveDocument(YamlLineParser(), self.document_lines)
+        self._loading = False
+        # Pending idle callback of a document loaded in chunks
+        self._load_job = None
+        self.edit_tracker.add_listener(self._on_document_edit)
+
+        # Which #if blocks of a header are taken: the others are dimmed,
+        # and validation checks the options defined in the taken ones
+        self.evaluator = Evaluator()
+        self.effective = None
+        self._effective_changes = set()
+        self.text.tag_configure('inactive', foreground=inactive_color)
+        self.scheduler.add_pass(self._update_effective, kinds=(EDIT, SCROLL))
+
+        # Undo history: compact deltas grouped by word, under a memory cap
+        self.journal = UndoJournal()
+        self._replaying = False
+        # Crash recovery journal every change is also written to, undo
+        # and redo included, if any
+        self.recovery = None
+        self.edit_tracker.add_change_listener(self._on_change)
+        # Moving the cursor or leaving the editor ends the current undo step
+        self.text.bind('<Button-1>', self._on_click, add='+')
+        self.text.bind('<FocusOut>', self._on_click, add='+')
+        # Tk's own undo is off, so its keys and events go to the journal
+        for sequence in ('<<Undo>>', '<Control-z>'):
+            self.text.bind(sequence, self._on_undo)
+        for sequence in ('<<Redo>>', '<Control-y>'):
+            self.text.bind(sequence, self._on_redo)
+
+    def _on_edit(self, first, removed, added):
+        self.scheduler.notify(EDIT)
+
+    def _on_document_edit(self, first, removed, added):
+        if self._loading or self.window.filling:
+            return
+        self.document.splice(self.window.first + first, removed, added)
+
+    def _on_change(self, index, removed, inserted):
+        if self._loading or self.window.filling:
+            return
+        line, column = index.split('.')
+        line = self.window.first + int(line) - 1
+        if self.recovery is not None:
+            self.recovery.record(line, int(column), removed, inserted)
+        if not self._replaying:
+            self.journal.record(line, int(column), removed, inserted)
+
+    def _on_click(self, event=None):
+        self.journal.separator()
+
+    def _on_yscroll(self, first, last):
+        self._scrollbar.set(*self.window.scroll_fractions(first, last))
+        self.scheduler.notify(SCROLL)
+
+    def _on_configure(self, event=None):
+        self.scheduler.notify(RESIZE)
+
+    def highlight_syntax(self, kinds=None):
+        """Highlight the visible lines now; the rest is filled in when idle"""
+        if not hasattr(self, 'syntax'):
+            return
+
+        try:
+            self.syntax.refresh()
+        except Exception:
+            # If there's an error in lexing, just continue without highlighting
+            pass
+
+    @staticmethod
+    def lexer_for(path):
+        """The lexer set_filename picks for ``path``"""
+        return MarlinConfigLexer() if is_marlin_config(path) else CppLexer()
+
+    def set_filename(self, path):
+        """Pick the lexer for ``path``: Marlin configuration headers get the
+        dedicated lexer, everything else is lexed as C++.  Headers are
+        parsed as configuration headers, other files as YAML"""
+        parser = ConfigLineParser() if is_header(path) else YamlLineParser()
+        if type(parser) is not type(self.document.parser):
+            self.document.parser = parser
+            self.document.reset(self.document_line_count())
+        lexer = self.lexer_for(path)
+        if type(lexer) is type(self.lexer):
+            return
+        self.lexer = lexer
+        line_lexer = lexer if isinstance(lexer, MarlinConfigLexer) else RegexLineLexer(lexer)
+        self.highlighter.line_lexer = line_lexer
+        self.lex_worker.line_lexer = line_lexer
+        self.highlighter.reset(self.edit_tracker.line_count())
+        self.highlight_syntax()
+
+    @property
+    def is_large(self):
+        """Whether the document is shown through a window of its lines"""
+        return self.window.active
+
+    @property
+    def is_loading(self):
+        """Whether a document loaded in chunks is still being inserted"""
+        return self._load_job is not None
+
+    def load_document(self, content, cached=None, done=None):
+        """Replace the editor contents with ``content``, a string or a
+        PieceTable; documents of LARGE_FILE_CHARS or more are opened in large
+        file mode.  ``cached`` is what :func:`struttura.parse_cache.read_entry`
+        returned for the same content, used instead of parsing and lexing it.
+
+        With ``done``, text shown in the widget is inserted LOAD_CHUNK_LINES
+        lines per idle callback, with the widget read-only meanwhile, and
+        ``done()`` is called once it is all in"""
+        self.cancel_load()
+        # Loading is not an undo step, and the document is parsed once
+        # it is all in
+        self._replaying = True
+        self._loading = True
+        large = isinstance(content, PieceTable) or len(content) >= LARGE_FILE_CHARS
+        if large or done is None:
+            try:
+                if large:
+                    self.window.open(content if isinstance(content, PieceTable) else PieceTable(content))
+                else:
+                    self.window.close()
+                    self.text.delete('1.0', tk.END)
+                    self.text.insert(tk.END, content)
+            finally:
+                self._finish_load(cached)
+            if done is not None:
+                done()
+            return
+
+        self.window.close()
+        self.text.delete('1.0', tk.END)
+        self.text.configure(state=tk.DISABLED)
+        lines = content.split('\n')
+
+        def step(first):
+            self._load_job = None
+            stop = first + LOAD_CHUNK_LINES
+            chunk = '\n'.join(lines[first:stop])
+            try:
+                self.text.configure(state=tk.NORMAL)
+                self.text.insert(tk.END, chunk + '\n' if stop < len(lines) else chunk)
+            except Exception:
+                self._finish_load(None)
+                raise
+            if stop < len(lines):
+                self.text.configure(state=tk.DISABLED)
+                self._load_job = self.after_idle(step, stop)
+                return
+            self._finish_load(cached)
+            done()
+
+        step(0)
+
+    def cancel_load(self):
+        """Stop inserting a document loaded in chunks, keeping what is in"""
+        if self._load_job is None:
+            return
+        self.after_cancel(self._load_job)
+        self._load_job = None
+        self.text.configure(state=tk.NORMAL)
+        self._finish_load(None)
+
+    def _finish_load(self, cached):
+        """Leave loading: clear the undo history and parse the document,
+        or take the parse from ``cached``"""
+        self._replaying = False
+        self._loading = False
+        self.journal.clear()
+        line_count = self.document_line_count()
+        if cached is not None and len(cached[0]) == line_count:
+            rows, states, highlighting = cached
+            self.document.restore(rows, states)
+            if highlighting is not None:
+                self.restore_highlighting(highlighting)
+        else:
+            self.document.reset(line_count)
+        self._update_effective((EDIT,))
+
+    def _update_effective(self, kinds=None):
+        """Re-evaluate a header's #if blocks after edits, and dim the blocks
+        that are not taken"""
+        if self._loading:
+            return
+        if not isinstance(self.document.parser, ConfigLineParser):
+            if self.effective is not None:
+                self.effective = None
+                self.text.tag_remove('inactive', '1.0', tk.END)
+            return
+        if kinds is None or EDIT in kinds or self.effective is None:
+            previous = self.effective.defines if self.effective is not None else {}
+            self.effective = self.evaluator.effective(self.document)
+            defines = self.effective.defines
+            if defines != previous:
+                self._effective_changes.update(
+                    name for name in previous.keys() | defines.keys()
+                    if previous.get(name, UNDEFINED) != defines.get(name, UNDEFINED)
+                )
+        elif not self.window.active:
+            # Scrolling the widget's own text keeps its tags
+            return
+        self._dim_inactive()
+
+    def _dim_inactive(self):
+        """Tag the lines of the widget in blocks that are not taken"""
+        self.text.tag_remove('inactive', '1.0', tk.END)
+        first = self.window.first
+        count = self.edit_tracker.line_count()
+        for start, stop in self.effective.inactive:
+            start, stop = max(start - first, 0), min(stop - first, count)
+            if start < stop:
+                self.text.tag_add('inactive', f'{start + 1}.0', f'{stop + 1}.0')
+        self.text.tag_raise('inactive')
+
+    def take_effective_changes(self):
+        """Names whose effective value changed since the last call"""
+        changed = self._effective_changes
+        self._effective_changes = set()
+        return changed
+
+    def set_predefined(self, defines):
+        """Evaluate the header's #if blocks with ``defines`` in effect before
+        its first line, e.g. those of Configuration.h for Configuration_adv.h"""
+        self.evaluator.predefined = dict(defines)
+        self._update_effective((EDIT,))
+
+    def word_at_cursor(self):
+        """The name under the insertion cursor, or an empty string"""
+        word = self.text.get('insert wordstart', 'insert wordend')
+        return word if word.isidentifier() else ''
+
+    def goto_line(self, line, column=0):
+        """Put the cursor at 0-based document line ``line`` and show it"""
+        if self.window.active:
+            self.window.show(max(line - 5, 0))
+        index = f'{line - self.window.first + 1}.{column}'
+        self.text.mark_set(tk.INSERT, index)
+        self.text.see(index)
+        self.text.focus_set()
+        self.journal.separator()
+
+    def document_line_count(self):
+        """Lines in the whole document"""
+        if self.window.active:
+            return self.window.document.line_count
+        return self.edit_tracker.line_count()
+
+    def document_lines(self, start, stop):
+        """Text of document lines ``[start, stop)``"""
+        if self.window.active:
+            return self.window.document.lines(start, stop)
+        return str(self.edit_tracker.call('get', f'{start + 1}.0', f'{stop}.end')).split('\n')
+
+    def restore_highlighting(self, snapshot):
+        """Highlight with the (tokens, states) of the highlighter lexed
+        earlier from the same text, e.g. by the parse cache"""
+        if self.window.active or len(snapshot[0]) != self.edit_tracker.line_count():
+            # In large file mode the highlighter only holds the window's lines
+            return
+        self.highlighter.restore(*snapshot)
+        self.highlight_syntax()
+
+    def when_highlighted(self, callback):
+        """Call ``callback`` with the highlighter's (tokens, states) once the
+        whole document is lexed; dropped if it is edited or reloaded first"""
+        generation = self.highlighter.generation
+
+        def check():
+            if self.highlighter.generation != generation:
+                return
+            snapshot = self.highlighter.snapshot()
+            if snapshot is None:
+                self.after(HIGHLIGHT_POLL_MS, check)
+            else:
+                callback(snapshot)
+
+        check()
+
+    def document_text(self):
+        """The whole document, including lines outside the window"""
+        return self.window.get_text()
+
+    def write_document(self, f):
+        """Write the whole document to the text file ``f``"""
+        self.window.write_to(f)
+
+    def document_snapshot(self):
+        """The document as a string, or in large file mode a copy of its
+        piece table; later edits do not change it, so it can be saved on
+        another thread"""
+        if self.window.active:
+            return self.window.document.copy()
+        return self.window.get_text()
+
+    def edit_undo(self):
+        self._replay(self.journal.undo())
+
+    def edit_redo(self):
+        self._replay(self.journal.redo())
+
+    def _on_undo(self, event=None):
+        self.edit_undo()
+        return 'break'
+
+    def _on_redo(self, event=None):
+        self.edit_redo()
+        return 'break'
+
+    def _replay(self, edits):
+        """Apply edits from the undo journal without recording them"""
+        if not edits:
+            return
+        self._replaying = True
+        try:
+            for edit in edits:
+                if self.window.active:
+                    # The window is refilled, so the document is told directly
+                    self.window.replace(edit.line, edit.column, edit.removed, edit.inserted)
+                    if self.recovery is not None:
+                        self.recovery.record(*edit)
+                    self.document.splice(edit.line, edit.removed.count('\n') + 1,
+                                         edit.inserted.count('\n') + 1)
+                    continue
+                index = f'{edit.line + 1}.{edit.column}'
+                if edit.removed:
+                    self.text.delete(index, f'{index}+{len(edit.removed)}c')
+                if edit.inserted:
+                    self.text.insert(index, edit.inserted)
+        finally:
+            self._replaying = False
+        index = f'{edit.line - self.window.first + 1}.{edit.column}+{len(edit.inserted)}c'
+        self.text.mark_set(tk.INSERT, index)
+        self.text.see(tk.INSERT)
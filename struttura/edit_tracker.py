@@ -0,0 +1,111 @@
+"""Edit notifications for tk.Text widgets.
+
+Tk has no event that says *what* changed in a Text widget, so the widget's
+Tcl command is renamed and replaced by a proxy that forwards every call and
+reports the line range touched by each insert, delete and replace.
+Listeners that need the text itself, like the undo journal, can also be
+told what each edit removed and inserted.
+"""
+
+from typing import Callable, List
+
+
+class EditTracker:
+    """
+    Proxy for a tk.Text widget command that reports line splices.
+
+    Listeners are called as ``listener(first, removed, added)`` after each
+    edit: lines ``[first, first + removed)`` (0-based) were replaced by
+    ``added`` lines.  Both counts are at least 1.
+
+    Change listeners are called as ``listener(index, removed, inserted)``,
+    where ``index`` is the "line.column" position the edit started at.
+    """
+
+    def __init__(self, text_widget):
+        self.text = text_widget
+        self.tk = text_widget.tk
+        self.listeners: List[Callable[[int, int, int], None]] = []
+        self.change_listeners: List[Callable[[str, str, str], None]] = []
+        self.command = text_widget._w + '_orig'
+        self.tk.call('rename', text_widget._w, self.command)
+        self.tk.createcommand(text_widget._w, self._dispatch)
+
+    def add_listener(self, listener: Callable[[int, int, int], None]):
+        self.listeners.append(listener)
+
+    def add_change_listener(self, listener: Callable[[str, str, str], None]):
+        self.change_listeners.append(listener)
+
+    def call(self, *args):
+        """Run a widget command directly, bypassing the listeners."""
+        return self.tk.call(self.command, *args)
+
+    def line_of(self, index) -> int:
+        """Line number of ``index``, clamped to the last line like Tk's own edits."""
+        line = int(str(self.tk.call(self.command, 'index', index)).split('.')[0])
+        last = int(str(self.tk.call(self.command, 'index', 'end-1c')).split('.')[0])
+        return min(line, last)
+
+    def line_count(self) -> int:
+        return self.line_of('end-1c')
+
+    def _notify(self, first, removed, added):
+        for listener in self.listeners:
+            listener(first - 1, removed, added)
+
+    def _index(self, index) -> str:
+        """Normalize ``index``, clamped before the final newline like Tk's own edits."""
+        if self.tk.getboolean(self.tk.call(self.command, 'compare', index, '>', 'end-1c')):
+            index = 'end-1c'
+        return str(self.tk.call(self.command, 'index', index))
+
+    def _changing(self, start, stop):
+        """Position and text of a range about to be replaced, for change listeners."""
+        if not self.change_listeners:
+            return None
+        start = self._index(start)
+        stop = self._index(stop) if stop is not None else start
+        return start, str(self.tk.call(self.command, 'get', start, stop))
+
+    def _notify_change(self, change, inserted):
+        if change is None or (not change[1] and not inserted):
+            return
+        for listener in self.change_listeners:
+            listener(change[0], change[1], inserted)
+
+    def _dispatch(self, command, *args):
+        """Forward a widget command and report which lines it touched."""
+        if command == 'insert' and args:
+            first = self.line_of(args[0])
+            added = sum(chunk.count('\n') for chunk in args[1::2])
+            change = self._changing(args[0], None)
+            result = self.tk.call(self.command, command, *args)
+            self._notify(first, 1, added + 1)
+            self._notify_change(change, ''.join(args[1::2]))
+            return result
+        if command == 'delete' and args:
+            first = self.line_of(args[0])
+            last = self.line_of(args[1] if len(args) > 1 else f'{args[0]}+1c')
+            change = self._changing(args[0], args[1] if len(args) > 1 else f'{args[0]}+1c')
+            result = self.tk.call(self.command, command, *args)
+            self._notify(first, last - first + 1, 1)
+            self._notify_change(change, '')
+            return result
+        if command == 'replace' and len(args) >= 3:
+            first = self.line_of(args[0])
+            last = self.line_of(args[1])
+            added = sum(chunk.count('\n') for chunk in args[2::2])
+            change = self._changing(args[0], args[1])
+            result = self.tk.call(self.command, command, *args)
+            self._notify(first, last - first + 1, added + 1)
+            self._notify_change(change, ''.join(args[2::2]))
+            return result
+        if command == 'edit' and args and args[0] in ('undo', 'redo'):
+            # Tk replays undo records internally, so the touched range is
+            # unknown; report the whole buffer as replaced
+            before = self.line_count()
+            result = self.tk.call(self.command, command, *args)
+            self._notify(1, before, self.line_count())
+            return result
+        return self.tk.call(self.command, command, *args)
@@ -0,0 +1,226 @@
+"""Opening and saving configuration files off the Tk thread.
+
+Reading a configuration from a slow network share, parsing it and writing
+it back used to run on the Tk thread, which froze the window until the
+file system answered.  A :class:`FileTask` runs that work on a daemon
+thread and posts its progress and outcome to a queue the window polls, and
+the user can cancel it between chunks.  What the window gets back is ready
+to show: the text, or a piece table for large files, and the rows and
+states of the editor's LiveDocument, parsed on the worker or read from the
+parse cache.
+
+Saves write a snapshot of the document to a temporary file next to the
+target, flush it to disk and rename it over the target, so a crash or a
+cancelled save leaves the old file as it was.
+"""
+
+import codecs
+import io
+import os
+import queue
+import shutil
+import tempfile
+import threading
+from typing import NamedTuple, Optional, Tuple
+
+from .config_parser import ConfigLineParser
+from .live_document import LiveDocument
+from .marlin_lexer import is_header
+from .parse_cache import read_entry
+from .piece_table import PieceTable
+from .text_window import LARGE_FILE_CHARS
+from .yaml_lines import YamlLineParser
+
+# Bytes read, or characters written, between progress reports
+CHUNK_BYTES = 1 << 20
+
+# Kinds of the messages a task posts
+PROGRESS, DONE, FAILED, CANCELLED = 'progress', 'done', 'failed', 'cancelled'
+
+
+class Cancelled(Exception):
+    """Raised inside a task's work once the task has been cancelled."""
+
+
+class Loaded(NamedTuple):
+    """A file read and parsed by :func:`load_file`."""
+    # The text, or a PieceTable of it for files opened in large file mode
+    content: object
+    # Line ending to save the file with
+    newline: str
+    # (rows, states, highlighting) for CodeEditor.load_document
+    parsed: tuple
+    # Parse cache key of a header, and whether the cache had it
+    key: Optional[str]
+    hit: bool
+
+
+class FileTask:
+    """
+    Runs ``work(task, *args)`` on a daemon thread.
+
+    ``work`` calls :meth:`progress` between chunks, which posts
+    ``(PROGRESS, fraction)`` to :attr:`messages` and raises
+    :class:`Cancelled` once :meth:`cancel` was called.  The last message is
+    ``(DONE, result)``, ``(FAILED, exception)`` or ``(CANCELLED, None)``.
+    Work that returns is done even if cancel came after its last progress
+    call: by then a save has replaced its file.
+    """
+
+    def __init__(self, work, *args):
+        self.messages = queue.Queue()
+        self._cancelled = threading.Event()
+        self._finished = threading.Event()
+        self._outcome: Tuple[str, object] = (CANCELLED, None)
+        self._thread = threading.Thread(
+            target=self._run, args=(work, args), name='file-task', daemon=True
+        )
+        self._thread.start()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def progress(self, done, total):
+        """Report ``done`` out of ``total``; raise Cancelled if cancelled."""
+        if self._cancelled.is_set():
+            raise Cancelled()
+        self.messages.put((PROGRESS, done / total if total else 1.0))
+
+    def _run(self, work, args):
+        try:
+            self._outcome = (DONE, work(self, *args))
+        except Cancelled:
+            self._outcome = (CANCELLED, None)
+        except Exception as e:
+            self._outcome = (FAILED, e)
+        self._finished.set()
+        self.messages.put(self._outcome)
+
+    def result(self, timeout=None):
+        """
+        Wait for the task and return what its work returned.
+
+        Raises:
+            Cancelled: If the task was cancelled
+            Exception: Whatever the work raised
+            TimeoutError: If it is still running after ``timeout`` seconds
+        """
+        if not self._finished.wait(timeout):
+            raise TimeoutError('file task still running')
+        kind, value = self._outcome
+        if kind == FAILED:
+            raise value
+        if kind == CANCELLED:
+            raise Cancelled()
+        return value
+
+
+def _newline(newlines) -> str:
+    """The line ending to keep, from a decoder's ``newlines``."""
+    return newlines if isinstance(newlines, str) else (newlines or ('\n',))[0]
+
+
+def read_file(task, path, chunk_bytes=CHUNK_BYTES) -> Tuple[str, str]:
+    """
+    Read UTF-8 text ``path`` in chunks, with newlines translated as text
+    mode does; ``task`` is the FileTask running this, or None.
+
+    Returns:
+        tuple: (text, line ending of the file)
+    """
+    size = os.path.getsize(path)
+    decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder('utf-8')(), True)
+    parts = []
+    done = 0
+    with open(path, 'rb') as f:
+        while True:
+            if task is not None:
+                task.progress(done, size)
+            data = f.read(chunk_bytes)
+            if not data:
+                break
+            done += len(data)
+            parts.append(decoder.decode(data))
+    parts.append(decoder.decode(b'', final=True))
+    return ''.join(parts), _newline(decoder.newlines)
+
+
+def load_file(task, path, parse_cache, version) -> Loaded:
+    """
+    Read ``path`` and parse it as the editor's LiveDocument would, or take
+    the parse from ``parse_cache`` for a header it holds.
+
+    Args:
+        task: The FileTask running this, or None
+        path: File to open
+        parse_cache: ParseCache of the window
+        version: cache_version() of the editor's lexer
+    """
+    content, newline = read_file(task, path)
+    key = None
+    if is_header(path):
+        key = parse_cache.key(content, version)
+        entry = parse_cache.load(key)
+        if entry is not None:
+            return Loaded(content, newline, read_entry(entry), key, True)
+        parser = ConfigLineParser()
+    else:
+        parser = YamlLineParser()
+
+    if len(content) >= LARGE_FILE_CHARS:
+        content = PieceTable(content)
+        get_lines = content.lines
+        line_count = content.line_count
+    else:
+        lines = content.split('\n')
+        get_lines = lambda start, stop: lines[start:stop]
+        line_count = len(lines)
+    if task is not None:
+        task.progress(1, 1)
+    document = LiveDocument(parser, get_lines)
+    document.reset(line_count)
+    return Loaded(content, newline, (document.rows, document.states, None), key, False)
+
+
+def save_file(task, path, snapshot, newline='\n', chunk_chars=CHUNK_BYTES) -> str:
+    """
+    Write ``snapshot``, a string or a PieceTable no one else edits, to
+    ``path`` through a temporary file renamed over it; ``task`` is the
+    FileTask running this, or None.
+
+    The file keeps the permissions of the one it replaces.  Returns ``path``.
+    """
+    if isinstance(snapshot, str):
+        total = len(snapshot)
+        chunks = (snapshot[pos:pos + chunk_chars] for pos in range(0, total, chunk_chars))
+    else:
+        total = snapshot.char_count()
+        chunks = snapshot.iter_chunks(chunk_chars)
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8', newline=newline) as f:
+            done = 0
+            for chunk in chunks:
+                if task is not None:
+                    task.progress(done, total)
+                f.write(chunk)
+                done += len(chunk)
+            if task is not None:
+                task.progress(done, total)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            shutil.copymode(path, temp)
+        os.replace(temp, path)
+    except BaseException:
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
+        raise
+    return path
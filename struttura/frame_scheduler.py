@@ -0,0 +1,89 @@
+"""Coalescing scheduler for editor redraw work.
+
+Edits, scrolling and resizing all used to trigger highlighting and gutter
+redraws straight from their event handlers, so holding a key down or pasting
+ran dozens of full passes.  The scheduler only records what happened and runs
+every registered pass at most once per frame, waiting longer between passes
+when the last one was slow.
+"""
+
+import time
+
+from .logger import log_exception
+
+EDIT = 'edit'
+SCROLL = 'scroll'
+RESIZE = 'resize'
+
+# One frame at 60 Hz
+FRAME_SECONDS = 1 / 60
+# Upper bound on how long a notification may wait for its pass
+MAX_DELAY_SECONDS = 0.25
+
+
+class FrameScheduler:
+    """
+    Runs registered passes once per frame for the notifications since the
+    last run.
+
+    Edits are debounced by about twice the duration of the previous run, so
+    typing into a file whose passes are slow does not queue up work; scroll
+    and resize notifications are handled on the next frame.  A new
+    notification replaces the pending timer instead of adding another one,
+    and nothing waits longer than ``MAX_DELAY_SECONDS``.
+    """
+
+    def __init__(self, widget):
+        self.widget = widget
+        self.passes = []
+        self.pending = set()
+        self.last_duration = 0.0
+        self._job = None
+        self._first_pending = None
+
+    def add_pass(self, callback, kinds=(EDIT, SCROLL, RESIZE)):
+        """Run ``callback(kinds)`` whenever one of ``kinds`` was notified."""
+        self.passes.append((callback, frozenset(kinds)))
+
+    def notify(self, kind):
+        """Record a change and (re)schedule the next pass."""
+        now = time.perf_counter()
+        if not self.pending:
+            self._first_pending = now
+        self.pending.add(kind)
+
+        if self.pending == {EDIT}:
+            delay = max(FRAME_SECONDS, 2 * self.last_duration)
+        else:
+            # The view moved: redraw on the next frame
+            delay = FRAME_SECONDS
+        delay = max(0.0, min(delay, self._first_pending + MAX_DELAY_SECONDS - now))
+
+        if self._job is not None:
+            self.widget.after_cancel(self._job)
+        self._job = self.widget.after(int(delay * 1000), self.flush)
+
+    def cancel(self):
+        """Drop pending notifications without running their passes."""
+        if self._job is not None:
+            self.widget.after_cancel(self._job)
+            self._job = None
+        self.pending.clear()
+
+    def flush(self):
+        """Run the passes for the pending notifications now."""
+        self._job = None
+        kinds = frozenset(self.pending)
+        self.pending.clear()
+        if not kinds:
+            return
+        start = time.perf_counter()
+        for callback, wanted in self.passes:
+            if kinds & wanted:
+                try:
+                    callback(kinds)
+                except Exception as e:
+                    log_exception(type(e), e, e.__traceback__)
+        # Smooth the measurement so one slow pass does not stall typing
+        duration = time.perf_counter() - start
+        self.last_duration = (self.last_duration + duration) / 2
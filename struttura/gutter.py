@@ -0,0 +1,119 @@
+"""Line number gutter shared by the code editors.
+
+Only the visible lines are numbered, using a pool of canvas text items that
+is reused from one redraw to the next: scrolling and typing just move and
+relabel the items that are already there.  A redraw that would not change
+anything (same first line, line count, geometry and font) returns right away.
+When the widget only shows part of a larger document, ``line_offset`` is the
+number of document lines before its first line.
+"""
+
+import tkinter as tk
+from tkinter import font as tkfont
+
+# Monospace fonts to try, in order of preference
+MONOSPACE_FONTS = ['Consolas', 'DejaVu Sans Mono', 'Liberation Mono', 'Courier New', 'Courier', 'monospace']
+
+
+def monospace_family():
+    """Return the first installed font of MONOSPACE_FONTS."""
+    available_fonts = set(tkfont.families())
+    for family in MONOSPACE_FONTS:
+        if family in available_fonts:
+            return family
+    return 'Courier'
+
+
+class LineGutter(tk.Canvas):
+    """
+    Canvas numbering the visible lines of a tk.Text.
+
+    Call :meth:`redraw` after edits, scrolling and resizing; it is cheap when
+    nothing relevant changed.
+    """
+
+    def __init__(self, master, text_widget, *args, **kwargs):
+        super().__init__(master, *args, **kwargs)
+        self.text_widget = text_widget
+        self.font_family = monospace_family()
+        self.font_size = 10
+        self.font = tkfont.Font(family=self.font_family, size=self.font_size)
+        self.fill = '#666666'
+        self.text_widget.configure(font=self.font)
+        self.line_offset = 0
+
+        # Canvas item pool and what each item currently shows: a
+        # (label, x, y) tuple, or None while the item is hidden
+        self._items = []
+        self._shown = []
+        self._key = None
+        self._digits = 0
+
+    def _visible_lines(self, first, count, height, top):
+        """Return (line, y) for every line of the text widget on screen."""
+        text = self.text_widget
+        if top is None:
+            return []
+        positions = []
+        if str(text.cget('wrap')) == 'none':
+            # Every line is one display line of the same height
+            y, step = top[1], top[3]
+            line = first
+            while line <= count and y < height:
+                positions.append((line, y))
+                line += 1
+                y += step
+        else:
+            line, info = first, top
+            while info is not None and line <= count:
+                positions.append((line, info[1]))
+                line += 1
+                info = text.dlineinfo(f'{line}.0')
+        return positions
+
+    def redraw(self, force=False):
+        """Number the visible lines, reusing the pooled canvas items."""
+        text = self.text_widget
+        first = int(text.index('@0,0').split('.')[0])
+        count = int(text.index('end-1c').split('.')[0])
+        top = text.dlineinfo(f'{first}.0')
+        height = text.winfo_height()
+        offset = self.line_offset
+        key = (first, top[1] if top else None, count, offset, height, str(text.cget('font')))
+        if key == self._key and not force:
+            return
+        self._key = key
+
+        digits = len(str(count + offset))
+        if digits != self._digits:
+            self._digits = digits
+            self.config(width=self.font.measure('9' * digits + ' ') + 10)
+        x = int(self.cget('width')) - 5
+
+        positions = self._visible_lines(first, count, height, top)
+        items = self._items
+        shown = self._shown
+        for i, (line, y) in enumerate(positions):
+            label = str(line + offset)
+            if i == len(items):
+                items.append(self.create_text(
+                    x, y, anchor='ne', text=label, font=self.font, fill=self.fill
+                ))
+                shown.append((label, x, y))
+                continue
+            previous = shown[i]
+            if previous is None:
+                self.itemconfigure(items[i], text=label, state='normal')
+                self.coords(items[i], x, y)
+            else:
+                if previous[0] != label:
+                    self.itemconfigure(items[i], text=label)
+                if previous[1:] != (x, y):
+                    self.coords(items[i], x, y)
+            shown[i] = (label, x, y)
+
+        # Hide the pooled items that are not needed for this view
+        for i in range(len(positions), len(items)):
+            if shown[i] is not None:
+                self.itemconfigure(items[i], state='hidden')
+                shown[i] = None
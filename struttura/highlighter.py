@@ -0,0 +1,366 @@
+"""Incremental syntax highlighting support for the code editors.
+
+The lexer state at the start of every line is cached, so after an edit only
+the touched lines are re-lexed, continuing past them just until the state
+matches the cached one again.  Nothing in here talks to Tk; the editors feed
+line edits in and get back the range of lines whose tokens changed.
+"""
+
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from pygments.token import Comment, Error, Text, _TokenType
+
+# Lines fetched from the editor per round-trip while relexing
+FETCH_CHUNK = 64
+
+
+def _enter_state(statestack: list, new_state):
+    """Apply a RegexLexer state transition to ``statestack`` in place."""
+    if isinstance(new_state, tuple):
+        for name in new_state:
+            if name == '#pop':
+                if len(statestack) > 1:
+                    statestack.pop()
+            elif name == '#push':
+                statestack.append(statestack[-1])
+            else:
+                statestack.append(name)
+    elif isinstance(new_state, int):
+        # Pop, but always keep the root state on the stack
+        if abs(new_state) >= len(statestack):
+            del statestack[1:]
+        else:
+            del statestack[new_state:]
+    elif new_state == '#push':
+        statestack.append(statestack[-1])
+
+
+class RegexLineLexer:
+    """Line-at-a-time driver for a pygments ``RegexLexer``.
+
+    pygments only tokenizes whole texts and does not expose the state stack
+    it ends up in, so this runs the same matching loop over a single line and
+    returns the stack left over at its end.
+    """
+
+    # Marker pushed on the state stack while inside an unterminated
+    # block comment
+    IN_COMMENT = '#block-comment'
+
+    def __init__(self, lexer, block_comment=('/*', '*/')):
+        self.lexer = lexer
+        self.initial_state = ('root',)
+        # C lexers match block comments with one regex spanning several
+        # lines, which a single line can never satisfy, so they are tracked
+        # here as an extra state instead.
+        self.block_comment = block_comment
+
+    def lex_line(self, line: str, state: tuple) -> Tuple[list, tuple]:
+        """
+        Tokenize one line starting from ``state``.
+
+        Args:
+            line: The line text without its trailing newline
+            state: The state stack at the start of the line
+
+        Returns:
+            tuple: (tokens, end_state) where tokens is a list of
+            (start_col, end_col, token_type) tuples
+        """
+        lexer = self.lexer
+        tokendefs = lexer._tokens
+        text = line + '\n'
+        length = len(line)
+        tokens = []
+        pos = 0
+        statestack = list(state)
+        if self.block_comment:
+            opener, closer = self.block_comment
+        else:
+            opener = closer = None
+
+        if statestack[-1] == self.IN_COMMENT:
+            close = line.find(closer)
+            if close < 0:
+                if length:
+                    tokens.append((0, length, Comment.Multiline))
+                return tokens, state
+            pos = close + len(closer)
+            tokens.append((0, pos, Comment.Multiline))
+            statestack.pop()
+
+        statetokens = tokendefs[statestack[-1]]
+        while pos < length:
+            if opener and line.startswith(opener, pos) and line.find(closer, pos + len(opener)) < 0:
+                tokens.append((pos, length, Comment.Multiline))
+                statestack.append(self.IN_COMMENT)
+                return tokens, tuple(statestack)
+            for rexmatch, action, new_state in statetokens:
+                m = rexmatch(text, pos)
+                if not m:
+                    continue
+                if action is not None:
+                    if type(action) is _TokenType:
+                        if m.end() > pos:
+                            tokens.append((pos, min(m.end(), length), action))
+                    else:
+                        for index, ttype, value in action(lexer, m):
+                            if value and index < length:
+                                tokens.append((index, min(index + len(value), length), ttype))
+                pos = m.end()
+                if new_state is not None:
+                    _enter_state(statestack, new_state)
+                    statetokens = tokendefs[statestack[-1]]
+                break
+            else:
+                tokens.append((pos, pos + 1, Error))
+                pos += 1
+
+        # Let the state machine consume the newline as well: this is where
+        # single-line constructs (preprocessor lines, // comments) end.
+        while pos <= length:
+            for rexmatch, action, new_state in statetokens:
+                m = rexmatch(text, pos)
+                if not m:
+                    continue
+                pos = m.end()
+                if new_state is not None:
+                    _enter_state(statestack, new_state)
+                    statetokens = tokendefs[statestack[-1]]
+                break
+            else:
+                # No rule matches the newline: pygments resets to "root" here
+                statestack = ['root']
+                break
+        return tokens, tuple(statestack)
+
+
+class IncrementalHighlighter:
+    """
+    Per-line token cache with lexer state checkpoints.
+
+    ``states[i]`` is the lexer state at the start of line ``i`` (0-based) and
+    ``tokens[i]`` the tokens of that line, or None when the line still has to
+    be lexed.  Edits are recorded with :meth:`splice`; :meth:`relex` then
+    re-lexes the dirty lines and keeps going only while the state at the end
+    of a line differs from the cached state of the next one.
+
+    ``applied[i]`` is set once the tokens of line ``i`` have been turned into
+    tags, so the editors can tag lazily and know what is still pending.
+
+    ``generation`` changes with every edit; lexing done elsewhere (see
+    :mod:`struttura.lex_worker`) is only merged back for the generation it
+    was started from.
+    """
+
+    def __init__(self, line_lexer):
+        self.line_lexer = line_lexer
+        self.generation = 0
+        self.reset()
+
+    @property
+    def line_count(self) -> int:
+        return len(self.tokens)
+
+    def reset(self, line_count: int = 1):
+        """Forget everything and mark ``line_count`` lines as dirty."""
+        self.states = [self.line_lexer.initial_state] + [None] * (line_count - 1)
+        self.tokens = [None] * line_count
+        self.applied = bytearray(line_count)
+        # Half-open range of lines that must be relexed unconditionally
+        self.dirty = (0, line_count)
+        self.generation += 1
+
+    def snapshot(self) -> Optional[Tuple[list, list]]:
+        """(tokens, states) of every line, or None while lines are still dirty."""
+        if self.is_dirty():
+            return None
+        return list(self.tokens), list(self.states)
+
+    def restore(self, tokens: list, states: list):
+        """Take the tokens and start states of every line from a snapshot of
+        the same text, e.g. a cached one; nothing is left to lex."""
+        self.tokens = tokens
+        self.states = states
+        self.applied = bytearray(len(tokens))
+        self.dirty = (0, 0)
+        self.generation += 1
+
+    def splice(self, first: int, removed: int, added: int):
+        """
+        Record that lines ``[first, first + removed)`` were replaced by
+        ``added`` lines.
+
+        Both counts are at least 1: inserting text into a line replaces that
+        line with the line(s) the insertion produced, and deleting a range
+        collapses the lines it spanned into one.
+        """
+        self.generation += 1
+        end = first + removed
+        self.tokens[first:end] = [None] * added
+        self.applied[first:end] = bytes(added)
+        # The start state of the first line is unaffected by the edit
+        self.states[first + 1:end] = [None] * (added - 1)
+
+        delta = added - removed
+        lo, hi = self.dirty
+        if lo >= hi:
+            lo, hi = first, first + added
+        else:
+            if hi >= end:
+                hi += delta
+            elif hi > first:
+                hi = first + added
+            if lo >= end:
+                lo += delta
+            elif lo > first:
+                lo = first
+            lo, hi = min(lo, first), max(hi, first + added)
+        self.dirty = (lo, min(hi, len(self.tokens)))
+
+    def is_dirty(self) -> bool:
+        lo, hi = self.dirty
+        return lo < hi
+
+    def lexed_until(self) -> int:
+        """Number of leading lines whose tokens are up to date."""
+        lo, hi = self.dirty
+        return lo if lo < hi else len(self.tokens)
+
+    def relex(self, get_lines: Callable[[int, int], Sequence[str]],
+              stop: Optional[int] = None) -> Optional[Tuple[int, int]]:
+        """
+        Re-lex the dirty lines.
+
+        Args:
+            get_lines: Callable returning the text of lines ``[start, stop)``
+            stop: Do not lex past this line; whatever is left stays dirty
+                for a later call
+
+        Returns:
+            tuple: Half-open (first, last) range of lines whose tokens were
+            replaced, or None if nothing was relexed
+        """
+        lo, hi = self.dirty
+        count = len(self.tokens)
+        limit = count if stop is None else min(stop, count)
+        if lo >= hi or lo >= limit:
+            return None
+        states = self.states
+        tokens = self.tokens
+        applied = self.applied
+        lex_line = self.line_lexer.lex_line
+
+        line_no = lo
+        buffer: List[str] = []
+        buffer_start = lo
+        while line_no < limit:
+            if line_no - buffer_start >= len(buffer):
+                buffer_start = line_no
+                fetch = max(hi, line_no + FETCH_CHUNK) if line_no < hi else line_no + FETCH_CHUNK
+                buffer = get_lines(line_no, min(fetch, limit))
+            line_tokens, end_state = lex_line(buffer[line_no - buffer_start], states[line_no])
+            tokens[line_no] = line_tokens
+            applied[line_no] = 0
+            line_no += 1
+            if line_no >= count:
+                self.dirty = (0, 0)
+                break
+            if line_no >= hi and states[line_no] == end_state and tokens[line_no] is not None:
+                self.dirty = (0, 0)
+                break
+            states[line_no] = end_state
+        else:
+            # Stopped early: resume here, and the line after is only known
+            # to be right once its cached start state has been compared
+            self.dirty = (line_no, max(hi, line_no + 1))
+        return lo, line_no
+
+    def merge(self, start: int, line_tokens: list, end_states: list, converged: bool) -> Optional[Tuple[int, int]]:
+        """
+        Store lines lexed outside :meth:`relex`, e.g. on a worker thread.
+
+        Args:
+            start: First line of the batch
+            line_tokens: Tokens of lines ``start``, ``start + 1``, ...
+            end_states: Lexer state at the end of each of those lines
+            converged: Whether the state after the batch matched the cache,
+                i.e. nothing after it needs relexing
+
+        Returns:
+            tuple: Half-open range of lines stored, or None if the batch did
+            not continue where lexing currently stands
+        """
+        lo, hi = self.dirty
+        end = start + len(line_tokens)
+        if lo >= hi or not start <= lo < end:
+            return None
+        count = len(self.tokens)
+        skip = lo - start
+        self.tokens[lo:end] = line_tokens[skip:]
+        self.applied[lo:end] = bytes(end - lo)
+        self.states[lo + 1:end + 1] = end_states[skip:count - start - 1]
+        if converged or end >= count:
+            self.dirty = (0, 0)
+        else:
+            self.dirty = (end, max(hi, end + 1))
+        return lo, end
+
+    def next_pending(self, start: int, forward: bool = True) -> int:
+        """
+        Find the nearest line from ``start`` whose tags are not applied.
+
+        Searches ``[start, end)`` forwards or ``[0, start)`` backwards and
+        returns -1 when there is none.
+        """
+        if forward:
+            return self.applied.find(0, start)
+        return self.applied.rfind(0, 0, start)
+
+    def mark_applied(self, start: int, stop: int):
+        self.applied[start:stop] = b'\x01' * (stop - start)
+
+
+def group_line_tokens(line_tokens: Sequence[list], first: int, last: int,
+                      tag_for: Callable[[object], Optional[str]] = str) -> Dict[str, List[str]]:
+    """
+    Group the cached tokens of lines ``[first, last)`` by tag name.
+
+    Args:
+        line_tokens: Per-line token lists of an :class:`IncrementalHighlighter`
+        tag_for: Maps a token type to its tag name, or None to leave the
+            token untagged, e.g. :meth:`TokenStyleMap.tag_for`
+
+    Returns:
+        dict: Tag name -> flat list of start/end indices, ready for a single
+        ``tag_add(tag, *indices)`` call
+    """
+    ranges: Dict[str, List[str]] = {}
+    for line_no in range(first, last):
+        line = line_no + 1
+        for col_start, col_end, token_type in line_tokens[line_no]:
+            if token_type in Text:
+                continue
+            tag = tag_for(token_type)
+            if tag is None:
+                continue
+            if tag in ranges:
+                ranges[tag].extend((f'{line}.{col_start}', f'{line}.{col_end}'))
+            else:
+                ranges[tag] = [f'{line}.{col_start}', f'{line}.{col_end}']
+    return ranges
+
+
+def apply_tag_ranges(text_widget, ranges: Dict[str, List[str]], clear=(), start='1.0', end='end'):
+    """
+    Retag a region of ``text_widget`` with one Tcl call per tag.
+
+    Args:
+        text_widget: The tk.Text to tag
+        ranges: Tag name -> flat index list, see :func:`group_line_tokens`
+        clear: Tags to remove from ``start``..``end`` first
+    """
+    for tag in clear:
+        text_widget.tag_remove(tag, start, end)
+    for tag, indices in ranges.items():
+        text_widget.tag_add(tag, *indices)
@@ -0,0 +1,64 @@
+import os
+import time
+import tkinter as tk
+from tkinter import ttk
+
+from .lang import tr
+
+
+class HistoryDialog:
+    """
+    A dialog listing the revisions a SnapshotStore kept of a file, newest
+    first, to restore one or compare it with the editor.
+    """
+
+    @staticmethod
+    def show(root, store, path, on_restore, on_compare):
+        """Show the history of ``path``; ``on_restore(revision)`` or
+        ``on_compare(revision)`` is called with the one chosen."""
+        revisions = store.history(path)[::-1]
+
+        dialog = tk.Toplevel(root)
+        dialog.title(tr('history_title', file=os.path.basename(path)))
+        dialog.geometry('640x400')
+        dialog.minsize(480, 240)
+
+        columns = ('time', 'lines', 'size', 'stored')
+        list_frame = ttk.Frame(dialog)
+        list_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        tree = ttk.Treeview(list_frame, columns=columns, show='headings', selectmode='browse')
+        for column in columns:
+            tree.heading(column, text=tr(f'history_{column}'))
+            tree.column(column, width=100 if column != 'time' else 180, anchor='w' if column == 'time' else 'e')
+        scrollbar = ttk.Scrollbar(list_frame, command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        tree.pack(fill=tk.BOTH, expand=True)
+        for i, revision in enumerate(revisions):
+            tree.insert('', tk.END, iid=str(i), values=(
+                time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(revision.time)),
+                revision.lines,
+                f'{revision.size / 1024:.1f} KB',
+                f'{revision.stored / 1024:.1f} KB',
+            ))
+        if not revisions:
+            ttk.Label(dialog, text=tr('no_history')).pack(anchor='w', padx=10)
+
+        def chosen(action):
+            selection = tree.selection()
+            if not selection:
+                return
+            dialog.destroy()
+            action(revisions[int(selection[0])])
+
+        tree.bind('<Double-Button-1>', lambda event: chosen(on_compare))
+
+        # Buttons
+        button_frame = ttk.Frame(dialog)
+        button_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
+        ttk.Button(button_frame, text=tr('close'), command=dialog.destroy).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(button_frame, text=tr('restore'), command=lambda: chosen(on_restore)).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(button_frame, text=tr('compare'), command=lambda: chosen(on_compare)).pack(side=tk.RIGHT, padx=5)
+
+        dialog.transient(root)
+        dialog.grab_set()
@@ -32,6 +32,113 @@ LANGUAGES = {
         'version_info': 'Version Information',
         'help_usage': "To start the application, run main.py from the project root.\nNavigate the menu bar for Help, About, Log Viewer, and more.\nUse the Log Viewer to see and filter application logs in real time.\nCustom log entries can be added in your code using log_info, log_warning, log_error.\nCommon troubleshooting: If you see import errors, ensure you are running from the root directory.\n",
         'help_features': "- Centralized logging system: info, warning, error, and uncaught exceptions are logged to traceback.log.\n- Log Viewer dialog with real-time filtering: view ALL, INFO, WARNING, or ERROR entries.\n- Use log_info, log_warning, log_error for custom log entries in your code.\n- Robust error handling and extensible design.\n",
+        'file_loading': 'Loading {file}...',
+        'file_saving': 'Saving {file}...',
+        'file_progress': '{task} {percent}% (Esc to cancel)',
+        'file_cancelled': 'Cancelled: {task}',
+        'file_busy': 'Another file is being opened or saved (Esc cancels it)',
+        'go_to_definition': 'Go to Definition',
+        'find_usages': 'Find Usages',
+        'new_from_template': 'New from Template...',
+        'template_library': 'Printer Templates',
+        'template_vendor': 'Vendor',
+        'template_model': 'Model',
+        'template_board': 'Board',
+        'template_kinematics': 'Kinematics',
+        'template_marlin': 'Marlin',
+        'templates_found': '{count} of {total} templates',
+        'search': 'Search',
+        'any': '(any)',
+        'create': 'Create...',
+        'history': 'History...',
+        'history_title': 'History of {file}',
+        'history_time': 'Saved',
+        'history_lines': 'Lines',
+        'history_size': 'Size',
+        'history_stored': 'Stored',
+        'no_history': 'No revisions kept yet; one is kept each time the file is saved.',
+        'restore': 'Restore',
+        'compare': 'Compare',
+        'load_error': 'Failed to load file',
+        'save_error': 'Failed to save file',
+        'error_title': 'Error',
+        'file_showing': 'Showing {file}...',
+        'file_loaded': 'Loaded {file}',
+        'file_loaded_options': 'Loaded {file} ({count} options)',
+        'file_saved': 'Saved {file}',
+        'marlin_configuration': 'Marlin configuration',
+        'yaml_files': 'YAML files',
+        'all_files': 'All files',
+        'line_error': 'Line {line}: {error}',
+        'undo_status': 'Undo: {steps} steps, {size:.1f} KB',
+        'diff_tab': 'Diff',
+        'compare_with': 'Compare with...',
+        'previous_change': 'Previous change',
+        'next_change': 'Next change',
+        'diff_prompt': 'Choose a file to compare the editor with',
+        'diff_change': 'Change',
+        'diff_option': 'Option',
+        'diff_before': 'Before',
+        'diff_after': 'After',
+        'diff_added': 'added',
+        'diff_removed': 'removed',
+        'diff_enabled': 'enabled',
+        'diff_disabled': 'disabled',
+        'diff_changed': 'changed',
+        'diff_moved': 'moved',
+        'diff_editor': 'editor',
+        'diff_summary': '{old} → {new}: {blocks} changed blocks, {options} options changed',
+        'diff_load_error': 'Failed to load revision',
+        'revision_loading': 'Loading a revision of {file}...',
+        'profiles_tab': 'Profiles',
+        'profile': 'Profile:',
+        'profile_overrides_only': 'Only options set by layers',
+        'profiles_prompt': 'Open a configuration header to see its profiles',
+        'profile_option': 'Option',
+        'profile_value': 'Value',
+        'profile_layer': 'Layer',
+        'profiles_read_error': 'Failed to read {file}: {error}',
+        'option_enabled': '(enabled)',
+        'option_disabled': '(disabled)',
+        'profiles_summary': '{count} of {total} options set by layers',
+        'layer_only': '{option} is only set by a layer',
+        'backup_failed': 'Saved {file}, but the backup failed: {error}',
+        'history_unavailable': 'Open or save a file to see its history',
+        'restore_revision': 'Restore Revision',
+        'restore_revision_confirm': "Replace the editor's text with {file} as saved on {time}?\n\nThe current text is kept in the history, and the file is not changed until you save.",
+        'revision_restoring': 'Restoring {file}...',
+        'revision_restored': 'Restored {file} as saved on {time}',
+        'restore_error': 'Failed to restore revision',
+        'template_library_error': 'Failed to open the template library: {error}',
+        'template_directory': 'Directory for {vendor} {model}',
+        'replace_files': 'Replace Files',
+        'replace_files_confirm': '{files} already in {directory}. Replace?',
+        'template_creating': 'Creating {vendor} {model}...',
+        'template_error': 'Failed to create configuration',
+        'unsaved_document': 'An unsaved document',
+        'new_document': 'a new document',
+        'recover_title': 'Recover Unsaved Changes',
+        'recover_confirm': '{file} has unsaved changes from {time} ({edits} edits). Recover them?',
+        'recovered': 'Recovered unsaved changes to {file}; save to keep them',
+        'symbols_not_indexed': 'The symbols of this project are not indexed yet',
+        'no_definition': 'No definition of {name} in {root}',
+        'symbol_definition': 'definition',
+        'symbol_reference': 'reference',
+        'symbol_condition': 'condition',
+        'commented_out': '{kind}, commented out',
+        'usages_found': '{count} usages of {name}',
+        'cli_description': 'Check Marlin configurations without starting the editor.',
+        'cli_jobs': 'worker processes (default: one per core)',
+        'cli_validate': 'validate configurations',
+        'cli_lazy': 'parse only the sections the rules read, for files too large to open whole; headers are checked as written',
+        'cli_diff': 'compare two configurations, or two directories of them',
+        'cli_convert': 'write the options in effect as YAML or JSON',
+        'cli_stats': 'count lines, options and sections',
+        'cli_paths': 'files or directories',
+        'cli_output': 'directory for the converted files, which keep their path under the directories given (default: beside each one)',
+        'cli_build_templates': 'write the printer template library from a directory of templates',
+        'cli_template_source': 'directory holding base/<Marlin version>/ and <vendor>/<model>/',
+        'cli_template_store': 'library file to write (default: the one New from Template opens)',
     },
     'it': {
         'app_title': 'Base',
@@ -64,6 +171,113 @@ LANGUAGES = {
         'version_info': 'Informazioni Versione',
         'help_usage': "Per avviare l'applicazione, esegui main.py dalla cartella principale del progetto.\nNaviga nella barra dei menu per Aiuto, Informazioni, Visualizza Log e altro.\nUsa il Visualizzatore Log per vedere e filtrare i log dell'applicazione in tempo reale.\nPuoi aggiungere voci personalizzate nel log usando log_info, log_warning, log_error nel tuo codice.\nRisoluzione problemi: se visualizzi errori di importazione, assicurati di eseguire dalla cartella principale.\n",
         'help_features': "- Sistema di logging centralizzato: info, warning, error ed eccezioni non gestite vengono registrate in traceback.log.\n- Finestra Visualizza Log con filtro in tempo reale: visualizza TUTTI, INFO, WARNING o ERROR.\n- Usa log_info, log_warning, log_error per aggiungere voci personalizzate nel log dal tuo codice.\n- Gestione robusta degli errori e design estendibile.\n",
+        'file_loading': 'Apertura di {file}...',
+        'file_saving': 'Salvataggio di {file}...',
+        'file_progress': '{task} {percent}% (Esc per annullare)',
+        'file_cancelled': 'Annullato: {task}',
+        'file_busy': 'Un altro file è in apertura o salvataggio (Esc per annullarlo)',
+        'go_to_definition': 'Vai alla definizione',
+        'find_usages': 'Trova utilizzi',
+        'new_from_template': 'Nuovo da modello...',
+        'template_library': 'Modelli di stampante',
+        'template_vendor': 'Produttore',
+        'template_model': 'Modello',
+        'template_board': 'Scheda',
+        'template_kinematics': 'Cinematica',
+        'template_marlin': 'Marlin',
+        'templates_found': '{count} di {total} modelli',
+        'search': 'Cerca',
+        'any': '(tutti)',
+        'create': 'Crea...',
+        'history': 'Cronologia...',
+        'history_title': 'Cronologia di {file}',
+        'history_time': 'Salvato',
+        'history_lines': 'Righe',
+        'history_size': 'Dimensione',
+        'history_stored': 'Archiviato',
+        'no_history': 'Nessuna revisione ancora; ne viene conservata una a ogni salvataggio.',
+        'restore': 'Ripristina',
+        'compare': 'Confronta',
+        'load_error': 'Impossibile aprire il file',
+        'save_error': 'Impossibile salvare il file',
+        'error_title': 'Errore',
+        'file_showing': 'Visualizzazione di {file}...',
+        'file_loaded': 'Aperto {file}',
+        'file_loaded_options': 'Aperto {file} ({count} opzioni)',
+        'file_saved': 'Salvato {file}',
+        'marlin_configuration': 'Configurazione Marlin',
+        'yaml_files': 'File YAML',
+        'all_files': 'Tutti i file',
+        'line_error': 'Riga {line}: {error}',
+        'undo_status': 'Annulla: {steps} passi, {size:.1f} KB',
+        'diff_tab': 'Differenze',
+        'compare_with': 'Confronta con...',
+        'previous_change': 'Modifica precedente',
+        'next_change': 'Modifica successiva',
+        'diff_prompt': "Scegli un file da confrontare con l'editor",
+        'diff_change': 'Modifica',
+        'diff_option': 'Opzione',
+        'diff_before': 'Prima',
+        'diff_after': 'Dopo',
+        'diff_added': 'aggiunta',
+        'diff_removed': 'rimossa',
+        'diff_enabled': 'abilitata',
+        'diff_disabled': 'disabilitata',
+        'diff_changed': 'cambiata',
+        'diff_moved': 'spostata',
+        'diff_editor': 'editor',
+        'diff_summary': '{old} → {new}: {blocks} blocchi modificati, {options} opzioni cambiate',
+        'diff_load_error': 'Impossibile aprire la revisione',
+        'revision_loading': 'Apertura di una revisione di {file}...',
+        'profiles_tab': 'Profili',
+        'profile': 'Profilo:',
+        'profile_overrides_only': 'Solo le opzioni impostate dai livelli',
+        'profiles_prompt': 'Apri un header di configurazione per vederne i profili',
+        'profile_option': 'Opzione',
+        'profile_value': 'Valore',
+        'profile_layer': 'Livello',
+        'profiles_read_error': 'Impossibile leggere {file}: {error}',
+        'option_enabled': '(abilitata)',
+        'option_disabled': '(disabilitata)',
+        'profiles_summary': '{count} di {total} opzioni impostate dai livelli',
+        'layer_only': '{option} è impostata solo da un livello',
+        'backup_failed': 'Salvato {file}, ma il backup non è riuscito: {error}',
+        'history_unavailable': 'Apri o salva un file per vederne la cronologia',
+        'restore_revision': 'Ripristina revisione',
+        'restore_revision_confirm': "Sostituire il testo dell'editor con {file} salvato il {time}?\n\nIl testo attuale resta nella cronologia, e il file non cambia finché non salvi.",
+        'revision_restoring': 'Ripristino di {file}...',
+        'revision_restored': 'Ripristinato {file} salvato il {time}',
+        'restore_error': 'Impossibile ripristinare la revisione',
+        'template_library_error': 'Impossibile aprire la libreria dei modelli: {error}',
+        'template_directory': 'Cartella per {vendor} {model}',
+        'replace_files': 'Sostituisci file',
+        'replace_files_confirm': '{files} già presenti in {directory}. Sostituirli?',
+        'template_creating': 'Creazione di {vendor} {model}...',
+        'template_error': 'Impossibile creare la configurazione',
+        'unsaved_document': 'Un documento non salvato',
+        'new_document': 'un nuovo documento',
+        'recover_title': 'Recupera modifiche non salvate',
+        'recover_confirm': '{file} ha modifiche non salvate del {time} ({edits} modifiche). Recuperarle?',
+        'recovered': 'Recuperate le modifiche non salvate a {file}; salva per conservarle',
+        'symbols_not_indexed': 'I simboli di questo progetto non sono ancora indicizzati',
+        'no_definition': 'Nessuna definizione di {name} in {root}',
+        'symbol_definition': 'definizione',
+        'symbol_reference': 'riferimento',
+        'symbol_condition': 'condizione',
+        'commented_out': '{kind}, commentata',
+        'usages_found': '{count} utilizzi di {name}',
+        'cli_description': "Controlla le configurazioni Marlin senza avviare l'editor.",
+        'cli_jobs': 'processi di lavoro (predefinito: uno per core)',
+        'cli_validate': 'valida le configurazioni',
+        'cli_lazy': 'analizza solo le sezioni lette dalle regole, per file troppo grandi da aprire interi; gli header sono controllati come scritti',
+        'cli_diff': 'confronta due configurazioni, o due cartelle di configurazioni',
+        'cli_convert': 'scrive le opzioni in vigore in YAML o JSON',
+        'cli_stats': 'conta righe, opzioni e sezioni',
+        'cli_paths': 'file o cartelle',
+        'cli_output': 'cartella dei file convertiti, che mantengono il loro percorso sotto le cartelle date (predefinita: accanto a ognuno)',
+        'cli_build_templates': 'scrive la libreria dei modelli di stampante da una cartella di modelli',
+        'cli_template_source': 'cartella con base/<versione Marlin>/ e <produttore>/<modello>/',
+        'cli_template_store': 'file della libreria da scrivere (predefinito: quello aperto da Nuovo da modello)',
     }
 }
 
@@ -0,0 +1,315 @@
+"""Memory-mapped configuration files, parsed a section at a time.
+
+Reading a large configuration into one string and parsing every option up
+front costs memory in proportion to the whole file, although a validator
+or a settings panel usually looks at a few sections.  :class:`LazyConfig`
+maps the file instead and only indexes where its sections start: the
+``// @section`` markers of a configuration header, along with its ``#if``
+blocks, or the top-level keys of a YAML file.  A section is decoded and
+parsed the first time something asks for it.
+
+The index is built by regular expressions scanning the mapped bytes, so
+the Python code only runs for the markers themselves; in a header, block
+comments are skipped by searching for their end.
+"""
+
+import heapq
+import mmap
+import re
+import sys
+from bisect import bisect_right
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import yaml
+
+from .config_parser import ConfigLineParser, ConfigModel, ConfigOption, _parse_rows
+from .marlin_lexer import is_header
+
+# Section markers, #if directives and block comments of a header, with the
+# line comments and strings that hide a comment opener.  Each is searched
+# for separately, as a single alternation defeats the regex engine's
+# literal prefix scan; markers are checked to start their line afterwards.
+_SECTION_MARK = re.compile(rb'//[ \t]*@section[ \t]+([^\r\n]*?)[ \t]*\r?$', re.MULTILINE)
+_DIRECTIVE_MARK = re.compile(rb'\#[ \t]*(?:if|ifdef|ifndef|elif|else|endif)\b[^\n]*')
+_HIDDEN_OPENER = re.compile(rb'//[^\n]*/\*[^\n]*|"[^"\n]*/\*(?:\\.|[^"\\\n])*"')
+_COMMENT_OPEN = re.compile(rb'/\*')
+_SECTION, _DIRECTIVE, _HIDDEN, _COMMENT = range(4)
+# What may precede "define NAME" on an option line
+_DEFINE_PREFIX = re.compile(rb'[ \t]*(?://[ \t]*)?\#[ \t]*')
+
+# Top-level keys of a YAML mapping
+_YAML_KEY = re.compile(rb'^(?![ \t#\-%]|\.\.\.|---)(?P<key>"[^"\n]*"|\'[^\'\n]*\'|[^:\r\n]+?)[ \t]*:(?=[ \t\r\n]|$)',
+                       re.MULTILINE)
+
+
+def _marks(kind, pattern, data):
+    """(offset, kind, match) of every match of ``pattern``, for merging."""
+    for m in pattern.finditer(data):
+        yield m.start(), kind, m
+
+
+class Section(NamedTuple):
+    """Where a section starts, and for headers the parser state there."""
+    name: Optional[str]
+    offset: int
+    line: int
+    state: Optional[tuple]
+
+
+class IfBlock(NamedTuple):
+    """An #if ... #endif block of a header, 0-based lines [line, end)."""
+    condition: str
+    line: int
+    end: int
+    depth: int
+
+
+class LazyConfig:
+    """
+    A configuration file mapped into memory and parsed section by section.
+
+    For a header, :meth:`section` returns a :class:`ConfigModel` of the
+    options in the section and :meth:`get` looks an option up by name; for
+    YAML, :meth:`section` returns the value of a top-level key, and the
+    object can be read like the mapping it holds.
+
+    Args:
+        path: The file to map
+        kind: 'header' or 'yaml'; by default guessed from ``path``
+    """
+
+    def __init__(self, path, kind=None):
+        self.path = path
+        self.kind = kind or ('header' if is_header(path) else 'yaml')
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            self._map = b''
+        self.sections: List[Section] = []
+        self.blocks: List[IfBlock] = []
+        self.line_count = 0
+        self._offsets: List[int] = []
+        self._materialized: Dict[int, object] = {}
+        self._found: Dict[str, Tuple[int, ...]] = {}
+        if self.kind == 'header':
+            self._index_header()
+        else:
+            self._index_yaml()
+        self._offsets = [section.offset for section in self.sections]
+        self._release()
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _release(self):
+        """Let the OS drop the mapped pages read so far; they are re-read on demand."""
+        if isinstance(self._map, mmap.mmap) and hasattr(mmap, 'MADV_DONTNEED'):
+            self._map.madvise(mmap.MADV_DONTNEED)
+
+    def _count_lines(self, start, stop):
+        return self._map[start:stop].count(b'\n')
+
+    def _line_start(self, offset) -> int:
+        return self._map.rfind(b'\n', 0, offset) + 1
+
+    def _starts_line(self, offset) -> bool:
+        """Whether only blanks precede ``offset`` on its line."""
+        start = self._line_start(offset)
+        return not self._map[start:offset].strip(b' \t')
+
+    def _total_lines(self, line, last):
+        """Lines in the file, given that ``line`` of them start before offset ``last``."""
+        data = self._map
+        line += self._count_lines(last, len(data))
+        # Like a text file, a last line without a newline still counts
+        return line + 1 if data[-1:] not in (b'', b'\n') else line
+
+    def _index_header(self):
+        data = self._map
+        size = len(data)
+        directive = ConfigLineParser._directive
+        state = ConfigLineParser.initial_state
+        sections = [Section(None, 0, 0, state)]
+        # (condition, start line) of the open #if blocks
+        open_blocks = []
+        marks = heapq.merge(
+            _marks(_SECTION, _SECTION_MARK, data), _marks(_DIRECTIVE, _DIRECTIVE_MARK, data),
+            _marks(_HIDDEN, _HIDDEN_OPENER, data), _marks(_COMMENT, _COMMENT_OPEN, data),
+        )
+        pos = line = last = 0
+        for start, kind, m in marks:
+            if start < pos:
+                # Inside a comment, or part of a mark already seen
+                continue
+            pos = m.end()
+            if kind == _COMMENT:
+                close = data.find(b'*/', pos)
+                pos = size if close < 0 else close + 2
+                continue
+            if kind == _HIDDEN:
+                continue
+            if not self._starts_line(start):
+                continue
+            start = self._line_start(start)
+            line += self._count_lines(last, start)
+            last = start
+            if kind == _SECTION:
+                name = sys.intern(m.group(1).decode('utf-8', 'replace'))
+                state = (False, state[1], state[2], name, None)
+                sections.append(Section(name, start, line, state))
+                continue
+            text = m.group().decode('utf-8', 'replace')
+            state = directive(text, state)
+            if state[0]:
+                # The directive line opens a block comment
+                close = data.find(b'*/', pos)
+                pos = size if close < 0 else close + 2
+                state = (False,) + state[1:]
+            keyword = text.lstrip(' \t#').split(None, 1)
+            if keyword[0] in ('if', 'ifdef', 'ifndef'):
+                open_blocks.append((state[2][-1], line))
+            elif keyword[0] == 'endif' and open_blocks:
+                condition, first = open_blocks.pop()
+                self.blocks.append(IfBlock(condition, first, line + 1, len(open_blocks)))
+        self.line_count = self._total_lines(line, last)
+        self.blocks.sort(key=lambda block: block.line)
+        self.sections = sections
+
+    def _index_yaml(self):
+        data = self._map
+        sections = []
+        line = last = 0
+        for m in _YAML_KEY.finditer(data):
+            start = m.start()
+            line += self._count_lines(last, start)
+            last = start
+            key = m.group('key').decode('utf-8', 'replace')
+            if key[:1] in '"\'':
+                key = key[1:-1]
+            sections.append(Section(sys.intern(key), start, line, None))
+        self.line_count = self._total_lines(line, last)
+        self.sections = sections
+
+    def _bounds(self, index) -> Tuple[int, int]:
+        stop = self._offsets[index + 1] if index + 1 < len(self._offsets) else len(self._map)
+        return self._offsets[index], stop
+
+    def section_names(self) -> List[Optional[str]]:
+        """Names of the sections in file order; a header's first is None,
+        for the lines before its first @section marker."""
+        return [section.name for section in self.sections]
+
+    @property
+    def materialized(self) -> List[Optional[str]]:
+        """Names of the sections parsed so far."""
+        return [self.sections[i].name for i in sorted(self._materialized)]
+
+    def _section_index(self, name) -> int:
+        for i, section in enumerate(self.sections):
+            if section.name == name:
+                return i
+        raise KeyError(name)
+
+    def section(self, name):
+        """The options (header) or value (YAML) of the first section ``name``."""
+        return self._materialize(self._section_index(name))
+
+    def _materialize(self, index):
+        value = self._materialized.get(index)
+        if value is not None or index in self._materialized:
+            return value
+        start, stop = self._bounds(index)
+        text = self._map[start:stop].decode('utf-8', 'replace')
+        section = self.sections[index]
+        if self.kind == 'header':
+            lines = text.split('\n')
+            if not lines[-1]:
+                lines.pop()
+            value = ConfigModel(self.path)
+            rows, value.line_count = _parse_rows(lines, section.state, section.line)
+            value._load_rows(rows)
+        else:
+            loaded = yaml.safe_load(text)
+            value = loaded.get(section.name) if isinstance(loaded, dict) else None
+        self._materialized[index] = value
+        self._release()
+        return value
+
+    # Headers
+
+    def _sections_defining(self, name) -> Tuple[int, ...]:
+        """Indexes of the sections with a line defining ``name``."""
+        found = self._found.get(name)
+        if found is None:
+            pattern = re.compile(rb'define[ \t]+' + re.escape(name.encode('utf-8')) + rb'(?![\w(])')
+            sections = set()
+            for m in pattern.finditer(self._map):
+                start = self._line_start(m.start())
+                if _DEFINE_PREFIX.fullmatch(self._map, start, m.start()):
+                    sections.add(bisect_right(self._offsets, start) - 1)
+            found = tuple(sorted(sections))
+            self._found[name] = found
+            self._release()
+        return found
+
+    def find_all(self, name) -> List[ConfigOption]:
+        """Every definition of ``name`` in a header, in file order."""
+        options = []
+        for index in self._sections_defining(name):
+            options.extend(self._materialize(index).find_all(name))
+        return options
+
+    def get(self, name, default=None):
+        """
+        For a header, the first enabled definition of option ``name``, or
+        its first definition; for YAML, the value of top-level key ``name``.
+        Only the sections holding it are parsed.
+        """
+        if self.kind != 'header':
+            try:
+                return self.section(name)
+            except KeyError:
+                return default
+        options = self.find_all(name)
+        for option in options:
+            if option.enabled:
+                return option
+        return options[0] if options else default
+
+    def __contains__(self, name) -> bool:
+        if self.kind != 'header':
+            return any(section.name == name for section in self.sections)
+        return bool(self._sections_defining(name))
+
+    def __getitem__(self, name):
+        value = self.get(name, self)
+        if value is self:
+            raise KeyError(name)
+        return value
+
+    def __iter__(self) -> Iterator:
+        """A header's options, or a YAML file's top-level keys; parses every section."""
+        if self.kind != 'header':
+            return iter(self.section_names())
+        return (option for index in range(len(self.sections))
+                for option in self._materialize(index))
+
+    def model(self) -> ConfigModel:
+        """A header's options as one ConfigModel; parses every section."""
+        rows = []
+        for index in range(len(self.sections)):
+            rows.extend(tuple(option) for option in self._materialize(index))
+        model = ConfigModel(self.path)
+        model._load_rows(rows)
+        model.line_count = self.line_count
+        return model
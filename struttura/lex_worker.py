@@ -0,0 +1,104 @@
+"""Background lexing for the code editors.
+
+Tokenizing with pygments is pure Python and used to run on the Tk thread.
+The worker lexes the dirty tail of a document from a snapshot of its lines
+and posts the results in batches, each tagged with the buffer generation the
+snapshot was taken from.  The Tk side merges a batch only if no edit happened
+since; everything else is dropped.
+"""
+
+import queue
+import threading
+
+# Lines lexed per result batch
+BATCH_LINES = 250
+
+
+class LexJob:
+    """Snapshot of the lines left to lex, taken on the Tk thread."""
+
+    def __init__(self, generation, start, lines, states, dirty_end):
+        self.generation = generation
+        self.start = start
+        self.lines = lines
+        # Cached start states of lines start, start + 1, ... for detecting
+        # convergence past the dirty range
+        self.states = states
+        self.dirty_end = dirty_end
+
+
+class LexWorker:
+    """
+    Daemon thread lexing :class:`LexJob` snapshots.
+
+    Results are ``(generation, start, line_tokens, end_states, converged,
+    done)`` tuples read from :attr:`results`; they have the shape expected by
+    :meth:`IncrementalHighlighter.merge`.
+    """
+
+    def __init__(self, line_lexer):
+        self.line_lexer = line_lexer
+        self.results = queue.Queue()
+        self._jobs = queue.Queue()
+        # Generation of the newest job; older jobs stop at the next batch
+        self._latest = 0
+        self._thread = threading.Thread(target=self._run, name='lex-worker', daemon=True)
+        self._thread.start()
+
+    def submit(self, highlighter, get_lines):
+        """Snapshot the dirty part of ``highlighter`` and queue it."""
+        start = highlighter.lexed_until()
+        end = highlighter.line_count
+        job = LexJob(
+            highlighter.generation,
+            start,
+            get_lines(start, end),
+            highlighter.states[start:],
+            highlighter.dirty[1],
+        )
+        self._latest = job.generation
+        self._jobs.put(job)
+        return job.generation
+
+    def stop(self):
+        self._jobs.put(None)
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            if job.generation == self._latest:
+                self._lex(job)
+
+    def _lex(self, job):
+        lex_line = self.line_lexer.lex_line
+        lines = job.lines
+        states = job.states
+        count = len(lines)
+        state = states[0]
+        index = 0
+        while index < count:
+            if job.generation != self._latest:
+                # A newer edit superseded this snapshot
+                return
+            batch_start = index
+            line_tokens = []
+            end_states = []
+            converged = False
+            while index < count and index - batch_start < BATCH_LINES:
+                tokens, state = lex_line(lines[index], state)
+                line_tokens.append(tokens)
+                end_states.append(state)
+                index += 1
+                if (index < count and job.start + index >= job.dirty_end
+                        and states[index] == state):
+                    converged = True
+                    break
+            done = converged or index >= count
+            self.results.put((
+                job.generation, job.start + batch_start,
+                line_tokens, end_states, converged, done
+            ))
+            if done:
+                return
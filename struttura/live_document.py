@@ -0,0 +1,166 @@
+"""Parsed view of the editor's document, kept up to date edit by edit.
+
+Reparsing a whole configuration after every keystroke costs time in
+proportion to the file, not to the edit.  :class:`LiveDocument` keeps what
+a line parser made of each line, and the parser's state after it, and
+re-parses only from the first line an edit touched until the state after a
+line matches the one recorded before the edit; everything below is known
+to parse as it did.  Rows are indexed by key, so lookups do not scan the
+document, and the keys whose rows changed are collected until taken.  The
+lines of rows the parser could not read are kept apart, shifted by splices,
+so listing errors costs nothing per line of the document either.
+
+A line parser has an ``initial_state``, ``parse_line(line, state)``
+returning ``(row, state)`` with ``row`` None for lines without one, and
+``key(row)``.  States must be immutable and comparable.
+"""
+
+import heapq
+from typing import Callable, Iterator, List, Optional, Set, Tuple
+
+# Lines read from the editor at a time while re-parsing
+CHUNK_LINES = 256
+
+
+class LiveDocument:
+    """
+    Rows parsed from each line of a document, updated by line splices.
+
+    Args:
+        parser: The line parser, such as ConfigLineParser
+        get_lines: ``get_lines(start, stop)`` returns the text of lines
+            ``[start, stop)`` (0-based, without newlines)
+    """
+
+    def __init__(self, parser, get_lines: Callable[[int, int], List[str]]):
+        self.parser = parser
+        self.get_lines = get_lines
+        # Row parsed from each line (or None) and the parser state after it
+        self.rows: list = []
+        self.states: list = []
+        self._by_key = {}
+        # Lines of the rows indexed under None
+        self._error_lines: Set[int] = set()
+        self.changed: Set = set()
+
+    @property
+    def line_count(self) -> int:
+        return len(self.rows)
+
+    def reset(self, line_count: int):
+        """Parse the whole document, which has ``line_count`` lines."""
+        self.rows = [None] * line_count
+        self.states = [None] * line_count
+        self._by_key = {}
+        self._error_lines = set()
+        self.changed = set()
+        self._parse(0, line_count)
+
+    def restore(self, rows: list, states: list):
+        """Take the rows and states of every line from a document with the
+        same text, e.g. a cached one, instead of parsing it."""
+        self.rows = rows
+        self.states = states
+        self._by_key = {}
+        self._error_lines = set()
+        self.changed = set()
+        for line, row in enumerate(rows):
+            if row is not None:
+                self._index(row, line)
+
+    def splice(self, first: int, removed: int, added: int):
+        """Lines ``[first, first + removed)`` were replaced by ``added`` lines."""
+        for line, row in enumerate(self.rows[first:first + removed], first):
+            if row is not None:
+                self._unindex(row, line)
+        if added != removed and self._error_lines:
+            shift = added - removed
+            self._error_lines = {line + shift if line >= first else line for line in self._error_lines}
+        self.rows[first:first + removed] = [None] * added
+        self.states[first:first + removed] = [None] * added
+        self._parse(first, first + added)
+
+    def _parse(self, start, stop):
+        """Re-parse from line ``start``, past ``stop`` until the state converges."""
+        rows = self.rows
+        states = self.states
+        parse_line = self.parser.parse_line
+        state = states[start - 1] if start else self.parser.initial_state
+        count = len(rows)
+        line = start
+        while line < count:
+            chunk_stop = min(count, max(stop, line + CHUNK_LINES))
+            for text in self.get_lines(line, chunk_stop):
+                row, state = parse_line(text, state)
+                old = rows[line]
+                if row != old:
+                    if old is not None:
+                        self._unindex(old, line)
+                    if row is not None:
+                        self._index(row, line)
+                    rows[line] = row
+                converged = state == states[line]
+                states[line] = state
+                line += 1
+                if converged and line >= stop:
+                    return
+
+    def _index(self, row, line):
+        key = self.parser.key(row)
+        self._by_key.setdefault(key, []).append(row)
+        if key is None:
+            self._error_lines.add(line)
+        self.changed.add(key)
+
+    def _unindex(self, row, line):
+        key = self.parser.key(row)
+        if key is None:
+            self._error_lines.discard(line)
+        rows = self._by_key[key]
+        # By identity: equal rows on other lines stay indexed
+        for i, indexed in enumerate(rows):
+            if indexed is row:
+                del rows[i]
+                break
+        if not rows:
+            del self._by_key[key]
+        self.changed.add(key)
+
+    def take_changes(self) -> Set:
+        """Keys whose rows changed since the last call."""
+        changed = self.changed
+        self.changed = set()
+        return changed
+
+    def __contains__(self, key) -> bool:
+        return key in self._by_key
+
+    def get(self, key, default=None):
+        """The first row indexed under ``key``."""
+        rows = self._by_key.get(key)
+        return rows[0] if rows else default
+
+    def find_all(self, key) -> list:
+        """Every row with ``key``, in no particular order."""
+        return list(self._by_key.get(key, ()))
+
+    def line_of(self, row) -> Optional[int]:
+        """The line ``row`` was parsed from; scans the document."""
+        for line, indexed in enumerate(self.rows):
+            if indexed is row:
+                return line
+        return None
+
+    def items(self) -> Iterator[Tuple[int, object]]:
+        """(line, row) for every line with a row, in document order."""
+        return ((line, row) for line, row in enumerate(self.rows) if row is not None)
+
+    def errors(self, limit=10) -> List[Tuple[int, object]]:
+        """(line, row) of the first ``limit`` rows indexed under None, which
+        line parsers use for lines they could not read; all if ``limit`` is
+        None."""
+        if limit is None:
+            lines = sorted(self._error_lines)
+        else:
+            lines = heapq.nsmallest(limit, self._error_lines)
+        return [(line, self.rows[line]) for line in lines]
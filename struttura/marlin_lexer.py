@@ -0,0 +1,244 @@
+"""Fast lexer for Marlin's Configuration.h and Configuration_adv.h.
+
+The stock configuration headers are almost entirely ``#define`` lines,
+``//#define`` toggles, ``#if ENABLED(...)`` blocks, brace arrays and comment
+prose.  Instead of the general C++ state machine this lexer matches those
+forms with a few precompiled patterns, emitting standard pygments token
+types.  Every identifier in these files is a macro name or value, so no
+context is tracked beyond block comments: lexing can restart at any line.
+
+Commented-out defines (``//#define FOO``) are disabled options rather than
+prose, and are emitted as ``Comment.Special`` so themes can show them apart.
+"""
+
+import fnmatch
+import os
+import re
+
+from pygments.lexer import Lexer
+from pygments.token import Comment, Keyword, Name, Number, Operator, Punctuation, String, Text
+
+ROOT = ('root',)
+IN_COMMENT = ('root', 'comment')
+
+# Changes whenever lexing a given text can give different tokens, which
+# invalidates token streams cached from earlier versions
+LEXER_VERSION = 1
+
+# Marlin condition helpers from macros.h
+CONDITION_MACROS = (
+    'ENABLED', 'DISABLED', 'ANY', 'ALL', 'NONE', 'BOTH', 'EITHER',
+    'defined', 'PIN_EXISTS', 'HAS_DRIVER', 'AXIS_DRIVER_TYPE',
+)
+CONSTANTS = ('true', 'false', 'nullptr')
+
+# File names this lexer is picked for
+FILENAMES = ['Configuration*.h']
+
+_DISABLED = r'//[ \t]*\#[ \t]*define\b[^/\n]*(?:/(?!/)[^/\n]*)*'
+# A #define keyword, or any other directive up to a trailing comment
+_DIRECTIVE = r'\#[ \t]*define\b|\#[^/\n]*(?:/(?![/*])[^/\n]*)*'
+_NAME = r'[A-Za-z_]\w*'
+_DECIMAL = r'\d+(?:\.\d*)?'
+
+# Whole-line forms that make up nearly all of a configuration file.  A
+# #define value is matched as a whole when it is a single number, string or
+# name, or an array of plain numbers; anything else (expressions) is scanned
+# token by token.
+_LINE = re.compile(r'''
+    [ \t]*
+    (?:
+        (?P<disabled>''' + _DISABLED + r''')(?P<disabled_note>//.*)?
+      | (?P<comment>//.*)
+      | (?P<open_comment>/\*[^*]*(?:\*+(?!/)[^*]*)*)
+      | (?:
+            (?P<define>\#[ \t]*define)[ \t]+(?P<name>''' + _NAME + r''')
+            (?:
+                [ \t]+(?:
+                    (?P<simple>\d[\w.]*|-''' + _DECIMAL + r'''|"(?:\\.|[^"\\])*"|''' + _NAME + r''')
+                  | (?P<array>\{[ \t]*(?:-?''' + _DECIMAL + r'''[ \t]*,[ \t]*)*-?''' + _DECIMAL + r'''[ \t]*\})
+                )[ \t]*
+              | (?P<value>[^/]*(?:/(?![/*])[^/]*)*)
+            )
+          | (?P<directive>\#[^/]*(?:/(?![/*])[^/]*)*)
+        )
+        (?:(?P<note>//.*)|(?P<rest>/\*.*))?
+    )?
+    $
+''', re.VERBOSE)
+
+(_DISABLED_GROUP, _DISABLED_NOTE, _COMMENT, _OPEN_COMMENT_LINE, _DEFINE, _DEFINE_NAME,
+ _SIMPLE, _ARRAY, _VALUE, _DIRECTIVE_GROUP, _NOTE, _REST) = (
+    _LINE.groupindex[name] for name in (
+        'disabled', 'disabled_note', 'comment', 'open_comment', 'define', 'name',
+        'simple', 'array', 'value', 'directive', 'note', 'rest',
+    )
+)
+
+# Token by token, for whatever the line forms do not cover and for lexing
+# whole texts, where block comments span lines
+_TOKENS = [
+    (r'/\*[^*]*\*+(?:[^/*][^*]*\*+)*/', Comment.Multiline),
+    (r'/\*[\s\S]*', Comment.Multiline),
+    (_DISABLED, Comment.Special),
+    (r'//.*', Comment.Single),
+    (_DIRECTIVE, Comment.Preproc),
+    (r'(?:' + '|'.join(CONDITION_MACROS) + r')\b', Name.Builtin),
+    (r'(?:' + '|'.join(CONSTANTS) + r')\b', Keyword.Constant),
+    (_NAME, Name.Constant),
+    (r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'', String),
+    (r'(?:0[xX][0-9a-fA-F]+|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)[uUlLfF]*', Number),
+    (r'&&|\|\||[=!<>]=|<<|>>|[-+*/%<>!~&|^?:=]', Operator),
+    (r'[{}()\[\],;.]', Punctuation),
+    (r'\S', Text),
+]
+# What the line forms leave to scan is mostly #define values.  The patterns
+# never match at the same character, so values are tried first there.
+_VALUE_TOKENS = (Number, Punctuation, Name.Builtin, Keyword.Constant, Name.Constant, String)
+_LINE_TOKENS = sorted(_TOKENS, key=lambda token: _VALUE_TOKENS.index(token[1])
+                      if token[1] in _VALUE_TOKENS else len(_VALUE_TOKENS))
+_TOKEN = re.compile(r'[ \t\r]*(?:' + '|'.join(f'({pattern})' for pattern, _ in _LINE_TOKENS) + ')')
+_TOKEN_TYPES = (None,) + tuple(token_type for _, token_type in _LINE_TOKENS)
+_OPEN_COMMENT = [pattern for pattern, _ in _LINE_TOKENS].index(r'/\*[\s\S]*') + 1
+# In whole texts the blanks after a token are part of it
+_TEXT_TOKEN = re.compile('|'.join(f'((?:{pattern})\\s*)' for pattern, _ in _TOKENS) + r'|(\s+)')
+_TEXT_TOKEN_TYPES = (None,) + tuple(token_type for _, token_type in _TOKENS) + (Text.Whitespace,)
+
+# Token types of the line forms, looked up once
+_SPECIAL = Comment.Special
+_SINGLE = Comment.Single
+_MULTILINE = Comment.Multiline
+_PREPROC = Comment.Preproc
+_CONSTANT = Name.Constant
+
+_NAME_TYPES = dict.fromkeys(CONDITION_MACROS, Name.Builtin)
+_NAME_TYPES.update(dict.fromkeys(CONSTANTS, Keyword.Constant))
+
+# Token type of a single-token #define value by its first character
+_VALUE_TYPES = dict.fromkeys('0123456789', Number)
+_VALUE_TYPES['"'] = String
+
+# Tokens of an array the line pattern has checked to hold plain numbers
+_ARRAY_TOKEN = re.compile(r'[ \t]*(?:([{},])|(-)|([\d.]+))')
+_ARRAY_TYPES = (None, Punctuation, Operator, Number)
+
+
+def is_header(path):
+    """Whether ``path`` names a C header, which is edited as plain text."""
+    return os.path.splitext(path or '')[1].lower() == '.h'
+
+
+def is_marlin_config(path):
+    """Whether ``path`` names a Marlin configuration header."""
+    name = os.path.basename(path or '')
+    return any(fnmatch.fnmatch(name, pattern) for pattern in FILENAMES)
+
+
+class MarlinConfigLexer(Lexer):
+    """
+    pygments lexer for Marlin configuration headers.
+
+    Besides the usual ``get_tokens_unprocessed``, it implements the line
+    lexer interface of :class:`~struttura.highlighter.IncrementalHighlighter`
+    natively (``initial_state`` and ``lex_line``).
+    """
+
+    name = 'Marlin configuration'
+    aliases = ['marlin']
+    filenames = FILENAMES
+    mimetypes = []
+
+    initial_state = ROOT
+
+    def get_tokens_unprocessed(self, text):
+        token_types = _TEXT_TOKEN_TYPES
+        for m in _TEXT_TOKEN.finditer(text):
+            yield m.start(), token_types[m.lastindex], m.group()
+
+    def lex_line(self, text, state, pos=0, end=None):
+        """
+        Tokenize one line starting from ``state``.
+
+        ``text`` is the line itself, or a whole document with ``pos`` and
+        ``end`` delimiting the line; columns are then absolute offsets.
+
+        Returns:
+            tuple: (tokens, end_state) where tokens is a list of
+            (start_col, end_col, token_type) tuples
+        """
+        if end is None:
+            end = len(text)
+        if state is not ROOT and state == IN_COMMENT:
+            close = text.find('*/', pos, end)
+            if close < 0:
+                return ([(pos, end, _MULTILINE)] if end > pos else []), IN_COMMENT
+            tokens = [(pos, close + 2, _MULTILINE)]
+            if close + 2 == end:
+                return tokens, ROOT
+            return tokens, self._scan(text, close + 2, end, tokens)
+
+        if pos == end:
+            return [], ROOT
+        m = _LINE.match(text, pos, end)
+        if m is None:
+            tokens = []
+            return tokens, self._scan(text, pos, end, tokens)
+        kind = m.lastindex
+        if kind is None:
+            # Blank line
+            return [], ROOT
+        if kind < _DEFINE:
+            # Comments: a disabled option, prose, or a block comment opening
+            if kind == _DISABLED_GROUP:
+                return [(m.start(kind), end, _SPECIAL)], ROOT
+            if kind == _COMMENT:
+                return [(m.start(kind), end, _SINGLE)], ROOT
+            if kind == _DISABLED_NOTE:
+                return [(m.start(_DISABLED_GROUP), m.end(_DISABLED_GROUP), _SPECIAL),
+                        (m.start(kind), end, _SINGLE)], ROOT
+            return [(m.start(kind), end, _MULTILINE)], IN_COMMENT
+
+        start = m.start(_DEFINE)
+        if start < 0:
+            tokens = [(m.start(_DIRECTIVE_GROUP), m.end(_DIRECTIVE_GROUP), _PREPROC)]
+        else:
+            tokens = [(start, m.end(_DEFINE), _PREPROC),
+                      (m.start(_DEFINE_NAME), m.end(_DEFINE_NAME), _CONSTANT)]
+            start = m.start(_SIMPLE)
+            if start >= 0:
+                stop = m.end(_SIMPLE)
+                if text[start] == '-':
+                    # A negative number, which the token patterns split
+                    tokens.append((start, start + 1, Operator))
+                    start += 1
+                value_type = _VALUE_TYPES.get(text[start])
+                if value_type is None:
+                    value_type = _NAME_TYPES.get(text[start:stop], _CONSTANT)
+                tokens.append((start, stop, value_type))
+            elif m.start(_ARRAY) >= 0:
+                append = tokens.append
+                token_types = _ARRAY_TYPES
+                for t in _ARRAY_TOKEN.finditer(text, m.start(_ARRAY), m.end(_ARRAY)):
+                    group = t.lastindex
+                    append((t.start(group), t.end(group), token_types[group]))
+            else:
+                start, stop = m.span(_VALUE)
+                if stop > start:
+                    self._scan(text, start, stop, tokens)
+        if kind == _NOTE:
+            tokens.append((m.start(kind), end, _SINGLE))
+        elif kind == _REST:
+            return tokens, self._scan(text, m.start(kind), end, tokens)
+        return tokens, ROOT
+
+    def _scan(self, text, pos, end, tokens):
+        """Tokenize ``text[pos:end]`` token by token; returns the end state."""
+        append = tokens.append
+        token_types = _TOKEN_TYPES
+        for m in _TOKEN.finditer(text, pos, end):
+            group = m.lastindex
+            start, stop = m.span(group)
+            append((start, stop, token_types[group]))
+            if group == _OPEN_COMMENT:
+                return IN_COMMENT
+        return ROOT
@@ -11,6 +11,7 @@ from .sponsor import Sponsor
 from .log_viewer import LogViewer
 from .version import show_version
 from .lang import tr, set_language, get_available_languages
+from .template_store import DEFAULT_STORE
 
 def create_menu_bar(root, app) -> tk.Menu:
     """
@@ -33,6 +34,13 @@ def create_menu_bar(root, app) -> tk.Menu:
         command=app.load_config,
         accelerator="Ctrl+O"
     )
+    if hasattr(app, 'new_from_template'):
+        # Until the library is built with marlin.py build-templates
+        file_menu.add_command(
+            label=tr('new_from_template'),
+            command=app.new_from_template,
+            state=tk.NORMAL if os.path.exists(DEFAULT_STORE) else tk.DISABLED
+        )
     file_menu.add_separator()
     file_menu.add_command(
         label=tr('save'),
@@ -44,10 +52,15 @@ def create_menu_bar(root, app) -> tk.Menu:
         command=app.save_as_config,
         accelerator="Ctrl+Shift+S"
     )
+    if hasattr(app, 'show_history'):
+        file_menu.add_command(
+            label=tr('history'),
+            command=app.show_history
+        )
     file_menu.add_separator()
     file_menu.add_command(
         label=tr('exit'),
-        command=root.quit,
+        command=root.destroy,
         accelerator="Alt+F4"
     )
     menubar.add_cascade(label=tr('file'), menu=file_menu)
@@ -86,6 +99,18 @@ def create_menu_bar(root, app) -> tk.Menu:
         command=app.select_all if hasattr(app, 'select_all') else None,
         accelerator="Ctrl+A"
     )
+    if hasattr(app, 'goto_definition'):
+        edit_menu.add_separator()
+        edit_menu.add_command(
+            label=tr('go_to_definition'),
+            command=app.goto_definition,
+            accelerator="F12"
+        )
+        edit_menu.add_command(
+            label=tr('find_usages'),
+            command=app.find_usages,
+            accelerator="Shift+F12"
+        )
     menubar.add_cascade(label=tr('edit'), menu=edit_menu)
 
     # View menu
@@ -0,0 +1,211 @@
+"""Persistent cache of parsed configuration headers.
+
+The same few headers are opened over and over, and parsing and lexing them
+costs far more than reading them.  :class:`ParseCache` maps a hash of a
+file's content and of the parser and lexer versions to what the editor's
+LiveDocument parsed from each line and the highlighter's token stream, so a
+hit skips both.  Entries are stored with marshal, one file each, under the
+user configuration directory; they are touched when read, and the least
+recently used ones are deleted once the cache grows past its size limit.
+
+The cache is best effort: an entry that cannot be read is a miss, and a
+failure to write one is ignored.
+"""
+
+import hashlib
+import marshal
+import os
+import sys
+import tempfile
+from typing import Optional, Tuple
+
+import pygments
+from pygments.token import string_to_tokentype
+
+from .config_parser import PARSER_VERSION
+from .marlin_lexer import LEXER_VERSION
+
+# Directory of the application under the user configuration directory
+APP_DIR = 'marlin-configurator'
+
+# Size the cache may grow to before the least recently used entries go
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Start of every entry file: a tag and the entry layout version
+_MAGIC = b'MCPC\x01'
+_SUFFIX = '.cache'
+
+
+def user_config_dir() -> str:
+    """The application's directory under the user configuration directory."""
+    if sys.platform == 'win32':
+        base = os.environ.get('APPDATA') or os.path.expanduser(r'~\AppData\Roaming')
+    elif sys.platform == 'darwin':
+        base = os.path.expanduser('~/Library/Application Support')
+    else:
+        base = os.environ.get('XDG_CONFIG_HOME') or os.path.expanduser('~/.config')
+    return os.path.join(base, APP_DIR)
+
+
+def cache_version(lexer) -> str:
+    """Everything besides the text that cached results depend on."""
+    lexer_type = type(lexer)
+    return (f'{PARSER_VERSION}:{LEXER_VERSION}:{lexer_type.__module__}.{lexer_type.__name__}:'
+            f'{pygments.__version__}:{marshal.version}')
+
+
+def pack_tokens(tokens) -> Tuple[list, list]:
+    """
+    Per-line token lists as (type names, lines), where each line is a tuple
+    of (start, end, type index) tuples; token types are not marshallable.
+    """
+    types = {}
+    lines = []
+    for line_tokens in tokens:
+        packed = []
+        for start, end, token_type in line_tokens:
+            index = types.get(token_type)
+            if index is None:
+                index = types[token_type] = len(types)
+            packed.append((start, end, index))
+        lines.append(tuple(packed))
+    return ['.'.join(token_type) for token_type in types], lines
+
+
+def unpack_tokens(packed) -> list:
+    """The per-line token lists packed by :func:`pack_tokens`."""
+    names, lines = packed
+    types = [string_to_tokentype(name) for name in names]
+    return [[(start, end, types[index]) for start, end, index in line] for line in lines]
+
+
+def make_entry(document, snapshot=None) -> tuple:
+    """
+    The cache entry for a header.
+
+    Args:
+        document: The LiveDocument of the header
+        snapshot: (tokens, states) of the highlighter, or None to cache
+            the document alone
+    """
+    if snapshot is None:
+        return document.rows, document.states, None, None
+    tokens, states = snapshot
+    return document.rows, document.states, pack_tokens(tokens), states
+
+
+def read_entry(entry) -> Tuple[list, list, Optional[tuple]]:
+    """(document rows, document states, highlighter snapshot or None) from
+    an entry of :func:`make_entry`."""
+    rows, states, tokens, token_states = entry
+    if tokens is None:
+        return rows, states, None
+    return rows, states, (unpack_tokens(tokens), token_states)
+
+
+class ParseCache:
+    """
+    Directory of cached parse results, keyed by :meth:`key`.
+
+    Args:
+        directory: Where entries are kept; defaults to ``parse-cache``
+            under :func:`user_config_dir`
+        max_bytes: Total size of the entries kept
+    """
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory or os.path.join(user_config_dir(), 'parse-cache')
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(content: str, version: str) -> str:
+        """Key of ``content`` parsed by the parsers described by ``version``."""
+        digest = hashlib.blake2b(version.encode('utf-8'), digest_size=20)
+        digest.update(b'\0')
+        digest.update(content.encode('utf-8', 'surrogatepass'))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + _SUFFIX)
+
+    def load(self, key):
+        """The entry stored under ``key``, or None."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            if not data.startswith(_MAGIC):
+                raise ValueError('not a cache entry')
+            entry = marshal.loads(memoryview(data)[len(_MAGIC):])
+        except (ValueError, EOFError, TypeError):
+            # Damaged or from another Python version
+            self._remove(path)
+            return None
+        try:
+            # Mark the entry as recently used
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def store(self, key, entry) -> bool:
+        """Store ``entry`` under ``key``, then evict; False if it could not be written."""
+        try:
+            data = _MAGIC + marshal.dumps(entry)
+        except ValueError:
+            return False
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # Written aside and renamed, so readers never see half an entry
+            fd, temp = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(temp, self._path(key))
+            except OSError:
+                self._remove(temp)
+                raise
+            self.evict()
+        except OSError:
+            return False
+        return True
+
+    def _entries(self):
+        """(last use, size, path) of every entry, least recently used first."""
+        entries = []
+        with os.scandir(self.directory) as scan:
+            for item in scan:
+                if item.name.endswith(_SUFFIX):
+                    stat = item.stat()
+                    entries.append((stat.st_mtime, stat.st_size, item.path))
+        entries.sort()
+        return entries
+
+    def evict(self):
+        """Delete the least recently used entries until the rest fit in max_bytes."""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        """Delete every entry."""
+        try:
+            entries = self._entries()
+        except OSError:
+            return
+        for _, _, path in entries:
+            self._remove(path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,150 @@
+"""Piece table holding the text of large documents by lines.
+
+The document is a sequence of pieces, each a run of lines of an immutable
+source string: the text the document was loaded from, or the lines written
+by one edit.  Replacing lines splits at most two pieces and adds one, so
+edits never copy the loaded text, and saving writes the pieces out in order
+instead of rebuilding the document as one string.
+"""
+
+import re
+from array import array
+from bisect import bisect_right
+
+# Largest string handed to a file's write() when saving
+CHUNK_CHARS = 1 << 20
+
+_NEWLINE = re.compile('\n')
+
+
+class _Source:
+    """An immutable text and the offsets its lines start at."""
+
+    __slots__ = ('text', 'starts')
+
+    def __init__(self, text):
+        self.text = text
+        # One entry per line, plus the start of the line after the last
+        starts = array('q', [0])
+        starts.extend(m.end() for m in _NEWLINE.finditer(text))
+        starts.append(len(text) + 1)
+        self.starts = starts
+
+    def line_count(self):
+        return len(self.starts) - 1
+
+    def span(self, first, stop):
+        """Offsets of lines ``[first, stop)``, without the final newline."""
+        return self.starts[first], self.starts[stop] - 1
+
+
+class PieceTable:
+    """
+    Line-addressed piece table.
+
+    Lines are 0-based and exclude their newline; a text of N newlines has
+    N + 1 lines, like a tk.Text widget.
+    """
+
+    def __init__(self, text=''):
+        source = _Source(text)
+        self._pieces = [(source, 0, source.line_count())]
+        self._update()
+
+    def _update(self):
+        # Document line each piece ends at, for bisecting
+        ends = []
+        total = 0
+        for _, first, stop in self._pieces:
+            total += stop - first
+            ends.append(total)
+        self._ends = ends
+
+    @property
+    def line_count(self) -> int:
+        return self._ends[-1] if self._ends else 0
+
+    def _split(self, line):
+        """Make ``line`` start a piece; return that piece's index."""
+        i = bisect_right(self._ends, line)
+        if i == len(self._pieces):
+            return i
+        before = self._ends[i - 1] if i else 0
+        if line == before:
+            return i
+        source, first, stop = self._pieces[i]
+        cut = first + line - before
+        self._pieces[i:i + 1] = [(source, first, cut), (source, cut, stop)]
+        self._update()
+        return i + 1
+
+    def replace_lines(self, first, count, lines):
+        """Replace lines ``[first, first + count)`` with ``lines``."""
+        if first < 0 or count < 0 or first + count > self.line_count:
+            raise IndexError(f'lines {first}-{first + count} out of range')
+        start = self._split(first)
+        stop = self._split(first + count)
+        pieces = []
+        if lines:
+            source = _Source('\n'.join(lines))
+            pieces.append((source, 0, source.line_count()))
+        self._pieces[start:stop] = pieces
+        self._update()
+
+    def lines(self, first, stop):
+        """Return lines ``[first, stop)`` as a list of strings."""
+        first = max(first, 0)
+        stop = min(stop, self.line_count)
+        ends = self._ends
+        result = []
+        line = first
+        while line < stop:
+            i = bisect_right(ends, line)
+            before = ends[i - 1] if i else 0
+            source, piece_first, piece_stop = self._pieces[i]
+            a = piece_first + line - before
+            b = min(piece_stop, a + stop - line)
+            begin, end = source.span(a, b)
+            result.extend(source.text[begin:end].split('\n'))
+            line += b - a
+        return result
+
+    def line(self, line) -> str:
+        if not 0 <= line < self.line_count:
+            raise IndexError(f'line {line} out of range')
+        return self.lines(line, line + 1)[0]
+
+    def iter_chunks(self, size=CHUNK_CHARS):
+        """Yield the document text in order, in strings of at most ``size``."""
+        separate = False
+        for source, first, stop in self._pieces:
+            if separate:
+                yield '\n'
+            separate = True
+            begin, end = source.span(first, stop)
+            for pos in range(begin, end, size):
+                yield source.text[pos:min(pos + size, end)]
+
+    def char_count(self) -> int:
+        """Characters in the document, newlines between lines included."""
+        total = max(len(self._pieces) - 1, 0)
+        for source, first, stop in self._pieces:
+            begin, end = source.span(first, stop)
+            total += end - begin
+        return total
+
+    def copy(self) -> 'PieceTable':
+        """A snapshot sharing the immutable sources; later edits of either
+        table do not show in the other."""
+        table = PieceTable.__new__(PieceTable)
+        table._pieces = list(self._pieces)
+        table._ends = list(self._ends)
+        return table
+
+    def write_to(self, f):
+        """Write the document to the text file ``f``."""
+        for chunk in self.iter_chunks():
+            f.write(chunk)
+
+    def get_text(self) -> str:
+        return ''.join(self.iter_chunks())
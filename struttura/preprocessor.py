@@ -0,0 +1,397 @@
+"""Which options of a configuration header are in effect.
+
+Marlin's options sit inside ``#if`` blocks testing other options with
+``ENABLED()``, ``DISABLED()``, ``ANY()``, ``BOTH()``, ``defined()`` and
+arithmetic, so the text alone does not say which definitions the compiler
+sees.  :class:`Evaluator` walks a header parsed into a LiveDocument in file
+order, like the preprocessor does, evaluating the conditions of each block
+against the options defined above it.  It yields the effective defines and
+the lines of the blocks that are not taken.
+
+Each condition is compiled once into a tree of closures and remembers its
+results by the values of the symbols it reads, so after an edit only the
+conditions reading an option whose value changed are evaluated again; the
+rest of the walk is dictionary lookups.  Conditions the evaluator cannot
+decide, such as calls of macros defined in Marlin's own headers, count as
+true: their blocks are neither dimmed nor dropped.
+"""
+
+import re
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+# Results a condition keeps, by the values of its symbols, before forgetting them
+MEMO_SIZE = 64
+
+_TOKEN = re.compile(r'''
+    \s*(?:
+        (?P<number>0[xX][0-9a-fA-F]+|\d+\.?\d*(?:[eE][-+]?\d+)?|\.\d+)[uUlLfF]*
+      | (?P<name>[A-Za-z_]\w*)
+      | (?P<op>&&|\|\||==|!=|<=|>=|<<|>>|[-+*/%<>!~&|^?:(),])
+    )''', re.VERBOSE)
+
+# Binary operators by precedence, loosest first
+_BINARY = (
+    ('||',), ('&&',), ('|',), ('^',), ('&',), ('==', '!='), ('<', '>', '<=', '>='),
+    ('<<', '>>'), ('+', '-'), ('*', '/', '%'),
+)
+
+
+class Unknown(Exception):
+    """Raised while evaluating a condition that cannot be decided."""
+
+
+class _Undefined:
+    __slots__ = ()
+
+    def __repr__(self):
+        return 'UNDEFINED'
+
+
+# Value of a symbol that is not defined
+UNDEFINED = _Undefined()
+
+
+def is_enabled(value) -> bool:
+    """What Marlin's ENABLED() gives for a symbol's value: true for a flag
+    defined without a value, or as 1 or true."""
+    return value is None or value is True or (value == 1 and not isinstance(value, (str, tuple)))
+
+
+class _Name(str):
+    """An undefined symbol: 0, as in C, except that it equals a symbol
+    defined as its name, as in ``MOTHERBOARD == BOARD_RAMPS_14_EFB``."""
+    __slots__ = ()
+
+
+def _number(value):
+    if isinstance(value, _Name):
+        return 0
+    if isinstance(value, str):
+        raise Unknown(value)
+    return value
+
+
+def _truth(value) -> bool:
+    return bool(_number(value))
+
+
+def _compare(op, left, right) -> int:
+    if isinstance(left, str) and isinstance(right, str):
+        if isinstance(left, _Name) and isinstance(right, _Name):
+            equal = True
+        else:
+            equal = str(left) == str(right)
+    else:
+        equal = _number(left) == _number(right)
+    return int(equal == (op == '=='))
+
+
+def _arithmetic(op, left, right):
+    left = _number(left)
+    right = _number(right)
+    if op in ('/', '%'):
+        if not right:
+            raise Unknown('division by zero')
+        if isinstance(left, int) and isinstance(right, int):
+            quotient = abs(left) // abs(right) * (1 if (left < 0) == (right < 0) else -1)
+            return quotient if op == '/' else left - quotient * right
+        return left / right if op == '/' else left % right
+    return {
+        '+': lambda: left + right, '-': lambda: left - right, '*': lambda: left * right,
+        '<': lambda: int(left < right), '>': lambda: int(left > right),
+        '<=': lambda: int(left <= right), '>=': lambda: int(left >= right),
+        '<<': lambda: int(left) << int(right), '>>': lambda: int(left) >> int(right),
+        '&': lambda: int(left) & int(right), '|': lambda: int(left) | int(right),
+        '^': lambda: int(left) ^ int(right),
+    }[op]()
+
+
+def symbol_value(name, value):
+    """The value of symbol ``name`` in an expression: numbers as they are,
+    flags as 1, names as the name; other text, like an expression, is Unknown."""
+    if value is UNDEFINED:
+        return _Name(name)
+    if value is False:
+        return 0
+    if value is None or value is True:
+        return 1
+    if isinstance(value, str):
+        if value.isidentifier():
+            return value
+        raise Unknown(value)
+    if isinstance(value, tuple):
+        raise Unknown(value)
+    return value
+
+
+# Marlin's condition macros: name -> (least arguments, function of the values)
+_MACROS: Dict[str, Tuple[int, Callable]] = {
+    'ENABLED': (1, lambda values: all(map(is_enabled, values))),
+    'DISABLED': (1, lambda values: not any(map(is_enabled, values))),
+    'ANY': (1, lambda values: any(map(is_enabled, values))),
+    'EITHER': (2, lambda values: any(map(is_enabled, values))),
+    'ALL': (1, lambda values: all(map(is_enabled, values))),
+    'BOTH': (2, lambda values: all(map(is_enabled, values))),
+    'NONE': (1, lambda values: not any(map(is_enabled, values))),
+}
+
+
+class _Parser:
+    """Compiles a condition into a closure of a symbol lookup."""
+
+    def __init__(self, text):
+        self.tokens = []
+        pos = 0
+        text = text.rstrip()
+        while pos < len(text):
+            m = _TOKEN.match(text, pos)
+            if m is None:
+                raise Unknown(text[pos:])
+            self.tokens.append((m.lastgroup, m.group(m.lastgroup)))
+            pos = m.end()
+        self.pos = 0
+        self.symbols = []
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self, expected=None):
+        kind, value = self.peek()
+        if kind is None or (expected is not None and value != expected):
+            raise Unknown(f'expected {expected or "more"}')
+        self.pos += 1
+        return kind, value
+
+    def symbol(self, name):
+        if name not in self.symbols:
+            self.symbols.append(name)
+        return name
+
+    def compile(self):
+        node = self.ternary()
+        if self.pos != len(self.tokens):
+            raise Unknown(f'unexpected {self.peek()[1]}')
+        return node
+
+    def ternary(self):
+        condition = self.binary(0)
+        if self.peek() != ('op', '?'):
+            return condition
+        self.take('?')
+        then = self.ternary()
+        self.take(':')
+        otherwise = self.ternary()
+        return lambda get: then(get) if _truth(condition(get)) else otherwise(get)
+
+    def binary(self, level):
+        if level == len(_BINARY):
+            return self.unary()
+        left = self.binary(level + 1)
+        while self.peek()[0] == 'op' and self.peek()[1] in _BINARY[level]:
+            op = self.take()[1]
+            right = self.binary(level + 1)
+            left = self._combine(op, left, right)
+        return left
+
+    @staticmethod
+    def _combine(op, left, right):
+        if op == '&&':
+            return lambda get: int(_truth(left(get)) and _truth(right(get)))
+        if op == '||':
+            return lambda get: int(_truth(left(get)) or _truth(right(get)))
+        if op in ('==', '!='):
+            return lambda get: _compare(op, left(get), right(get))
+        return lambda get: _arithmetic(op, left(get), right(get))
+
+    def unary(self):
+        kind, value = self.peek()
+        if kind == 'op' and value in '!~-+':
+            self.take()
+            operand = self.unary()
+            if value == '!':
+                return lambda get: int(not _truth(operand(get)))
+            if value == '~':
+                return lambda get: ~int(_number(operand(get)))
+            if value == '-':
+                return lambda get: -_number(operand(get))
+            return operand
+        return self.primary()
+
+    def primary(self):
+        kind, value = self.take()
+        if kind == 'number':
+            number = value.rstrip('uUlLfF') if not value.startswith(('0x', '0X')) else value
+            if number.startswith(('0x', '0X')):
+                constant = int(number.rstrip('uUlL'), 16)
+            elif '.' in number or 'e' in number or 'E' in number:
+                constant = float(number)
+            else:
+                constant = int(number, 8) if len(number) > 1 and number[0] == '0' else int(number)
+            return lambda get: constant
+        if kind == 'op':
+            if value != '(':
+                raise Unknown(value)
+            node = self.ternary()
+            self.take(')')
+            return node
+        if value == 'defined':
+            parenthesized = self.peek() == ('op', '(')
+            if parenthesized:
+                self.take('(')
+            name = self.symbol(self.take()[1])
+            if parenthesized:
+                self.take(')')
+            return lambda get: int(get(name) is not UNDEFINED)
+        if self.peek() == ('op', '('):
+            return self.call(value)
+        name = self.symbol(value)
+        return lambda get: symbol_value(name, get(name))
+
+    def call(self, function):
+        self.take('(')
+        names = []
+        while True:
+            kind, value = self.take()
+            if kind != 'name':
+                raise Unknown(f'{function}({value}')
+            names.append(self.symbol(value))
+            if self.take()[1] == ')':
+                break
+        macro = _MACROS.get(function)
+        if macro is None or len(names) < macro[0]:
+            raise Unknown(function)
+        test = macro[1]
+        return lambda get: int(test([get(name) for name in names]))
+
+
+class Condition:
+    """
+    A compiled ``#if`` condition.
+
+    Attributes:
+        text: The condition as written
+        symbols: Names it reads, in order; results are memoized by their values
+        evaluations: How many times it was evaluated rather than remembered
+    """
+
+    __slots__ = ('text', 'symbols', 'evaluations', '_node', '_memo')
+
+    def __init__(self, text):
+        self.text = text
+        self.evaluations = 0
+        self._memo: Dict[tuple, Optional[bool]] = {}
+        try:
+            parser = _Parser(text)
+            self._node = parser.compile()
+            self.symbols = tuple(parser.symbols)
+        except Unknown:
+            self._node = None
+            self.symbols = ()
+
+    def __call__(self, defines) -> Optional[bool]:
+        """True or False under ``defines``, or None if it cannot be decided."""
+        if self._node is None:
+            return None
+        key = tuple([defines.get(name, UNDEFINED) for name in self.symbols])
+        memo = self._memo
+        try:
+            return memo[key]
+        except KeyError:
+            pass
+        except TypeError:
+            # An unhashable value; not remembered
+            key = None
+        self.evaluations += 1
+        values = dict(zip(self.symbols, key)) if key is not None else defines
+        try:
+            result = _truth(self._node(lambda name: values.get(name, UNDEFINED)))
+        except (Unknown, ArithmeticError, TypeError, ValueError):
+            result = None
+        if key is not None:
+            if len(memo) >= MEMO_SIZE:
+                memo.clear()
+            memo[key] = result
+        return result
+
+
+class Effective(NamedTuple):
+    """What a header defines once its #if blocks are evaluated."""
+    # Name -> value of every enabled definition in a block that is taken
+    defines: Dict[str, object]
+    # 0-based [start, stop) line ranges of the blocks that are not taken
+    inactive: List[Tuple[int, int]]
+
+
+def _outer(before, after):
+    """Conditions around a directive line: those it neither opens nor closes."""
+    n = min(len(before), len(after))
+    while n and before[:n] != after[:n]:
+        n -= 1
+    return before[:n]
+
+
+class Evaluator:
+    """
+    Evaluates the #if blocks of headers parsed by ConfigLineParser, keeping
+    every condition it compiles.
+
+    Args:
+        predefined: Symbols defined before the header, e.g. by
+            Configuration.h for Configuration_adv.h
+    """
+
+    def __init__(self, predefined=None):
+        self.predefined = dict(predefined or {})
+        self._conditions: Dict[str, Condition] = {}
+
+    def condition(self, text) -> Condition:
+        condition = self._conditions.get(text)
+        if condition is None:
+            condition = self._conditions[text] = Condition(text)
+        return condition
+
+    @property
+    def evaluations(self) -> int:
+        """Conditions evaluated so far rather than remembered."""
+        return sum(condition.evaluations for condition in self._conditions.values())
+
+    def taken(self, conditions, defines) -> bool:
+        """Whether a line inside blocks with ``conditions`` is compiled;
+        undecidable conditions count as true."""
+        for text in conditions:
+            if self.condition(text)(defines) is False:
+                return False
+        return True
+
+    def effective(self, document) -> Effective:
+        """Walk ``document``, a LiveDocument parsed by ConfigLineParser, in file order."""
+        rows = document.rows
+        states = document.states
+        defines = dict(self.predefined)
+        inactive = []
+        start = None
+        before = ()
+        current = None
+        taken = True
+        for line, state in enumerate(states):
+            after = state[2]
+            conditions = after if after is before or after == before else _outer(before, after)
+            before = after
+            if conditions is not current:
+                taken = self.taken(conditions, defines)
+                current = conditions
+            if not taken:
+                if start is None:
+                    start = line
+                continue
+            if start is not None:
+                inactive.append((start, line))
+                start = None
+            row = rows[line]
+            if row is not None and row[3]:
+                defines[row[0]] = row[2]
+                # Conditions below may read what was just defined
+                current = None
+        if start is not None:
+            inactive.append((start, len(states)))
+        return Effective(defines, inactive)
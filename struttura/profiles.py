@@ -0,0 +1,307 @@
+"""Configuration profiles: overlay layers over a base configuration.
+
+A machine's base header is shared by several printers that differ in their
+probe, hotend or steps per mm, so a profile is an ordered list of overlay
+layers, each setting some options, over the base.  The value of an option
+in a profile is that of the topmost layer setting it: ``false`` disables
+it, ``true`` enables it without a value, anything else enables it with
+that value.
+
+The layers and profiles of a configuration are kept in a YAML file beside
+it, PROFILES_FILE::
+
+    layers:
+      bltouch: {BLTOUCH: true, Z_MIN_PROBE_USES_Z_MIN_ENDSTOP_PIN: false}
+      v6: {DEFAULT_MAX_FEEDRATE: [300, 300, 5, 25]}
+    profiles:
+      ender3-bltouch: [bltouch, v6]
+
+:class:`MergedView` resolves the options of a profile as they are asked
+for and caches them, with the layer each comes from.  Every layer tells the
+views over it which keys it changed, and the views drop those keys only,
+so a view stays warm across edits and switching between profiles costs a
+dictionary lookup per option shown.
+"""
+
+import os
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import yaml
+
+from .file_io import read_file, save_file
+from .rules import MISSING
+
+# File of the layers and profiles of the configurations in a directory
+PROFILES_FILE = 'profiles.yaml'
+
+# Name of the base layer, under every profile
+BASE = 'base'
+
+
+def profiles_path(config_path) -> str:
+    """The profiles file of the configuration ``config_path``."""
+    return os.path.join(os.path.dirname(os.path.abspath(config_path)), PROFILES_FILE)
+
+
+class Layer:
+    """
+    Values of some options, set over the layers below it.
+
+    Listeners are called with ``(layer, keys, membership)`` after keys
+    change, where ``membership`` is whether keys were added or removed.
+    """
+
+    def __init__(self, name, values=None):
+        self.name = name
+        self.values: Dict[str, object] = dict(values or {})
+        self._listeners: List[Callable] = []
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
+    def _changed(self, keys, membership):
+        if keys:
+            for listener in list(self._listeners):
+                listener(self, keys, membership)
+
+    def get(self, key):
+        """The value the layer sets ``key`` to, or MISSING."""
+        return self.values.get(key, MISSING)
+
+    def keys(self) -> Iterable[str]:
+        return self.values.keys()
+
+    def set(self, key, value):
+        previous = self.values.get(key, MISSING)
+        if previous is MISSING or previous != value:
+            self.values[key] = value
+            self._changed({key}, previous is MISSING)
+
+    def remove(self, key):
+        if key in self.values:
+            del self.values[key]
+            self._changed({key}, True)
+
+    def update(self, values: Dict[str, object]):
+        """Set the layer's values to ``values``, telling of the keys that differ."""
+        old = self.values
+        changed = {key for key in old.keys() | values.keys()
+                   if old.get(key, MISSING) is MISSING or values.get(key, MISSING) is MISSING
+                   or old[key] != values[key]}
+        membership = old.keys() != values.keys()
+        self.values = dict(values)
+        self._changed(changed, membership)
+
+
+class DocumentLayer(Layer):
+    """
+    The base layer of a header, read from its LiveDocument as options are
+    asked for.  Call :meth:`changed` with the keys the document's
+    take_changes() returned.
+    """
+
+    def __init__(self, document, name=BASE):
+        super().__init__(name)
+        self.document = document
+        # Option names in document order, until the options change
+        self._keys: Optional[Dict[str, None]] = None
+
+    def get(self, key):
+        rows = self.document.find_all(key)
+        if not rows:
+            return MISSING
+        # An enabled definition, as header_lookup reads it; a flag is True
+        for row in rows:
+            if row[3]:
+                return True if row[2] is None else row[2]
+        return False
+
+    def keys(self) -> Iterable[str]:
+        if self._keys is None:
+            self._keys = dict.fromkeys(row[0] for _, row in self.document.items() if row[0] is not None)
+        return self._keys.keys()
+
+    def set(self, key, value):
+        raise TypeError('the base layer is edited in the editor')
+
+    def remove(self, key):
+        raise TypeError('the base layer is edited in the editor')
+
+    def update(self, values):
+        raise TypeError('the base layer is edited in the editor')
+
+    def changed(self, keys):
+        """Tell the views over this layer that the options ``keys`` changed."""
+        keys = {key for key in keys if isinstance(key, str)}
+        # While the layer's keys are unknown, no view has them either
+        membership = self._keys is not None and any(
+            (key in self._keys) != (key in self.document) for key in keys
+        )
+        if membership:
+            self._keys = None
+        self._changed(keys, membership)
+
+
+class MergedView:
+    """
+    The options of a profile: the value of each key in the topmost of
+    ``layers``, bottom first, that sets it, and the name of that layer.
+    Values are resolved when asked for and kept until a layer changes them.
+    """
+
+    def __init__(self, layers: List[Layer]):
+        self.layers = layers
+        # Key -> (value, layer name) of the keys resolved so far
+        self._cache: Dict[str, Tuple[object, Optional[str]]] = {}
+        # Every key of every layer, bottom layer first, until one is added or removed
+        self._keys: Optional[List[str]] = None
+
+    def resolve(self, key) -> Tuple[object, Optional[str]]:
+        """(value, layer name) of ``key``, or (MISSING, None)."""
+        found = self._cache.get(key)
+        if found is None:
+            found = (MISSING, None)
+            for layer in reversed(self.layers):
+                value = layer.get(key)
+                if value is not MISSING:
+                    found = (value, layer.name)
+                    break
+            self._cache[key] = found
+        return found
+
+    def get(self, key, default=None):
+        value = self.resolve(key)[0]
+        return default if value is MISSING else value
+
+    def source(self, key) -> Optional[str]:
+        """The name of the layer ``key`` comes from, or None."""
+        return self.resolve(key)[1]
+
+    def keys(self) -> List[str]:
+        if self._keys is None:
+            keys: Dict[str, None] = {}
+            for layer in self.layers:
+                keys.update(dict.fromkeys(layer.keys()))
+            self._keys = list(keys)
+        return self._keys
+
+    def items(self):
+        """(key, value, layer name) of every option, in the order of keys()."""
+        for key in self.keys():
+            value, layer = self.resolve(key)
+            yield key, value, layer
+
+    def invalidate(self, keys, membership=False):
+        """Forget ``keys``, and the list of keys too if ``membership`` changed."""
+        cache = self._cache
+        for key in keys:
+            cache.pop(key, None)
+        if membership:
+            self._keys = None
+
+
+class ProfileSet:
+    """
+    The overlay layers and profiles of one base configuration.
+
+    Views of the profiles are made on first use and kept; a change to a
+    layer invalidates its keys in the views of the profiles using it.
+    """
+
+    def __init__(self, base: Layer):
+        self.base = base
+        self.layers: Dict[str, Layer] = {}
+        # Profile name -> names of its layers, bottom first
+        self.profiles: Dict[str, List[str]] = {}
+        self._views: Dict[str, MergedView] = {}
+        base.add_listener(self._on_layer_changed)
+
+    def _on_layer_changed(self, layer, keys, membership):
+        for name, view in self._views.items():
+            if layer is self.base or layer.name in self.profiles.get(name, ()):
+                view.invalidate(keys, membership)
+
+    def add_layer(self, layer: Layer):
+        """Add or replace a layer; the views using one of its name are made again."""
+        old = self.layers.get(layer.name)
+        if old is not None:
+            old.remove_listener(self._on_layer_changed)
+        self.layers[layer.name] = layer
+        layer.add_listener(self._on_layer_changed)
+        for name, layer_names in self.profiles.items():
+            if layer.name in layer_names:
+                self._views.pop(name, None)
+
+    def set_profile(self, name, layer_names: List[str]):
+        """Define the profile ``name`` as ``layer_names`` over the base, bottom first."""
+        missing = [layer for layer in layer_names if layer not in self.layers]
+        if missing:
+            raise ValueError(f"profile {name} uses unknown layers: {', '.join(missing)}")
+        self.profiles[name] = list(layer_names)
+        self._views.pop(name, None)
+
+    def remove_profile(self, name):
+        self.profiles.pop(name, None)
+        self._views.pop(name, None)
+
+    def view(self, name=None) -> MergedView:
+        """The merged view of the profile ``name``, or of the base alone."""
+        view = self._views.get(name)
+        if view is None:
+            layers = [self.base] + [self.layers[layer] for layer in self.profiles[name]] if name else [self.base]
+            view = self._views[name] = MergedView(layers)
+        return view
+
+    def load(self, data):
+        """
+        Take the layers and profiles of ``data``, as read from a profiles
+        file; layers kept over are updated in place, so only their keys
+        that changed are invalidated.
+
+        Raises:
+            ValueError: If ``data`` is not laid out as a profiles file
+        """
+        if not isinstance(data, dict):
+            raise ValueError('a profiles file holds a mapping of layers and profiles')
+        layers = data.get('layers') or {}
+        profiles = data.get('profiles') or {}
+        if not isinstance(layers, dict) or not all(isinstance(values, dict) for values in layers.values()):
+            raise ValueError('layers must map names to mappings of options to values')
+        if not isinstance(profiles, dict) or not all(isinstance(names, list) for names in profiles.values()):
+            raise ValueError('profiles must map names to lists of layers')
+        layer_names = {str(name) for name in layers}
+        for name, names in profiles.items():
+            missing = [str(layer) for layer in names if str(layer) not in layer_names]
+            if missing:
+                raise ValueError(f"profile {name} uses unknown layers: {', '.join(missing)}")
+        for name in set(self.layers) - layer_names:
+            self.layers.pop(name).remove_listener(self._on_layer_changed)
+        for name, values in layers.items():
+            name = str(name)
+            if name in self.layers:
+                self.layers[name].update({str(key): value for key, value in values.items()})
+            else:
+                self.add_layer(Layer(name, {str(key): value for key, value in values.items()}))
+        for name in set(self.profiles) - set(profiles):
+            self.remove_profile(name)
+        for name, layer_names in profiles.items():
+            layer_names = [str(layer) for layer in layer_names]
+            if self.profiles.get(str(name)) != layer_names:
+                self.set_profile(str(name), layer_names)
+
+    def dump(self) -> Dict:
+        """The layers and profiles, laid out as a profiles file."""
+        return {
+            'layers': {name: dict(layer.values) for name, layer in self.layers.items()},
+            'profiles': {name: list(layers) for name, layers in self.profiles.items()},
+        }
+
+    def read(self, path):
+        """Load the profiles file ``path``; see :meth:`load`."""
+        self.load(yaml.safe_load(read_file(None, path)[0]) or {})
+
+    def write(self, path):
+        save_file(None, path, yaml.safe_dump(self.dump(), sort_keys=False, allow_unicode=True))
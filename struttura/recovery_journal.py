@@ -0,0 +1,433 @@
+"""Crash recovery journal of the edits made since a file was opened or saved.
+
+Writing the whole document every few seconds would stall the editor on
+large files, so the journal keeps the text the editor started from and
+then only the edits, as the undo journal records them.  :meth:`record` is
+all the editor's thread does per edit: it merges keystrokes into the last
+pending edit where they chain, under a lock.  A writer thread appends the
+pending edits as one record every FLUSH_SECONDS, and syncs the file once
+per batch.
+
+A journal file starts with a base record, the text the edits apply to,
+written to a temporary file that is synced and renamed into place, and
+goes on with edit records, each framed with its length and checksum so a
+record torn by a crash is dropped with whatever follows it.  A save
+starts a journal whose base is the text being saved, marked unsaved, and
+:meth:`RecoveryJournal.saved` appends a saved record once the file is
+written, so a save that fails leaves that text to recover.  The journal
+of each file is kept until its text is saved: at the next start
+:meth:`RecoveryJournal.pending` replays the journals left with unsaved
+text, whether the application crashed or was closed without saving.
+
+Every instance of the application journals into the same directory, so
+an open journal is locked through a ``.lock`` file beside it, which the
+system releases if the process dies.  Locked journals belong to a running
+instance and are neither recovered nor discarded, and an instance editing
+a file another one has open journals it under a name of its own.
+"""
+
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import threading
+import zlib
+from typing import List, NamedTuple, Optional
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+from .parse_cache import user_config_dir
+from .undo_journal import Edit, compose
+
+# Seconds between the writes of the pending edits
+FLUSH_SECONDS = 1.0
+
+# Record kinds
+BASE = 1
+EDITS = 2
+SAVED = 3
+
+# Start of every journal file: a tag and the layout version; each record
+# is its kind, length and CRC-32 then its payload
+_MAGIC = b'MCRJ\x01'
+_RECORD = struct.Struct('>BII')
+_SUFFIX = '.journal'
+_LOCK_SUFFIX = '.lock'
+
+
+class Recovered(NamedTuple):
+    """A document rebuilt from a journal left with unsaved text."""
+    # The journal file, which discard() removes
+    journal: str
+    # The file the document was opened from or saved to, or None
+    path: Optional[str]
+    text: str
+    # Line ending of the file
+    newline: str
+    edits: int
+    # Last write of the journal, in seconds since the epoch
+    time: float
+
+
+def _lock_journal(journal):
+    """
+    The lock file of ``journal``, open and locked for this process, or
+    None if another instance holds it.
+
+    Raises:
+        OSError: If the lock file cannot be created
+    """
+    f = open(journal + _LOCK_SUFFIX, 'a+b')
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+def _unlock_journal(lock):
+    """Release and remove a lock file _lock_journal() returned."""
+    lock.close()
+    try:
+        os.remove(lock.name)
+    except OSError:
+        pass
+
+
+def journal_in_use(journal) -> bool:
+    """Whether a running instance, this one included, holds ``journal`` open."""
+    if not os.path.exists(journal + _LOCK_SUFFIX):
+        return False
+    try:
+        lock = _lock_journal(journal)
+    except OSError:
+        return False
+    if lock is None:
+        return True
+    # Left by an instance that died
+    _unlock_journal(lock)
+    return False
+
+
+def _remove_journal(journal):
+    if journal_in_use(journal):
+        return
+    try:
+        os.remove(journal)
+    except OSError:
+        pass
+
+
+def apply_edits(text: str, edits) -> str:
+    """
+    ``text`` with ``edits`` (line, column, removed, inserted) applied in
+    order.
+
+    Raises:
+        ValueError: If an edit does not remove the text at its position
+    """
+    lines = text.split('\n')
+    for line, column, removed, inserted in edits:
+        parts = removed.split('\n')
+        last = line + len(parts) - 1
+        if last >= len(lines):
+            raise ValueError(f'edit at line {line + 1} past the end of the text')
+        end = (column if len(parts) == 1 else 0) + len(parts[-1])
+        span = '\n'.join(lines[line:last + 1])
+        if span[column:len(span) - len(lines[last]) + end] != removed:
+            raise ValueError(f'edit at line {line + 1} does not match the text')
+        lines[line:last + 1] = (lines[line][:column] + inserted + lines[last][end:]).split('\n')
+    return '\n'.join(lines)
+
+
+def read_journal(journal) -> Optional[Recovered]:
+    """
+    The document a journal file rebuilds, or None if it is the text saved
+    to its file.
+
+    Raises:
+        OSError: If the journal cannot be read
+        ValueError: If its edits do not apply to its base
+    """
+    with open(journal, 'rb') as f:
+        data = f.read()
+    if not data.startswith(_MAGIC):
+        return None
+    base = None
+    edits: List[Edit] = []
+    pos = len(_MAGIC)
+    while pos + _RECORD.size <= len(data):
+        kind, length, checksum = _RECORD.unpack_from(data, pos)
+        start = pos + _RECORD.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != checksum:
+            # Torn by a crash while it was written
+            break
+        pos = start + length
+        if kind == BASE:
+            base = json.loads(zlib.decompress(payload).decode('utf-8'))
+            edits = []
+        elif kind == EDITS:
+            edits.extend(Edit(*edit) for edit in json.loads(payload.decode('utf-8')))
+        elif kind == SAVED and base is not None:
+            base['saved'] = True
+    if base is None:
+        return None
+    text = apply_edits(base['text'], edits)
+    if base['saved'] and text == base['text']:
+        return None
+    return Recovered(journal, base['path'], text, base['newline'], len(edits), os.path.getmtime(journal))
+
+
+class RecoveryJournal:
+    """
+    Journal of the edits to the document of one editor, under ``directory``,
+    by default under the user configuration directory.
+
+    Call :meth:`start` when a document is opened or saved, :meth:`record`
+    after every edit, and :meth:`close` on exit.  Edits made before the
+    first start are not journaled.
+    """
+
+    def __init__(self, directory=None, interval=FLUSH_SECONDS):
+        self.directory = directory or os.path.join(user_config_dir(), 'recovery')
+        self.interval = interval
+        # The last error writing the journal, if any
+        self.error: Optional[OSError] = None
+        self._cond = threading.Condition()
+        self._wake = threading.Event()
+        # Operations not written yet: (BASE, path, content, newline,
+        # saved), (EDITS, list of Edit) and (SAVED,), and how many were
+        # queued and written
+        self._ops: list = []
+        self._queued = 0
+        self._written = 0
+        self._started = False
+        self._closing = False
+        self._thread: Optional[threading.Thread] = None
+        # Journal file being appended to, its lock, whether it has
+        # anything to recover, and whether edits were appended to it
+        self._file = None
+        self._lock = None
+        self._journal: Optional[str] = None
+        self._dirty = False
+        self._edited = False
+        # Journal the next start takes over, removed once it is written
+        self._replaces: Optional[str] = None
+        # Names the journals of this instance only, as that of the unsaved
+        # document
+        self._instance = f'{os.getpid()}-{os.urandom(4).hex()}'
+        self._untitled = f'untitled-{self._instance}'
+
+    def journal_path(self, path) -> str:
+        """The journal file of the document opened from ``path``, or of an unsaved one."""
+        if path is None:
+            return os.path.join(self.directory, self._untitled + _SUFFIX)
+        key = hashlib.blake2b(os.path.abspath(path).encode('utf-8'), digest_size=16).hexdigest()
+        return os.path.join(self.directory, key + _SUFFIX)
+
+    def start(self, path, content, newline='\n', saved=True):
+        """Journal the edits made from now on to ``content``, a string or
+        a PieceTable no one else edits, as the document of ``path``;
+        unless ``saved``, the content itself is not in the file and is
+        recovered even without edits."""
+        with self._cond:
+            self._ops.append((BASE, path, content, newline, saved, self._replaces))
+            self._replaces = None
+            self._queued += 1
+            self._started = True
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='recovery-journal', daemon=True)
+            self._thread.start()
+        self._wake.set()
+
+    def take_over(self, recovered: Recovered):
+        """Have the next start journal the document ``recovered`` was
+        rebuilt as, and remove its journal once the new one is written."""
+        with self._cond:
+            self._replaces = recovered.journal
+
+    def saved(self):
+        """Mark the content of the last start as written to its file;
+        edits journaled since are still recovered."""
+        with self._cond:
+            if not self._started:
+                return
+            self._ops.append((SAVED,))
+            self._queued += 1
+        self._wake.set()
+
+    def record(self, line, column, removed, inserted):
+        """Journal the replacement of ``removed`` at (line, column) with ``inserted``."""
+        edit = Edit(line, column, removed, inserted)
+        with self._cond:
+            if not self._started:
+                return
+            ops = self._ops
+            if ops and ops[-1][0] == EDITS:
+                edits = ops[-1][1]
+                last = edits[-1] if edits else None
+                if (last is not None and not removed and line == last.line
+                        and column == last.column + len(last.inserted) and '\n' not in last.inserted):
+                    # Typing on: compose() would rebuild the whole run
+                    edits[-1] = Edit(line, last.column, last.removed, last.inserted + inserted)
+                    self._queued += 1
+                    return
+                composed = compose(last, edit) if last is not None else None
+                if composed is None:
+                    edits.append(edit)
+                elif composed.removed or composed.inserted:
+                    edits[-1] = composed
+                else:
+                    edits.pop()
+            else:
+                ops.append((EDITS, [edit]))
+            self._queued += 1
+
+    def flush(self, timeout=None) -> bool:
+        """Write the pending edits now; False if that took over ``timeout`` seconds."""
+        with self._cond:
+            target = self._queued
+            if self._thread is None or self._written >= target:
+                return True
+            self._wake.set()
+            return self._cond.wait_for(lambda: self._written >= target, timeout)
+
+    def close(self, timeout=None):
+        """Write the pending edits and stop; a journal with nothing to recover is removed."""
+        if self._thread is not None:
+            with self._cond:
+                self._closing = True
+            self._wake.set()
+            self._thread.join(timeout)
+            self._thread = None
+        self._close_file()
+
+    def pending(self) -> List[Recovered]:
+        """The documents the journals left with unsaved text rebuild, newest
+        first; those of running instances are left to them."""
+        try:
+            names = [name for name in os.listdir(self.directory) if name.endswith(_SUFFIX)]
+        except OSError:
+            return []
+        found = []
+        for name in names:
+            journal = os.path.join(self.directory, name)
+            if journal_in_use(journal):
+                continue
+            try:
+                recovered = read_journal(journal)
+            except (OSError, ValueError):
+                continue
+            if recovered is not None:
+                found.append(recovered)
+        found.sort(key=lambda recovered: recovered.time, reverse=True)
+        return found
+
+    @staticmethod
+    def discard(recovered: Recovered):
+        """Remove the journal a Recovered document came from, unless a
+        running instance has taken it up since."""
+        _remove_journal(recovered.journal)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            with self._cond:
+                ops, self._ops = self._ops, []
+                queued = self._queued
+                closing = self._closing
+            try:
+                self._write(ops)
+            except OSError as e:
+                self.error = e
+            with self._cond:
+                self._written = queued
+                self._cond.notify_all()
+            if closing:
+                return
+
+    def _write(self, ops):
+        appended = False
+        for op in ops:
+            if op[0] == BASE:
+                self._write_base(*op[1:])
+            elif self._file is None:
+                continue
+            elif op[0] == SAVED:
+                self._append(self._file, SAVED, b'')
+                self._dirty = self._edited
+                appended = True
+            elif op[1]:
+                edits = json.dumps([list(edit) for edit in op[1]], ensure_ascii=False).encode('utf-8')
+                self._append(self._file, EDITS, edits)
+                self._dirty = self._edited = True
+                appended = True
+        if appended:
+            # One sync for every record of the batch
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    @staticmethod
+    def _append(f, kind, payload):
+        f.write(_RECORD.pack(kind, len(payload), zlib.crc32(payload)) + payload)
+
+    def _write_base(self, path, content, newline, saved, replaces):
+        self._close_file()
+        text = content if isinstance(content, str) else content.get_text()
+        base = zlib.compress(json.dumps({'path': path, 'newline': newline, 'saved': saved, 'text': text},
+                                        ensure_ascii=False).encode('utf-8'), 1)
+        os.makedirs(self.directory, exist_ok=True)
+        journal = self.journal_path(path)
+        self._lock = _lock_journal(journal)
+        if self._lock is None:
+            # Another instance has the file open
+            journal = f'{os.path.splitext(journal)[0]}-{self._instance}{_SUFFIX}'
+            self._lock = _lock_journal(journal)
+        self._journal = journal
+        fd, temp = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_MAGIC)
+                self._append(f, BASE, base)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp, journal)
+        except BaseException:
+            try:
+                os.remove(temp)
+            except OSError:
+                pass
+            raise
+        self._file = open(journal, 'ab')
+        self._dirty = not saved
+        self._edited = False
+        if replaces is not None and replaces != journal:
+            _remove_journal(replaces)
+
+    def _close_file(self):
+        """Close the journal file, removing it if it has nothing to recover,
+        and release it."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            if not self._dirty:
+                try:
+                    os.remove(self._journal)
+                except OSError:
+                    pass
+        if self._lock is not None:
+            _unlock_journal(self._lock)
+            self._lock = None
@@ -0,0 +1,412 @@
+"""Declarative validation rules, re-checked only where edits touch them.
+
+A rule names the options it reads and says what must hold between them:
+an option that requires one of several others, options that exclude each
+other, a number within a range, an array with one entry per axis.
+:class:`RuleSet` compiles every rule once into a check function and keeps a
+reverse index from each option to the rules reading it.  A
+:class:`Validator` holds the failures of a rule set over one document; after
+an edit it is given the keys the document's LiveDocument reports as changed
+and re-runs only the rules reading one of them, so a keystroke costs time in
+proportion to the rules it touches rather than to the whole set.
+
+Keys are option names for configuration headers and key paths (tuples) for
+YAML files.  Rules see the value of each key they read, or :data:`MISSING`
+if it is not defined; a header option is defined when it is enabled, and a
+flag without a value reads as None.
+"""
+
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .lazy_config import LazyConfig
+from .marlin_lexer import is_header
+from .yaml_lines import YamlView
+
+
+class _Missing:
+    __slots__ = ()
+
+    def __repr__(self):
+        return 'MISSING'
+
+
+# Value of a key that is not defined
+MISSING = _Missing()
+
+
+def _label(key) -> str:
+    return '.'.join(key) if isinstance(key, tuple) else str(key)
+
+
+def _number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class Rule(ABC):
+    """
+    A check over the values of ``reads``.
+
+    :meth:`compile` returns a function taking the value of each key in
+    ``reads``, in order, and returning an error message or None.  Rules are
+    data; they are compiled once, by the RuleSet they belong to.
+    """
+
+    reads: Tuple = ()
+
+    @abstractmethod
+    def compile(self) -> Callable[..., Optional[str]]:
+        """The check function of the rule."""
+
+
+class Required(Rule):
+    """``key`` must be defined."""
+
+    def __init__(self, key, message=None):
+        self.reads = (key,)
+        self.message = message or f"Missing required option: {_label(key)}"
+
+    def compile(self):
+        message = self.message
+        return lambda value: message if value is MISSING else None
+
+
+class Requires(Rule):
+    """If ``key`` is defined, at least one of ``any_of`` must be."""
+
+    def __init__(self, key, any_of: Sequence, message=None):
+        self.reads = (key,) + tuple(any_of)
+        self.message = message or (
+            f"{_label(key)} requires one of {', '.join(map(_label, any_of))}"
+            if len(any_of) > 1 else f"{_label(key)} requires {_label(any_of[0])}"
+        )
+
+    def compile(self):
+        message = self.message
+
+        def check(value, *others):
+            if value is MISSING:
+                return None
+            for other in others:
+                if other is not MISSING:
+                    return None
+            return message
+        return check
+
+
+class Exclusive(Rule):
+    """At most one of ``keys`` may be defined."""
+
+    def __init__(self, keys: Sequence, message=None):
+        self.reads = tuple(keys)
+        self.message = message
+
+    def compile(self):
+        keys = self.reads
+        message = self.message
+
+        def check(*values):
+            defined = [key for key, value in zip(keys, values) if value is not MISSING]
+            if len(defined) < 2:
+                return None
+            return message or f"Only one of {', '.join(map(_label, defined))} may be enabled"
+        return check
+
+
+class Range(Rule):
+    """``key``, if defined, must be a number within [low, high]; either bound may be None."""
+
+    def __init__(self, key, low=None, high=None):
+        self.reads = (key,)
+        self.low = low
+        self.high = high
+
+    def compile(self):
+        name = _label(self.reads[0])
+        low, high = self.low, self.high
+        if high is None:
+            limits = f"at least {low}"
+        elif low is None:
+            limits = f"at most {high}"
+        else:
+            limits = f"between {low} and {high}"
+
+        def check(value):
+            if value is MISSING or isinstance(value, str):
+                # Not set, or an expression the parser kept as text
+                return None
+            if not _number(value):
+                return f"{name} must be a number"
+            if (low is not None and value < low) or (high is not None and value > high):
+                return f"{name} must be {limits}, not {value}"
+            return None
+        return check
+
+
+class OneOf(Rule):
+    """``key``, if defined, must be one of ``choices``."""
+
+    def __init__(self, key, choices: Sequence):
+        self.reads = (key,)
+        self.choices = tuple(choices)
+
+    def compile(self):
+        name = _label(self.reads[0])
+        choices = frozenset(self.choices)
+        listed = ', '.join(map(str, self.choices))
+
+        def check(value):
+            if value is MISSING or value in choices:
+                return None
+            return f"{name} must be one of {listed}, not {value}"
+        return check
+
+
+class ArrayLength(Rule):
+    """
+    ``key``, if defined as a brace array, must have ``count(*values)``
+    entries, where ``values`` are the values of ``count_reads``.
+    """
+
+    def __init__(self, key, count_reads: Sequence, count: Callable[..., int], what='entries'):
+        self.reads = (key,) + tuple(count_reads)
+        self.count = count
+        self.what = what
+
+    def compile(self):
+        name = _label(self.reads[0])
+        count = self.count
+        what = self.what
+
+        def check(value, *values):
+            if not isinstance(value, tuple):
+                return None
+            expected = count(*values)
+            if len(value) == expected:
+                return None
+            return f"{name} needs {expected} {what}, not {len(value)}"
+        return check
+
+
+class RuleSet:
+    """
+    Rules compiled once, with the reverse index of the keys they read.
+
+    Attributes:
+        rules: The rules, in the order their failures are reported
+        dependents: Key -> indexes of the rules reading it
+    """
+
+    def __init__(self, rules: Iterable[Rule]):
+        self.rules: List[Rule] = list(rules)
+        self.checks = [rule.compile() for rule in self.rules]
+        self.reads = [rule.reads for rule in self.rules]
+        dependents: Dict[object, List[int]] = {}
+        for i, reads in enumerate(self.reads):
+            for key in reads:
+                dependents.setdefault(key, []).append(i)
+        self.dependents: Dict[object, Tuple[int, ...]] = {
+            key: tuple(indexes) for key, indexes in dependents.items()
+        }
+
+    def __len__(self):
+        return len(self.rules)
+
+
+class Validator:
+    """
+    Failures of a RuleSet over one document.
+
+    Args:
+        rule_set: The rules
+        lookup: ``lookup(key)`` returns the value of ``key``, or MISSING
+    """
+
+    def __init__(self, rule_set: RuleSet, lookup: Callable[[object], object]):
+        self.rule_set = rule_set
+        self.lookup = lookup
+        # Rule index -> error message of the failing rules
+        self.failures: Dict[int, str] = {}
+
+    def _run(self, i):
+        lookup = self.lookup
+        message = self.rule_set.checks[i](*[lookup(key) for key in self.rule_set.reads[i]])
+        if message is None:
+            self.failures.pop(i, None)
+        else:
+            self.failures[i] = message
+
+    def validate_all(self):
+        """Run every rule."""
+        self.failures = {}
+        for i in range(len(self.rule_set)):
+            self._run(i)
+
+    def update(self, changed: Iterable) -> int:
+        """Re-run the rules reading one of the ``changed`` keys; returns how many ran."""
+        dependents = self.rule_set.dependents
+        affected = set()
+        for key in changed:
+            affected.update(dependents.get(key, ()))
+        for i in affected:
+            self._run(i)
+        return len(affected)
+
+    @property
+    def is_valid(self) -> bool:
+        return not self.failures
+
+    def errors(self) -> List[str]:
+        """Messages of the failing rules, in rule order."""
+        return [self.failures[i] for i in sorted(self.failures)]
+
+
+def header_lookup(document):
+    """``lookup`` for a LiveDocument of a header: the value of the first
+    enabled definition of a name."""
+
+    def lookup(name):
+        for row in document.find_all(name):
+            if row[3]:
+                return row[2]
+        return MISSING
+    return lookup
+
+
+def effective_lookup(get_defines):
+    """``lookup`` over a header's effective defines, as returned by
+    ``get_defines()``: options in #if blocks that are not taken are not defined."""
+
+    def lookup(name):
+        return get_defines().get(name, MISSING)
+    return lookup
+
+
+def yaml_lookup(document):
+    """``lookup`` for a LiveDocument of a YAML file, by key path."""
+
+    def lookup(path):
+        return YamlView(document, path[:-1]).get(path[-1], MISSING)
+    return lookup
+
+
+def lazy_lookup(config: LazyConfig):
+    """``lookup`` for a LazyConfig: a header's options as written, or a
+    YAML file's values by key path; only the sections read are parsed."""
+
+    if config.kind == 'header':
+        def lookup(name):
+            for option in config.find_all(name):
+                if option.enabled:
+                    return option.value
+            return MISSING
+        return lookup
+
+    def lookup(path):
+        value = config.get(path[0], MISSING)
+        for key in path[1:]:
+            if not isinstance(value, dict) or key not in value:
+                return MISSING
+            value = value[key]
+        return value
+    return lookup
+
+
+# Rules for Marlin configuration headers, after Marlin's SanityCheck.h
+
+# Ways of probing the bed, of which only one may be enabled
+PROBE_TYPES = (
+    'PROBE_MANUALLY', 'SENSORLESS_PROBING', 'BLTOUCH', 'BD_SENSOR', 'FIX_MOUNTED_PROBE',
+    'NOZZLE_AS_PROBE', 'TOUCH_MI_PROBE', 'SOLENOID_PROBE', 'Z_PROBE_ALLEN_KEY', 'Z_PROBE_SLED',
+    'Z_PROBE_SERVO_NR', 'RACK_AND_PINION_PROBE', 'MAGLEV4', 'BIQU_MICROPROBE_V1', 'BIQU_MICROPROBE_V2',
+)
+# Probe types with an actual probe, as opposed to probing by hand
+BED_PROBES = tuple(probe for probe in PROBE_TYPES if probe != 'PROBE_MANUALLY')
+BED_LEVELING = ('AUTO_BED_LEVELING_3POINT', 'AUTO_BED_LEVELING_LINEAR',
+                'AUTO_BED_LEVELING_BILINEAR', 'AUTO_BED_LEVELING_UBL', 'MESH_BED_LEVELING')
+KINEMATICS = ('DELTA', 'MORGAN_SCARA', 'MP_SCARA', 'AXEL_TPARA', 'COREXY', 'COREXZ', 'COREYZ',
+              'COREYX', 'COREZX', 'COREZY', 'MARKFORGED_XY', 'MARKFORGED_YX', 'POLARGRAPH')
+BAUDRATES = (2400, 9600, 19200, 38400, 57600, 115200, 250000, 500000, 1000000, 2000000)
+# Stepper drivers of the axes past X, Y and Z; each one defined adds an axis
+EXTRA_AXIS_DRIVERS = tuple(f'{axis}_DRIVER_TYPE' for axis in 'IJKUVW')
+
+
+def _axes(*drivers) -> int:
+    return 3 + sum(driver is not MISSING for driver in drivers)
+
+
+def _logical_axes(extruders, distinct_e_factors, *drivers) -> int:
+    """Entries of a per-axis array: one per axis, then one for the
+    extruders, or one per extruder with DISTINCT_E_FACTORS."""
+    if extruders is MISSING:
+        extruders = 1
+    if not _number(extruders) or extruders <= 0:
+        return _axes(*drivers)
+    return _axes(*drivers) + (int(extruders) if distinct_e_factors is not MISSING else 1)
+
+
+_LOGICAL_AXES_READS = ('EXTRUDERS', 'DISTINCT_E_FACTORS') + EXTRA_AXIS_DRIVERS
+
+HEADER_RULES = (
+    Exclusive(PROBE_TYPES),
+    Exclusive(BED_LEVELING),
+    Exclusive(KINEMATICS),
+    *(Requires(leveling, PROBE_TYPES, f"{leveling} requires a probe, or PROBE_MANUALLY")
+      for leveling in BED_LEVELING[:4]),
+    Requires('Z_MIN_PROBE_USES_Z_MIN_ENDSTOP_PIN', BED_PROBES,
+             "Z_MIN_PROBE_USES_Z_MIN_ENDSTOP_PIN requires a probe type"),
+    Requires('USE_PROBE_FOR_Z_HOMING', BED_PROBES, "USE_PROBE_FOR_Z_HOMING requires a probe type"),
+    Requires('Z_SAFE_HOMING', BED_PROBES + ('Z_MIN_PROBE_USES_Z_MIN_ENDSTOP_PIN',)),
+    Requires('RESTORE_LEVELING_AFTER_G28', BED_LEVELING),
+    Requires('ENABLE_LEVELING_FADE_HEIGHT', BED_LEVELING),
+    OneOf('BAUDRATE', BAUDRATES),
+    Range('EXTRUDERS', 0, 8),
+    Range('X_BED_SIZE', 1),
+    Range('Y_BED_SIZE', 1),
+    Range('PROBING_MARGIN', 0),
+    Range('GRID_MAX_POINTS_X', 2, 255),
+    Range('GRID_MAX_POINTS_Y', 2, 255),
+    Range('HOTEND_OVERSHOOT', 0),
+    Range('BED_OVERSHOOT', 0),
+    *(ArrayLength(name, _LOGICAL_AXES_READS, _logical_axes, 'values, one per axis and extruder')
+      for name in ('DEFAULT_AXIS_STEPS_PER_UNIT', 'DEFAULT_MAX_FEEDRATE', 'DEFAULT_MAX_ACCELERATION')),
+    ArrayLength('HOMING_FEEDRATE_MM_M', EXTRA_AXIS_DRIVERS, _axes, 'values, one per axis'),
+)
+
+# Rules for YAML configuration bundles
+YAML_SECTIONS = ('configuration', 'pins', 'temperature', 'motion')
+
+YAML_RULES = (
+    *(Required((section,), f"Missing required section: {section}") for section in YAML_SECTIONS),
+    *(Requires(('configuration',), [('configuration', key)], f"Missing required configuration: {key}")
+      for key in ('firmware_name', 'firmware_version')),
+)
+
+_rule_sets: Dict[bool, RuleSet] = {}
+
+
+def rules_for(path) -> RuleSet:
+    """The compiled rules for the file ``path``: header or YAML rules."""
+    header = is_header(path)
+    rule_set = _rule_sets.get(header)
+    if rule_set is None:
+        rule_set = _rule_sets[header] = RuleSet(HEADER_RULES if header else YAML_RULES)
+    return rule_set
+
+
+def validator_for(path, document, get_defines=None) -> Validator:
+    """
+    A Validator of the rules for ``path`` over its LiveDocument, or over a
+    LazyConfig of it.  Headers are checked as written, or with
+    ``get_defines`` by their effective defines, e.g. those of a
+    :class:`~struttura.preprocessor.Evaluator`.
+    """
+    if isinstance(document, LazyConfig):
+        lookup = lazy_lookup(document)
+    elif not is_header(path):
+        lookup = yaml_lookup(document)
+    elif get_defines is not None:
+        lookup = effective_lookup(get_defines)
+    else:
+        lookup = header_lookup(document)
+    return Validator(rules_for(path), lookup)
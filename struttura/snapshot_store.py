@@ -0,0 +1,180 @@
+"""Backups of configurations as deduplicated snapshots.
+
+Every save of a configuration also keeps a snapshot of it in a local store.
+Its text is cut into chunks of lines at boundaries set by the content:
+after a line whose hash has its low bits clear, so an edit moves the
+boundaries around it only and the other chunks stay as they were.  Chunks
+are stored once, compressed, under the hash of their content, and a
+snapshot is the list of the hashes of its chunks, stored the same way.
+Hundreds of revisions of a header with a few lines changed in each cost a
+chunk or two and a list of hashes apiece.
+
+The revisions of each file are indexed in a file of their own, one line of
+JSON appended per snapshot, so a file's history is listed by reading its
+index alone and a revision is restored by reading its chunks.
+
+Layout of the store::
+
+    objects/<first 2 hex digits>/<other hex digits>
+    history/<hash of the file path>.jsonl
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+import zlib
+from typing import List, NamedTuple, Set, Tuple
+
+from .parse_cache import user_config_dir
+
+# A chunk ends after a line whose hash has these bits clear, once it has
+# MIN_CHUNK_LINES lines, and after MAX_CHUNK_LINES lines in any case
+CHUNK_MASK = 0x1f
+MIN_CHUNK_LINES = 8
+MAX_CHUNK_LINES = 256
+
+# Bytes of the hash objects are stored under
+DIGEST_SIZE = 16
+
+
+class Revision(NamedTuple):
+    """A snapshot of a file, as its history lists it."""
+    # Hash of the list of chunks, which restore() takes
+    id: str
+    path: str
+    # When it was taken, in seconds since the epoch
+    time: float
+    # Characters and lines of the text
+    size: int
+    lines: int
+    chunks: int
+    # Compressed bytes the snapshot added to the store
+    stored: int
+
+
+def chunk_lines(text: str) -> List[str]:
+    """``text`` cut into chunks of whole lines at content-defined boundaries."""
+    lines = text.splitlines(keepends=True)
+    chunks = []
+    start = 0
+    for i, line in enumerate(lines):
+        length = i + 1 - start
+        if length >= MAX_CHUNK_LINES or (
+            length >= MIN_CHUNK_LINES and not zlib.crc32(line.encode('utf-8')) & CHUNK_MASK
+        ):
+            chunks.append(''.join(lines[start:i + 1]))
+            start = i + 1
+    if start < len(lines):
+        chunks.append(''.join(lines[start:]))
+    return chunks
+
+
+class SnapshotStore:
+    """
+    A content-addressed store of snapshots under ``directory``, by default
+    under the user configuration directory.
+
+    Objects are written through temporary files renamed into place, so
+    snapshots may be taken on worker threads while the history is listed
+    and revisions restored on another.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or os.path.join(user_config_dir(), 'backups')
+        # Hashes of the objects known to be stored already
+        self._known: Set[str] = set()
+
+    def _object_path(self, digest) -> str:
+        return os.path.join(self.directory, 'objects', digest[:2], digest[2:])
+
+    def history_path(self, path) -> str:
+        """The index of the revisions of the file ``path``."""
+        key = hashlib.blake2b(os.path.abspath(path).encode('utf-8'), digest_size=DIGEST_SIZE).hexdigest()
+        return os.path.join(self.directory, 'history', key + '.jsonl')
+
+    def _put(self, data: bytes) -> Tuple[str, int]:
+        """Store ``data`` unless it is stored already; (its hash, bytes written)."""
+        digest = hashlib.blake2b(data, digest_size=DIGEST_SIZE).hexdigest()
+        if digest in self._known:
+            return digest, 0
+        target = self._object_path(digest)
+        if os.path.exists(target):
+            self._known.add(digest)
+            return digest, 0
+        directory = os.path.dirname(target)
+        os.makedirs(directory, exist_ok=True)
+        compressed = zlib.compress(data, 6)
+        fd, temp = tempfile.mkstemp(suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(compressed)
+            os.replace(temp, target)
+        except BaseException:
+            try:
+                os.remove(temp)
+            except OSError:
+                pass
+            raise
+        self._known.add(digest)
+        return digest, len(compressed)
+
+    def _get(self, digest) -> bytes:
+        with open(self._object_path(digest), 'rb') as f:
+            data = zlib.decompress(f.read())
+        if hashlib.blake2b(data, digest_size=DIGEST_SIZE).hexdigest() != digest:
+            raise ValueError(f'backup object {digest} is damaged')
+        return data
+
+    def snapshot(self, path, content, task=None) -> Revision:
+        """
+        Keep ``content``, a string or a PieceTable, as a revision of the
+        file ``path``; ``task`` is the FileTask running this, or None.
+        Returns the new revision, or the last one if it has the same text.
+        """
+        text = content if isinstance(content, str) else content.get_text()
+        chunks = chunk_lines(text)
+        digests = []
+        stored = 0
+        for k, chunk in enumerate(chunks):
+            if task is not None:
+                task.progress(k, len(chunks))
+            digest, written = self._put(chunk.encode('utf-8'))
+            digests.append(bytes.fromhex(digest))
+            stored += written
+        manifest, written = self._put(b''.join(digests))
+        stored += written
+
+        history = self.history(path)
+        if history and history[-1].id == manifest:
+            return history[-1]
+        revision = Revision(manifest, os.path.abspath(path), time.time(), len(text),
+                            text.count('\n') + 1, len(chunks), stored)
+        index = self.history_path(path)
+        os.makedirs(os.path.dirname(index), exist_ok=True)
+        with open(index, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(revision._asdict(), ensure_ascii=False) + '\n')
+        return revision
+
+    def history(self, path) -> List[Revision]:
+        """The revisions of the file ``path``, oldest first."""
+        try:
+            with open(self.history_path(path), 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+        except OSError:
+            return []
+        revisions = []
+        for line in lines:
+            try:
+                revisions.append(Revision(**json.loads(line)))
+            except (ValueError, TypeError):
+                # Cut short by a crash while it was written
+                continue
+        return revisions
+
+    def restore(self, revision) -> str:
+        """The text of a Revision, or of the revision with that id."""
+        manifest = self._get(revision if isinstance(revision, str) else revision.id)
+        return ''.join(self._get(manifest[k:k + DIGEST_SIZE].hex()).decode('utf-8')
+                       for k in range(0, len(manifest), DIGEST_SIZE))
@@ -0,0 +1,332 @@
+"""Index of the symbols of every header in a configuration project.
+
+Options defined in Configuration.h are tested by the #if blocks of
+Configuration_adv.h, and both refer to the boards and pins defined by the
+pins files.  :class:`SymbolIndex` records, for every header under a project
+directory, where each symbol is defined (``#define``, enabled or commented
+out), referenced (in the value of a definition or an ``#undef``) and tested
+(in an ``#if``, ``#ifdef``, ``#ifndef`` or ``#elif`` condition), so going to
+a definition, finding the usages of an option or evaluating one header
+against another are dictionary lookups.
+
+A header is only scanned again when its size or modification time changed,
+or when the editor hands over its unsaved text.  Scanning looks at the lines
+starting with a directive and skips the prose around them without splitting
+the text into lines.  The index is kept between sessions, with marshal, in
+one file per project under the user configuration directory; like the parse
+cache, it is best effort, and an index that cannot be read is rebuilt.
+"""
+
+import hashlib
+import marshal
+import os
+import re
+import sys
+import tempfile
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from .config_parser import PARSER_VERSION, _DEFINE, ConfigLineParser, parse_value
+from .parse_cache import user_config_dir
+from .preprocessor import Evaluator
+
+DEFINITION = 'definition'
+REFERENCE = 'reference'
+CONDITION = 'condition'
+
+# Changes whenever scanning a given text can give different symbols, which
+# invalidates indexes kept by earlier versions
+INDEX_VERSION = 1
+
+# Files of a project that are indexed
+INDEXED_SUFFIXES = ('.h',)
+
+# Headers compiled after others, which they see the definitions of
+_INCLUDED_AFTER = {'configuration_adv.h': ('Configuration.h',)}
+
+_MAGIC = b'MCSI\x01'
+
+# A line starting with a directive, or with a commented-out definition
+_LINE = re.compile(r'^[ \t]*(//[ \t]*)?\#[ \t]*(define|undef|if|ifdef|ifndef|elif|else|endif)\b.*',
+                   re.MULTILINE)
+# Names in the value of a definition or in a condition; literals are
+# matched to be skipped
+_NAME = re.compile(r'''"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*'|\d\w*|([A-Za-z_]\w*)([ \t]*\()?''')
+
+
+class Site(NamedTuple):
+    """Where a symbol appears."""
+    path: str
+    # 0-based line and column of the name
+    line: int
+    column: int
+    # DEFINITION, REFERENCE or CONDITION
+    kind: str
+    # False on a commented-out definition
+    enabled: bool
+
+
+class FileSymbols(NamedTuple):
+    """What the index holds for one header."""
+    # (modification time in ns, size) it was scanned at, or None for text
+    # handed over by the editor
+    stamp: Optional[Tuple[int, int]]
+    # (name, line, column, kind, enabled) of every symbol, in file order
+    sites: tuple
+    # (name, raw value, conditions) of the enabled definitions, in file order
+    defines: tuple
+
+
+def scan_symbols(text) -> FileSymbols:
+    """The symbols of a header's ``text``, without a stamp."""
+    sites = []
+    defines = []
+    intern = sys.intern
+    directive = ConfigLineParser._directive
+    state = ConfigLineParser.initial_state
+    line = 0
+    counted = 0
+    for m in _LINE.finditer(text):
+        start = m.start()
+        line += text.count('\n', counted, start)
+        counted = start
+        commented, word = m.groups()
+        source = m.group().rstrip('\r')
+        if word == 'define':
+            d = _DEFINE.match(source)
+            if d is None:
+                continue
+            name = intern(d.group('name'))
+            enabled = commented is None
+            sites.append((name, line, d.start('name'), DEFINITION, enabled))
+            value = d.group('value')
+            offset = d.start('value')
+            parameters = ()
+            if d.group('function') is not None:
+                # The parameters of a function-like macro are not symbols
+                close = value.find(')')
+                parameters = value[:close].replace(' ', '').split(',')
+                offset += close + 1
+                value = value[close + 1:]
+            for n in _NAME.finditer(value):
+                if n.group(1) is not None and n.group(1) not in parameters:
+                    sites.append((intern(n.group(1)), line, offset + n.start(1), REFERENCE, enabled))
+            if enabled and d.group('function') is None:
+                defines.append((name, value.strip(), state[2]))
+            continue
+        if commented is not None:
+            continue
+        if word in ('undef', 'if', 'ifdef', 'ifndef', 'elif'):
+            kind = REFERENCE if word == 'undef' else CONDITION
+            for n in _NAME.finditer(source, m.end(2) - start):
+                name = n.group(1)
+                # Macros like ENABLED() are called, the options are their arguments
+                if name is None or name == 'defined' or (n.group(2) and kind == CONDITION):
+                    continue
+                sites.append((intern(name), line, n.start(1), kind, True))
+        if word != 'undef':
+            state = directive(source, state)
+    return FileSymbols(None, tuple(sites), tuple(defines))
+
+
+def included_before(path) -> List[str]:
+    """Headers in the directory of ``path`` compiled before it, whose
+    definitions it sees, e.g. Configuration.h for Configuration_adv.h."""
+    directory = os.path.dirname(os.path.abspath(path))
+    return [os.path.join(directory, name)
+            for name in _INCLUDED_AFTER.get(os.path.basename(path).lower(), ())]
+
+
+def _stamp(stat) -> Tuple[int, int]:
+    return stat.st_mtime_ns, stat.st_size
+
+
+class SymbolIndex:
+    """
+    Symbols of the headers under a project directory.
+
+    Args:
+        root: The project directory
+        store: File the index is kept in between sessions; defaults to one
+            named after ``root`` under :func:`user_config_dir`, and None
+            keeps nothing
+    """
+
+    def __init__(self, root, store=''):
+        self.root = os.path.abspath(root)
+        if store == '':
+            digest = hashlib.blake2b(os.path.normcase(self.root).encode('utf-8', 'surrogatepass'),
+                                     digest_size=16).hexdigest()
+            store = os.path.join(user_config_dir(), 'symbol-index', digest + '.index')
+        self.store = store
+        # Absolute path -> FileSymbols
+        self.files: Dict[str, FileSymbols] = {}
+        # Symbol -> {path: indices of its sites in files[path].sites}
+        self._names: Dict[str, Dict[str, Tuple[int, ...]]] = {}
+        # Headers scanned rather than taken from the stored index
+        self.scanned = 0
+
+    def __contains__(self, name) -> bool:
+        return name in self._names
+
+    def __len__(self):
+        return len(self._names)
+
+    def _add(self, path, symbols):
+        self.files[path] = symbols
+        positions: Dict[str, list] = {}
+        for i, site in enumerate(symbols.sites):
+            positions.setdefault(site[0], []).append(i)
+        names = self._names
+        for name, indices in positions.items():
+            names.setdefault(name, {})[path] = tuple(indices)
+
+    def _drop(self, path):
+        symbols = self.files.pop(path, None)
+        if symbols is None:
+            return
+        names = self._names
+        for name in {site[0] for site in symbols.sites}:
+            paths = names[name]
+            del paths[path]
+            if not paths:
+                del names[name]
+
+    def update(self, path, text):
+        """Index ``text`` as the contents of ``path``, e.g. the unsaved
+        text of an editor; the file is scanned again by the next refresh."""
+        path = os.path.abspath(path)
+        self._drop(path)
+        self._add(path, scan_symbols(text))
+        self.scanned += 1
+
+    def remove(self, path):
+        self._drop(os.path.abspath(path))
+
+    def _headers(self):
+        """Path -> stat of every indexed file under the root."""
+        found = {}
+        for directory, subdirectories, names in os.walk(self.root):
+            subdirectories[:] = [name for name in subdirectories if not name.startswith('.')]
+            for name in names:
+                if name.lower().endswith(INDEXED_SUFFIXES):
+                    path = os.path.join(directory, name)
+                    try:
+                        found[path] = os.stat(path)
+                    except OSError:
+                        pass
+        return found
+
+    def refresh(self, task=None) -> int:
+        """
+        Scan the headers added or changed since the last refresh and drop
+        the deleted ones; returns how many were scanned.
+
+        Args:
+            task: A FileTask the progress is reported to
+        """
+        headers = self._headers()
+        for path in [path for path in self.files if path not in headers]:
+            self._drop(path)
+        stale = [(path, stat) for path, stat in headers.items()
+                 if path not in self.files or self.files[path].stamp != _stamp(stat)]
+        for done, (path, stat) in enumerate(stale):
+            if task is not None:
+                task.progress(done, len(stale))
+            try:
+                with open(path, 'r', encoding='utf-8', errors='replace', newline='') as f:
+                    text = f.read()
+            except OSError:
+                self._drop(path)
+                continue
+            self._drop(path)
+            self._add(path, scan_symbols(text)._replace(stamp=_stamp(stat)))
+        self.scanned += len(stale)
+        return len(stale)
+
+    def load(self) -> bool:
+        """Take over the index kept by :meth:`save`; False if there is none."""
+        if not self.store:
+            return False
+        try:
+            with open(self.store, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return False
+        try:
+            if not data.startswith(_MAGIC):
+                raise ValueError('not a symbol index')
+            version, root, files = marshal.loads(memoryview(data)[len(_MAGIC):])
+        except (ValueError, EOFError, TypeError):
+            return False
+        if version != (INDEX_VERSION, PARSER_VERSION) or root != self.root:
+            return False
+        self.files.clear()
+        self._names.clear()
+        for path, (stamp, sites, defines) in files.items():
+            self._add(path, FileSymbols(stamp, sites, defines))
+        return True
+
+    def save(self) -> bool:
+        """Keep the index for the next session; False if it could not be written."""
+        if not self.store:
+            return False
+        # Text from the editor is scanned again from the file next time
+        files = {path: tuple(symbols) for path, symbols in self.files.items()
+                 if symbols.stamp is not None}
+        try:
+            data = _MAGIC + marshal.dumps(((INDEX_VERSION, PARSER_VERSION), self.root, files))
+        except ValueError:
+            return False
+        directory = os.path.dirname(self.store)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, temp = tempfile.mkstemp(suffix='.tmp', dir=directory)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(temp, self.store)
+            except OSError:
+                try:
+                    os.remove(temp)
+                except OSError:
+                    pass
+                raise
+        except OSError:
+            return False
+        return True
+
+    def sites(self, name, kinds=(DEFINITION, REFERENCE, CONDITION)) -> List[Site]:
+        """Where ``name`` appears as one of ``kinds``, by path and line."""
+        found = []
+        for path, indices in sorted(self._names.get(name, {}).items()):
+            sites = self.files[path].sites
+            for i in indices:
+                _, line, column, kind, enabled = sites[i]
+                if kind in kinds:
+                    found.append(Site(path, line, column, kind, enabled))
+        return found
+
+    def definitions(self, name) -> List[Site]:
+        """Where ``name`` is defined, enabled definitions first."""
+        return sorted(self.sites(name, (DEFINITION,)), key=lambda site: not site.enabled)
+
+    def usages(self, name) -> List[Site]:
+        """Where ``name`` is referenced or tested."""
+        return self.sites(name, (REFERENCE, CONDITION))
+
+    def predefined(self, path) -> Dict[str, object]:
+        """
+        The options in effect in the headers compiled before ``path`` in
+        the same directory, e.g. Configuration.h for Configuration_adv.h,
+        as values for an Evaluator's ``predefined``.
+        """
+        evaluator = Evaluator()
+        defines: Dict[str, object] = {}
+        for header in included_before(path):
+            symbols = self.files.get(header)
+            if symbols is None:
+                continue
+            for option, raw, conditions in symbols.defines:
+                if evaluator.taken(conditions, defines):
+                    defines[option] = parse_value(raw)
+        return defines
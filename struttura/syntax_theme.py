@@ -0,0 +1,89 @@
+"""Syntax highlighting themes for the code editors.
+
+pygments produces dozens of token subtypes (Keyword.Reserved, Name.Builtin,
+Literal.Number.Hex, ...).  Rather than one Tk tag per subtype, each theme
+styles a small fixed set of token types and every other type falls back to
+its nearest styled parent, so a highlighting pass only ever touches about a
+dozen tags.  The resolved maps are built once per theme and shared by all
+editor instances.
+"""
+
+from typing import Dict, Optional
+
+from pygments.token import Comment, Keyword, Name, Number, Operator, Punctuation, String
+
+THEMES = {
+    'dark': {
+        Comment: '#6A9955',
+        Comment.Special: '#808080',
+        Comment.Preproc: '#C586C0',
+        Comment.PreprocFile: '#CE9178',
+        Keyword: '#569CD6',
+        Keyword.Constant: '#9CDCFE',
+        Keyword.Declaration: '#C586C0',
+        Keyword.Type: '#4EC9B0',
+        Name.Class: '#4EC9B0',
+        Name.Function: '#DCDCAA',
+        Name.Variable: '#9CDCFE',
+        Number: '#B5CEA8',
+        String: '#CE9178',
+        Operator: '#D4D4D4',
+        Punctuation: '#D4D4D4',
+    },
+    'light': {
+        Comment: '#008000',
+        Comment.Special: '#8A8A8A',
+        Comment.Preproc: '#AF00DB',
+        Comment.PreprocFile: '#A31515',
+        Keyword: '#0000FF',
+        Keyword.Type: '#2B91AF',
+        Name.Class: '#2B91AF',
+        Name.Function: '#795E26',
+        Number: '#098658',
+        String: '#A31515',
+        Operator: '#000000',
+    },
+}
+
+
+class TokenStyleMap:
+    """
+    Resolves pygments token types to the tags of one theme.
+
+    Args:
+        styles: Token type -> foreground color of the styled types
+    """
+
+    def __init__(self, styles):
+        self.styles = dict(styles)
+        self.tags = frozenset(str(token_type) for token_type in self.styles)
+        self._resolved: Dict[object, Optional[str]] = {}
+
+    def tag_for(self, token_type) -> Optional[str]:
+        """Return the tag of the nearest styled ancestor, or None."""
+        try:
+            return self._resolved[token_type]
+        except KeyError:
+            pass
+        styled = token_type
+        while styled is not None and styled not in self.styles:
+            styled = styled.parent
+        tag = str(styled) if styled is not None else None
+        self._resolved[token_type] = tag
+        return tag
+
+    def configure(self, text_widget):
+        """Create the theme's tags on ``text_widget``."""
+        for token_type, color in self.styles.items():
+            text_widget.tag_configure(str(token_type), foreground=color)
+
+
+_style_maps: Dict[str, TokenStyleMap] = {}
+
+
+def get_style_map(theme: str) -> TokenStyleMap:
+    """Return the shared TokenStyleMap of ``theme``, building it on first use."""
+    style_map = _style_maps.get(theme)
+    if style_map is None:
+        style_map = _style_maps[theme] = TokenStyleMap(THEMES[theme])
+    return style_map
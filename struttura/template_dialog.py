@@ -0,0 +1,89 @@
+import tkinter as tk
+from tkinter import ttk
+
+from .lang import tr
+from .template_store import FIELDS
+
+# Fields shown as choices above the list; the model is found by searching
+FILTERS = ('vendor', 'board', 'kinematics', 'marlin')
+
+
+class TemplateDialog:
+    """
+    A dialog to browse a TemplateStore by vendor, board, kinematics and
+    Marlin version, and pick a template to start a configuration from.
+    Only the store's index is used until a template is picked.
+    """
+
+    @staticmethod
+    def show(root, store, on_pick):
+        """Show the templates of ``store``; ``on_pick(template)`` is called
+        with the one chosen, after the dialog closes."""
+        dialog = tk.Toplevel(root)
+        dialog.title(tr('template_library'))
+        dialog.geometry('800x500')
+        dialog.minsize(600, 300)
+
+        # Filters
+        filter_frame = ttk.Frame(dialog)
+        filter_frame.pack(fill=tk.X, padx=10, pady=5)
+        ttk.Label(filter_frame, text=tr('search')).grid(row=0, column=0, padx=5, sticky='w')
+        search = tk.StringVar()
+        entry = ttk.Entry(filter_frame, textvariable=search, width=24)
+        entry.grid(row=1, column=0, padx=5, sticky='w')
+        choices = {}
+        for column, field in enumerate(FILTERS, start=1):
+            ttk.Label(filter_frame, text=tr(f'template_{field}')).grid(row=0, column=column, padx=5, sticky='w')
+            choices[field] = tk.StringVar(value=tr('any'))
+            combobox = ttk.Combobox(filter_frame, textvariable=choices[field], state='readonly', width=16,
+                                    values=[tr('any')] + store.values(field))
+            combobox.grid(row=1, column=column, padx=5, sticky='w')
+            combobox.bind('<<ComboboxSelected>>', lambda event: update_list())
+
+        # Templates
+        list_frame = ttk.Frame(dialog)
+        list_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        tree = ttk.Treeview(list_frame, columns=FIELDS, show='headings', selectmode='browse')
+        for field in FIELDS:
+            tree.heading(field, text=tr(f'template_{field}'))
+            tree.column(field, width=120)
+        scrollbar = ttk.Scrollbar(list_frame, command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        tree.pack(fill=tk.BOTH, expand=True)
+
+        count = ttk.Label(dialog)
+        count.pack(anchor='w', padx=10)
+
+        def update_list(*args):
+            wanted = {field: variable.get() for field, variable in choices.items()
+                      if variable.get() != tr('any')}
+            found = store.find(search.get().strip(), **wanted)
+            tree.delete(*tree.get_children())
+            for template in found:
+                tree.insert('', tk.END, iid=template.id,
+                            values=[getattr(template, field) for field in FIELDS])
+            count.config(text=tr('templates_found', count=len(found), total=len(store)))
+
+        def pick(event=None):
+            selection = tree.selection()
+            if not selection:
+                return
+            template = store.get(selection[0])
+            dialog.destroy()
+            on_pick(template)
+
+        search.trace_add('write', update_list)
+        tree.bind('<Double-Button-1>', pick)
+        tree.bind('<Return>', pick)
+
+        # Buttons
+        button_frame = ttk.Frame(dialog)
+        button_frame.pack(fill=tk.X, padx=10, pady=10)
+        ttk.Button(button_frame, text=tr('close'), command=dialog.destroy).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(button_frame, text=tr('create'), command=pick).pack(side=tk.RIGHT, padx=5)
+
+        update_list()
+        entry.focus_set()
+        dialog.transient(root)
+        dialog.grab_set()
@@ -0,0 +1,298 @@
+"""Library of printer configuration templates in one compressed file.
+
+The headers of most printers differ from the stock ones of their Marlin
+version in a few dozen lines, so a template is stored as a delta against a
+base: the stock headers, kept once each.  The file starts with an index of
+the templates, with their vendor, model, board, kinematics and Marlin
+version and where their deltas are, and goes on with the bases and deltas,
+each compressed on its own.  :class:`TemplateStore` reads the index only,
+so browsing and filtering the library costs no more than that; the
+headers of a template are decompressed and rebuilt from their bases when
+:meth:`TemplateStore.materialize` is called, and the bases are kept for the
+next one.
+
+Layout of the file: a tag and the layout version, the length of the index
+in 4 bytes, the index as zlib-compressed JSON, then the compressed blobs,
+at offsets from the end of the index.  A delta is a JSON list of
+``[start, stop]`` ranges of base lines to copy and of lines to insert.
+
+:func:`build_store` writes a library from a directory of templates::
+
+    base/<Marlin version>/Configuration.h, Configuration_adv.h
+    <vendor>/<model>/template.yaml, Configuration.h, Configuration_adv.h
+
+where ``template.yaml`` gives the ``board``, ``kinematics`` and ``marlin``
+version of the printer, and may give its ``vendor`` and ``model`` if they
+differ from the directory names.
+"""
+
+import json
+import os
+import struct
+import tempfile
+import zlib
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import yaml
+
+from .config_diff import EQUAL, diff_lines
+from .file_io import read_file, save_file
+from .marlin_lexer import is_header
+
+STORE_VERSION = 1
+
+# Fields of a template that the library can be filtered by
+FIELDS = ('vendor', 'model', 'board', 'kinematics', 'marlin')
+
+# Metadata of each template directory given to build_store, and the
+# directory of the bases
+TEMPLATE_FILE = 'template.yaml'
+BASE_DIR = 'base'
+
+# Library shipped with the application
+DEFAULT_STORE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             'templates', 'printers.mct')
+
+# Start of every library file: a tag and the layout version
+_MAGIC = b'MCTS\x01'
+_LENGTH = struct.Struct('>I')
+
+
+class Template(NamedTuple):
+    """A template of the library, as the index describes it."""
+    id: str
+    vendor: str
+    model: str
+    board: str
+    kinematics: str
+    marlin: str
+    # Names of its headers
+    files: Tuple[str, ...]
+
+
+def make_delta(base: List[str], lines: List[str]) -> list:
+    """The delta turning the lines ``base`` into ``lines``."""
+    delta: list = []
+    for tag, i1, i2, j1, j2 in diff_lines(base, lines):
+        if tag == EQUAL:
+            delta.append([i1, i2])
+        else:
+            delta.extend(lines[j1:j2])
+    return delta
+
+
+def apply_delta(base: List[str], delta: list) -> List[str]:
+    """The lines made by :func:`make_delta` from ``base``."""
+    lines: List[str] = []
+    for item in delta:
+        if isinstance(item, str):
+            lines.append(item)
+        else:
+            lines.extend(base[item[0]:item[1]])
+    return lines
+
+
+def _inserted(delta) -> int:
+    return sum(1 for item in delta if isinstance(item, str))
+
+
+def write_store(path, bases: Dict[Tuple[str, str], str],
+                templates: Iterable[Tuple[Template, Dict[str, str]]]) -> Dict:
+    """
+    Write a library of ``templates`` to ``path``, through a temporary file
+    renamed over it.
+
+    Args:
+        path: The library file
+        bases: (Marlin version, file name) -> text of a stock header
+        templates: (Template, file name -> text) of every template; each
+            header is stored against the base of the same name it differs
+            least from, preferring its own Marlin version
+
+    Returns:
+        dict: Counts of templates, and bytes of their headers and of the file
+    """
+    base_lines = {key: text.split('\n') for key, text in bases.items()}
+    blobs: List[bytes] = []
+    offset = 0
+
+    def add(data) -> List[int]:
+        nonlocal offset
+        blob = zlib.compress(json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8'), 9)
+        blobs.append(blob)
+        offset += len(blob)
+        return [offset - len(blob), len(blob)]
+
+    index_bases = {}
+    for (marlin, name), lines in base_lines.items():
+        index_bases[f'{marlin}/{name}'] = add(lines)
+    index_templates = []
+    count = raw = 0
+    for template, files in templates:
+        entry = {field: getattr(template, field) for field in ('id',) + FIELDS}
+        entry['files'] = {}
+        for name, text in files.items():
+            lines = text.split('\n')
+            raw += len(text.encode('utf-8'))
+            best = None
+            for (marlin, base_name), base in base_lines.items():
+                if base_name != name:
+                    continue
+                delta = make_delta(base, lines)
+                rank = (_inserted(delta), marlin != template.marlin)
+                if best is None or rank < best[0]:
+                    best = (rank, f'{marlin}/{name}', delta)
+            if best is None:
+                best = (None, None, make_delta([], lines))
+            entry['files'][name] = [best[1]] + add(best[2])
+        index_templates.append(entry)
+        count += 1
+
+    index = zlib.compress(json.dumps({
+        'version': STORE_VERSION,
+        'bases': index_bases,
+        'templates': index_templates,
+    }, ensure_ascii=False, separators=(',', ':')).encode('utf-8'), 9)
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp = tempfile.mkstemp(suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_MAGIC + _LENGTH.pack(len(index)) + index)
+            for blob in blobs:
+                f.write(blob)
+        os.replace(temp, path)
+    except BaseException:
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
+        raise
+    return {'templates': count, 'raw_bytes': raw, 'bytes': os.path.getsize(path)}
+
+
+def build_store(source, path) -> Dict:
+    """Write a library to ``path`` from the directory of templates ``source``; see the module docstring."""
+    bases = {}
+    base_dir = os.path.join(source, BASE_DIR)
+    if os.path.isdir(base_dir):
+        for marlin in sorted(os.listdir(base_dir)):
+            directory = os.path.join(base_dir, marlin)
+            if os.path.isdir(directory):
+                for name in sorted(os.listdir(directory)):
+                    if is_header(name):
+                        bases[(marlin, name)] = read_file(None, os.path.join(directory, name))[0]
+
+    def templates():
+        for directory, subdirectories, names in os.walk(source):
+            subdirectories.sort()
+            if TEMPLATE_FILE not in names or os.path.relpath(directory, source).split(os.sep)[0] == BASE_DIR:
+                continue
+            with open(os.path.join(directory, TEMPLATE_FILE), 'r', encoding='utf-8') as f:
+                meta = yaml.safe_load(f) or {}
+            template_id = os.path.relpath(directory, source).replace(os.sep, '/')
+            parts = template_id.split('/')
+            files = {name: read_file(None, os.path.join(directory, name))[0]
+                     for name in sorted(names) if is_header(name)}
+            yield Template(
+                id=template_id,
+                vendor=str(meta.get('vendor', parts[0])),
+                model=str(meta.get('model', parts[-1])),
+                board=str(meta.get('board', '')),
+                kinematics=str(meta.get('kinematics', '')),
+                marlin=str(meta.get('marlin', '')),
+                files=tuple(files),
+            ), files
+
+    return write_store(path, bases, templates())
+
+
+class TemplateStore:
+    """
+    A library file written by :func:`write_store`, of which only the index
+    is read until a template is materialized.
+
+    Raises:
+        ValueError: If the file is not a template library of this version
+        OSError: If it cannot be read
+    """
+
+    def __init__(self, path=DEFAULT_STORE):
+        self.path = path
+        with open(path, 'rb') as f:
+            head = f.read(len(_MAGIC) + _LENGTH.size)
+            if len(head) < len(_MAGIC) + _LENGTH.size or head[:len(_MAGIC)] != _MAGIC:
+                raise ValueError(f'{path} is not a template library')
+            (length,) = _LENGTH.unpack(head[len(_MAGIC):])
+            index = json.loads(zlib.decompress(f.read(length)).decode('utf-8'))
+        if index.get('version') != STORE_VERSION:
+            raise ValueError(f'{path} is a template library of another version')
+        self._data_start = len(head) + length
+        self._base_blobs: Dict[str, List[int]] = index['bases']
+        self._files: Dict[str, Dict[str, list]] = {}
+        self.templates: List[Template] = []
+        for entry in index['templates']:
+            files = entry['files']
+            self._files[entry['id']] = files
+            self.templates.append(Template(files=tuple(files), **{
+                field: entry[field] for field in ('id',) + FIELDS
+            }))
+        self._by_id = {template.id: template for template in self.templates}
+        # Base id -> lines of the bases decompressed so far
+        self._bases: Dict[str, List[str]] = {}
+
+    def __len__(self):
+        return len(self.templates)
+
+    def get(self, template_id) -> Optional[Template]:
+        return self._by_id.get(template_id)
+
+    def values(self, field) -> List[str]:
+        """The values of ``field`` among the templates, sorted, for choosing from."""
+        return sorted({getattr(template, field) for template in self.templates if getattr(template, field)},
+                      key=str.lower)
+
+    def find(self, text='', **fields) -> List[Template]:
+        """
+        The templates whose ``fields`` (see FIELDS) have the values given,
+        empty values matching all, and whose vendor, model or board contain
+        ``text``, in any case.
+        """
+        wanted = [(field, value) for field, value in fields.items() if value]
+        text = text.lower()
+        return [template for template in self.templates
+                if all(getattr(template, field) == value for field, value in wanted)
+                and (not text or text in f'{template.vendor} {template.model} {template.board}'.lower())]
+
+    def _read(self, f, location) -> list:
+        offset, length = location
+        f.seek(self._data_start + offset)
+        return json.loads(zlib.decompress(f.read(length)).decode('utf-8'))
+
+    def materialize(self, template_id) -> Dict[str, str]:
+        """File name -> text of each header of a template."""
+        files = self._files[template_id]
+        texts = {}
+        with open(self.path, 'rb') as f:
+            for name, (base_id, offset, length) in files.items():
+                base: List[str] = []
+                if base_id is not None:
+                    base = self._bases.get(base_id)
+                    if base is None:
+                        base = self._bases[base_id] = self._read(f, self._base_blobs[base_id])
+                texts[name] = '\n'.join(apply_delta(base, self._read(f, (offset, length))))
+        return texts
+
+    def extract(self, template_id, directory, task=None) -> List[str]:
+        """
+        Write the headers of a template to ``directory``, replacing any of
+        the same name; ``task`` is the FileTask running this, or None.
+        Returns the paths written.
+        """
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for name, text in self.materialize(template_id).items():
+            path = os.path.join(directory, name)
+            save_file(task, path, text)
+            paths.append(path)
+        return paths
@@ -0,0 +1,160 @@
+"""Sliding window of a large document in a tk.Text.
+
+Tk's text widget slows down badly once it holds a few megabytes.  In large
+file mode the document lives in a :class:`~struttura.piece_table.PieceTable`
+and the widget only holds a window of lines around the viewport, refilled
+whenever the view gets close to either edge.  The vertical scrollbar is
+mapped onto the whole document, and every edit made in the widget is copied
+line by line into the piece table, so the document is saved from the piece
+table without reading the widget back.
+"""
+
+# Documents of at least this many characters are opened in large file mode
+LARGE_FILE_CHARS = 2 * 1024 * 1024
+
+# Lines held by the widget, and how close the view may get to the edge of
+# the window before it is refilled around the view
+WINDOW_LINES = 3000
+MARGIN_LINES = 500
+
+
+class TextWindow:
+    """
+    Shows a window of a document's lines in a tk.Text.
+
+    Inactive until :meth:`open` is called; meanwhile :meth:`yview` and
+    :meth:`scroll_fractions` pass the widget's own scrolling through, so the
+    editor can route its scrollbar through the window unconditionally.
+
+    Args:
+        text_widget: The tk.Text showing the window
+        tracker: The EditTracker of ``text_widget``
+    """
+
+    def __init__(self, text_widget, tracker, window_lines=WINDOW_LINES, margin_lines=MARGIN_LINES):
+        self.text = text_widget
+        self.tracker = tracker
+        self.window_lines = window_lines
+        self.margin_lines = margin_lines
+        self.document = None
+        # Document line shown on the first line of the widget
+        self.first = 0
+        # True while the window is being refilled, which is not an edit
+        self.filling = False
+        self._recenter_job = None
+        tracker.add_listener(self._on_edit)
+
+    @property
+    def active(self) -> bool:
+        return self.document is not None
+
+    def open(self, document, line=0):
+        """Show ``document``, a PieceTable, from document line ``line``."""
+        self.document = document
+        self.first = 0
+        self.fill(line)
+
+    def close(self):
+        """Stop windowing; the widget keeps whatever it holds."""
+        if self._recenter_job is not None:
+            self.text.after_cancel(self._recenter_job)
+            self._recenter_job = None
+        self.document = None
+        self.first = 0
+
+    def fill(self, first):
+        """Load the window starting at document line ``first`` into the widget."""
+        document = self.document
+        first = max(0, min(first, document.line_count - self.window_lines))
+        insert_line, insert_column = str(self.tracker.call('index', 'insert')).split('.')
+        insert_line = self.first + int(insert_line) - 1
+
+        self.filling = True
+        try:
+            self.text.delete('1.0', 'end')
+            self.text.insert('1.0', '\n'.join(document.lines(first, first + self.window_lines)))
+        finally:
+            self.filling = False
+        self.first = first
+
+        if first <= insert_line < first + self.window_lines:
+            self.text.mark_set('insert', f'{insert_line - first + 1}.{insert_column}')
+
+    def replace(self, line, column, removed, inserted):
+        """Replace ``removed`` at document position (line, column) with
+        ``inserted`` in the document itself, then refill the window so it
+        shows the edit; used to replay edits of any size."""
+        count = removed.count('\n') + 1
+        text = '\n'.join(self.document.lines(line, line + count))
+        text = text[:column] + inserted + text[column + len(removed):]
+        self.document.replace_lines(line, count, text.split('\n'))
+        if self.first <= line < self.first + self.window_lines:
+            self.fill(self.first)
+        else:
+            self.fill(line - self.window_lines // 2)
+
+    def show(self, line):
+        """Scroll document line ``line`` to the top of the view."""
+        document = self.document
+        line = max(0, min(line, document.line_count - 1))
+        count = self.tracker.line_count()
+        near_top = line - self.first < self.margin_lines and self.first > 0
+        near_bottom = (self.first + count - line < self.margin_lines
+                       and self.first + count < document.line_count)
+        if line < self.first or line >= self.first + count or near_top or near_bottom:
+            self.fill(line - self.window_lines // 2)
+        self.text.yview(f'{line - self.first + 1}.0')
+
+    def yview(self, *args):
+        """Scrollbar command: 'moveto' fractions refer to the whole document."""
+        if self.document is None or not args or args[0] != 'moveto':
+            return self.text.yview(*args)
+        self.show(int(float(args[1]) * self.document.line_count))
+
+    def scroll_fractions(self, first, last):
+        """Map the widget's yscrollcommand fractions onto the document.
+
+        Also schedules a refill when the view has come close to an edge of
+        the window, as scrolling by units or pages and moving the cursor
+        never leave the widget.
+        """
+        if self.document is None:
+            return first, last
+        first, last = float(first), float(last)
+        count = self.tracker.line_count()
+        total = max(self.document.line_count, 1)
+        top = first * count
+        bottom = last * count
+        if self._recenter_job is None and (
+            (top < self.margin_lines and self.first > 0)
+            or (count - bottom < self.margin_lines and self.first + count < total)
+        ):
+            self._recenter_job = self.text.after_idle(self._recenter)
+        return (self.first + top) / total, (self.first + bottom) / total
+
+    def _recenter(self):
+        self._recenter_job = None
+        if self.document is None:
+            return
+        top = int(str(self.tracker.call('index', '@0,0')).split('.')[0]) - 1
+        self.show(self.first + top)
+
+    def _on_edit(self, first, removed, added):
+        """Copy the lines an edit of the widget touched into the document."""
+        if self.document is None or self.filling:
+            return
+        lines = str(self.tracker.call('get', f'{first + 1}.0', f'{first + added}.end'))
+        self.document.replace_lines(self.first + first, removed, lines.split('\n'))
+
+    def get_text(self) -> str:
+        """The whole document, or the widget's text when inactive."""
+        if self.document is None:
+            return str(self.tracker.call('get', '1.0', 'end-1c'))
+        return self.document.get_text()
+
+    def write_to(self, f):
+        """Write the whole document, or the widget's text when inactive, to ``f``."""
+        if self.document is None:
+            f.write(self.get_text())
+        else:
+            self.document.write_to(f)
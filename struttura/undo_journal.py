@@ -0,0 +1,198 @@
+"""Memory-bounded undo journal for the code editors.
+
+Tk's own undo keeps every edit for the whole session.  The journal instead
+records each edit as a compact delta (position, removed text, inserted text),
+merges keystrokes into word-level steps, and keeps its size under a cap:
+once the cap is exceeded the older half of the history is squashed into a
+single checkpoint step, composing edits that chain into one delta, and if
+that is not enough the oldest steps are dropped.
+
+Positions are (line, column) pairs in document coordinates, with 0-based
+lines, so the journal works the same whether the editor holds the whole
+document or only a window of it.
+"""
+
+from typing import List, NamedTuple, Optional
+
+# Default memory cap of a journal, in bytes
+DEFAULT_MAX_BYTES = 4 * 1024 * 1024
+
+# Approximate size of an edit besides its text
+EDIT_BYTES = 64
+
+
+class Edit(NamedTuple):
+    """Replacement of ``removed`` at (line, column) with ``inserted``."""
+    line: int
+    column: int
+    removed: str
+    inserted: str
+
+    def inverse(self) -> 'Edit':
+        return Edit(self.line, self.column, self.inserted, self.removed)
+
+    def size(self) -> int:
+        return EDIT_BYTES + len(self.removed) + len(self.inserted)
+
+
+def _is_word(char):
+    return char.isalnum() or char == '_'
+
+
+def compose(first: Edit, second: Edit) -> Optional[Edit]:
+    """
+    Combine two consecutive edits into one, when possible.
+
+    ``second`` must touch the text ``first`` inserted, on the same line;
+    returns None otherwise.
+    """
+    if first.line != second.line or '\n' in first.inserted or '\n' in second.removed:
+        return None
+    start, stop = first.column, first.column + len(first.inserted)
+    second_stop = second.column + len(second.removed)
+    if second.column > stop or second_stop < start:
+        return None
+
+    # Text of the union of both spans after the first edit: the first
+    # edit's insertion, surrounded by text the second edit removed
+    low = min(start, second.column)
+    high = max(stop, second_stop)
+    between = ''.join(
+        first.inserted[pos - start] if start <= pos < stop else second.removed[pos - second.column]
+        for pos in range(low, high)
+    )
+    removed = between[:start - low] + first.removed + between[stop - low:]
+    inserted = between[:second.column - low] + second.inserted + between[second_stop - low:]
+    return Edit(first.line, low, removed, inserted)
+
+
+def _squash(steps):
+    """Concatenate ``steps`` into one, composing the edits that chain."""
+    edits = []
+    for step in steps:
+        for edit in step:
+            if edits:
+                composed = compose(edits[-1], edit)
+                if composed is not None:
+                    edits.pop()
+                    if composed.removed or composed.inserted:
+                        edits.append(composed)
+                    continue
+            edits.append(edit)
+    return edits
+
+
+class UndoJournal:
+    """
+    Undo and redo history of one document.
+
+    Call :meth:`record` after every edit and :meth:`separator` where the
+    current step must end (cursor jumps, loading a file).  :meth:`undo` and
+    :meth:`redo` return the edits to apply to the document, in order.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._undo: List[List[Edit]] = []
+        self._redo: List[List[Edit]] = []
+        self._memory = 0
+        # Whether the last undo step may still absorb typing
+        self._open = False
+
+    @property
+    def memory(self) -> int:
+        """Approximate size of the history, in bytes."""
+        return self._memory
+
+    def can_undo(self) -> bool:
+        return bool(self._undo)
+
+    def can_redo(self) -> bool:
+        return bool(self._redo)
+
+    def __len__(self):
+        return len(self._undo)
+
+    def clear(self):
+        self._undo.clear()
+        self._redo.clear()
+        self._memory = 0
+        self._open = False
+
+    def separator(self):
+        """End the current undo step."""
+        self._open = False
+
+    def record(self, line, column, removed, inserted):
+        """Record that ``removed`` at (line, column) was replaced by ``inserted``."""
+        if not removed and not inserted:
+            return
+        edit = Edit(line, column, removed, inserted)
+        for step in self._redo:
+            self._memory -= sum(e.size() for e in step)
+        self._redo.clear()
+
+        typed = len(removed) + len(inserted) == 1 and removed != '\n' and inserted != '\n'
+        if typed and self._open and self._continues(self._undo[-1][-1], edit):
+            step = self._undo[-1]
+            composed = compose(step[-1], edit)
+            if composed is not None:
+                self._memory += composed.size() - step[-1].size()
+                step[-1] = composed
+                self._enforce_cap()
+                return
+        self._undo.append([edit])
+        self._memory += edit.size()
+        self._open = typed
+        self._enforce_cap()
+
+    @staticmethod
+    def _continues(last, edit):
+        """Whether the keystroke ``edit`` belongs to the same word as ``last``."""
+        if edit.inserted:
+            # Typing goes on at the end of the text typed so far; a word
+            # character after a non-word character starts a new step
+            return (not last.removed and last.line == edit.line
+                    and edit.column == last.column + len(last.inserted)
+                    and not (_is_word(edit.inserted) and not _is_word(last.inserted[-1])))
+        # Backspace or Delete, continuing a run of deletions
+        return (not last.inserted and last.line == edit.line
+                and edit.column in (last.column - 1, last.column))
+
+    def _enforce_cap(self):
+        if self._memory <= self.max_bytes:
+            return
+        # Squash the older half of the history into one checkpoint step
+        count = len(self._undo) // 2
+        if count >= 2:
+            checkpoint = _squash(self._undo[:count])
+            self._undo[:count] = [checkpoint] if checkpoint else []
+            self._recount()
+        # Then drop the oldest steps, checkpoint first, until under the cap
+        while self._memory > self.max_bytes and self._redo:
+            self._memory -= sum(e.size() for e in self._redo.pop(0))
+        while self._memory > self.max_bytes and self._undo:
+            self._memory -= sum(e.size() for e in self._undo.pop(0))
+        if not self._undo:
+            self._open = False
+
+    def _recount(self):
+        self._memory = sum(e.size() for steps in (self._undo, self._redo) for step in steps for e in step)
+
+    def undo(self) -> List[Edit]:
+        """Pop the last step; returns the edits that revert it."""
+        self._open = False
+        if not self._undo:
+            return []
+        step = self._undo.pop()
+        self._redo.append(step)
+        return [edit.inverse() for edit in reversed(step)]
+
+    def redo(self) -> List[Edit]:
+        """Pop the last undone step; returns the edits that reapply it."""
+        self._open = False
+        if not self._redo:
+            return []
+        step = self._redo.pop()
+        self._undo.append(step)
+        return list(step)
@@ -0,0 +1,185 @@
+"""Viewport-first syntax highlighting for tk.Text widgets.
+
+Only the visible lines (plus a margin) are lexed and tagged right away; the
+rest of the document is filled in from ``after_idle`` callbacks that each
+stop after a few milliseconds, working in the direction the user last
+scrolled.
+"""
+
+import queue
+import time
+
+from .highlighter import apply_tag_ranges, group_line_tokens
+
+# Lines above and below the viewport that are tagged with it
+VIEW_MARGIN = 40
+# Time budget of one background slice, well under one frame at 60 Hz
+SLICE_SECONDS = 0.008
+# Lines lexed or tagged per step of a background slice
+STEP_LINES = 200
+# The viewport pass lexes synchronously only if it is this close to the
+# first dirty line; further down the background slices catch up instead
+SYNC_LEX_LINES = 1500
+# How often results from a LexWorker are collected
+POLL_MS = 15
+
+
+class ViewportHighlighter:
+    """
+    Drives an :class:`~struttura.highlighter.IncrementalHighlighter` for a
+    tk.Text, tagging what is on screen first.
+
+    Args:
+        text_widget: The tk.Text to highlight
+        highlighter: The per-line token cache, fed by an EditTracker
+        style_map: The :class:`~struttura.syntax_theme.TokenStyleMap` whose
+            tags are applied; they must already be configured on the widget
+        worker: Optional :class:`~struttura.lex_worker.LexWorker`; when
+            given, background lexing runs on its thread and this side only
+            merges and tags the results
+    """
+
+    def __init__(self, text_widget, highlighter, style_map, worker=None):
+        self.text = text_widget
+        self.highlighter = highlighter
+        self.style_map = style_map
+        self.worker = worker
+        self._fill_job = None
+        self._poll_job = None
+        self._submitted = None
+        self._last_first = 0
+        self._direction = 1
+
+    def _get_lines(self, start, stop):
+        """Return the text of lines [start, stop) (0-based)"""
+        return self.text.get(f'{start + 1}.0', f'{stop}.0 lineend').split('\n')
+
+    def visible_range(self):
+        """Half-open, 0-based range of the visible lines plus the margin."""
+        first = int(self.text.index('@0,0').split('.')[0]) - 1
+        last = int(self.text.index(f'@0,{self.text.winfo_height()}').split('.')[0])
+        if first != self._last_first:
+            self._direction = 1 if first > self._last_first else -1
+            self._last_first = first
+        count = self.highlighter.line_count
+        return max(0, first - VIEW_MARGIN), min(count, last + VIEW_MARGIN)
+
+    def refresh(self):
+        """
+        Highlight the visible lines now and schedule the rest.
+
+        Call this after edits and whenever the view scrolls or resizes.
+        """
+        first, last = self.visible_range()
+        highlighter = self.highlighter
+        if highlighter.is_dirty() and last - highlighter.lexed_until() <= SYNC_LEX_LINES:
+            highlighter.relex(self._get_lines, stop=last)
+        self.tag_lines(first, last)
+        self.schedule_fill()
+
+    def schedule_fill(self):
+        if self._fill_job is None:
+            self._fill_job = self.text.after_idle(self._fill)
+
+    def cancel(self):
+        if self._fill_job is not None:
+            self.text.after_cancel(self._fill_job)
+            self._fill_job = None
+        if self._poll_job is not None:
+            self.text.after_cancel(self._poll_job)
+            self._poll_job = None
+
+    def _submit(self):
+        """Hand the dirty lines to the worker once per buffer generation."""
+        if self._submitted != self.highlighter.generation:
+            self._submitted = self.worker.submit(self.highlighter, self._get_lines)
+        if self._poll_job is None:
+            self._poll_job = self.text.after(POLL_MS, self._poll)
+
+    def _poll(self):
+        """Merge worker results for the current generation, drop the rest."""
+        self._poll_job = None
+        highlighter = self.highlighter
+        results = self.worker.results
+        deadline = time.perf_counter() + SLICE_SECONDS
+        merged = False
+        while time.perf_counter() < deadline:
+            try:
+                generation, start, line_tokens, end_states, converged, done = results.get_nowait()
+            except queue.Empty:
+                break
+            if generation == highlighter.generation:
+                merged = highlighter.merge(start, line_tokens, end_states, converged) or merged
+        if merged:
+            first, last = self.visible_range()
+            self.tag_lines(first, last)
+            self.schedule_fill()
+        if highlighter.is_dirty() or not results.empty():
+            self._submit()
+
+    def tag_lines(self, start, stop):
+        """Tag the pending, already lexed lines in [start, stop)"""
+        highlighter = self.highlighter
+        stop = min(stop, highlighter.lexed_until())
+        applied = highlighter.applied
+        line = highlighter.next_pending(start)
+        while 0 <= line < stop:
+            run_end = applied.find(1, line, stop)
+            if run_end < 0:
+                run_end = stop
+            self._apply(line, run_end)
+            line = highlighter.next_pending(run_end)
+
+    def _apply(self, start, stop):
+        style_map = self.style_map
+        ranges = group_line_tokens(self.highlighter.tokens, start, stop, style_map.tag_for)
+        apply_tag_ranges(
+            self.text, ranges, clear=style_map.tags,
+            start=f'{start + 1}.0', end=f'{stop}.0 lineend'
+        )
+        self.highlighter.mark_applied(start, stop)
+
+    def _fill(self):
+        """Background slice: lex and tag until the time budget runs out."""
+        self._fill_job = None
+        deadline = time.perf_counter() + SLICE_SECONDS
+        first, last = self.visible_range()
+        while time.perf_counter() < deadline:
+            if not self._fill_step(first, last):
+                return
+        self._fill_job = self.text.after_idle(self._fill)
+
+    def _fill_step(self, first, last):
+        """Do one bounded unit of work; False once everything is tagged."""
+        highlighter = self.highlighter
+        if highlighter.is_dirty():
+            if self.worker is not None:
+                # The worker lexes; keep tagging what is already lexed
+                self._submit()
+            else:
+                # Lexing has to proceed top-down, a chunk at a time; keep
+                # what is on screen in sync as it goes
+                lo = highlighter.lexed_until()
+                highlighter.relex(self._get_lines, stop=lo + STEP_LINES)
+                self.tag_lines(first, last)
+                return True
+
+        # Tag what is lexed: the viewport, then the side the user is
+        # scrolling towards, then the other one
+        limit = highlighter.lexed_until()
+        line = highlighter.next_pending(first)
+        if 0 <= line < min(last, limit):
+            self.tag_lines(line, last)
+            return True
+        for forward in ((True, False) if self._direction > 0 else (False, True)):
+            if forward:
+                line = highlighter.next_pending(last)
+                if 0 <= line < limit:
+                    self.tag_lines(line, line + STEP_LINES)
+                    return True
+            else:
+                line = highlighter.next_pending(min(first, limit), forward=False)
+                if line >= 0:
+                    self.tag_lines(max(0, line + 1 - STEP_LINES), line + 1)
+                    return True
+        return False
@@ -0,0 +1,194 @@
+"""Line-by-line index of the keys of a block-style YAML file.
+
+Configuration files are block-style YAML: nested mappings, lists and
+scalars with one ``key: value`` per line.  :class:`YamlLineParser` reads
+such a file one line at a time, with an immutable state between lines, so
+:class:`~struttura.live_document.LiveDocument` can re-parse just the lines
+an edit touched instead of the whole document.  Scalars keep their source
+text and are only converted by PyYAML when read through a
+:class:`YamlView`.
+"""
+
+import re
+import sys
+
+import yaml
+
+_KEY = re.compile(r'''
+    (?: "(?P<double>(?:\\.|[^"\\])*)"
+      | '(?P<single>(?:''|[^'])*)'
+      | (?P<plain>[^\s#'"\[\]{},:&*!|>%@`-][^#:]*?|-[^\s#:][^#:]*?)
+    )[ \t]*:(?:[ \t]+|$)
+''', re.VERBOSE)
+
+
+def _strip_comment(value):
+    """Remove a trailing ``# comment`` from a scalar, minding quotes."""
+    if value[:1] in ('"', "'"):
+        quote = value[0]
+        close = 1
+        while True:
+            close = value.find(quote, close)
+            if close < 0:
+                return value
+            if quote == "'" and value[close + 1:close + 2] == "'":
+                close += 2
+                continue
+            if quote == '"' and value[close - 1] == '\\':
+                close += 1
+                continue
+            break
+        start = close + 1
+    else:
+        start = 0
+    hash_pos = value.find(' #', start)
+    if hash_pos >= 0:
+        value = value[:hash_pos]
+    return value.rstrip()
+
+
+def scalar(raw):
+    """The value of a scalar's source text, or the text itself if it does not parse."""
+    try:
+        return yaml.safe_load(raw)
+    except yaml.YAMLError:
+        return raw
+
+
+class YamlLineParser:
+    """
+    Parses block-style YAML one line at a time.
+
+    The state between lines is an immutable tuple (open keys, scalar
+    indent): the (indent, key) pairs of the mappings and list items
+    enclosing the next line, and the indent of a key whose value may
+    continue on more indented lines.  :meth:`parse_line` returns a row
+    (path, raw) for key lines, where ``path`` is the tuple of keys leading
+    to the key (list items appear as '-') and ``raw`` is the value's source
+    text, empty when the value is a nested block.  Lines that cannot be
+    read give a row (None, message).
+    """
+
+    initial_state = ((), None)
+
+    def key(self, row):
+        return row[0]
+
+    def parse_line(self, line, state):
+        stack, scalar_indent = state
+        content = line.rstrip()
+        stripped = content.lstrip(' ')
+        if not stripped:
+            return None, state
+        indent = len(content) - len(stripped)
+        if scalar_indent is not None:
+            if indent > scalar_indent:
+                # Continuation of a multi-line scalar
+                return None, state
+            state = (stack, None)
+        first = stripped[0]
+        if first == '#':
+            return None, state
+        if indent == 0 and (stripped.startswith('---') or stripped.startswith('...')):
+            return None, ((), None)
+        if first == '\t':
+            return (None, 'tabs are not allowed in indentation'), state
+
+        while stack and stack[-1][0] >= indent:
+            stack = stack[:-1]
+        # List items, possibly nested on one line ("- - x")
+        item_indent = None
+        while stripped == '-' or stripped.startswith('- '):
+            item_indent = indent
+            stack += ((indent, '-'),)
+            rest = stripped[1:].lstrip(' ')
+            indent += len(stripped) - len(rest)
+            stripped = rest
+            if not stripped:
+                return None, (stack, None)
+
+        m = _KEY.match(stripped)
+        if m is None:
+            if item_indent is not None or stripped[0] in '[{':
+                # A scalar list item or a flow collection
+                return None, (stack, item_indent if item_indent is not None else indent)
+            return (None, 'expected "key: value"'), (stack, indent)
+
+        key = m.group('plain')
+        if key is None:
+            key = m.group('double')
+            if key is None:
+                key = m.group('single').replace("''", "'")
+            else:
+                key = scalar(f'"{key}"')
+        key = sys.intern(key.rstrip())
+        path = tuple(name for _, name in stack) + (key,)
+        value = _strip_comment(stripped[m.end():])
+        if not value:
+            # A nested block follows
+            return (path, ''), (stack + ((indent, key),), None)
+        return (path, value), (stack, indent)
+
+
+class YamlView:
+    """
+    Read-only mapping over the keys of a LiveDocument parsed by
+    YamlLineParser; nested blocks are views as well.  Plain scalars are
+    read from their key's line; block scalars and quoted scalars running
+    over several lines are read from the document.
+    """
+
+    def __init__(self, document, path=()):
+        self.document = document
+        self.path = path
+
+    def __contains__(self, key):
+        return self.path + (key,) in self.document
+
+    def __getitem__(self, key):
+        path = self.path + (key,)
+        row = self.document.get(path)
+        if row is None:
+            raise KeyError(key)
+        raw = row[1]
+        if not raw:
+            return YamlView(self.document, path)
+        if raw[0] not in '|>':
+            try:
+                return yaml.safe_load(raw)
+            except yaml.YAMLError:
+                if raw[0] not in '"\'':
+                    return raw
+        # A block scalar, or a quoted one continued on the next lines
+        return self._read_value(row)
+
+    def _read_value(self, row):
+        """The value of a block or quoted scalar, which may span lines;
+        finds the row's line by scanning the document."""
+        document = self.document
+        line = document.line_of(row)
+        # Lines indented past the key continue its value
+        indent = document.states[line][1]
+        lines = [document.get_lines(line, line + 1)[0][indent:]]
+        start = line + 1
+        while start < document.line_count:
+            stop = min(start + 64, document.line_count)
+            for text in document.get_lines(start, stop):
+                if text.strip() and len(text) - len(text.lstrip(' ')) <= indent:
+                    stop = None
+                    break
+                lines.append(text[indent:])
+            if stop is None:
+                break
+            start = stop
+        try:
+            value = yaml.safe_load('\n'.join(lines) + '\n')
+        except yaml.YAMLError:
+            return row[1]
+        return next(iter(value.values())) if isinstance(value, dict) else row[1]
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
@@ -0,0 +1,135 @@
+import io
+import json
+
+from struttura.cli import is_command, main
+from struttura.template_store import TemplateStore
+
+VALID = '''#define MOTHERBOARD BOARD_RAMPS_14_EFB
+#define BAUDRATE 250000
+#define EXTRUDERS 1
+//#define BLTOUCH
+'''
+
+
+def run(argv):
+    out = io.StringIO()
+    status = main(argv, out)
+    lines = [json.loads(line) for line in out.getvalue().splitlines()]
+    return status, lines[:-1], lines[-1]
+
+
+def test_commands_are_told_from_the_editor():
+    assert is_command(['validate', 'Configuration.h'])
+    assert not is_command([])
+    assert not is_command(['Configuration.h'])
+
+
+def test_validate_reports_each_file_and_a_summary(tmp_path):
+    (tmp_path / 'Configuration.h').write_text(VALID)
+    (tmp_path / 'broken').mkdir()
+    (tmp_path / 'broken' / 'Configuration.h').write_text(VALID.replace('250000', '12345'))
+    status, results, summary = run(['validate', '-j', '2', str(tmp_path)])
+    assert status == 1
+    assert summary['summary'] == 'validate' and summary['files'] == 2 and summary['failed'] == 1
+    assert summary['files_per_second'] > 0
+    by_file = {result['file']: result for result in results}
+    assert by_file[str(tmp_path / 'Configuration.h')]['valid']
+    broken = by_file[str(tmp_path / 'broken' / 'Configuration.h')]
+    assert not broken['ok'] and broken['errors']
+
+    status, results, summary = run(['validate', '-j', '1', str(tmp_path / 'Configuration.h')])
+    assert status == 0 and summary['failed'] == 0 and results[0]['ok']
+
+
+def test_convert_writes_the_options_in_effect(tmp_path):
+    header = tmp_path / 'Configuration.h'
+    header.write_text(VALID + '#if EXTRUDERS > 1\n  #define SWITCHING_EXTRUDER\n#endif\n')
+    status, results, _ = run(['convert', '-j', '1', '--format', 'json',
+                              '-o', str(tmp_path / 'out'), str(header)])
+    assert status == 0
+    with open(results[0]['output']) as f:
+        data = json.load(f)
+    options = {name: value for section in data.values() for name, value in section.items()}
+    assert options == {'MOTHERBOARD': 'BOARD_RAMPS_14_EFB', 'BAUDRATE': 250000, 'EXTRUDERS': 1}
+    assert results[0]['options'] == 3
+
+    status, results, _ = run(['stats', '-j', '1', str(header)])
+    assert status == 0
+    assert results[0]['options'] == 5 and results[0]['enabled'] == 4 and results[0]['in_effect'] == 3
+
+    # Defined before, so the name is in effect, but not by this line
+    header.write_text(VALID + '#if 0\n  #define BAUDRATE 115200\n#endif\n')
+    status, results, _ = run(['stats', '-j', '1', str(header)])
+    assert status == 0
+    assert results[0]['enabled'] == 4 and results[0]['in_effect'] == 3 and results[0]['inactive_lines'] == 1
+
+
+def test_diff_pairs_files_by_option(tmp_path):
+    old = tmp_path / 'old.h'
+    new = tmp_path / 'new.h'
+    old.write_text(VALID)
+    new.write_text(VALID.replace('250000', '115200').replace('//#define BLTOUCH', '#define BLTOUCH'))
+    status, results, summary = run(['diff', str(old), str(new)])
+    assert status == 0 and summary['files'] == 1
+    result = results[0]
+    assert result['changed_blocks'] == 2 and result['added_lines'] == 2
+    assert [(option['change'], option['name']) for option in result['options']] == [
+        ('changed', 'BAUDRATE'), ('enabled', 'BLTOUCH')]
+
+
+def test_convert_keeps_the_paths_of_same_named_files(tmp_path):
+    for printer in ('ender3', 'prusa'):
+        (tmp_path / 'in' / printer).mkdir(parents=True)
+        (tmp_path / 'in' / printer / 'Configuration.h').write_text(VALID)
+    out = tmp_path / 'out'
+    status, results, summary = run(['convert', '-j', '1', '-o', str(out), str(tmp_path / 'in')])
+    assert status == 0 and summary['failed'] == 0
+    assert sorted(result['output'] for result in results) == [
+        str(out / 'ender3' / 'Configuration.yaml'), str(out / 'prusa' / 'Configuration.yaml')]
+
+    # Files given one by one would be written over each other
+    status, results, summary = run(['convert', '-j', '1', '-o', str(out),
+                                    str(tmp_path / 'in' / 'ender3' / 'Configuration.h'),
+                                    str(tmp_path / 'in' / 'prusa' / 'Configuration.h')])
+    assert status == 1 and summary['failed'] == 1
+    clash = next(result for result in results if not result['ok'])
+    assert clash['file'] == str(tmp_path / 'in' / 'prusa' / 'Configuration.h')
+
+
+def test_build_templates_writes_the_library(tmp_path):
+    source = tmp_path / 'source'
+    (source / 'base' / '2.1').mkdir(parents=True)
+    (source / 'base' / '2.1' / 'Configuration.h').write_text(VALID)
+    (source / 'Creality' / 'Ender-3').mkdir(parents=True)
+    (source / 'Creality' / 'Ender-3' / 'template.yaml').write_text('board: BOARD_CREALITY_V4\nmarlin: "2.1"\n')
+    (source / 'Creality' / 'Ender-3' / 'Configuration.h').write_text(VALID.replace('250000', '115200'))
+    store = tmp_path / 'printers.mct'
+    out = io.StringIO()
+    assert is_command(['build-templates', str(source)])
+    assert main(['build-templates', '-o', str(store), str(source)], out) == 0
+    assert json.loads(out.getvalue())['templates'] == 1
+    assert TemplateStore(str(store)).materialize('Creality/Ender-3')['Configuration.h'] == \
+        VALID.replace('250000', '115200')
+
+    out = io.StringIO()
+    assert main(['build-templates', '-o', str(store), str(tmp_path / 'missing')], out) == 1
+    assert not json.loads(out.getvalue())['ok']
+
+
+def test_lazy_validation_parses_only_the_sections_read(tmp_path):
+    header = tmp_path / 'Configuration.h'
+    header.write_text('//#define LANGUAGE en\n// @section machine\n' + VALID
+                      + '// @section extras\n#define CUSTOM_NAME "Ender"\n')
+    status, results, _ = run(['validate', '-j', '1', '--lazy', str(header)])
+    assert status == 0 and results[0]['valid']
+    # Nothing the rules read is defined in the first section or in extras
+    assert results[0]['sections_parsed'] == 1
+
+    header.write_text(VALID.replace('250000', '12345'))
+    status, results, _ = run(['validate', '-j', '1', '--lazy', str(header)])
+    assert status == 1 and results[0]['errors'] == run(['validate', '-j', '1', str(header)])[1][0]['errors']
+
+    config = tmp_path / 'config.yaml'
+    config.write_text('configuration:\n  firmware_name: Marlin\npins: {}\ntemperature: {}\nmotion: {}\n')
+    status, results, _ = run(['validate', '-j', '1', '--lazy', str(config)])
+    assert status == 1 and results[0]['errors'] == ['Missing required configuration: firmware_version']
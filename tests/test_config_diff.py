@@ -0,0 +1,103 @@
+import random
+
+from struttura.config_diff import (
+    ADDED, CHANGED, DELETE, DISABLED, ENABLED, EQUAL, INSERT, MOVED, REMOVED, REPLACE,
+    diff_lines, diff_options, diff_projects, side_by_side,
+)
+from struttura.config_parser import parse_config
+
+
+def check(a, b, opcodes):
+    """Opcodes must cover both sides in order and turn ``a`` into ``b``."""
+    i = j = 0
+    result = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        assert (i1, j1) == (i, j)
+        if tag == EQUAL:
+            assert a[i1:i2] == b[j1:j2]
+            result += a[i1:i2]
+        else:
+            result += b[j1:j2]
+        i, j = i2, j2
+    assert (i, j) == (len(a), len(b))
+    assert result == b
+
+
+def test_line_diff_anchors_on_unique_lines():
+    a = ['#if A', '#define X 1', '#endif', '', '#if B', '#define Y 2', '#endif', '']
+    b = ['#if B', '#define Y 3', '#endif', '', '#if A', '#define X 1', '#endif', '']
+    opcodes = diff_lines(a, b)
+    check(a, b, opcodes)
+    # As many lines kept as any diff can
+    assert sum(i2 - i1 for tag, i1, i2, _, _ in opcodes if tag == EQUAL) == 4
+    assert diff_lines([], ['x']) == [(INSERT, 0, 0, 0, 1)]
+    assert diff_lines(['x', 'y'], ['x']) == [(EQUAL, 0, 1, 0, 1), (DELETE, 1, 2, 1, 1)]
+
+    rng = random.Random(7)
+    for _ in range(500):
+        a = [rng.choice('abcdef') for _ in range(rng.randint(0, 30))]
+        b = list(a)
+        for _ in range(rng.randint(0, 5)):
+            position = rng.randint(0, len(b))
+            if b and rng.random() < 0.5:
+                del b[min(position, len(b) - 1)]
+            else:
+                b.insert(position, rng.choice('abcxyz'))
+        check(a, b, diff_lines(a, b))
+
+
+def test_side_by_side_rows():
+    rows = side_by_side(diff_lines(['a', 'b', 'c', 'd'], ['a', 'x', 'y', 'd', 'e']))
+    assert rows == [(0, 0, EQUAL), (1, 1, REPLACE), (2, 2, REPLACE), (3, 3, EQUAL), (None, 4, INSERT)]
+    rows = side_by_side(diff_lines(['a', 'b', 'c'], ['a', 'x']))
+    assert rows == [(0, 0, EQUAL), (1, 1, REPLACE), (2, None, REPLACE)]
+
+
+BEFORE = '''#define BAUDRATE 250000
+//#define BLTOUCH
+#define EXTRUDERS 1
+#define DEFAULT_AXIS_STEPS_PER_UNIT { 80, 80, 400, 500 }
+#if EXTRUDERS > 1
+  #define SWITCHING_EXTRUDER
+#else
+  #define SWITCHING_EXTRUDER 0
+#endif
+#define X_BED_SIZE 200
+'''
+
+AFTER = '''#define BAUDRATE 115200
+#define BLTOUCH
+#define EXTRUDERS 1
+#define DEFAULT_AXIS_STEPS_PER_UNIT {80,80,400,500}
+#if EXTRUDERS > 1
+  //#define SWITCHING_EXTRUDER
+#else
+  #define SWITCHING_EXTRUDER 0
+#endif
+#define Y_BED_SIZE 200
+'''
+
+
+def test_option_diff_pairs_definitions_by_name():
+    changes = diff_options(parse_config(BEFORE), parse_config(AFTER))
+    assert [(change.kind, change.name) for change in changes] == [
+        (CHANGED, 'BAUDRATE'),
+        (ENABLED, 'BLTOUCH'),
+        # The array is written differently but holds the same values
+        (DISABLED, 'SWITCHING_EXTRUDER'),
+        (ADDED, 'Y_BED_SIZE'),
+        (REMOVED, 'X_BED_SIZE'),
+    ]
+    assert changes[0].before.raw == '250000' and changes[0].after.raw == '115200'
+    assert changes[2].after.line == 5
+
+
+def test_project_diff_finds_options_moved_between_files():
+    before = {'Configuration.h': parse_config('#define A 1\n#define B 2\n'),
+              'Configuration_adv.h': parse_config('#define C 3\n')}
+    after = {'Configuration.h': parse_config('#define A 1\n'),
+             'Configuration_adv.h': parse_config('#define C 3\n#define B 5\n')}
+    changes = diff_projects(before, after)
+    assert [(change.kind, change.name, change.before_file, change.after_file) for change in changes] == [
+        (MOVED, 'B', 'Configuration.h', 'Configuration_adv.h')]
+    assert changes[0].after.value == 5
@@ -0,0 +1,153 @@
+import io
+
+from struttura.config_parser import parse_config, parse_value
+
+SAMPLE = '''/**
+ * Marlin 3D Printer Firmware
+ * #define NOT_AN_OPTION
+ */
+#pragma once
+
+// @section machine
+
+#define MOTHERBOARD BOARD_RAMPS_14_EFB   // Board type
+//#define CUSTOM_MACHINE_NAME "3D Printer"
+#define BAUDRATE 250000
+#ifdef SERIAL_PORT_2
+  #define BAUDRATE_2 250000
+#endif
+
+// @section motion
+
+#define DEFAULT_AXIS_STEPS_PER_UNIT   { 80, 80, 400, 500 }
+#define DEFAULT_MAX_FEEDRATE          { 300, 300, 5, 25 } /* mm/s */
+#if ENABLED(DELTA)
+  #define DELTA_HEIGHT 250.00
+#elif ANY(COREXY, COREYZ)
+  #define CORE_FACTOR 1
+#else
+  #define BED_SIZE { \\
+    200, 200 }
+#endif
+#define NEED_HEX 0x1F
+#define TEMP_SENSOR_0 -1
+#define STRING_CONFIG_H_AUTHOR "(none, \\"default\\" config)"
+#define EXPR (X_BED_SIZE / 2)
+#define ENABLE_FLAG true
+#define MAX(a, b) ((a) > (b) ? (a) : (b))
+'''
+
+
+def test_options_and_their_state():
+    model = parse_config(SAMPLE, 'Configuration.h')
+    assert model.filename == 'Configuration.h'
+    assert 'NOT_AN_OPTION' not in model
+    assert 'MAX' not in model
+
+    board = model.get('MOTHERBOARD')
+    assert board.enabled and board.raw == 'BOARD_RAMPS_14_EFB' and board.value == 'BOARD_RAMPS_14_EFB'
+    assert board.comment == 'Board type'
+    assert board.section == 'machine'
+    assert (board.line, board.end) == (8, 9)
+
+    name = model.get('CUSTOM_MACHINE_NAME')
+    assert not name.enabled and name.value == '3D Printer'
+
+    steps = model.get('DEFAULT_AXIS_STEPS_PER_UNIT')
+    assert steps.value == (80, 80, 400, 500) and steps.section == 'motion'
+    feedrate = model.get('DEFAULT_MAX_FEEDRATE')
+    assert feedrate.value == (300, 300, 5, 25) and feedrate.comment == 'mm/s'
+
+
+def test_if_stack():
+    model = parse_config(SAMPLE)
+    assert model.get('BAUDRATE').conditions == ()
+    assert model.get('BAUDRATE_2').conditions == ('defined(SERIAL_PORT_2)',)
+    assert model.get('DELTA_HEIGHT').conditions == ('ENABLED(DELTA)',)
+    assert model.get('CORE_FACTOR').conditions == ('!(ENABLED(DELTA)) && (ANY(COREXY, COREYZ))',)
+    assert model.get('BED_SIZE').conditions == ('!(ENABLED(DELTA)) && !(ANY(COREXY, COREYZ))',)
+    assert model.get('NEED_HEX').conditions == ()
+
+
+def test_continued_definition_spans_lines():
+    model = parse_config(SAMPLE)
+    bed = model.get('BED_SIZE')
+    assert bed.raw == '{ 200, 200 }'
+    assert bed.value == (200, 200)
+    assert bed.end - bed.line == 2
+
+
+def test_parsed_values():
+    model = parse_config(SAMPLE)
+    assert model.get('DELTA_HEIGHT').value == 250.0
+    assert model.get('NEED_HEX').value == 31
+    assert model.get('TEMP_SENSOR_0').value == -1
+    assert model.get('STRING_CONFIG_H_AUTHOR').value == '(none, "default" config)'
+    assert model.get('EXPR').value == '(X_BED_SIZE / 2)'
+    assert model.get('ENABLE_FLAG').value is True
+    assert parse_value('') is None
+    assert parse_value('{ { 1, 2 }, "a,b", 3.5f, }') == ((1, 2), 'a,b', 3.5)
+    assert parse_value("'x'") == 'x'
+    assert parse_value('1000UL') == 1000
+
+
+def test_streams_from_a_file_and_indexes_names():
+    model = parse_config(io.StringIO(SAMPLE))
+    assert model.line_count == SAMPLE.count('\n') == parse_config(SAMPLE).line_count
+    assert model.as_dict()['BAUDRATE'] == 250000
+    assert 'CUSTOM_MACHINE_NAME' not in model.as_dict()
+    assert model.names()[:3] == ['MOTHERBOARD', 'CUSTOM_MACHINE_NAME', 'BAUDRATE']
+    assert [option.name for option in model.find_all('BAUDRATE')] == ['BAUDRATE']
+
+
+def test_definitions_continued_over_several_lines():
+    model = parse_config('#define TEMP_TABLE { \\\n  1, \\\n  2, \\\n  3 }\n#define AFTER 1\n')
+    table = model.get('TEMP_TABLE')
+    assert table.value == (1, 2, 3)
+    assert (table.line, table.end) == (0, 4)
+    assert model.get('AFTER').line == 4
+
+
+def test_names_are_interned_and_indexed():
+    first = parse_config(SAMPLE)
+    second = parse_config(SAMPLE)
+    assert first.column('name')[0] is second.column('name')[0]
+    assert first.get('BAUDRATE').section is second.get('BAUDRATE').section
+    assert first[first.index('BAUDRATE')].name == 'BAUDRATE'
+    assert first.index('NOT_DEFINED') is None
+
+
+def test_copies_share_columns_until_changed():
+    base = parse_config(SAMPLE)
+    variant = base.copy()
+    for field in ('name', 'raw', 'value', 'enabled', 'line'):
+        assert variant.column(field) is base.column(field)
+
+    baudrate = variant.index('BAUDRATE')
+    variant.set_raw(baudrate, '115200')
+    variant.set_enabled(variant.index('CUSTOM_MACHINE_NAME'), True)
+    assert variant.get('BAUDRATE').value == 115200
+    assert variant.get('CUSTOM_MACHINE_NAME').enabled
+    assert base.get('BAUDRATE').value == 250000
+    assert not base.get('CUSTOM_MACHINE_NAME').enabled
+    # Small changes are kept aside; the columns are still shared
+    assert variant.column('name') is base.column('name')
+    assert variant.as_dict()['BAUDRATE'] == 115200
+    assert list(variant)[baudrate].raw == '115200'
+
+    # Changing many options gives the variant its own columns
+    for i in range(len(variant)):
+        variant.set_enabled(i, False)
+    assert not any(variant.column('enabled'))
+    assert variant.column('enabled') is not base.column('enabled')
+    assert base.get('BAUDRATE').enabled
+
+
+def test_lookups_follow_enabled_state_of_duplicates():
+    model = parse_config('#if A\n  #define SPEED 1\n#else\n  //#define SPEED 2\n#endif\n')
+    variant = model.copy()
+    variant.set_enabled(0, False)
+    variant.set_enabled(1, True)
+    assert variant.get('SPEED').value == 2
+    assert model.get('SPEED').value == 1
+    assert [option.value for option in variant.find_all('SPEED')] == [1, 2]
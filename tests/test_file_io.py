@@ -0,0 +1,88 @@
+import os
+
+import pytest
+
+from struttura.config_parser import ConfigLineParser
+from struttura.file_io import CANCELLED, DONE, PROGRESS, Cancelled, FileTask, load_file, read_file, save_file
+from struttura.live_document import LiveDocument
+from struttura.marlin_lexer import MarlinConfigLexer
+from struttura.parse_cache import ParseCache, cache_version, make_entry
+from struttura.piece_table import PieceTable
+
+HEADER = '#pragma once\r\n#define BAUDRATE 250000\r\n//#define SPEED 5\r\n'
+
+
+def drain(task):
+    messages = []
+    while not messages or messages[-1][0] == PROGRESS:
+        messages.append(task.messages.get(timeout=5))
+    return messages
+
+
+def test_read_reports_progress_and_keeps_the_line_ending(tmp_path):
+    path = tmp_path / 'Configuration.h'
+    path.write_bytes(HEADER.encode('utf-8') * 100)
+    task = FileTask(read_file, str(path), 512)
+    content, newline = task.result(timeout=5)
+    assert content == HEADER.replace('\r\n', '\n') * 100
+    assert newline == '\r\n'
+    messages = drain(task)
+    fractions = [value for kind, value in messages if kind == PROGRESS]
+    assert len(fractions) > 5 and fractions == sorted(fractions) and fractions[-1] == 1.0
+    assert messages[-1][0] == DONE
+
+
+def test_load_parses_on_the_worker_or_takes_the_cache(tmp_path):
+    path = tmp_path / 'Configuration.h'
+    path.write_bytes(HEADER.encode('utf-8'))
+    cache = ParseCache(str(tmp_path / 'cache'))
+    version = cache_version(MarlinConfigLexer())
+    loaded = FileTask(load_file, str(path), cache, version).result(timeout=5)
+    assert not loaded.hit and loaded.newline == '\r\n'
+    rows, states, highlighting = loaded.parsed
+    assert highlighting is None
+    document = LiveDocument(ConfigLineParser(), None)
+    document.restore(rows, states)
+    assert document.get('BAUDRATE')[2] == 250000
+
+    cache.store(loaded.key, make_entry(document))
+    again = FileTask(load_file, str(path), cache, version).result(timeout=5)
+    assert again.hit and again.key == loaded.key and again.parsed[:2] == (rows, states)
+
+
+def test_save_replaces_the_file_atomically(tmp_path):
+    path = tmp_path / 'config.yaml'
+    path.write_text('old: 1\n', encoding='utf-8')
+    table = PieceTable('a: 1\nb: 2\n' * 1000)
+    snapshot = table.copy()
+    table.replace_lines(0, 1, ['edited: 1'])
+    FileTask(save_file, str(path), snapshot, '\r\n', 1000).result(timeout=5)
+    assert path.read_bytes() == b'a: 1\r\nb: 2\r\n' * 1000
+    assert os.listdir(str(tmp_path)) == ['config.yaml']
+
+
+def test_cancelled_save_leaves_the_old_file(tmp_path):
+    path = tmp_path / 'config.yaml'
+    path.write_text('old: 1\n', encoding='utf-8')
+    task = FileTask(save_file, str(path), 'new: 1\n' * 100000, '\n', 10)
+    task.cancel()
+    with pytest.raises(Cancelled):
+        task.result(timeout=5)
+    assert drain(task)[-1] == (CANCELLED, None)
+    assert path.read_text(encoding='utf-8') == 'old: 1\n'
+    assert os.listdir(str(tmp_path)) == ['config.yaml']
+
+
+def test_work_cancelled_after_its_last_checkpoint_is_done(tmp_path):
+    path = tmp_path / 'config.yaml'
+
+    def save_then_cancel(task):
+        save_file(task, str(path), 'new: 1\n')
+        # Escape pressed as the file was renamed into place
+        task.cancel()
+        return 'saved'
+
+    task = FileTask(save_then_cancel)
+    assert task.result(timeout=5) == 'saved'
+    assert drain(task)[-1] == (DONE, 'saved')
+    assert path.read_text(encoding='utf-8') == 'new: 1\n'
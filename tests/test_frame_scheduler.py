@@ -0,0 +1,68 @@
+from struttura.frame_scheduler import EDIT, RESIZE, SCROLL, FrameScheduler
+
+
+class Timers:
+    """Records after() calls instead of running a Tk event loop."""
+
+    def __init__(self):
+        self.jobs = {}
+        self.next_id = 0
+
+    def after(self, ms, callback):
+        self.next_id += 1
+        self.jobs[self.next_id] = (ms, callback)
+        return self.next_id
+
+    def after_cancel(self, job):
+        del self.jobs[job]
+
+
+def test_notifications_coalesce_into_one_pass():
+    timers = Timers()
+    scheduler = FrameScheduler(timers)
+    runs = []
+    scheduler.add_pass(runs.append)
+    for _ in range(20):
+        scheduler.notify(EDIT)
+    scheduler.notify(SCROLL)
+    assert len(timers.jobs) == 1
+    (ms, callback), = timers.jobs.values()
+    callback()
+    assert runs == [frozenset({EDIT, SCROLL})]
+
+
+def test_passes_only_run_for_their_kinds():
+    timers = Timers()
+    scheduler = FrameScheduler(timers)
+    validated = []
+    redrawn = []
+    scheduler.add_pass(validated.append, kinds=(EDIT,))
+    scheduler.add_pass(redrawn.append)
+    scheduler.notify(RESIZE)
+    scheduler.flush()
+    assert validated == []
+    assert redrawn == [frozenset({RESIZE})]
+
+
+def test_slow_passes_lengthen_the_edit_debounce():
+    timers = Timers()
+    scheduler = FrameScheduler(timers)
+    scheduler.last_duration = 0.1
+    scheduler.notify(EDIT)
+    (ms, _), = timers.jobs.values()
+    assert ms == 200
+    scheduler.notify(SCROLL)
+    (ms, _), = timers.jobs.values()
+    assert ms < 200
+
+
+def test_cancel_drops_pending_work():
+    timers = Timers()
+    scheduler = FrameScheduler(timers)
+    runs = []
+    scheduler.add_pass(runs.append)
+    scheduler.notify(EDIT)
+    scheduler.cancel()
+    scheduler.flush()
+    assert timers.jobs == {}
+    assert runs == []
@@ -0,0 +1,135 @@
+import random
+
+from pygments.lexer import RegexLexer
+from pygments.lexers import CppLexer
+from pygments.token import Comment
+
+from struttura.highlighter import (
+    IncrementalHighlighter, RegexLineLexer, group_line_tokens
+)
+
+SAMPLE = '''#pragma once
+/**
+ * Marlin 3D Printer Firmware
+ */
+#define CONFIGURATION_H_VERSION 02010300
+//#define MOTHERBOARD BOARD_RAMPS_14_EFB
+#if ENABLED(FOO) && BAR > 3
+  #define X_BED_SIZE 200 // comment
+  #define STRING_CONFIG_H_AUTHOR "(none, default config)"
+#endif
+#define DEFAULT_AXIS_STEPS_PER_UNIT   { 80, 80, 400, 500 }
+int x = 3; /* inline */ char c = 'a';
+'''
+
+
+def full_highlight(lines):
+    highlighter = IncrementalHighlighter(RegexLineLexer(CppLexer()))
+    highlighter.reset(len(lines))
+    highlighter.relex(lambda start, stop: lines[start:stop])
+    return highlighter
+
+
+def char_types(lines, highlighter):
+    types = {}
+    for line_no, tokens in enumerate(highlighter.tokens):
+        for start, end, ttype in tokens:
+            for col in range(start, end):
+                types[(line_no, col)] = ttype
+    return types
+
+
+def test_line_lexing_matches_pygments():
+    lines = (SAMPLE * 3).split('\n')
+    highlighter = full_highlight(lines)
+    text = '\n'.join(lines) + '\n'
+    offsets = [0]
+    for line in lines:
+        offsets.append(offsets[-1] + len(line) + 1)
+    expected = {}
+    line_no = 0
+    for index, ttype, value in RegexLexer.get_tokens_unprocessed(CppLexer(), text):
+        for k, char in enumerate(value):
+            pos = index + k
+            while offsets[line_no + 1] <= pos:
+                line_no += 1
+            if char != '\n':
+                expected[(line_no, pos - offsets[line_no])] = ttype
+    actual = char_types(lines, highlighter)
+    assert all(actual.get(key) == ttype for key, ttype in expected.items())
+
+
+def test_incremental_edits_match_full_relex():
+    random.seed(7)
+    lines = (SAMPLE * 10).split('\n')
+    highlighter = full_highlight(lines)
+    for _ in range(200):
+        i = random.randrange(len(lines))
+        op = random.choice(['insert', 'newline', 'delete'])
+        if op == 'insert':
+            col = random.randrange(len(lines[i]) + 1)
+            snippet = random.choice(['/*', '*/', '"', 'x', '#define A 1', '//'])
+            lines[i] = lines[i][:col] + snippet + lines[i][col:]
+            highlighter.splice(i, 1, 1)
+        elif op == 'newline':
+            col = random.randrange(len(lines[i]) + 1)
+            lines[i:i + 1] = [lines[i][:col], '', lines[i][col:]]
+            highlighter.splice(i, 1, 3)
+        else:
+            j = min(len(lines) - 1, i + random.randrange(3))
+            lines[i:j + 1] = [lines[i][:2] + lines[j][3:]]
+            highlighter.splice(i, j - i + 1, 1)
+        if random.random() < 0.5:
+            highlighter.relex(lambda start, stop: lines[start:stop])
+    highlighter.relex(lambda start, stop: lines[start:stop])
+    reference = full_highlight(lines)
+    assert highlighter.tokens == reference.tokens
+    assert highlighter.states == reference.states
+
+
+def test_relex_stops_when_state_converges():
+    lines = (SAMPLE * 20).split('\n')
+    highlighter = full_highlight(lines)
+    highlighter.splice(100, 1, 1)
+    assert highlighter.relex(lambda start, stop: lines[start:stop]) == (100, 101)
+
+
+def test_opening_block_comment_relexes_following_lines():
+    lines = ['int a;', 'int b;', 'int c;']
+    highlighter = full_highlight(lines)
+    lines[0] = 'int a; /* open'
+    highlighter.splice(0, 1, 1)
+    assert highlighter.relex(lambda start, stop: lines[start:stop]) == (0, 3)
+    assert highlighter.tokens[2] == [(0, 6, Comment.Multiline)]
+
+
+def test_line_tokens_grouped_per_tag():
+    lines = ['int a;', '', 'int b;']
+    highlighter = full_highlight(lines)
+    ranges = group_line_tokens(highlighter.tokens, 1, 3)
+    assert ranges['Token.Keyword.Type'] == ['3.0', '3.3']
+    assert ranges['Token.Punctuation'] == ['3.5', '3.6']
+
+
+def test_relex_can_stop_early_and_resume():
+    lines = (SAMPLE * 5).split('\n')
+    reference = full_highlight(lines)
+    highlighter = IncrementalHighlighter(RegexLineLexer(CppLexer()))
+    highlighter.reset(len(lines))
+    get_lines = lambda start, stop: lines[start:stop]
+    assert highlighter.relex(get_lines, stop=10) == (0, 10)
+    assert highlighter.lexed_until() == 10
+    while highlighter.is_dirty():
+        highlighter.relex(get_lines, stop=highlighter.lexed_until() + 7)
+    assert highlighter.tokens == reference.tokens
+
+
+def test_pending_lines_follow_edits():
+    lines = SAMPLE.split('\n')
+    highlighter = full_highlight(lines)
+    assert highlighter.next_pending(0) == 0
+    highlighter.mark_applied(0, len(lines))
+    assert highlighter.next_pending(0) == -1
+    highlighter.splice(5, 1, 2)
+    assert highlighter.next_pending(0) == 5
+    assert highlighter.next_pending(len(lines), forward=False) == 6
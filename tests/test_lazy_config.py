@@ -0,0 +1,77 @@
+from struttura.config_parser import parse_config
+from struttura.lazy_config import LazyConfig
+
+HEADER = '''/**
+ * // @section not_a_section
+ * #if NOT_A_BLOCK
+ */
+#pragma once
+#define CONFIGURATION_H_VERSION 02010200
+
+// @section machine
+
+#define BAUDRATE 250000  /* also /* here */
+#if ENABLED(DELTA)
+  #define DELTA_HEIGHT 250.00
+#else
+  //#define BED_SIZE 200
+#endif
+
+// @section motion
+
+#ifdef SERIAL_PORT_2
+  #define BAUDRATE 115200 // "/*"
+#endif
+#define STEPS { 80, 80, \\
+  400 }'''
+
+YAML = '''# Bundle
+---
+configuration:
+  firmware_name: Marlin
+  description: |
+    text: not a key
+"pins":
+  x: 1
+motion: {steps: 80}
+'''
+
+
+def write(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+def test_header_sections_match_full_parse(tmp_path):
+    with LazyConfig(write(tmp_path, 'Configuration.h', HEADER)) as config:
+        assert config.section_names() == [None, 'machine', 'motion']
+        assert config.materialized == []
+        assert config.line_count == parse_config(HEADER).line_count
+        assert [(block.condition, block.line, block.end) for block in config.blocks] == [
+            ('ENABLED(DELTA)', 10, 15), ('defined(SERIAL_PORT_2)', 18, 21)]
+
+        assert config.section('machine').get('DELTA_HEIGHT').conditions == ('ENABLED(DELTA)',)
+        assert config.materialized == ['machine']
+        assert list(config.model()) == list(parse_config(HEADER, config.path))
+
+
+def test_header_lookups_parse_only_the_sections_defining_a_name(tmp_path):
+    with LazyConfig(write(tmp_path, 'Configuration.h', HEADER)) as config:
+        assert config.get('STEPS').value == (80, 80, 400)
+        assert config.materialized == ['motion']
+        assert [option.value for option in config.find_all('BAUDRATE')] == [250000, 115200]
+        assert config['BAUDRATE'].line == 9
+        assert 'BED_SIZE' in config and 'BED' not in config
+        assert config.get('MISSING') is None
+        assert config.materialized == ['machine', 'motion']
+
+
+def test_yaml_top_level_keys(tmp_path):
+    with LazyConfig(write(tmp_path, 'config.yaml', YAML)) as config:
+        assert config.section_names() == ['configuration', 'pins', 'motion']
+        assert 'pins' in config and 'text' not in config
+        assert config['motion'] == {'steps': 80}
+        assert config.materialized == ['motion']
+        assert config['configuration']['description'] == 'text: not a key\n'
+        assert config.get('missing', 0) == 0
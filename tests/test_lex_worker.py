@@ -0,0 +1,69 @@
+from pygments.lexers import CppLexer
+
+from struttura.highlighter import IncrementalHighlighter, RegexLineLexer
+from struttura.lex_worker import LexWorker
+
+LINES = ('#define X 1 // c\n/* a\n b */\nint x;\n' * 300).split('\n')
+
+
+def make_highlighter(lines):
+    highlighter = IncrementalHighlighter(RegexLineLexer(CppLexer()))
+    highlighter.reset(len(lines))
+    return highlighter
+
+
+def drain(worker, highlighter):
+    while True:
+        generation, start, tokens, states, converged, done = worker.results.get(timeout=5)
+        if generation == highlighter.generation:
+            highlighter.merge(start, tokens, states, converged)
+            if done:
+                return
+
+
+def test_worker_results_match_synchronous_lexing():
+    lines = list(LINES)
+    highlighter = make_highlighter(lines)
+    get_lines = lambda start, stop: lines[start:stop]
+    highlighter.relex(get_lines, stop=20)
+    worker = LexWorker(highlighter.line_lexer)
+    worker.submit(highlighter, get_lines)
+    drain(worker, highlighter)
+    worker.stop()
+
+    reference = make_highlighter(lines)
+    reference.relex(get_lines)
+    assert not highlighter.is_dirty()
+    assert highlighter.tokens == reference.tokens
+    assert highlighter.states == reference.states
+
+
+def test_results_for_an_older_generation_are_not_merged():
+    lines = list(LINES)
+    highlighter = make_highlighter(lines)
+    get_lines = lambda start, stop: lines[start:stop]
+    worker = LexWorker(highlighter.line_lexer)
+    stale = worker.submit(highlighter, get_lines)
+    lines[0] = '/* unterminated'
+    highlighter.splice(0, 1, 1)
+    assert highlighter.generation != stale
+    worker.submit(highlighter, get_lines)
+    drain(worker, highlighter)
+    worker.stop()
+
+    reference = make_highlighter(lines)
+    reference.relex(get_lines)
+    assert highlighter.tokens == reference.tokens
+
+
+def test_merge_skips_lines_already_lexed():
+    lines = list(LINES)
+    highlighter = make_highlighter(lines)
+    get_lines = lambda start, stop: lines[start:stop]
+    worker = LexWorker(highlighter.line_lexer)
+    worker.submit(highlighter, get_lines)
+    highlighter.relex(get_lines, stop=400)
+    drain(worker, highlighter)
+    worker.stop()
+    assert not highlighter.is_dirty()
+    assert None not in highlighter.tokens
@@ -0,0 +1,137 @@
+from struttura.config_parser import ConfigLineParser, model_from_document, parse_config
+from struttura.live_document import LiveDocument
+from struttura.yaml_lines import YamlLineParser, YamlView
+
+HEADER = '''/**
+ * #define IN_COMMENT 1
+ */
+#define BAUDRATE 250000
+#if ENABLED(DELTA)
+  #define DELTA_HEIGHT 250.00
+#endif
+#define BED_SIZE { \\
+  200, 200 }
+//#define SPEED 5
+'''
+
+YAML = '''# Printer settings
+configuration:
+  firmware_name: Marlin   # shown on the LCD
+  firmware_version: "2.1.2"
+  description: a long text that
+    continues on the next line
+motion:
+  steps:
+    - axis: x
+      value: 80
+    - axis: y
+      value: 80
+notes: |
+  free text: not a key
+temperature: {hotend: 200}
+'''
+
+
+class Buffer:
+    """Lines of a document being edited, as the editor would hold them."""
+
+    def __init__(self, text):
+        self.lines = text.split('\n')
+
+    def get_lines(self, start, stop):
+        return self.lines[start:stop]
+
+    def edit(self, document, first, removed, new_lines):
+        self.lines[first:first + removed] = new_lines
+        document.splice(first, removed, len(new_lines))
+
+
+def open_document(parser, text):
+    buffer = Buffer(text)
+    document = LiveDocument(parser, buffer.get_lines)
+    document.reset(len(buffer.lines))
+    return buffer, document
+
+
+def rows_of(model):
+    return [tuple(option) for option in model]
+
+
+def test_incremental_parse_matches_full_parse():
+    buffer, document = open_document(ConfigLineParser(), HEADER)
+    assert rows_of(model_from_document(document)) == rows_of(parse_config(HEADER))
+    document.take_changes()
+
+    # Opening a block comment changes every line below it
+    buffer.edit(document, 3, 0, ['/*'])
+    assert 'BAUDRATE' not in document
+    buffer.edit(document, 3, 1, [])
+    assert 'BAUDRATE' in document
+
+    buffer.edit(document, 8, 1, ['  300, 300 }'])
+    buffer.edit(document, 4, 1, ['#if ENABLED(COREXY)'])
+    text = '\n'.join(buffer.lines)
+    assert rows_of(model_from_document(document)) == rows_of(parse_config(text))
+    assert document.get('BED_SIZE')[2] == (300, 300)
+    assert document.get('DELTA_HEIGHT')[5] == ('ENABLED(COREXY)',)
+
+
+def test_edits_report_only_the_keys_they_touch():
+    buffer, document = open_document(ConfigLineParser(), HEADER)
+    document.take_changes()
+    buffer.edit(document, 3, 1, ['#define BAUDRATE 115200'])
+    assert document.take_changes() == {'BAUDRATE'}
+    assert document.take_changes() == set()
+    # Parsing stopped where the state converged
+    buffer.edit(document, 9, 1, ['#define SPEED 5'])
+    assert document.take_changes() == {'SPEED'}
+    assert document.get('SPEED')[3]
+
+
+def test_yaml_keys_by_path():
+    buffer, document = open_document(YamlLineParser(), YAML)
+    assert document.errors() == []
+    config = YamlView(document)
+    assert config['configuration']['firmware_name'] == 'Marlin'
+    assert config['configuration']['firmware_version'] == '2.1.2'
+    assert 'description' in config['configuration']
+    assert 'continues on the next line' not in document
+    assert ('motion', 'steps', '-', 'axis') in document
+    assert len(document.find_all(('motion', 'steps', '-', 'value'))) == 2
+    assert ('notes', 'free text') not in document
+    assert config['temperature'] == {'hotend': 200}
+    assert 'pins' not in config
+
+    document.take_changes()
+    buffer.edit(document, 3, 1, ['  firmware_version: "2.1.3"'])
+    assert document.take_changes() == {('configuration', 'firmware_version')}
+    assert config['configuration']['firmware_version'] == '2.1.3'
+
+    buffer.edit(document, 1, 1, ['configuration', ''])
+    assert [line for line, row in document.errors()] == [1]
+    assert ('configuration', 'firmware_name') not in document
+
+
+def test_yaml_values_over_several_lines():
+    buffer, document = open_document(YamlLineParser(), 'a:\n  text: |\n    one\n    two\n  quoted: "x\n    y"\nb: 1\n')
+    config = YamlView(document)
+    assert config['a']['text'] == 'one\ntwo\n'
+    assert config['a']['quoted'] == 'x y'
+    assert config['b'] == 1
+
+
+def test_error_lines_follow_splices():
+    buffer, document = open_document(YamlLineParser(), 'a: 1\nbad\nb: 2\nworse\nc: 3\n')
+    # Listing errors reads the lines kept with them, not the whole document
+    document.line_of = None
+    assert [line for line, row in document.errors()] == [1, 3]
+
+    buffer.edit(document, 0, 0, ['z: 0', 'y: 0'])
+    assert [line for line, row in document.errors()] == [3, 5]
+    assert document.errors(limit=1) == [(3, document.rows[3])]
+
+    buffer.edit(document, 3, 1, ['fixed: 1'])
+    assert [line for line, row in document.errors(limit=None)] == [5]
+
+    buffer.edit(document, 4, 2, [])
+    assert document.errors() == []
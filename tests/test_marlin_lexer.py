@@ -0,0 +1,130 @@
+import random
+
+from pygments.lexers import CppLexer
+from pygments.token import Comment, Name, Number, String
+
+from struttura.highlighter import IncrementalHighlighter, RegexLineLexer
+from struttura.marlin_lexer import IN_COMMENT, ROOT, MarlinConfigLexer, is_marlin_config
+
+SAMPLE = '''/**
+ * Marlin 3D Printer Firmware
+ */
+#pragma once
+
+#define CONFIGURATION_H_VERSION 02010300
+//#define MOTHERBOARD BOARD_RAMPS_14_EFB  // The board
+// @section machine
+#if ENABLED(FOO) && BAR > 3
+  #define X_BED_SIZE 200 // comment
+  #define Z_PROBE_OFFSET -1.5
+  #define STRING_CONFIG_H_AUTHOR "(none, default config)"
+  #define DEFAULT_AXIS_STEPS_PER_UNIT   { 80, 80, 400, 500 }
+#endif
+#include "Configuration_adv.h"
+#define LONG_MACRO (X_BED_SIZE / 2) /* half
+   the bed */ #define AFTER 1
+'''
+
+
+def line_types(lexer, lines):
+    """Token type of every non-blank character, lexing line by line."""
+    types = {}
+    state = lexer.initial_state
+    for line_no, line in enumerate(lines):
+        tokens, state = lexer.lex_line(line, state)
+        for start, end, ttype in tokens:
+            for col in range(start, end):
+                if not line[col].isspace():
+                    types[(line_no, col)] = ttype
+    return types
+
+
+def text_types(tokens):
+    types = {}
+    line_no = col = 0
+    for _, ttype, value in tokens:
+        for char in value:
+            if char == '\n':
+                line_no, col = line_no + 1, 0
+                continue
+            if not char.isspace():
+                types[(line_no, col)] = ttype
+            col += 1
+    return types
+
+
+def test_tokens_cover_the_text():
+    text = SAMPLE * 2
+    tokens = list(MarlinConfigLexer().get_tokens_unprocessed(text))
+    assert ''.join(value for _, _, value in tokens) == text
+    assert all(text[index:index + len(value)] == value for index, _, value in tokens)
+
+
+def test_text_and_line_lexing_agree():
+    text = SAMPLE * 2
+    lexer = MarlinConfigLexer()
+    assert text_types(lexer.get_tokens_unprocessed(text)) == line_types(lexer, text.split('\n'))
+
+
+def test_comments_match_cpp_lexer():
+    # Whatever CppLexer calls a comment is a comment here too
+    lines = SAMPLE.split('\n')
+    expected = line_types(RegexLineLexer(CppLexer()), lines)
+    actual = line_types(MarlinConfigLexer(), lines)
+    for key, ttype in expected.items():
+        if ttype in Comment and ttype not in Comment.Preproc:
+            assert actual[key] in Comment
+
+
+def test_option_lines():
+    lexer = MarlinConfigLexer()
+    tokens, state = lexer.lex_line('  #define X_BED_SIZE 200 // mm', ROOT)
+    assert [t for _, _, t in tokens] == [Comment.Preproc, Name.Constant, Number, Comment.Single]
+    assert state == ROOT
+    tokens, _ = lexer.lex_line('#define NAME "x"', ROOT)
+    assert tokens[-1] == (13, 16, String)
+    tokens, _ = lexer.lex_line('//#define MESH_BED_LEVELING  // note', ROOT)
+    assert tokens == [(0, 29, Comment.Special), (29, 36, Comment.Single)]
+    assert lexer.lex_line('// plain comment', ROOT)[0] == [(0, 16, Comment.Single)]
+    assert lexer.lex_line('', ROOT) == ([], ROOT)
+
+
+def test_block_comment_state():
+    lexer = MarlinConfigLexer()
+    _, state = lexer.lex_line('#define A 1 /* open', ROOT)
+    assert state == IN_COMMENT
+    assert lexer.lex_line(' * prose', state) == ([(0, 8, Comment.Multiline)], IN_COMMENT)
+    tokens, state = lexer.lex_line(' */ #define B 2', state)
+    assert state == ROOT
+    assert tokens[0] == (0, 3, Comment.Multiline)
+    assert (14, 15, Number) in tokens
+
+
+def test_incremental_edits_match_full_relex():
+    rng = random.Random(8)
+    lexer = MarlinConfigLexer()
+    lines = (SAMPLE * 4).split('\n')
+    highlighter = IncrementalHighlighter(lexer)
+    highlighter.reset(len(lines))
+    highlighter.relex(lambda start, stop: lines[start:stop])
+    pieces = ['/*', '*/', '//#define X', '#if ENABLED(A)', '"', ' 12', 'text']
+    for _ in range(150):
+        line_no = rng.randrange(len(lines))
+        line = lines[line_no]
+        col = rng.randint(0, len(line))
+        lines[line_no] = line[:col] + rng.choice(pieces) + line[col:]
+        highlighter.splice(line_no, 1, 1)
+        highlighter.relex(lambda start, stop: lines[start:stop])
+
+        expected = IncrementalHighlighter(lexer)
+        expected.reset(len(lines))
+        expected.relex(lambda start, stop: lines[start:stop])
+        assert highlighter.tokens == expected.tokens
+
+
+def test_picked_for_configuration_headers():
+    assert is_marlin_config('/x/Configuration.h')
+    assert is_marlin_config('Configuration_adv.h')
+    assert not is_marlin_config('pins_RAMPS.h')
+    assert not is_marlin_config('config.yaml')
+    assert not is_marlin_config(None)
@@ -0,0 +1,77 @@
+import os
+
+from struttura.config_parser import ConfigLineParser, model_from_document
+from struttura.highlighter import IncrementalHighlighter
+from struttura.live_document import LiveDocument
+from struttura.marlin_lexer import MarlinConfigLexer
+from struttura.parse_cache import ParseCache, cache_version, make_entry, read_entry
+
+HEADER = '''/**
+ * Marlin 3D Printer Firmware
+ */
+#define BAUDRATE 250000
+#if ENABLED(DELTA)
+  #define DELTA_HEIGHT 250.00
+#endif
+//#define SPEED 5
+'''
+
+
+def parsed(text):
+    lines = text.split('\n')
+    document = LiveDocument(ConfigLineParser(), lambda start, stop: lines[start:stop])
+    document.reset(len(lines))
+    highlighter = IncrementalHighlighter(MarlinConfigLexer())
+    highlighter.reset(len(lines))
+    highlighter.relex(lambda start, stop: lines[start:stop])
+    return document, highlighter
+
+
+def test_round_trip(tmp_path):
+    cache = ParseCache(str(tmp_path))
+    document, highlighter = parsed(HEADER)
+    key = cache.key(HEADER, cache_version(MarlinConfigLexer()))
+    assert cache.load(key) is None
+    assert cache.store(key, make_entry(document, highlighter.snapshot()))
+
+    rows, states, (tokens, token_states) = read_entry(cache.load(key))
+    restored = LiveDocument(ConfigLineParser(), None)
+    restored.restore(rows, states)
+    assert list(model_from_document(restored)) == list(model_from_document(document))
+    assert restored.get('SPEED') == document.get('SPEED')
+    assert tokens == highlighter.tokens and token_states == highlighter.states
+
+    other = IncrementalHighlighter(MarlinConfigLexer())
+    other.restore(tokens, token_states)
+    assert not other.is_dirty()
+
+
+def test_key_depends_on_content_and_version():
+    version = cache_version(MarlinConfigLexer())
+    assert ParseCache.key(HEADER, version) == ParseCache.key(HEADER, version)
+    assert ParseCache.key(HEADER + ' ', version) != ParseCache.key(HEADER, version)
+    assert ParseCache.key(HEADER, version + '+') != ParseCache.key(HEADER, version)
+
+
+def test_damaged_entries_are_misses(tmp_path):
+    cache = ParseCache(str(tmp_path))
+    cache.store('k', (1, 2))
+    path = os.path.join(str(tmp_path), 'k.cache')
+    with open(path, 'r+b') as f:
+        f.truncate(8)
+    assert cache.load('k') is None
+    assert not os.path.exists(path)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ParseCache(str(tmp_path), max_bytes=3500)
+    for i, key in enumerate('abc'):
+        cache.store(key, 'x' * 1000)
+        os.utime(os.path.join(str(tmp_path), f'{key}.cache'), (i, i))
+    # Reading an entry makes it the most recently used
+    assert cache.load('a') is not None
+    cache.store('d', 'x' * 1000)
+    assert cache.load('b') is None
+    assert [cache.load(key) is not None for key in 'acd'] == [True, True, True]
+    cache.clear()
+    assert os.listdir(str(tmp_path)) == []
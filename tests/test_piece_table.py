@@ -0,0 +1,56 @@
+import io
+import random
+
+import pytest
+
+from struttura.piece_table import PieceTable
+
+SAMPLE = '#pragma once\n\n#define X_BED_SIZE 200\n//#define Y_BED_SIZE 200\n#endif'
+
+
+def test_lines_match_split():
+    table = PieceTable(SAMPLE)
+    lines = SAMPLE.split('\n')
+    assert table.line_count == len(lines)
+    assert table.lines(0, table.line_count) == lines
+    assert table.lines(1, 3) == lines[1:3]
+    assert table.line(4) == '#endif'
+    assert PieceTable('').lines(0, 1) == ['']
+    assert PieceTable('a\n').lines(0, 5) == ['a', '']
+
+
+def test_random_edits_match_list_model():
+    rng = random.Random(9)
+    model = SAMPLE.split('\n') * 20
+    table = PieceTable('\n'.join(model))
+    for _ in range(300):
+        first = rng.randrange(len(model) + 1)
+        count = rng.randrange(min(3, len(model) - first) + 1)
+        lines = [f'#define OPTION_{rng.randrange(100)}' for _ in range(rng.randrange(3))]
+        model[first:first + count] = lines
+        table.replace_lines(first, count, lines)
+        assert table.line_count == len(model)
+        start = rng.randrange(len(model) + 1)
+        assert table.lines(start, start + 7) == model[start:start + 7]
+    assert table.get_text() == '\n'.join(model)
+
+
+def test_saving_streams_bounded_chunks():
+    text = '\n'.join(f'#define OPTION_{i} {i}' for i in range(5000))
+    table = PieceTable(text)
+    table.replace_lines(10, 1, ['#define EDITED 1', ''])
+    chunks = list(table.iter_chunks(size=4096))
+    assert max(map(len, chunks)) <= 4096
+    out = io.StringIO()
+    table.write_to(out)
+    expected = text.split('\n')
+    expected[10:11] = ['#define EDITED 1', '']
+    assert out.getvalue() == ''.join(chunks) == '\n'.join(expected)
+
+
+def test_out_of_range_edits_are_rejected():
+    table = PieceTable(SAMPLE)
+    with pytest.raises(IndexError):
+        table.replace_lines(4, 2, [])
+    with pytest.raises(IndexError):
+        table.line(5)
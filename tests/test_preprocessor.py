@@ -0,0 +1,79 @@
+import pytest
+
+from struttura.config_parser import ConfigLineParser
+from struttura.live_document import LiveDocument
+from struttura.preprocessor import Condition, Evaluator
+
+HEADER = '''#define MOTHERBOARD BOARD_RAMPS_14_EFB
+#define EXTRUDERS 2
+//#define DELTA
+#if ENABLED(DELTA)
+  #define DELTA_HEIGHT 250.00
+#elif EXTRUDERS > 1 && MOTHERBOARD == BOARD_RAMPS_14_EFB
+  #define SWITCHING_EXTRUDER
+  #if PIN_EXISTS(SWITCHING)
+    #define SWITCHING_PIN 5
+  #endif
+#else
+  #define SINGLE
+#endif
+#ifndef SINGLE
+  #define MULTI
+#endif
+'''
+
+
+@pytest.mark.parametrize('text, defines, result', [
+    ('ENABLED(A)', {'A': None}, True),
+    ('ENABLED(A)', {'A': 0}, False),
+    ('DISABLED(A)', {}, True),
+    ('ANY(A, B) && !BOTH(A, B)', {'B': True}, True),
+    ('defined A || NONE(B)', {'B': 1}, False),
+    ('X * 2 + 1 == 7 ? -1 : 0', {'X': 3}, True),
+    ('(0x10 >> 2) % 3 == 1 && -7 / 2 == -3', {}, True),
+    ('UNDEFINED_SYMBOL', {}, False),
+    ('PIN_EXISTS(Z_MIN)', {}, None),
+    ('X > 1', {'X': '(2 * 3)'}, None),
+    ('1 +', {}, None),
+])
+def test_conditions(text, defines, result):
+    assert Condition(text)(defines) is result
+
+
+def parsed(text):
+    lines = text.split('\n')
+    document = LiveDocument(ConfigLineParser(), lambda start, stop: lines[start:stop])
+    document.reset(len(lines))
+    return lines, document
+
+
+def test_effective_defines_and_inactive_lines():
+    lines, document = parsed(HEADER)
+    effective = Evaluator().effective(document)
+    # Undecidable conditions count as true
+    assert {'SWITCHING_EXTRUDER', 'SWITCHING_PIN', 'MULTI'} <= effective.defines.keys()
+    assert 'DELTA_HEIGHT' not in effective.defines and 'SINGLE' not in effective.defines
+    assert effective.inactive == [(4, 5), (11, 12)]
+
+
+def test_toggling_an_option_reevaluates_only_conditions_reading_it():
+    lines, document = parsed(HEADER)
+    evaluator = Evaluator()
+    evaluator.effective(document)
+    before = evaluator.evaluations
+
+    lines[2] = '#define DELTA'
+    document.splice(2, 1, 1)
+    effective = evaluator.effective(document)
+    assert effective.defines.keys() >= {'DELTA', 'DELTA_HEIGHT', 'MULTI'}
+    assert 'SWITCHING_EXTRUDER' not in effective.defines
+    assert effective.inactive == [(6, 10), (11, 12)]
+    # ENABLED(DELTA) and the #elif branch, which reads it through its !(...)
+    ran = evaluator.evaluations - before
+    assert 0 < ran <= 3
+
+    lines[2] = '//#define DELTA'
+    document.splice(2, 1, 1)
+    before = evaluator.evaluations
+    assert evaluator.effective(document).inactive == [(4, 5), (11, 12)]
+    assert evaluator.evaluations == before
@@ -0,0 +1,94 @@
+import pytest
+
+from struttura.config_parser import ConfigLineParser
+from struttura.live_document import LiveDocument
+from struttura.profiles import BASE, DocumentLayer, Layer, ProfileSet
+from struttura.rules import MISSING
+
+HEADER = '''#define MOTHERBOARD BOARD_RAMPS_14_EFB
+#define BAUDRATE 250000
+//#define BLTOUCH
+#define EXTRUDERS 1
+#define DEFAULT_AXIS_STEPS_PER_UNIT { 80, 80, 400, 500 }'''
+
+PROFILES = {
+    'layers': {
+        'bltouch': {'BLTOUCH': True, 'Z_SAFE_HOMING': True},
+        'titan': {'DEFAULT_AXIS_STEPS_PER_UNIT': [80, 80, 400, 837]},
+        'fast': {'BAUDRATE': 1000000, 'BLTOUCH': False},
+    },
+    'profiles': {
+        'ender': ['bltouch'],
+        'ender-titan': ['bltouch', 'titan'],
+        'bench': ['bltouch', 'fast'],
+    },
+}
+
+
+def open_profiles():
+    lines = HEADER.split('\n')
+    document = LiveDocument(ConfigLineParser(), lambda start, stop: lines[start:stop])
+    document.reset(len(lines))
+    document.take_changes()
+    profiles = ProfileSet(DocumentLayer(document))
+    profiles.load(PROFILES)
+    return lines, document, profiles
+
+
+def test_profiles_merge_layers_in_order():
+    _, _, profiles = open_profiles()
+    base = profiles.view()
+    assert base.resolve('BAUDRATE') == (250000, BASE)
+    assert base.resolve('BLTOUCH') == (False, BASE)
+    assert base.resolve('Z_SAFE_HOMING') == (MISSING, None)
+
+    ender = profiles.view('ender-titan')
+    assert ender.resolve('BLTOUCH') == (True, 'bltouch')
+    assert ender.resolve('DEFAULT_AXIS_STEPS_PER_UNIT') == ([80, 80, 400, 837], 'titan')
+    assert ender.source('MOTHERBOARD') == BASE
+    # The base options in document order, then those the layers add
+    assert ender.keys() == ['MOTHERBOARD', 'BAUDRATE', 'BLTOUCH', 'EXTRUDERS',
+                            'DEFAULT_AXIS_STEPS_PER_UNIT', 'Z_SAFE_HOMING']
+    bench = profiles.view('bench')
+    assert bench.resolve('BLTOUCH') == (False, 'fast')
+    assert bench.get('BAUDRATE') == 1000000
+    # Views are kept
+    assert profiles.view('bench') is bench
+
+
+def test_changes_invalidate_only_their_keys():
+    lines, document, profiles = open_profiles()
+    views = [profiles.view(name) for name in ('ender', 'ender-titan', 'bench')]
+    for view in views:
+        list(view.items())
+
+    profiles.layers['titan'].set('DEFAULT_AXIS_STEPS_PER_UNIT', [80, 80, 400, 415])
+    # Only the view using the layer forgets the key
+    assert 'DEFAULT_AXIS_STEPS_PER_UNIT' in views[0]._cache
+    assert 'DEFAULT_AXIS_STEPS_PER_UNIT' not in views[1]._cache
+    assert views[1].get('DEFAULT_AXIS_STEPS_PER_UNIT') == [80, 80, 400, 415]
+
+    # Editing the base reaches every view
+    lines[1] = '#define BAUDRATE 115200'
+    document.splice(1, 1, 1)
+    profiles.base.changed(document.take_changes())
+    assert views[0].resolve('BAUDRATE') == (115200, BASE)
+    assert views[2].resolve('BAUDRATE') == (1000000, 'fast')
+    assert 'MOTHERBOARD' in views[0]._cache
+    lines.append('#define FAN_SOFT_PWM')
+    document.splice(len(lines) - 1, 0, 1)
+    profiles.base.changed(document.take_changes())
+    assert views[0].keys()[-1] == 'Z_SAFE_HOMING' and 'FAN_SOFT_PWM' in views[0].keys()
+
+    # Reloading the file updates layers in place
+    data = {'layers': dict(PROFILES['layers'], fast={'BAUDRATE': 500000}), 'profiles': PROFILES['profiles']}
+    profiles.load(data)
+    assert views[2].resolve('BLTOUCH') == (True, 'bltouch')
+    assert 'MOTHERBOARD' in views[2]._cache
+    assert profiles.dump() == data
+
+    with pytest.raises(ValueError):
+        profiles.load({'layers': {}, 'profiles': {'ender': ['bltouch']}})
+    with pytest.raises(TypeError):
+        profiles.base.set('BAUDRATE', 1)
+    assert isinstance(profiles.layers['fast'], Layer)
@@ -0,0 +1,145 @@
+import os
+
+import pytest
+
+from struttura.recovery_journal import RecoveryJournal, apply_edits, read_journal
+
+BASE = '#define BAUDRATE 250000\n#define EXTRUDERS 1\n'
+
+
+def test_apply_edits():
+    assert apply_edits(BASE, [(0, 17, '250000', '115200')]) == BASE.replace('250000', '115200')
+    # Across lines, and past the last newline
+    assert apply_edits('ab\ncd\nef', [(0, 1, 'b\ncd\ne', 'X')]) == 'aXf'
+    assert apply_edits('ab', [(0, 2, '', '\n')]) == 'ab\n'
+    with pytest.raises(ValueError):
+        apply_edits(BASE, [(0, 0, '#undef', '')])
+    with pytest.raises(ValueError):
+        apply_edits(BASE, [(5, 0, '', 'x')])
+
+
+def type_text(journal, line, column, text):
+    for i, char in enumerate(text):
+        journal.record(line, column + i, '', char)
+
+
+def test_journal_recovers_coalesced_edits(tmp_path):
+    path = str(tmp_path / 'Configuration.h')
+    journal = RecoveryJournal(str(tmp_path / 'recovery'), interval=60)
+    # Edits before a document is started are not journaled
+    type_text(journal, 0, 0, 'lost')
+    journal.start(path, BASE)
+    type_text(journal, 2, 0, '#define BLTOUCH')
+    journal.record(0, 17, '250000', '115200')
+    assert journal.flush(5)
+    type_text(journal, 2, 15, '\n')
+    type_text(journal, 3, 0, '// done')
+    assert journal.flush(5)
+    # A crash while the next record was written
+    with open(journal.journal_path(path), 'ab') as f:
+        f.write(b'\x02\x00\x00\x01\x00')
+    # Edits not saved keep the journal for the next start
+    journal.close()
+    assert os.path.exists(journal.journal_path(path))
+
+    [recovered] = RecoveryJournal(str(tmp_path / 'recovery')).pending()
+    assert recovered.path == path
+    assert recovered.text == ('#define BAUDRATE 115200\n#define EXTRUDERS 1\n#define BLTOUCH\n// done')
+    # Keystrokes merge into one edit per run of typing
+    assert recovered.edits == 4
+    RecoveryJournal.discard(recovered)
+    assert RecoveryJournal(str(tmp_path / 'recovery')).pending() == []
+
+
+def test_saving_leaves_nothing_to_recover(tmp_path):
+    path = str(tmp_path / 'Configuration.h')
+    directory = str(tmp_path / 'recovery')
+    journal = RecoveryJournal(directory, interval=60)
+    journal.start(path, BASE)
+    type_text(journal, 2, 0, 'abc')
+    # Typed and deleted again
+    journal.record(2, 0, 'abc', '')
+    journal.flush(5)
+    assert read_journal(journal.journal_path(path)) is None
+    type_text(journal, 2, 0, 'xyz')
+    journal.start(path, BASE + 'xyz')
+    journal.flush(5)
+    assert journal.pending() == []
+    journal.close()
+    assert os.listdir(directory) == []
+
+    # Text put in the editor unsaved is recovered without edits
+    journal = RecoveryJournal(directory, interval=60)
+    journal.start(path, 'restored\n', saved=False)
+    journal.close()
+    [recovered] = journal.pending()
+    assert recovered.text == 'restored\n' and recovered.edits == 0
+
+
+def test_a_failed_save_leaves_the_text_to_recover(tmp_path):
+    path = str(tmp_path / 'Configuration.h')
+    directory = str(tmp_path / 'recovery')
+    journal = RecoveryJournal(directory, interval=60)
+    journal.start(path, BASE)
+    type_text(journal, 2, 0, 'abc')
+    # A save starts the journal from the text being saved, which fails
+    journal.start(path, BASE + 'abc', saved=False)
+    type_text(journal, 2, 3, 'd')
+    assert journal.flush(5)
+    # What the application crashing now would leave
+    recovered = read_journal(journal.journal_path(path))
+    assert recovered.text == BASE + 'abcd'
+
+    # Saved this time: only the edits made after the save are left
+    journal.start(path, BASE + 'abcd', saved=False)
+    type_text(journal, 2, 4, 'e')
+    journal.saved()
+    assert journal.flush(5)
+    recovered = read_journal(journal.journal_path(path))
+    assert recovered.text == BASE + 'abcde'
+    journal.start(path, BASE + 'abcde', saved=False)
+    journal.saved()
+    journal.close()
+    assert journal.pending() == [] and os.listdir(directory) == []
+
+
+def test_unsaved_documents_have_a_journal_each(tmp_path):
+    directory = str(tmp_path / 'recovery')
+    first = RecoveryJournal(directory, interval=60)
+    second = RecoveryJournal(directory, interval=60)
+    assert first.journal_path(None) != second.journal_path(None)
+    first.start(None, 'first\n', saved=False)
+    second.start(None, 'second\n', saved=False)
+    first.close()
+    second.close()
+    assert sorted(recovered.text for recovered in RecoveryJournal(directory).pending()) == ['first\n', 'second\n']
+
+
+def test_journals_of_running_instances_are_left_to_them(tmp_path):
+    path = str(tmp_path / 'Configuration.h')
+    directory = str(tmp_path / 'recovery')
+    first = RecoveryJournal(directory, interval=60)
+    second = RecoveryJournal(directory, interval=60)
+    first.start(path, BASE, saved=False)
+    assert first.flush(5)
+    # Another instance starting meanwhile neither offers nor removes it
+    assert second.pending() == []
+    RecoveryJournal.discard(read_journal(first.journal_path(path)))
+    assert os.path.exists(first.journal_path(path))
+    # Both editing the same file journal it apart
+    second.start(path, BASE + 'second\n', saved=False)
+    assert second.flush(5)
+    assert len([name for name in os.listdir(directory) if name.endswith('.journal')]) == 2
+    first.close()
+    [recovered] = second.pending()
+    assert recovered.text == BASE
+    RecoveryJournal.discard(recovered)
+    second.close()
+    [recovered] = RecoveryJournal(directory).pending()
+    assert recovered.text == BASE + 'second\n'
+    # Recovered and journaled again, it replaces its old journal
+    third = RecoveryJournal(directory, interval=60)
+    third.take_over(recovered)
+    third.start(path, recovered.text, saved=False)
+    third.close()
+    assert [recovered.journal for recovered in RecoveryJournal(directory).pending()] == [third.journal_path(path)]
@@ -0,0 +1,101 @@
+from struttura.config_parser import ConfigLineParser
+from struttura.live_document import LiveDocument
+from struttura.rules import (
+    MISSING, ArrayLength, Exclusive, Range, Requires, RuleSet, Validator, header_lookup, validator_for,
+)
+from struttura.yaml_lines import YamlLineParser
+
+HEADER = '''#define BAUDRATE 250000
+#define EXTRUDERS 1
+//#define BLTOUCH
+#define FIX_MOUNTED_PROBE
+#define Z_MIN_PROBE_USES_Z_MIN_ENDSTOP_PIN
+#define DEFAULT_AXIS_STEPS_PER_UNIT { 80, 80, 400, 500 }
+#define X_BED_SIZE 220
+'''
+
+
+def live(parser, text):
+    lines = text.split('\n')
+    document = LiveDocument(parser, lambda start, stop: lines[start:stop])
+    document.reset(len(lines))
+    document.take_changes()
+    return lines, document
+
+
+def edit(lines, document, line, text):
+    lines[line] = text
+    document.splice(line, 1, 1)
+    return document.take_changes()
+
+
+def test_rules_read_values_and_report_in_order():
+    values = {'A': 5, 'B': None, 'C': (1, 2)}
+    rule_set = RuleSet([
+        Range('A', 0, 3),
+        Requires('B', ['D', 'E']),
+        Exclusive(['A', 'B', 'D']),
+        ArrayLength('C', ['A'], lambda a: a - 2),
+        Range('D', 0),
+    ])
+    validator = Validator(rule_set, lambda key: values.get(key, MISSING))
+    validator.validate_all()
+    assert validator.errors() == [
+        'A must be between 0 and 3, not 5',
+        'B requires one of D, E',
+        'Only one of A, B may be enabled',
+        'C needs 3 entries, not 2',
+    ]
+    assert rule_set.dependents['A'] == (0, 2, 3)
+
+
+def test_edits_rerun_only_the_rules_reading_changed_options():
+    lines, document = live(ConfigLineParser(), HEADER)
+    validator = validator_for('Configuration.h', document)
+    validator.validate_all()
+    assert validator.is_valid
+
+    assert edit(lines, document, 2, '#define BLTOUCH') == {'BLTOUCH'}
+    ran = validator.update({'BLTOUCH'})
+    assert 0 < ran < len(validator.rule_set)
+    assert validator.errors() == ['Only one of BLTOUCH, FIX_MOUNTED_PROBE may be enabled']
+
+    edit(lines, document, 2, '//#define BLTOUCH')
+    validator.update(edit(lines, document, 3, '//#define FIX_MOUNTED_PROBE'))
+    assert validator.errors() == ['Z_MIN_PROBE_USES_Z_MIN_ENDSTOP_PIN requires a probe type']
+
+    validator.update(edit(lines, document, 1, '#define EXTRUDERS 2'))
+    assert validator.errors() == ['Z_MIN_PROBE_USES_Z_MIN_ENDSTOP_PIN requires a probe type']
+    validator.update(edit(lines, document, 4, '#define DISTINCT_E_FACTORS'))
+    assert validator.errors() == [
+        'DEFAULT_AXIS_STEPS_PER_UNIT needs 5 values, one per axis and extruder, not 4']
+    validator.update(edit(lines, document, 6, '#define X_BED_SIZE -5'))
+    assert validator.errors()[0] == 'X_BED_SIZE must be at least 1, not -5'
+
+    fresh = validator_for('Configuration.h', document)
+    fresh.validate_all()
+    assert fresh.errors() == validator.errors()
+
+
+def test_yaml_rules_replace_the_required_sections_check():
+    text = 'configuration:\n  firmware_name: Marlin\npins: {}\ntemperature: {}\nmotion: {}\n'
+    lines, document = live(YamlLineParser(), text)
+    validator = validator_for('config.yaml', document)
+    validator.validate_all()
+    assert validator.errors() == ['Missing required configuration: firmware_version']
+
+    validator.update(edit(lines, document, 2, 'pin: {}'))
+    assert validator.errors() == ['Missing required section: pins',
+                                  'Missing required configuration: firmware_version']
+    validator.update(edit(lines, document, 1, '  firmware_version: 2.1'))
+    assert validator.errors() == ['Missing required section: pins',
+                                  'Missing required configuration: firmware_name']
+
+
+def test_header_lookup_reads_the_first_enabled_definition():
+    text = '//#define PROBE 1\n#define FLAG\n#if ENABLED(DELTA)\n  #define PROBE 2\n#endif\n'
+    _, document = live(ConfigLineParser(), text)
+    lookup = header_lookup(document)
+    assert lookup('PROBE') == 2
+    assert lookup('FLAG') is None
+    assert lookup('DELTA') is MISSING
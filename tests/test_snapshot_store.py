@@ -0,0 +1,71 @@
+import os
+import random
+import zlib
+
+import pytest
+
+from struttura.snapshot_store import SnapshotStore, chunk_lines
+
+
+def header(lines=5000, seed=0):
+    rng = random.Random(seed)
+    return ''.join(f'#define OPTION_{i} {rng.randint(0, 1000)}  // What option {i} does\n'
+                   for i in range(lines))
+
+
+def test_chunks_survive_edits_around_them():
+    text = header()
+    chunks = chunk_lines(text)
+    assert ''.join(chunks) == text
+    lines = text.splitlines(keepends=True)
+    lines.insert(2500, '#define INSERTED 1\n')
+    lines[4000] = '#define OPTION_4000 5\n'
+    edited = chunk_lines(''.join(lines))
+    # Only the chunks holding the edits change
+    assert len(set(edited) - set(chunks)) <= 4
+    for text in ('', 'no newline', 'a\r\nb\r\n', '\n\n\n'):
+        assert ''.join(chunk_lines(text)) == text
+
+
+def test_revisions_share_their_chunks(tmp_path):
+    store = SnapshotStore(str(tmp_path / 'backups'))
+    path = str(tmp_path / 'Configuration.h')
+    text = header()
+    first = store.snapshot(path, text)
+    assert first.stored < len(text)
+    lines = text.splitlines(keepends=True)
+    texts = [text]
+    for k in range(1, 100):
+        lines[(k * 37) % len(lines)] = f'#define OPTION_EDITED {k}\n'
+        texts.append(''.join(lines))
+        store.snapshot(path, texts[-1])
+    history = store.history(path)
+    assert len(history) == 100
+    # A revision with a line changed costs a chunk and the list of chunks
+    assert max(revision.stored for revision in history[1:]) < 8 * 1024
+    for k in (0, 42, 99):
+        assert store.restore(history[k]) == texts[k]
+    # Saving the same text again keeps no new revision
+    assert store.snapshot(path, texts[-1]) == history[-1]
+    assert len(store.history(path)) == 100
+    assert store.history(str(tmp_path / 'other.h')) == []
+
+
+def test_damaged_store(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    path = str(tmp_path / 'Configuration.h')
+    revision = store.snapshot(path, 'a\nb\n')
+    # A line cut short by a crash is skipped
+    with open(store.history_path(path), 'a') as f:
+        f.write('{"id": "12')
+    assert store.history(path) == [revision]
+
+    objects = os.path.join(str(tmp_path), 'objects')
+    for directory, _, names in os.walk(objects):
+        for name in names:
+            if directory.endswith(revision.id[:2]) and name == revision.id[2:]:
+                continue
+            with open(os.path.join(directory, name), 'wb') as f:
+                f.write(zlib.compress(b'x'))
+    with pytest.raises(ValueError):
+        SnapshotStore(str(tmp_path)).restore(revision)
@@ -0,0 +1,107 @@
+import os
+
+from struttura.preprocessor import Evaluator
+from struttura.symbol_index import CONDITION, DEFINITION, REFERENCE, SymbolIndex, scan_symbols
+
+CONFIGURATION = '''#define MOTHERBOARD BOARD_RAMPS_14_EFB
+//#define BLTOUCH
+#define EXTRUDERS 2
+#if EXTRUDERS > 1
+  #define SINGLENOZZLE
+#endif
+'''
+
+CONFIGURATION_ADV = '''#if ENABLED(BLTOUCH)
+  #define BLTOUCH_DELAY 500
+#elif EITHER(SINGLENOZZLE, MIXING_EXTRUDER)
+  #define SINGLENOZZLE_STANDBY_TEMP
+#endif
+#ifdef EXTRUDERS
+  #undef EXTRUDERS
+#endif
+'''
+
+PINS = '''#define BOARD_RAMPS_14_EFB 1101
+#define MB(board) (MOTHERBOARD == BOARD_##board)
+#if MB(RAMPS_14_EFB)
+  #define X_STEP_PIN 54  // "X" step
+#endif
+'''
+
+
+def project(tmp_path):
+    for name, text in (('Configuration.h', CONFIGURATION), ('Configuration_adv.h', CONFIGURATION_ADV),
+                       (os.path.join('pins', 'pins_RAMPS.h'), PINS), ('README.md', '#define NOT_A_HEADER')):
+        path = tmp_path / name
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(text)
+    return SymbolIndex(tmp_path, str(tmp_path / 'index'))
+
+
+def test_scan_records_definitions_references_and_conditions():
+    symbols = scan_symbols(CONFIGURATION_ADV + PINS)
+    sites = [(name, line, kind) for name, line, _, kind, _ in symbols.sites]
+    assert sites == [
+        ('BLTOUCH', 0, CONDITION), ('BLTOUCH_DELAY', 1, DEFINITION),
+        ('SINGLENOZZLE', 2, CONDITION), ('MIXING_EXTRUDER', 2, CONDITION),
+        ('SINGLENOZZLE_STANDBY_TEMP', 3, DEFINITION),
+        ('EXTRUDERS', 5, CONDITION), ('EXTRUDERS', 6, REFERENCE),
+        ('BOARD_RAMPS_14_EFB', 8, DEFINITION),
+        ('MB', 9, DEFINITION), ('MOTHERBOARD', 9, REFERENCE), ('BOARD_', 9, REFERENCE),
+        ('RAMPS_14_EFB', 10, CONDITION), ('X_STEP_PIN', 11, DEFINITION),
+    ]
+    assert symbols.sites[1][2] == 10
+    assert symbols.defines[0] == ('BLTOUCH_DELAY', '500', ('ENABLED(BLTOUCH)',))
+
+
+def test_index_lookups_and_incremental_refresh(tmp_path):
+    index = project(tmp_path)
+    assert index.refresh() == 3
+    configuration = str(tmp_path / 'Configuration.h')
+    assert index.definitions('BOARD_RAMPS_14_EFB')[0].path == str(tmp_path / 'pins' / 'pins_RAMPS.h')
+    assert [(os.path.basename(site.path), site.line, site.kind) for site in index.usages('EXTRUDERS')] == [
+        ('Configuration.h', 3, CONDITION),
+        ('Configuration_adv.h', 5, CONDITION), ('Configuration_adv.h', 6, REFERENCE),
+    ]
+    assert not index.definitions('BLTOUCH')[0].enabled
+
+    # Unchanged files are not scanned again
+    assert index.refresh() == 0
+    (tmp_path / 'pins' / 'pins_RAMPS.h').unlink()
+    assert index.refresh() == 0
+    assert 'X_STEP_PIN' not in index and index.definitions('BOARD_RAMPS_14_EFB') == []
+
+    # Unsaved text replaces the file's symbols until the file changes
+    index.update(configuration, CONFIGURATION.replace('//#define BLTOUCH', '#define BLTOUCH\n#define FAN_PIN 9'))
+    assert index.definitions('BLTOUCH')[0].enabled and 'FAN_PIN' in index
+    assert index.refresh() == 1
+    assert 'FAN_PIN' not in index
+
+
+def test_index_is_kept_between_sessions(tmp_path):
+    index = project(tmp_path)
+    index.refresh()
+    assert index.save()
+
+    reloaded = SymbolIndex(tmp_path, index.store)
+    assert reloaded.load()
+    assert reloaded.refresh() == 0
+    assert reloaded.usages('SINGLENOZZLE') == index.usages('SINGLENOZZLE')
+
+    (tmp_path / 'index').write_bytes(b'damaged')
+    assert not SymbolIndex(tmp_path, index.store).load()
+
+
+def test_configuration_adv_sees_the_options_of_configuration(tmp_path):
+    index = project(tmp_path)
+    index.refresh()
+    adv = str(tmp_path / 'Configuration_adv.h')
+    predefined = index.predefined(adv)
+    assert predefined == {'MOTHERBOARD': 'BOARD_RAMPS_14_EFB', 'EXTRUDERS': 2, 'SINGLENOZZLE': None}
+    assert index.predefined(str(tmp_path / 'Configuration.h')) == {}
+
+    evaluator = Evaluator(predefined)
+    defines = dict(predefined)
+    taken = [name for name, _, conditions in index.files[adv].defines
+             if evaluator.taken(conditions, defines)]
+    assert taken == ['SINGLENOZZLE_STANDBY_TEMP']
@@ -0,0 +1,30 @@
+from pygments.token import Comment, Keyword, Name, Number, String, Text
+
+from struttura.syntax_theme import THEMES, get_style_map
+
+
+def test_subtypes_fall_back_to_styled_parent():
+    style_map = get_style_map('dark')
+    assert style_map.tag_for(Keyword.Reserved) == 'Token.Keyword'
+    assert style_map.tag_for(Keyword.Type) == 'Token.Keyword.Type'
+    assert style_map.tag_for(Number.Hex) == 'Token.Literal.Number'
+    assert style_map.tag_for(String.Escape) == 'Token.Literal.String'
+    assert style_map.tag_for(Comment.Single) == 'Token.Comment'
+
+
+def test_unstyled_types_are_not_tagged():
+    style_map = get_style_map('light')
+    assert style_map.tag_for(Text) is None
+    assert style_map.tag_for(Name) is None
+
+
+def test_tag_set_is_bounded_by_the_theme():
+    for theme, styles in THEMES.items():
+        style_map = get_style_map(theme)
+        assert len(style_map.tags) == len(styles)
+        resolved = {style_map.tag_for(t) for t in (Keyword.Pseudo, Name.Builtin, Number.Float, Comment.Multiline)}
+        assert resolved - {None} <= style_map.tags
+
+
+def test_style_maps_are_shared():
+    assert get_style_map('dark') is get_style_map('dark')
@@ -0,0 +1,92 @@
+import random
+import zlib
+
+import pytest
+
+from struttura.template_store import TemplateStore, apply_delta, build_store, make_delta
+
+BASE = '''#define MOTHERBOARD BOARD_RAMPS_14_EFB
+#define BAUDRATE 250000
+#define EXTRUDERS 1
+//#define COREXY
+#define X_BED_SIZE 200
+#define Y_BED_SIZE 200
+'''
+
+
+def test_delta_round_trip():
+    rng = random.Random(3)
+    for _ in range(300):
+        base = [rng.choice('abcdef') for _ in range(rng.randint(0, 30))]
+        lines = list(base)
+        for _ in range(rng.randint(0, 6)):
+            position = rng.randint(0, len(lines))
+            if lines and rng.random() < 0.5:
+                del lines[min(position, len(lines) - 1)]
+            else:
+                lines.insert(position, rng.choice('abcxyz'))
+        assert apply_delta(base, make_delta(base, lines)) == lines
+    # Unchanged lines are copied, not stored
+    assert make_delta(['a', 'b', 'c'], ['a', 'x', 'c']) == [[0, 1], 'x', [2, 3]]
+
+
+def write_template(directory, meta, text):
+    directory.mkdir(parents=True)
+    (directory / 'template.yaml').write_text(meta)
+    (directory / 'Configuration.h').write_text(text)
+
+
+@pytest.fixture
+def library(tmp_path):
+    source = tmp_path / 'source'
+    (source / 'base' / '2.1').mkdir(parents=True)
+    (source / 'base' / '2.1' / 'Configuration.h').write_text(BASE)
+    write_template(source / 'Creality' / 'Ender-3', 'board: BOARD_CREALITY_V4\nkinematics: cartesian\nmarlin: "2.1"\n',
+                   BASE.replace('BOARD_RAMPS_14_EFB', 'BOARD_CREALITY_V4').replace('250000', '115200'))
+    write_template(source / 'Voron' / 'Trident', 'board: BOARD_BTT_OCTOPUS_V1_1\nkinematics: corexy\nmarlin: "2.1"\n',
+                   BASE.replace('//#define COREXY', '#define COREXY').replace('200', '300'))
+    path = tmp_path / 'printers.mct'
+    stats = build_store(str(source), str(path))
+    assert stats['templates'] == 2
+    return path
+
+
+def test_browse_and_materialize(library):
+    store = TemplateStore(str(library))
+    assert [template.id for template in store.templates] == ['Creality/Ender-3', 'Voron/Trident']
+    assert store.values('kinematics') == ['cartesian', 'corexy']
+    assert [template.model for template in store.find(kinematics='corexy')] == ['Trident']
+    assert [template.model for template in store.find('octopus')] == ['Trident']
+    assert store.find('ender', vendor='Voron') == []
+
+    trident = store.materialize('Voron/Trident')
+    assert list(trident) == ['Configuration.h']
+    assert '#define COREXY' in trident['Configuration.h']
+    assert '#define X_BED_SIZE 300' in trident['Configuration.h']
+    ender = store.materialize('Creality/Ender-3')['Configuration.h']
+    assert ender == BASE.replace('BOARD_RAMPS_14_EFB', 'BOARD_CREALITY_V4').replace('250000', '115200')
+
+
+def test_browsing_reads_only_the_index(library, tmp_path):
+    data = library.read_bytes()
+    store = TemplateStore(str(library))
+    # Cut the file after its index: the library can still be browsed
+    index_end = store._data_start
+    truncated = tmp_path / 'truncated.mct'
+    truncated.write_bytes(data[:index_end])
+    store = TemplateStore(str(truncated))
+    assert len(store) == 2 and store.find(vendor='Creality')
+    with pytest.raises(zlib.error):
+        store.materialize('Creality/Ender-3')
+
+    (tmp_path / 'other.mct').write_bytes(b'not a library')
+    with pytest.raises(ValueError):
+        TemplateStore(str(tmp_path / 'other.mct'))
+
+
+def test_extract_writes_the_headers(library, tmp_path):
+    store = TemplateStore(str(library))
+    paths = store.extract('Voron/Trident', str(tmp_path / 'trident'))
+    assert [path.endswith('Configuration.h') for path in paths] == [True]
+    with open(paths[0]) as f:
+        assert f.read() == store.materialize('Voron/Trident')['Configuration.h']
@@ -0,0 +1,111 @@
+import random
+
+from struttura.undo_journal import Edit, UndoJournal, compose
+
+SAMPLE = '#define X_BED_SIZE 200\n#define Y_BED_SIZE 200\n//#define Z_SAFE_HOMING\n'
+
+
+def offset(text, line, column):
+    lines = text.split('\n')
+    return sum(len(l) + 1 for l in lines[:line]) + column
+
+
+def apply(text, edit):
+    start = offset(text, edit.line, edit.column)
+    assert text[start:start + len(edit.removed)] == edit.removed
+    return text[:start] + edit.inserted + text[start + len(edit.removed):]
+
+
+def position(text, start):
+    before = text[:start]
+    return before.count('\n'), start - before.rfind('\n') - 1
+
+
+def edit(journal, text, start, length, inserted):
+    """Replace text[start:start + length] and record it."""
+    line, column = position(text, start)
+    journal.record(line, column, text[start:start + length], inserted)
+    return text[:start] + inserted + text[start + length:]
+
+
+def undo_all(journal, text):
+    while journal.can_undo():
+        for e in journal.undo():
+            text = apply(text, e)
+    return text
+
+
+def test_typing_is_grouped_by_word():
+    journal = UndoJournal()
+    text = SAMPLE
+    pos = offset(text, 1, 19)
+    for char in ' // mm':
+        text = edit(journal, text, pos, 0, char)
+        pos += 1
+    assert text.split('\n')[1] == '#define Y_BED_SIZE  // mm200'
+    # ' // ' and 'mm' are separate steps
+    assert len(journal) == 2
+    for e in journal.undo():
+        text = apply(text, e)
+    assert text.split('\n')[1] == '#define Y_BED_SIZE  // 200'
+
+    # Backspacing merges into one step
+    journal.separator()
+    for column in range(23, 19, -1):
+        text = edit(journal, text, offset(text, 1, column) - 1, 1, '')
+    assert text.split('\n')[1] == '#define Y_BED_SIZE 200'
+    assert len(journal) == 2
+    assert undo_all(journal, text) == SAMPLE
+
+
+def test_random_edits_undo_and_redo():
+    rng = random.Random(3)
+    journal = UndoJournal()
+    text = SAMPLE * 5
+    for _ in range(400):
+        start = rng.randrange(len(text) + 1)
+        if rng.random() < 0.3:
+            journal.separator()
+        if rng.random() < 0.6:
+            text = edit(journal, text, start, 0, rng.choice(['a', ' ', '\n', 'ENABLED(', 'x\ny']))
+        else:
+            text = edit(journal, text, start, rng.randrange(3), '')
+    final = text
+    text = undo_all(journal, text)
+    assert text == SAMPLE * 5
+    while journal.can_redo():
+        for e in journal.redo():
+            text = apply(text, e)
+    assert text == final
+
+
+def test_cap_squashes_old_steps_into_a_checkpoint():
+    journal = UndoJournal(max_bytes=4000)
+    text = SAMPLE
+    # Rewriting the same option over and over composes into one delta
+    for i in range(200):
+        start = offset(text, 0, 19)
+        end = text.index('\n')
+        journal.separator()
+        text = edit(journal, text, start, end - start, str(i))
+    assert journal.memory <= 4000
+    assert len(journal) < 200
+    assert undo_all(journal, text) == SAMPLE
+
+
+def test_cap_drops_the_oldest_history():
+    journal = UndoJournal(max_bytes=1000)
+    text = ''
+    for i in range(100):
+        journal.separator()
+        text = edit(journal, text, len(text), 0, f'#define OPTION_{i}\n')
+    assert journal.memory <= 1000
+    assert 0 < len(journal) < 100
+    assert undo_all(journal, text).startswith('#define OPTION_0\n')
+
+
+def test_compose_chained_edits():
+    assert compose(Edit(0, 4, '', 'ab'), Edit(0, 6, '', 'c')) == Edit(0, 4, '', 'abc')
+    assert compose(Edit(0, 4, 'xy', 'ab'), Edit(0, 3, 'za', 'Q')) == Edit(0, 3, 'zxy', 'Qb')
+    assert compose(Edit(0, 4, '', 'ab'), Edit(0, 7, '', 'c')) is None
+    assert compose(Edit(0, 4, '', 'ab'), Edit(1, 4, '', 'c')) is None